@@ -0,0 +1,234 @@
+"""
+Benchmark dos agregados das contas. No próprio processo, para quantidades crescentes de contas, mede a varredura
+completa e a latência do relatório, que deve se manter constante. Em seguida, aplica alterações aleatórias por
+`Conta.aplicar`, de várias threads e durante uma varredura, e confere os agregados incrementais com um cálculo
+direto sobre os saldos esperados, e que a verificação não encontra divergências. Por fim, consulta o relatório
+pelo servidor, com e sem verificação.
+
+Uso: PYTHONPATH=$(pwd) python3 -m benchmarks.agregados --contas 100000
+"""
+from __future__ import annotations
+
+import time
+import random
+import argparse
+import tempfile
+import threading
+from bisect import bisect_right
+from typing import Dict, List
+
+from pixson.cliente import Cliente
+from pixson.recursos.conta import Conta
+from pixson.recursos.enums import Operacoes
+from pixson.recursos.protocolo import OperacaoDeposito
+from pixson.recursos.travas import TravasContas
+from pixson.recursos.agregados import Agregados, FAIXAS_PADRAO, TOPO_PADRAO
+from pixson.recursos.armazenamento import ARMAZENAMENTO_JSON, ARMAZENAMENTO_MMAP, criar_armazenamento
+from benchmarks.comum import servidor_temporario
+
+RG_PADRAO = '1111111111'
+
+
+def percentis(amostras: List[float]) -> str:
+    amostras = sorted(amostras)
+    return (
+        f'p50={amostras[len(amostras) // 2] * 1e6:.1f} µs | p99={amostras[int(len(amostras) * 0.99)] * 1e6:.1f} µs'
+    )
+
+
+def conferir(agregados: Agregados, saldos: Dict[str, int]) -> List[str]:
+    """
+    Compara o relatório com os agregados calculados diretamente sobre os saldos esperados.
+    :return: Os nomes dos agregados divergentes.
+    :rtype: list
+    """
+    relatorio = agregados.relatorio()
+    histograma = [0] * (len(agregados.faixas) + 1)
+    for saldo in saldos.values():
+        histograma[bisect_right(agregados.faixas, saldo)] += 1
+    maiores = sorted(saldos.values(), reverse=True)[:agregados.topo]
+    divergentes = []
+    if relatorio['quantidade'] != len(saldos):
+        divergentes.append('quantidade')
+    if relatorio['total_centavos'] != sum(saldos.values()):
+        divergentes.append('total')
+    if [faixa['contas'] for faixa in relatorio['histograma']] != histograma:
+        divergentes.append('histograma')
+    topo = relatorio['topo']
+    if relatorio['topo_exato'] and (
+            [conta['saldo_centavos'] for conta in topo] != maiores
+            or any(saldos[conta['rg']] != conta['saldo_centavos'] for conta in topo)
+    ):
+        divergentes.append('topo')
+    return divergentes
+
+
+def alterar(travas: TravasContas, saldos: Dict[str, int], rgs: List[str], operacoes: int, semente: int) -> None:
+    """
+    Aplica depósitos, saques e transferências aleatórios, como o servidor: com as travas das contas adquiridas.
+    """
+    aleatorio = random.Random(semente)
+    for _ in range(operacoes):
+        origem, destino = aleatorio.sample(rgs, 2)
+        valor = aleatorio.randint(1, 200_000_00)
+        tipo = aleatorio.random()
+        with travas.travar(origem, destino):
+            conta = Conta.ler_arquivo(origem)
+            if tipo < 0.4:
+                Conta.aplicar(operacao=Operacoes.DEPOSITO, saldos={conta: conta.saldo + valor})
+            elif tipo < 0.6:
+                Conta.aplicar(operacao=Operacoes.SAQUE, saldos={conta: conta.saldo - valor})
+            else:
+                outra = Conta.ler_arquivo(destino)
+                Conta.aplicar(operacao=Operacoes.TRANSFERENCIA, saldos={conta: conta.saldo - valor, outra: outra.saldo + valor})
+                saldos[destino] = outra.saldo
+            saldos[origem] = conta.saldo
+
+
+def medir_local(tipo: str, contas: int, operacoes: int, consultas: int) -> bool:
+    """
+    Cria as contas num armazenamento temporário, mede a varredura e o relatório e confere os agregados.
+    :return: Se todas as verificações passaram.
+    :rtype: bool
+    """
+    resultados = []
+    original = Conta.armazenamento
+    with tempfile.TemporaryDirectory() as pasta:
+        Conta.armazenamento = criar_armazenamento(tipo=tipo, pasta=pasta)
+        travas = TravasContas()
+        saldos: Dict[str, int] = {}
+        aleatorio = random.Random(contas)
+        criadas = 0
+        medianas = []
+        for quantidade in sorted({max(contas // 100, 10), max(contas // 10, 10), contas}):
+            for indice in range(criadas, quantidade):
+                rg = f'{indice:010d}'
+                saldos[rg] = aleatorio.choice((0, aleatorio.randint(-5_000_00, 50_000_00), aleatorio.randint(0, 10 ** 10)))
+                Conta.armazenamento.gravar({'rg': rg, 'nome': f'Conta {indice}', 'saldo': saldos[rg]})
+            criadas = quantidade
+            agregados = Agregados(faixas=FAIXAS_PADRAO, topo=TOPO_PADRAO)
+            agregados.pausar = travas.travar_todas
+            varredura = agregados.reconstruir()
+            latencias = []
+            for _ in range(consultas):
+                inicio = time.perf_counter()
+                agregados.relatorio()
+                latencias.append(time.perf_counter() - inicio)
+            medianas.append(sorted(latencias)[len(latencias) // 2])
+            divergentes = conferir(agregados, saldos)
+            print(
+                f'  {quantidade:>8} contas: varredura {varredura["duracao_s"] * 1000:.0f} ms'
+                f' ({varredura["duracao_s"] / quantidade * 1e6:.2f} µs por conta) | relatório {percentis(latencias)}'
+                f'{" | divergências: " + ", ".join(divergentes) if divergentes else ""}'
+            )
+            resultados.append(not divergentes)
+        # O relatório não depende do número de contas: a mediana com 100 vezes mais contas fica na mesma ordem.
+        resultados.append(medianas[-1] < medianas[0] * 3 + 20e-6)
+
+        Conta.agregados = agregados
+        rgs = list(saldos)
+        try:
+            inicio = time.perf_counter()
+            alterar(travas, saldos, rgs, operacoes, semente=1)
+            duracao = time.perf_counter() - inicio
+            divergentes = conferir(agregados, saldos)
+            print(
+                f'  {operacoes} alterações sequenciais: {duracao / operacoes * 1e6:.1f} µs por alteração'
+                f' | agregados {"corretos" if not divergentes else "divergentes: " + ", ".join(divergentes)}'
+            )
+            resultados.append(not divergentes)
+
+            # Alterações concorrentes entre si e com a varredura da verificação. Cada thread altera um
+            # conjunto próprio de contas, para que os saldos esperados não dependam da ordem entre elas.
+            grupos = [rgs[indice::4] for indice in range(4)]
+            threads = [
+                threading.Thread(target=alterar, args=(travas, saldos, grupo, operacoes // 4, indice + 2))
+                for indice, grupo in enumerate(grupos)
+            ]
+            for thread in threads:
+                thread.start()
+            verificacoes = []
+            while any(thread.is_alive() for thread in threads):
+                verificacoes.append(agregados.reconstruir())
+            for thread in threads:
+                thread.join()
+            divergentes = conferir(agregados, saldos)
+            print(
+                f'  {operacoes} alterações em 4 threads durante {len(verificacoes)} varreduras:'
+                f' agregados {"corretos" if not divergentes else "divergentes: " + ", ".join(divergentes)}'
+                f' | divergências nas varreduras: {sum(bool(v["divergencias"]) for v in verificacoes)}'
+            )
+            resultados.append(not divergentes and not any(v['divergencias'] for v in verificacoes))
+
+            verificacao = agregados.reconstruir()
+            print(f'  verificação final: {verificacao["divergencias"] or "sem divergências"}')
+            resultados.append(not verificacao['divergencias'] and not conferir(agregados, saldos))
+        finally:
+            Conta.agregados = None
+            Conta.armazenamento.fechar()
+            Conta.armazenamento = original
+    return all(resultados)
+
+
+def medir_servidor(porta: int, consultas: int) -> bool:
+    """
+    Consulta o relatório pelo servidor, antes e depois de um depósito, e com verificação.
+    :return: Se o relatório acompanhou o depósito e a verificação não encontrou divergências.
+    :rtype: bool
+    """
+    with servidor_temporario(porta):
+        cliente = Cliente(rg=RG_PADRAO, host='localhost', porta=porta, interativo=False)
+        cliente.conectar()
+        cliente.login()
+        relatorio = None
+        for _ in range(100):
+            try:
+                relatorio = cliente.consultar_relatorio()
+                break
+            except ValueError:
+                time.sleep(0.05)
+        if relatorio is None:
+            print('  servidor: relatório não ficou pronto')
+            return False
+        cliente.enviar_solicitacao(OperacaoDeposito(tempo=cliente.obter_e_incrementar_tempo(), rg=RG_PADRAO, valor=12345))
+        cliente.receber_resposta()
+        latencias = []
+        for _ in range(consultas):
+            inicio = time.perf_counter()
+            depois = cliente.consultar_relatorio()
+            latencias.append(time.perf_counter() - inicio)
+        verificado = cliente.consultar_relatorio(verificar=True)
+        cliente.desconectar()
+    correto = (
+        depois['total_centavos'] == relatorio['total_centavos'] + 12345
+        and depois['quantidade'] == relatorio['quantidade']
+        and verificado['ultima_varredura']['divergencias'] == {}
+    )
+    print(
+        f'  servidor: {depois["quantidade"]} contas | {percentis(latencias)} por consulta'
+        f' | agregados {"corretos" if correto else "incorretos"}'
+    )
+    return correto
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark dos agregados das contas do PIXSON')
+    parser.add_argument('--porta', type=int, default=6150)
+    parser.add_argument('--contas', type=int, default=100000)
+    parser.add_argument('--operacoes', type=int, default=20000, help='alterações aleatórias aplicadas')
+    parser.add_argument('--consultas', type=int, default=2000)
+    argumentos = parser.parse_args()
+
+    resultados = []
+    for tipo, contas in ((ARMAZENAMENTO_MMAP, argumentos.contas), (ARMAZENAMENTO_JSON, max(argumentos.contas // 20, 100))):
+        print(f'agregados no processo, armazenamento {tipo}:')
+        resultados.append(medir_local(tipo, contas, argumentos.operacoes, argumentos.consultas))
+    print('agregados pelo servidor:')
+    resultados.append(medir_servidor(argumentos.porta, argumentos.consultas // 4))
+    print('OK' if all(resultados) else 'FALHA')
+    if not all(resultados):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
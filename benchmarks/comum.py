@@ -0,0 +1,85 @@
+"""
+Utilitários compartilhados pelos benchmarks: servidor temporário e medições do processo.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import time
+import shutil
+import socket
+import tempfile
+import subprocess
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Iterator, List
+
+from pixson.recursos import utils
+
+RAIZ = Path(__file__).resolve().parent.parent
+
+
+def aguardar_porta(porta: int, limite: float = 10.0) -> None:
+    """
+    Aguarda até o servidor aceitar conexões na porta.
+    :param porta: Porta do servidor.
+    :type porta: int
+    :param limite: Tempo máximo de espera, em segundos.
+    :type limite: float
+    """
+    fim = time.monotonic() + limite
+    while time.monotonic() < fim:
+        try:
+            socket.create_connection(('localhost', porta), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f'Servidor não respondeu na porta {porta}')
+
+
+def memoria_processo(pid: int) -> str:
+    """
+    Lê a memória residente e o número de threads do processo (apenas Linux).
+    :param pid: Identificador do processo.
+    :type pid: int
+    :rtype: str
+    """
+    try:
+        status = Path(f'/proc/{pid}/status').read_text().splitlines()
+    except OSError:
+        return 'indisponível'
+    campos = dict(linha.split(':', 1) for linha in status if ':' in linha)
+    return f"rss={campos['VmRSS'].strip()} threads={campos['Threads'].strip()}"
+
+
+@contextmanager
+def servidor_temporario(porta: int, argumentos: List[str] = ()) -> Iterator[subprocess.Popen]:
+    """
+    Inicia o servidor numa cópia temporária de `contas/`, para que o benchmark não altere as contas do repositório.
+    :param porta: Porta do servidor.
+    :type porta: int
+    :param argumentos: Argumentos adicionais da linha de comando do servidor.
+    :type argumentos: list
+    """
+    with tempfile.TemporaryDirectory() as pasta:
+        shutil.copytree(RAIZ / 'contas', Path(pasta) / 'contas')
+        ambiente = dict(os.environ, PYTHONPATH=str(RAIZ))
+        processo = subprocess.Popen(
+            [sys.executable, '-m', 'pixson.servidor', '--porta', str(porta), *argumentos],
+            cwd=pasta, env=ambiente, stdout=subprocess.DEVNULL
+        )
+        try:
+            aguardar_porta(porta)
+            yield processo
+        finally:
+            processo.terminate()
+            processo.wait()
+
+
+def requisitar(s: socket.socket, mensagem: str) -> str:
+    """
+    Envia uma mensagem e aguarda a resposta do servidor.
+    :rtype: str
+    """
+    s.send(mensagem.encode())
+    return s.recv(utils.TAMANHO_BUFFER_PADRAO).decode()
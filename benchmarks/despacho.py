@@ -0,0 +1,64 @@
+"""
+Microbenchmark do custo de análise e despacho de uma solicitação de texto no servidor.
+
+Compara a cadeia de `match` usada anteriormente em `Servidor.processar_operacao` (leitura do tempo,
+até cinco expressões testadas em sequência e um novo `match` no `desencapsular`) com `Protocolo.analisar`
+seguido da consulta à tabela `PROCESSADORES`.
+
+Uso: PYTHONPATH=$(pwd) python3 -m benchmarks.despacho --repeticoes 200000
+"""
+from __future__ import annotations
+
+import timeit
+import argparse
+from re import match
+
+from pixson.recursos.protocolo import *
+from pixson.servidor import PROCESSADORES
+
+MENSAGENS = [
+    OperacaoSaldo(tempo=10, rg='1111111111').encapsular(),
+    OperacaoSaque(tempo=10, rg='1111111111', valor=850).encapsular(),
+    OperacaoDeposito(tempo=10, rg='1111111111', valor=1400).encapsular(),
+    OperacaoTransferencia(tempo=10, rg_origem='1111111111', rg_destino='2222222222', valor=550).encapsular(),
+    OperacaoLogin(tempo=10, rg='1111111111').encapsular(),
+]
+
+CADEIA = [OperacaoSaldo, OperacaoSaque, OperacaoDeposito, OperacaoTransferencia, OperacaoLogin]
+
+
+def despachar_cadeia(mensagem: str):
+    """
+    Reproduz a análise feita pela cadeia de `if/elif` anterior.
+    """
+    Protocolo.obter_tempo(mensagem)
+    for classe in CADEIA:
+        if match(pattern=classe.pattern, string=mensagem):
+            return PROCESSADORES[classe.operacao], classe.desencapsular(mensagem)
+    return None
+
+
+def despachar_tabela(mensagem: str):
+    """
+    Análise em uma única leitura e despacho pela tabela de processadores.
+    """
+    solicitacao = Protocolo.analisar(mensagem)
+    return PROCESSADORES[solicitacao.operacao], solicitacao
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Microbenchmark do despacho de operações do servidor PIXSON')
+    parser.add_argument('--repeticoes', type=int, default=100000)
+    argumentos = parser.parse_args()
+
+    print(f'{"mensagem":<60} {"cadeia":>9} {"tabela":>9}')
+    for mensagem in MENSAGENS:
+        custos = [
+            min(timeit.repeat(lambda: funcao(mensagem), number=argumentos.repeticoes, repeat=3)) / argumentos.repeticoes
+            for funcao in (despachar_cadeia, despachar_tabela)
+        ]
+        print(f'{mensagem:<60} {custos[0] * 1e9:7.0f}ns {custos[1] * 1e9:7.0f}ns')
+
+
+if __name__ == '__main__':
+    main()
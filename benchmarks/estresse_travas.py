@@ -0,0 +1,118 @@
+"""
+Teste de estresse de concorrência das travas por conta.
+
+Clientes simultâneos fazem transferências aleatórias entre as contas de exemplo. Ao final, a soma
+dos saldos deve ser igual à soma inicial, e a vazão é reportada para cada número de clientes.
+
+Com `--sessoes`, cada cliente faz login numa conta e transfere dela sem informar o RG de origem, usando a
+conta fixada na conexão. Vários clientes compartilham cada conta, e com `--sem-cache` ou uma capacidade de
+cache pequena as contas fixadas são constantemente invalidadas pelas alterações dos outros clientes.
+
+Uso: PYTHONPATH=$(pwd) python3 -m benchmarks.estresse_travas --clientes 1 2 4 8 16 --operacoes 300
+     PYTHONPATH=$(pwd) python3 -m benchmarks.estresse_travas --clientes 16 --sessoes --cache-capacidade 2
+"""
+from __future__ import annotations
+
+import time
+import random
+import socket
+import argparse
+import threading
+from pathlib import Path
+from re import match
+
+from typing import List
+
+from pixson.recursos.protocolo import OperacaoLogin, OperacaoSaldo, OperacaoTransferencia, RespostaSucesso
+from pixson.recursos.dinheiro import ler_valor, formatar_valor
+from benchmarks.comum import RAIZ, requisitar, servidor_temporario
+
+RGS = sorted(arquivo.stem for arquivo in Path(RAIZ / 'contas').glob('*.json'))
+
+
+def cliente_transferencias(porta: int, operacoes: int, semente: int, largada: threading.Barrier, sessoes: bool) -> None:
+    """
+    Conecta, aguarda a largada e executa transferências de valores aleatórios entre contas aleatórias,
+    ou, com sessões, da conta autenticada para contas aleatórias.
+    """
+    aleatorio = random.Random(semente)
+    rg_sessao = RGS[semente % len(RGS)]
+    with socket.create_connection(('localhost', porta)) as s:
+        if sessoes:
+            requisitar(s, OperacaoLogin(0, rg_sessao).encapsular())
+        largada.wait()
+        for tempo in range(operacoes):
+            if sessoes:
+                rg_origem = None
+                rg_destino = aleatorio.choice([rg for rg in RGS if rg != rg_sessao])
+            else:
+                rg_origem, rg_destino = aleatorio.sample(RGS, 2)
+            requisitar(s, OperacaoTransferencia(tempo, rg_origem, rg_destino, aleatorio.randint(1, 300)).encapsular())
+
+
+def somar_saldos(porta: int) -> int:
+    """
+    Consulta e soma o saldo de todas as contas, em centavos.
+    :rtype: int
+    """
+    total = 0
+    with socket.create_connection(('localhost', porta)) as s:
+        for rg in RGS:
+            resposta = RespostaSucesso.desencapsular(requisitar(s, OperacaoSaldo(0, rg).encapsular()))
+            total += ler_valor(match(r'^Saldo: (.*)$', resposta.resposta).group(1))
+    return total
+
+
+def medir(porta: int, clientes: int, operacoes: int, sessoes: bool = False, argumentos: List[str] = ()) -> bool:
+    """
+    Executa o estresse com um número de clientes e verifica a conservação dos saldos.
+    :rtype: bool
+    """
+    with servidor_temporario(porta, argumentos):
+        total_inicial = somar_saldos(porta)
+        largada = threading.Barrier(clientes + 1)
+        threads = [
+            threading.Thread(target=cliente_transferencias, args=(porta, operacoes, semente, largada, sessoes))
+            for semente in range(clientes)
+        ]
+        for thread in threads:
+            thread.start()
+        largada.wait()
+        inicio = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        duracao = time.perf_counter() - inicio
+        total_final = somar_saldos(porta)
+
+    conservado = total_inicial == total_final
+    print(
+        f'clientes={clientes:>3}: {clientes * operacoes / duracao:10.0f} op/s'
+        f' | saldo total {formatar_valor(total_inicial)} -> {formatar_valor(total_final)} {"OK" if conservado else "DIVERGENTE"}'
+    )
+    return conservado
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Estresse de concorrência das travas por conta')
+    parser.add_argument('--porta', type=int, default=5200)
+    parser.add_argument('--clientes', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--operacoes', type=int, default=300, help='transferências por cliente')
+    parser.add_argument('--sessoes', action='store_true', help='transfere da conta autenticada, sem o RG de origem')
+    parser.add_argument('--sem-cache', action='store_true', help='executa o servidor sem o armazém em memória')
+    parser.add_argument('--cache-capacidade', type=int, help='capacidade do armazém em memória do servidor')
+    argumentos = parser.parse_args()
+
+    argumentos_servidor = ['--sem-cache'] if argumentos.sem_cache else []
+    if argumentos.cache_capacidade is not None:
+        argumentos_servidor += ['--cache-capacidade', str(argumentos.cache_capacidade)]
+    conservado = True
+    for deslocamento, clientes in enumerate(argumentos.clientes):
+        conservado &= medir(
+            argumentos.porta + deslocamento, clientes, argumentos.operacoes, argumentos.sessoes, argumentos_servidor
+        )
+    if not conservado:
+        raise SystemExit('Saldo total não foi conservado')
+
+
+if __name__ == '__main__':
+    main()
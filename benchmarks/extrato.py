@@ -0,0 +1,193 @@
+"""
+Benchmark do extrato das contas. No próprio processo, registra movimentos em poucas contas com segmentos
+pequenos e mede o custo do registro e a latência da consulta da página mais recente, respondida da memória,
+e de páginas antigas, lidas dos segmentos. Verifica que a paginação percorre todos os movimentos retidos,
+sem lacunas nem repetições, que as consultas por intervalo de tempo lógico e de instante retornam o mesmo
+que uma busca linear, e que os segmentos além da retenção vão para o arquivo morto. Em seguida, mede a
+consulta pelo servidor, em texto e binário, e confere os movimentos das operações feitas pelo benchmark.
+
+Uso: PYTHONPATH=$(pwd) python3 -m benchmarks.extrato --movimentos 20000
+"""
+from __future__ import annotations
+
+import json
+import time
+import socket
+import argparse
+import tempfile
+import itertools
+from pathlib import Path
+from typing import List
+
+from pixson.recursos.enums import Operacoes
+from pixson.recursos.extrato import Extrato, PASTA_ARQUIVO, SEQ, TEMPO, INSTANTE, CHAVE_INSTANTE, CHAVE_TEMPO
+from pixson.recursos.protocolo import (
+    OperacaoDeposito, OperacaoExtrato, OperacaoLogin, OperacaoTransferencia, Protocolo, RespostaSucesso,
+    CABECALHO, CODIFICACAO_BINARIA, SEPARADOR
+)
+from benchmarks.comum import servidor_temporario
+
+RG_PADRAO = '1111111111'
+RG_DESTINO = '2222222222'
+
+
+def percentis(amostras: List[float]) -> str:
+    amostras = sorted(amostras)
+    return (
+        f'p50={amostras[len(amostras) // 2] * 1e6:.0f} µs | p99={amostras[int(len(amostras) * 0.99)] * 1e6:.0f} µs'
+    )
+
+
+def medir_local(movimentos: int, segmento: int, retencao: int, consultas: int) -> bool:
+    """
+    Registra movimentos num extrato temporário e mede as consultas.
+    :return: Se todas as verificações passaram.
+    :rtype: bool
+    """
+    resultados = []
+    with tempfile.TemporaryDirectory() as pasta:
+        relogio = itertools.count(1)
+        extrato = Extrato(pasta=pasta, segmento=segmento, retencao=retencao, intervalo=0.2)
+        extrato.iniciar(obter_tempo=lambda: next(relogio))
+        rgs = [f'{indice:010d}' for indice in range(1, 5)]
+        saldo = 0
+        inicio = time.perf_counter()
+        for indice in range(movimentos):
+            rg = rgs[indice % len(rgs)] if indice % 2 else rgs[0]
+            extrato.registrar(operacao=Operacoes.DEPOSITO, saldos={rg: (saldo, saldo + 1)})
+            saldo += 1
+        duracao = time.perf_counter() - inicio
+        print(f'  registro: {movimentos} movimentos em {duracao:.2f} s ({duracao / movimentos * 1e6:.1f} µs por movimento)')
+        extrato.descarregar()
+
+        rg = rgs[0]
+        recentes = []
+        for _ in range(consultas):
+            inicio = time.perf_counter()
+            pagina, proximo = extrato.consultar(rg=rg)
+            recentes.append(time.perf_counter() - inicio)
+        print(f'  página mais recente (memória): {percentis(recentes)}')
+        resultados.append(sorted(recentes)[len(recentes) // 2] < 0.001)
+
+        # Percorre todas as páginas: os números sequenciais devem ser contíguos e decrescentes.
+        seqs = []
+        antigas = []
+        antes = None
+        while True:
+            inicio = time.perf_counter()
+            pagina, antes = extrato.consultar(rg=rg, antes=antes, limite=100)
+            antigas.append(time.perf_counter() - inicio)
+            seqs.extend(movimento[SEQ] for movimento in pagina)
+            if antes is None:
+                break
+        historico = extrato.historicos[rg]
+        esperados = list(range(historico.seq, historico.seq - len(seqs), -1))
+        limite_retidos = segmento * (retencao + 1)
+        print(
+            f'  paginação completa: {len(seqs)} movimentos retidos de {historico.seq} (limite {limite_retidos})'
+            f' em {len(antigas)} páginas | {percentis(antigas)}'
+        )
+        resultados.append(seqs == esperados and len(seqs) <= limite_retidos)
+
+        arquivados = list((Path(pasta) / PASTA_ARQUIVO / rg).glob('*.jsonl'))
+        consultaveis = len(historico.segmentos)
+        print(f'  segmentos: {consultaveis} consultáveis, {len(arquivados)} no arquivo morto')
+        resultados.append(consultaveis <= retencao and (historico.seq <= limite_retidos or arquivados))
+
+        # Intervalos: compara com a busca linear sobre todas as páginas.
+        todos = []
+        antes = None
+        while True:
+            pagina, antes = extrato.consultar(rg=rg, antes=antes, limite=100)
+            todos.extend(pagina)
+            if antes is None:
+                break
+        for chave, indice in ((CHAVE_TEMPO, TEMPO), (CHAVE_INSTANTE, INSTANTE)):
+            valores = sorted({movimento[indice] for movimento in todos})
+            for de, ate in ((valores[len(valores) // 3], valores[len(valores) // 2]), (valores[-5], valores[-1]), (valores[0], valores[10])):
+                esperado = [movimento for movimento in todos if de <= movimento[indice] <= ate]
+                obtido = []
+                antes = None
+                while True:
+                    pagina, antes = extrato.consultar(rg=rg, inicio=de, fim=ate, chave=chave, antes=antes, limite=37)
+                    obtido.extend(pagina)
+                    if antes is None:
+                        break
+                if obtido != esperado:
+                    print(f'  intervalo por {chave} [{de}, {ate}]: {len(obtido)} movimentos, esperados {len(esperado)}')
+                    resultados.append(False)
+        print(f'  intervalos por tempo e por instante: {"corretos" if all(resultados) else "incorretos"}')
+
+        extrato.encerrar()
+        # Um novo extrato, lido do disco, continua a numeração e responde as mesmas páginas.
+        relido = Extrato(pasta=pasta, segmento=segmento, retencao=retencao)
+        pagina, _ = relido.consultar(rg=rg, limite=100)
+        resultados.append([movimento[SEQ] for movimento in pagina] == seqs[:100])
+    return all(resultados)
+
+
+def requisitar(s: socket.socket, arquivo, solicitacao: Protocolo, binario: bool) -> Protocolo:
+    if binario:
+        s.sendall(solicitacao.empacotar())
+        cabecalho = arquivo.read(CABECALHO.size)
+        _, comprimento, _, _ = Protocolo.ler_cabecalho(cabecalho)
+        return Protocolo.desempacotar(cabecalho + arquivo.read(comprimento))
+    s.sendall(solicitacao.enquadrar())
+    return Protocolo.analisar_resposta(arquivo.readline().rstrip(SEPARADOR).decode())
+
+
+def medir_servidor(porta: int, consultas: int) -> bool:
+    """
+    Faz depósitos e transferências pelo servidor e consulta o extrato, em texto e binário.
+    :return: Se os movimentos do extrato correspondem às operações feitas.
+    :rtype: bool
+    """
+    resultados = []
+    with servidor_temporario(porta):
+        for binario in (False, True):
+            with socket.create_connection(('localhost', porta)) as s:
+                arquivo = s.makefile('rb')
+                codificacao = CODIFICACAO_BINARIA if binario else 'texto'
+                s.sendall(OperacaoLogin(0, RG_PADRAO, codificacao=codificacao).enquadrar())
+                arquivo.readline()
+                for valor in (100, 200, 300):
+                    requisitar(s, arquivo, OperacaoDeposito(0, None, valor), binario)
+                requisitar(s, arquivo, OperacaoTransferencia(0, None, RG_DESTINO, 50), binario)
+
+                latencias = []
+                for _ in range(consultas):
+                    inicio = time.perf_counter()
+                    resposta = requisitar(s, arquivo, OperacaoExtrato(0, None, limite=4), binario)
+                    latencias.append(time.perf_counter() - inicio)
+                extrato = json.loads(resposta.resposta) if isinstance(resposta, RespostaSucesso) else {'movimentos': []}
+                valores = [movimento['valor_centavos'] for movimento in extrato['movimentos']]
+                ultimo = extrato['movimentos'][0] if extrato['movimentos'] else {}
+                correto = (
+                    valores == [-50, 300, 200, 100] and ultimo.get('contraparte') == RG_DESTINO
+                    and ultimo.get('saldo_centavos') == extrato['saldo_centavos']
+                )
+                print(f'  servidor ({codificacao}): {percentis(latencias)} por consulta | movimentos {"corretos" if correto else valores}')
+                resultados.append(correto)
+    return all(resultados)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark do extrato das contas do PIXSON')
+    parser.add_argument('--porta', type=int, default=6050)
+    parser.add_argument('--movimentos', type=int, default=20000)
+    parser.add_argument('--segmento', type=int, default=1000, help='movimentos por segmento')
+    parser.add_argument('--retencao', type=int, default=3, help='segmentos fechados consultáveis')
+    parser.add_argument('--consultas', type=int, default=2000)
+    argumentos = parser.parse_args()
+
+    print('extrato no processo:')
+    resultados = [medir_local(argumentos.movimentos, argumentos.segmento, argumentos.retencao, argumentos.consultas)]
+    print('extrato pelo servidor:')
+    resultados.append(medir_servidor(argumentos.porta, argumentos.consultas // 4))
+    print('OK' if all(resultados) else 'FALHA')
+    if not all(resultados):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""
+Teste de failover do grupo de réplicas.
+
+Inicia três réplicas, cada uma com a sua cópia de `contas/`, e gera carga de transferências e consultas
+nas duas seguidoras. No meio da carga, o líder (nó 0) é encerrado com SIGKILL; quando a concessão dele
+expira, as seguidoras devem eleger o nó 1, numa nova época, e continuar atendendo. Ao final, verifica que
+as réplicas restantes têm os mesmos saldos e que a soma dos saldos foi conservada; em seguida, reinicia o
+nó 0, que deve copiar o estado do nó 1 e voltar ao grupo como seguidor.
+
+Uso: PYTHONPATH=$(pwd) python3 -m benchmarks.failover --clientes 8 --duracao 6
+"""
+from __future__ import annotations
+
+import os
+import sys
+import time
+import shutil
+import signal
+import argparse
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from re import match
+from typing import Dict, List, Optional
+
+from pixson import carga
+from pixson.cliente import Cliente
+from pixson.recursos.protocolo import OperacaoSaldo
+from pixson.recursos.dinheiro import ler_valor, formatar_valor
+from benchmarks.comum import RAIZ, aguardar_porta
+
+RGS = sorted(arquivo.stem for arquivo in Path(RAIZ / 'contas').glob('*.json'))
+# Tempo máximo, em segundos, para o grupo eleger o líder e todos os nós ficarem atualizados.
+PRAZO_GRUPO = 15.0
+
+
+def iniciar_replica(pasta: Path, no: int, portas: List[int]) -> subprocess.Popen:
+    """
+    Inicia uma réplica, com as contas em `pasta/contas-<no>`.
+    :rtype: subprocess.Popen
+    """
+    processo = subprocess.Popen(
+        [
+            sys.executable, '-m', 'pixson.servidor', '--porta', str(portas[no]),
+            '--replicas', ','.join(map(str, portas)), '--pasta', f'contas-{no}'
+        ],
+        cwd=pasta, env=dict(os.environ, PYTHONPATH=str(RAIZ)), stdout=subprocess.DEVNULL
+    )
+    aguardar_porta(portas[no])
+    return processo
+
+
+def consultar_saldos(porta: int) -> Dict[str, int]:
+    """
+    Consulta o saldo de todas as contas numa réplica, em centavos.
+    :rtype: dict
+    """
+    cliente = Cliente(RGS[0], host='localhost', porta=porta, interativo=False)
+    cliente.conectar()
+    saldos = {}
+    for rg in RGS:
+        cliente.enviar_solicitacao(OperacaoSaldo(tempo=cliente.obter_e_incrementar_tempo(), rg=rg))
+        saldos[rg] = ler_valor(match(r'^Saldo: (.*)$', cliente.receber_resposta().resposta).group(1))
+    cliente.desconectar()
+    return saldos
+
+
+def consultar_replicacao(porta: int) -> Dict:
+    """
+    Consulta a visão da réplica sobre o grupo.
+    :rtype: dict
+    """
+    cliente = Cliente(RGS[0], host='localhost', porta=porta, interativo=False)
+    cliente.conectar()
+    estatisticas = cliente.consultar_estatisticas()
+    cliente.desconectar()
+    return estatisticas['replicacao']
+
+
+def aguardar_grupo(portas: List[int], lider: int) -> Optional[Dict]:
+    """
+    Aguarda todas as réplicas reconhecerem o líder esperado e ficarem atualizadas.
+    :param portas: Portas das réplicas em execução.
+    :type portas: List[int]
+    :param lider: Número do líder esperado.
+    :type lider: int
+    :return: A visão do grupo na primeira réplica, ou None se o prazo se esgotar.
+    :rtype: Optional[dict]
+    """
+    limite = time.monotonic() + PRAZO_GRUPO
+    while time.monotonic() < limite:
+        try:
+            visoes = [consultar_replicacao(porta) for porta in portas]
+        except OSError:
+            visoes = []
+        if visoes and all(visao['lider'] == lider and visao['atualizada'] for visao in visoes):
+            return visoes[0]
+        time.sleep(0.1)
+    return None
+
+
+def verificar(portas: List[int], total_inicial: int) -> bool:
+    """
+    Verifica que as réplicas têm os mesmos saldos e que a soma foi conservada.
+    :rtype: bool
+    """
+    saldos = [consultar_saldos(porta) for porta in portas]
+    iguais = all(outros == saldos[0] for outros in saldos[1:])
+    total = sum(saldos[0].values())
+    conservado = total == total_inicial
+    print(f'  réplicas {portas}: saldos iguais={iguais}, soma={formatar_valor(total)} (inicial {formatar_valor(total_inicial)})')
+    return iguais and conservado
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Teste de failover das réplicas do PIXSON')
+    parser.add_argument('--porta', type=int, default=5700)
+    parser.add_argument('--clientes', type=int, default=8, help='clientes simulados por seguidora')
+    parser.add_argument('--duracao', type=float, default=6.0, help='duração da carga, em segundos')
+    argumentos = parser.parse_args()
+
+    portas = [argumentos.porta + no for no in range(3)]
+    with tempfile.TemporaryDirectory() as diretorio:
+        pasta = Path(diretorio)
+        for no in range(3):
+            shutil.copytree(RAIZ / 'contas', pasta / f'contas-{no}')
+        replicas: List[subprocess.Popen] = []
+        resultados = {}
+
+        def gerar_carga(porta: int) -> None:
+            configuracao = {
+                'host': 'localhost', 'porta': porta, 'rgs': RGS,
+                'mistura': carga.ler_mistura('saldo=50,transferencia=50'),
+                'zipf': 0.0, 'valor': carga.VALOR_PADRAO, 'codificacao': carga.CODIFICACAO_TEXTO,
+                'duracao': argumentos.duracao, 'semente': porta,
+            }
+            resultados[porta] = carga.executar(configuracao, carga.MODO_THREADS, argumentos.clientes)
+
+        geradores = [threading.Thread(target=gerar_carga, args=(porta,)) for porta in portas[1:]]
+        try:
+            for no in range(3):
+                replicas.append(iniciar_replica(pasta, no, portas))
+            if aguardar_grupo(portas, lider=0) is None:
+                raise RuntimeError('O grupo de réplicas não elegeu o nó 0')
+            total_inicial = sum(consultar_saldos(portas[0]).values())
+            for gerador in geradores:
+                gerador.start()
+            time.sleep(argumentos.duracao / 3)
+            print(f'Encerrando o líder (nó 0, porta {portas[0]}) com SIGKILL')
+            replicas[0].send_signal(signal.SIGKILL)
+            replicas[0].wait()
+            for gerador in geradores:
+                gerador.join()
+
+            for porta, resultado in resultados.items():
+                print(
+                    f"  carga na porta {porta}: {resultado['ops_por_segundo']:.0f} op/s,"
+                    f" erros={resultado['taxa_erros']:.4f}, recusas={resultado['taxa_recusas']:.4f}"
+                )
+            grupo = aguardar_grupo(portas[1:], lider=1)
+            if grupo is not None:
+                print(f"  após a falha: líder={grupo['lider']} época={grupo['epoca']} ativos={grupo['ativos']}")
+            sucesso = grupo is not None and verificar(portas[1:], total_inicial)
+
+            print('Reiniciando o nó 0')
+            replicas[0] = iniciar_replica(pasta, 0, portas)
+            gerar_carga(portas[2])
+            grupo = aguardar_grupo(portas, lider=1)
+            if grupo is not None:
+                print(f"  após o retorno: líder={grupo['lider']} época={grupo['epoca']} ativos={grupo['ativos']}")
+            sucesso = grupo is not None and verificar(portas, total_inicial) and sucesso
+        finally:
+            for replica in replicas:
+                replica.terminate()
+                replica.wait()
+
+    print('OK' if sucesso else 'FALHA')
+    sys.exit(0 if sucesso else 1)
+
+
+if __name__ == '__main__':
+    main()
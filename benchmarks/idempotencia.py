@@ -0,0 +1,227 @@
+"""
+Benchmark das chaves de idempotência. No próprio processo, preenche o cache com milhões de chaves, no formato
+das geradas pelo `PoolClientes` (UUID em hexadecimal), e mede a memória por chave e o custo das consultas de
+chaves repetidas e de chaves novas, que descartam as mais antigas ao atingir a capacidade. Verifica também a
+expiração pela janela de tempo. Em seguida, pelo servidor, em texto e binário, envia saques com chave e fecha
+a conexão sem ler a resposta, como um cliente cujo prazo esgotou, repete-os numa nova conexão e confere que
+cada saque foi debitado uma única vez, e mede o custo da chave por operação.
+
+Uso: PYTHONPATH=$(pwd) python3 -m benchmarks.idempotencia --chaves 1000000,2000000,4000000
+"""
+from __future__ import annotations
+
+import gc
+import time
+import uuid
+import socket
+import argparse
+from pathlib import Path
+from typing import List
+
+from pixson.recursos.enums import SituacaoChave
+from pixson.recursos.idempotencia import Idempotencia
+from pixson.recursos.protocolo import (
+    OperacaoDeposito, OperacaoLogin, OperacaoSaldo, OperacaoSaque, Protocolo, RespostaErro, RespostaSucesso,
+    CABECALHO, CODIFICACAO_BINARIA, CODIFICACAO_TEXTO, SEPARADOR
+)
+from pixson.recursos.dinheiro import analisar_valor
+from pixson.pool import PoolClientes, EM_ANDAMENTO
+from benchmarks.comum import servidor_temporario
+
+RG_PADRAO = '1111111111'
+RESPOSTA = RespostaSucesso(tempo=0, resposta='Saque realizado com sucesso')
+
+
+def percentis(amostras: List[float]) -> str:
+    amostras = sorted(amostras)
+    return (
+        f'p50={amostras[len(amostras) // 2] * 1e6:.2f} µs | p99={amostras[int(len(amostras) * 0.99)] * 1e6:.2f} µs'
+    )
+
+
+def memoria_residente() -> int:
+    """
+    Lê a memória residente do processo, em bytes (apenas Linux).
+    :rtype: int
+    """
+    for linha in Path('/proc/self/status').read_text().splitlines():
+        if linha.startswith('VmRSS:'):
+            return int(linha.split()[1]) * 1024
+    return 0
+
+
+def medir_cache(quantidade: int, consultas: int) -> bool:
+    """
+    Preenche um cache com a capacidade informada e mede a memória e as consultas.
+    :return: Se as chaves repetidas retornaram a resposta original e a capacidade foi respeitada.
+    :rtype: bool
+    """
+    gc.collect()
+    base = memoria_residente()
+    idempotencia = Idempotencia(capacidade=quantidade, janela=3600)
+    chaves = [uuid.uuid4().hex for _ in range(quantidade)]
+    # A lista das chaves é do benchmark; as ‘strings’ das chaves são contadas, pois o servidor as guarda.
+    lista = chaves.__sizeof__()
+    memoria_chaves = memoria_residente() - base - lista
+    inicio = time.perf_counter()
+    for indice, chave in enumerate(chaves):
+        idempotencia.reservar(chave, indice)
+        idempotencia.concluir(chave, RESPOSTA)
+    preenchimento = time.perf_counter() - inicio
+    memoria = memoria_residente() - base - lista
+    por_chave = memoria / quantidade
+    estrutura = (memoria - memoria_chaves) / quantidade
+
+    repetidas = []
+    corretas = True
+    passo = max(quantidade // consultas, 1)
+    for indice in range(0, quantidade, passo):
+        chave = chaves[indice]
+        antes = time.perf_counter()
+        situacao, resposta = idempotencia.reservar(chave, indice)
+        repetidas.append(time.perf_counter() - antes)
+        corretas = corretas and situacao == SituacaoChave.REPETIDA and resposta.resposta == RESPOSTA.resposta
+    novas = []
+    for indice in range(consultas):
+        chave = uuid.uuid4().hex
+        antes = time.perf_counter()
+        idempotencia.reservar(chave, indice)
+        idempotencia.concluir(chave, RESPOSTA)
+        novas.append(time.perf_counter() - antes)
+    print(
+        f'  {quantidade:>9} chaves: {por_chave:.0f} bytes por chave ({estrutura:.0f} sem a ‘string’ da chave)'
+        f' | {memoria / 2 ** 20:.0f} MiB | preenchimento {preenchimento / quantidade * 1e6:.2f} µs por chave'
+    )
+    print(f'            repetida {percentis(repetidas)} | nova com descarte {percentis(novas)}')
+    del chaves, idempotencia
+    gc.collect()
+    return corretas
+
+
+def verificar_janela() -> bool:
+    """
+    Confere a expiração pela janela de tempo, a recusa de uma chave reutilizada e a liberação de uma reserva.
+    :rtype: bool
+    """
+    idempotencia = Idempotencia(capacidade=100, janela=0.2)
+    idempotencia.reservar('a', 1)
+    idempotencia.concluir('a', RESPOSTA)
+    resultados = [
+        idempotencia.reservar('a', 1)[0] == SituacaoChave.REPETIDA,
+        idempotencia.reservar('a', 2)[0] == SituacaoChave.DIVERGENTE,
+        idempotencia.reservar('b', 1)[0] == SituacaoChave.NOVA,
+        idempotencia.reservar('b', 1)[0] == SituacaoChave.EM_ANDAMENTO,
+    ]
+    idempotencia.liberar('b')
+    resultados.append(idempotencia.reservar('b', 1)[0] == SituacaoChave.NOVA)
+    time.sleep(0.3)
+    resultados.append(idempotencia.reservar('a', 1)[0] == SituacaoChave.NOVA)
+    for indice in range(300):
+        idempotencia.reservar(str(indice), indice)
+    resultados.append(len(idempotencia) == 100)
+    print(f'  janela, reutilização, reserva e capacidade: {"corretas" if all(resultados) else resultados}')
+    return all(resultados)
+
+
+def requisitar(s: socket.socket, arquivo, solicitacao: Protocolo, codificacao: str) -> Protocolo:
+    if codificacao == CODIFICACAO_BINARIA:
+        s.sendall(solicitacao.empacotar())
+        cabecalho = arquivo.read(CABECALHO.size)
+        _, comprimento, _, _ = Protocolo.ler_cabecalho(cabecalho)
+        return Protocolo.desempacotar(cabecalho + arquivo.read(comprimento))
+    s.sendall(solicitacao.enquadrar())
+    return Protocolo.analisar_resposta(arquivo.readline().rstrip(SEPARADOR).decode())
+
+
+def conectar(porta: int, codificacao: str):
+    s = socket.create_connection(('localhost', porta))
+    arquivo = s.makefile('rb')
+    s.sendall(OperacaoLogin(0, RG_PADRAO, codificacao=codificacao).enquadrar())
+    arquivo.readline()
+    return s, arquivo
+
+
+def saldo(porta: int) -> int:
+    s, arquivo = conectar(porta, CODIFICACAO_TEXTO)
+    with s:
+        resposta = requisitar(s, arquivo, OperacaoSaldo(0, None), CODIFICACAO_TEXTO)
+    return analisar_valor(resposta.resposta[len('Saldo: '):])
+
+
+def medir_servidor(porta: int, repeticoes: int, operacoes: int) -> bool:
+    """
+    Repete saques com chave de idempotência após fechar a conexão sem ler a resposta, e mede o custo da chave.
+    :return: Se cada saque foi debitado uma única vez e a chave reutilizada foi recusada.
+    :rtype: bool
+    """
+    resultados = []
+    with servidor_temporario(porta):
+        for codificacao in (CODIFICACAO_TEXTO, CODIFICACAO_BINARIA):
+            s, arquivo = conectar(porta, codificacao)
+            requisitar(s, arquivo, OperacaoDeposito(0, None, repeticoes * 100), codificacao)
+            s.close()
+            inicial = saldo(porta)
+            respostas = []
+            for _ in range(repeticoes):
+                saque = OperacaoSaque(0, None, 100)
+                saque.chave_idempotencia = uuid.uuid4().hex
+                # A primeira tentativa é enviada e a conexão é fechada sem ler a resposta.
+                s, arquivo = conectar(porta, codificacao)
+                s.sendall(saque.empacotar() if codificacao == CODIFICACAO_BINARIA else saque.enquadrar())
+                s.close()
+                s, arquivo = conectar(porta, codificacao)
+                with s:
+                    for _ in range(2):
+                        resposta = requisitar(s, arquivo, saque, codificacao)
+                        # A primeira tentativa pode ainda estar sendo aplicada pela thread da outra conexão.
+                        while isinstance(resposta, RespostaErro) and resposta.resposta == EM_ANDAMENTO:
+                            time.sleep(0.01)
+                            resposta = requisitar(s, arquivo, saque, codificacao)
+                        respostas.append(resposta)
+                    outro = OperacaoSaque(0, None, 200)
+                    outro.chave_idempotencia = saque.chave_idempotencia
+                    recusa = requisitar(s, arquivo, outro, codificacao)
+            debitado = inicial - saldo(porta)
+            correto = (
+                debitado == repeticoes * 100 and all(isinstance(resposta, RespostaSucesso) for resposta in respostas)
+                and isinstance(recusa, RespostaErro)
+            )
+            print(
+                f'  servidor ({codificacao}): {repeticoes} saques de R$ 1,00, cada um enviado 3 vezes,'
+                f' debitaram R$ {debitado / 100:.2f} | {"correto" if correto else "INCORRETO"}'
+            )
+            resultados.append(correto)
+
+        for idempotente in (False, True):
+            pool = PoolClientes(RG_PADRAO, porta=porta, tamanho=1, idempotente=idempotente).iniciar()
+            latencias = []
+            for _ in range(operacoes):
+                inicio = time.perf_counter()
+                pool.depositar(RG_PADRAO, 1)
+                latencias.append(time.perf_counter() - inicio)
+            pool.fechar()
+            print(f'  depósitos pelo PoolClientes, {"com" if idempotente else "sem"} chave: {percentis(latencias)}')
+    return all(resultados)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark das chaves de idempotência do PIXSON')
+    parser.add_argument('--porta', type=int, default=6250)
+    parser.add_argument('--chaves', type=lambda valores: [int(valor) for valor in valores.split(',')], default=[1000000, 2000000, 4000000])
+    parser.add_argument('--consultas', type=int, default=100000)
+    parser.add_argument('--repeticoes', type=int, default=50, help='saques repetidos pelo servidor')
+    parser.add_argument('--operacoes', type=int, default=2000, help='depósitos medidos pelo servidor')
+    argumentos = parser.parse_args()
+
+    print('cache de chaves no processo:')
+    resultados = [medir_cache(quantidade, argumentos.consultas) for quantidade in argumentos.chaves]
+    resultados.append(verificar_janela())
+    print('chaves pelo servidor:')
+    resultados.append(medir_servidor(argumentos.porta, argumentos.repeticoes, argumentos.operacoes))
+    print('OK' if all(resultados) else 'FALHA')
+    if not all(resultados):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
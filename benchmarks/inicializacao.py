@@ -0,0 +1,143 @@
+"""
+Benchmark da inicialização do servidor: mede o tempo entre a criação do processo e a primeira resposta
+a uma consulta de saldo, para algumas configurações, e o reinício imediato na mesma porta, com conexões
+do processo anterior ainda abertas quando ele é encerrado (a porta fica em TIME_WAIT).
+
+Com `--importacoes`, imprime também os módulos de maior tempo de importação do servidor (`python -X importtime`).
+
+Uso: PYTHONPATH=$(pwd) python3 -m benchmarks.inicializacao --repeticoes 10
+"""
+from __future__ import annotations
+
+import os
+import sys
+import time
+import shutil
+import socket
+import argparse
+import statistics
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import List, Tuple
+
+from pixson.recursos.protocolo import OperacaoSaldo
+from benchmarks.comum import RAIZ, requisitar
+
+RG_PADRAO = '1111111111'
+CONFIGURACOES = {
+    'threading': [],
+    'asyncio': ['--motor', 'asyncio'],
+    'sem diário': ['--sem-diario'],
+    'aquecer cache': ['--aquecer-cache'],
+}
+
+
+def iniciar(pasta: Path, porta: int, argumentos: List[str]) -> Tuple[subprocess.Popen, float]:
+    """
+    Inicia o servidor e aguarda a primeira resposta a uma consulta de saldo.
+    :return: O processo e o tempo até a resposta, em segundos, ou infinito se ele encerrou antes de responder.
+    :rtype: tuple
+    """
+    ambiente = dict(os.environ, PYTHONPATH=str(RAIZ))
+    inicio = time.perf_counter()
+    processo = subprocess.Popen(
+        [sys.executable, '-m', 'pixson.servidor', '--porta', str(porta), *argumentos],
+        cwd=pasta, env=ambiente, stdout=subprocess.DEVNULL
+    )
+    while processo.poll() is None:
+        try:
+            with socket.create_connection(('localhost', porta), timeout=1) as s:
+                if requisitar(s, OperacaoSaldo(0, RG_PADRAO).encapsular()):
+                    return processo, time.perf_counter() - inicio
+        except OSError:
+            time.sleep(0.001)
+    return processo, float('inf')
+
+
+def encerrar(processo: subprocess.Popen) -> None:
+    """
+    Encerra o servidor e aguarda o fim do processo.
+    """
+    processo.terminate()
+    processo.wait()
+
+
+def medir(porta: int, argumentos: List[str], repeticoes: int) -> List[float]:
+    """
+    Mede o tempo de inicialização numa cópia temporária de `contas/`.
+    :rtype: list
+    """
+    tempos = []
+    for _ in range(repeticoes):
+        with tempfile.TemporaryDirectory() as pasta:
+            shutil.copytree(RAIZ / 'contas', Path(pasta) / 'contas')
+            processo, tempo = iniciar(Path(pasta), porta, argumentos)
+            encerrar(processo)
+            tempos.append(tempo)
+    return tempos
+
+
+def medir_reinicio(porta: int, repeticoes: int) -> List[float]:
+    """
+    Encerra o servidor com um cliente conectado e o reinicia imediatamente na mesma porta.
+    :rtype: list
+    """
+    tempos = []
+    with tempfile.TemporaryDirectory() as pasta:
+        shutil.copytree(RAIZ / 'contas', Path(pasta) / 'contas')
+        processo, tempo = iniciar(Path(pasta), porta, [])
+        while tempo != float('inf') and len(tempos) < repeticoes:
+            cliente = socket.create_connection(('localhost', porta))
+            requisitar(cliente, OperacaoSaldo(0, RG_PADRAO).encapsular())
+            encerrar(processo)
+            cliente.close()
+            processo, tempo = iniciar(Path(pasta), porta, [])
+            tempos.append(tempo)
+        encerrar(processo)
+        if not tempos:
+            tempos.append(tempo)
+    return tempos
+
+
+def imprimir(descricao: str, tempos: List[float]) -> None:
+    """
+    Imprime a mediana e o mínimo dos tempos, em milissegundos.
+    """
+    if any(tempo == float('inf') for tempo in tempos):
+        falhas = sum(tempo == float('inf') for tempo in tempos)
+        print(f'{descricao:<16} {falhas} de {len(tempos)} inicializações falharam')
+        return
+    print(f'{descricao:<16} mediana {statistics.median(tempos) * 1000:7.1f} ms | mínimo {min(tempos) * 1000:7.1f} ms')
+
+
+def imprimir_importacoes(quantidade: int) -> None:
+    """
+    Imprime os módulos com o maior tempo acumulado de importação de `pixson.servidor`.
+    """
+    resultado = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import pixson.servidor'],
+        env=dict(os.environ, PYTHONPATH=str(RAIZ)), capture_output=True, text=True
+    )
+    linhas = [linha.split('|') for linha in resultado.stderr.splitlines() if linha.startswith('import time:')][1:]
+    modulos = sorted(((int(acumulado), modulo.rstrip()) for _, acumulado, modulo in linhas), reverse=True)
+    for acumulado, modulo in modulos[:quantidade]:
+        print(f'{acumulado / 1000:8.1f} ms {modulo}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark da inicialização do servidor PIXSON')
+    parser.add_argument('--porta', type=int, default=5900)
+    parser.add_argument('--repeticoes', type=int, default=10)
+    parser.add_argument('--importacoes', action='store_true', help='imprime os módulos de maior tempo de importação')
+    argumentos = parser.parse_args()
+
+    for deslocamento, (descricao, argumentos_servidor) in enumerate(CONFIGURACOES.items()):
+        imprimir(descricao, medir(argumentos.porta + deslocamento, argumentos_servidor, argumentos.repeticoes))
+    imprimir('reinício', medir_reinicio(argumentos.porta + len(CONFIGURACOES), argumentos.repeticoes))
+    if argumentos.importacoes:
+        imprimir_importacoes(15)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark de carga comparando os motores de processamento do servidor.
+
+Para cada motor, inicia um servidor numa cópia temporária de `contas/`, abre conexões ociosas
+e dispara clientes ativos que consultam o saldo, medindo vazão, latência e memória do processo.
+
+Uso: PYTHONPATH=$(pwd) python3 -m benchmarks.motores --ociosas 1000 --ativos 50 --operacoes 200
+"""
+from __future__ import annotations
+
+import time
+import socket
+import argparse
+import threading
+
+from pixson.recursos.protocolo import OperacaoSaldo
+from pixson.servidor import MOTORES
+from benchmarks.comum import memoria_processo, requisitar, servidor_temporario
+
+RG_PADRAO = '1111111111'
+
+
+def cliente_ativo(porta: int, operacoes: int, latencias: list, largada: threading.Barrier) -> None:
+    """
+    Conecta, aguarda a largada e executa operações de saldo em sequência, registrando a latência de cada uma.
+    """
+    with socket.create_connection(('localhost', porta)) as s:
+        largada.wait()
+        for tempo in range(operacoes):
+            inicio = time.perf_counter()
+            requisitar(s, OperacaoSaldo(tempo=tempo, rg=RG_PADRAO).encapsular())
+            latencias.append(time.perf_counter() - inicio)
+
+
+def medir(motor: str, porta: int, ociosas: int, ativos: int, operacoes: int) -> None:
+    """
+    Mede um motor de processamento do servidor.
+    """
+    with servidor_temporario(porta, ['--motor', motor]) as processo:
+        conexoes_ociosas = [socket.create_connection(('localhost', porta)) for _ in range(ociosas)]
+
+        latencias = []
+        largada = threading.Barrier(ativos + 1)
+        threads = [
+            threading.Thread(target=cliente_ativo, args=(porta, operacoes, latencias, largada))
+            for _ in range(ativos)
+        ]
+        for thread in threads:
+            thread.start()
+        largada.wait()
+        inicio = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        duracao = time.perf_counter() - inicio
+
+        memoria = memoria_processo(processo.pid)
+        for conexao in conexoes_ociosas:
+            conexao.close()
+
+    latencias.sort()
+    print(
+        f'{motor:>9}: {len(latencias) / duracao:10.0f} op/s'
+        f' | p50={latencias[len(latencias) // 2] * 1000:.2f}ms'
+        f' p99={latencias[int(len(latencias) * 0.99)] * 1000:.2f}ms'
+        f' | {memoria}'
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark dos motores do servidor PIXSON')
+    parser.add_argument('--porta', type=int, default=5100)
+    parser.add_argument('--ociosas', type=int, default=500, help='conexões abertas sem tráfego')
+    parser.add_argument('--ativos', type=int, default=20, help='clientes enviando operações')
+    parser.add_argument('--operacoes', type=int, default=200, help='operações por cliente ativo')
+    argumentos = parser.parse_args()
+
+    print(f'ociosas={argumentos.ociosas} ativos={argumentos.ativos} operacoes={argumentos.operacoes}')
+    for deslocamento, motor in enumerate(MOTORES):
+        medir(motor, argumentos.porta + deslocamento, argumentos.ociosas, argumentos.ativos, argumentos.operacoes)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""
+Benchmark das notificações de saldo. No próprio processo, mede o custo da publicação em `Conta.aplicar`, sem
+assinaturas da conta alterada e com uma assinatura, e confere que as alterações não enviadas são agrupadas.
+Em seguida, em cada motor do servidor, mede a latência entre um depósito e a notificação do novo saldo,
+comparada com uma consulta de saldo, confere o saldo da última notificação após uma rajada de depósitos e
+mede os depósitos com assinantes que não leem as notificações, que não devem atrasá-los. Por fim, num servidor
+particionado, confere as notificações repassadas entre as partições.
+
+Uso: PYTHONPATH=$(pwd) python3 -m benchmarks.notificacoes --operacoes 5000
+"""
+from __future__ import annotations
+
+import time
+import socket
+import argparse
+from typing import List
+
+from pixson.cliente import Cliente
+from pixson.recursos.notificacoes import Assinatura, Notificacoes
+from pixson.recursos.protocolo import (
+    OperacaoAssinar, OperacaoDeposito, OperacaoLogin, OperacaoSaldo, RespostaSucesso, CODIFICACAO_BINARIA,
+    CODIFICACAO_TEXTO
+)
+from benchmarks.comum import servidor_temporario
+
+RG_ASSINADO = '1111111111'
+RG_DEPOSITANTE = '2222222222'
+SALDO_INICIAL = 1000
+
+
+def percentis(amostras: List[float]) -> str:
+    amostras = sorted(amostras)
+    return (
+        f'p50={amostras[len(amostras) // 2] * 1e6:.1f} µs | p99={amostras[int(len(amostras) * 0.99)] * 1e6:.1f} µs'
+    )
+
+
+def p99(amostras: List[float]) -> float:
+    return sorted(amostras)[int(len(amostras) * 0.99)]
+
+
+def medir_publicacao(operacoes: int) -> bool:
+    """
+    Mede a publicação dos saldos, como feita por `Conta.aplicar`, e confere o agrupamento das alterações.
+    :return: Se as alterações não enviadas foram agrupadas num único saldo e num único sinal.
+    :rtype: bool
+    """
+    notificacoes = Notificacoes(max_assinaturas=10000)
+    outras = Assinatura(despertar=lambda: None)
+    for indice in range(10000):
+        notificacoes.assinar(assinatura=outras, rg=f'{indice + 3000000000:010d}', saldo=None)
+    assinatura = Assinatura()
+    casos = (('sem assinaturas da conta', '4444444444'), ('com uma assinatura da conta', RG_ASSINADO))
+    notificacoes.assinar(assinatura=assinatura, rg=RG_ASSINADO, saldo=None)
+    for descricao, rg in casos:
+        latencias = []
+        for saldo in range(operacoes):
+            inicio = time.perf_counter()
+            notificacoes.publicar(saldos={rg: saldo})
+            latencias.append(time.perf_counter() - inicio)
+        print(f'  publicação {descricao} (10000 outras contas assinadas): {percentis(latencias)}')
+    sinais = assinatura.leitura.recv(1024)
+    pendentes = notificacoes.empacotar(assinatura=assinatura, codificacao=CODIFICACAO_TEXTO)
+    enviadas = pendentes.count(b'\n')
+    correto = len(sinais) == 1 and enviadas == 1 and f'saldo:{(operacoes - 1) / 100:.2f}'.encode() in pendentes
+    print(
+        f'  {operacoes} alterações sem envio: {len(sinais)} sinal, {enviadas} notificação pendente'
+        f' | {"agrupadas" if correto else "NÃO AGRUPADAS"}'
+    )
+    assinatura.fechar()
+    return correto
+
+
+def conectar(porta: int, rg: str, codificacao: str = CODIFICACAO_TEXTO) -> Cliente:
+    cliente = Cliente(rg=rg, codificacao=codificacao, host='localhost', porta=porta, interativo=False)
+    cliente.conectar()
+    cliente.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    cliente.login()
+    return cliente
+
+
+def depositar(cliente: Cliente, rg: str = RG_ASSINADO, valor: int = 1) -> None:
+    cliente.enviar_solicitacao(OperacaoDeposito(tempo=cliente.obter_e_incrementar_tempo(), rg=rg, valor=valor))
+    if not isinstance(cliente.receber_resposta(), RespostaSucesso):
+        raise RuntimeError('Depósito recusado')
+
+
+def ultima_notificacao(cliente: Cliente, prazo: float = 0.5) -> tuple:
+    """
+    Lê as notificações até nenhuma chegar no prazo.
+    :return: A quantidade de notificações lidas e o saldo da última.
+    :rtype: tuple
+    """
+    quantidade, saldo = 0, None
+    while True:
+        notificacao = cliente.receber_notificacao(prazo=prazo)
+        if notificacao is None:
+            return quantidade, saldo
+        quantidade, saldo = quantidade + 1, notificacao.saldo
+
+
+def assinante_lento(porta: int) -> socket.socket:
+    """
+    Abre uma conexão com um buffer de recepção mínimo que assina a conta e nunca lê as notificações.
+    :rtype: socket.socket
+    """
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1024)
+    s.connect(('localhost', porta))
+    s.sendall(OperacaoLogin(tempo=0, rg=RG_ASSINADO).enquadrar())
+    s.sendall(OperacaoAssinar(tempo=0, rg=RG_ASSINADO).enquadrar())
+    return s
+
+
+def medir_servidor(porta: int, motor: str, operacoes: int, lentos: int) -> bool:
+    """
+    Mede as notificações por um servidor com o motor informado.
+    :return: Se as notificações chegaram com os saldos corretos e os assinantes lentos não atrasaram os depósitos.
+    :rtype: bool
+    """
+    resultados = []
+    with servidor_temporario(porta, ['--motor', motor, '--prazo-envio', '30']):
+        for codificacao in (CODIFICACAO_TEXTO, CODIFICACAO_BINARIA):
+            assinante = conectar(porta, RG_ASSINADO, codificacao)
+            depositante = conectar(porta, RG_DEPOSITANTE, codificacao)
+            assinante.assinar()
+            saldo = assinante.receber_notificacao(prazo=5).saldo
+
+            notificacoes, consultas = [], []
+            for _ in range(operacoes // 10):
+                inicio = time.perf_counter()
+                depositar(depositante)
+                saldo += 1
+                notificacao = assinante.receber_notificacao(prazo=5)
+                notificacoes.append(time.perf_counter() - inicio)
+                resultados.append(notificacao is not None and notificacao.saldo == saldo)
+                inicio = time.perf_counter()
+                depositante.enviar_solicitacao(OperacaoSaldo(tempo=depositante.obter_e_incrementar_tempo(), rg=RG_ASSINADO))
+                depositante.receber_resposta()
+                consultas.append(time.perf_counter() - inicio)
+            print(
+                f'  {motor} ({codificacao}): depósito até a notificação {percentis(notificacoes)}'
+                f' | consulta de saldo {percentis(consultas)}'
+            )
+
+            for inicio in range(0, operacoes, 100):
+                depositante.enviar_pipeline([
+                    OperacaoDeposito(tempo=depositante.obter_e_incrementar_tempo(), rg=RG_ASSINADO, valor=1)
+                    for _ in range(min(100, operacoes - inicio))
+                ])
+            saldo += operacoes
+            quantidade, ultimo = ultima_notificacao(assinante)
+            correto = ultimo == saldo
+            print(
+                f'    rajada de {operacoes} depósitos: {quantidade} notificações, a última com o saldo'
+                f' {"correto" if correto else "INCORRETO"}'
+            )
+            resultados.append(correto)
+            assinante.desconectar()
+            depositante.desconectar()
+
+        depositante = conectar(porta, RG_DEPOSITANTE)
+        medicoes = {}
+        conexoes = []
+        for quantidade in (0, lentos):
+            while len(conexoes) < quantidade:
+                conexoes.append(assinante_lento(porta))
+            time.sleep(0.2)
+            latencias = []
+            for _ in range(operacoes):
+                inicio = time.perf_counter()
+                depositar(depositante)
+                latencias.append(time.perf_counter() - inicio)
+            medicoes[quantidade] = latencias
+            print(f'    depósitos com {quantidade} assinantes que não leem: {percentis(latencias)}')
+        # Os assinantes lentos não devem fazer os depósitos aguardarem o envio das notificações.
+        resultados.append(p99(medicoes[lentos]) < p99(medicoes[0]) * 3 + 500e-6)
+        assinante = conectar(porta, RG_ASSINADO)
+        assinante.assinar()
+        depositar(depositante)
+        _, ultimo = ultima_notificacao(assinante)
+        depositante.enviar_solicitacao(OperacaoSaldo(tempo=depositante.obter_e_incrementar_tempo(), rg=RG_ASSINADO))
+        esperado = int(depositante.receber_resposta().resposta.split(': ')[1].replace('.', ''))
+        print(f'    novo assinante após os lentos: saldo {"correto" if ultimo == esperado else "INCORRETO"}')
+        resultados.append(ultimo == esperado)
+        for conexao in conexoes:
+            conexao.close()
+    return all(resultados)
+
+
+def medir_particoes(porta: int, operacoes: int) -> bool:
+    """
+    Assina a conta por várias conexões de um servidor com duas partições, que caem em qualquer uma delas, e
+    confere que todas recebem o saldo final, inclusive pelo repasse da outra partição.
+    :rtype: bool
+    """
+    with servidor_temporario(porta, ['--particoes', '2']):
+        assinantes = []
+        for _ in range(6):
+            assinante = conectar(porta, RG_DEPOSITANTE)
+            assinante.assinar(RG_ASSINADO)
+            assinantes.append(assinante)
+        depositante = conectar(porta, RG_DEPOSITANTE)
+        for _ in range(operacoes // 10):
+            depositar(depositante)
+        finais = [ultima_notificacao(assinante)[1] for assinante in assinantes]
+        estatisticas = assinantes[0].consultar_estatisticas()
+    correto = all(final == SALDO_INICIAL + operacoes // 10 for final in finais)
+    print(
+        f'  {len(assinantes)} assinantes em 2 partições: saldo final {"correto" if correto else finais} em todos'
+        f' | repassadas na partição do primeiro: {estatisticas["contadores"].get("notificacoes.repassadas", 0)}'
+    )
+    return correto
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark das notificações de saldo do PIXSON')
+    parser.add_argument('--porta', type=int, default=6300)
+    parser.add_argument('--operacoes', type=int, default=5000)
+    parser.add_argument('--lentos', type=int, default=20, help='assinantes que não leem as notificações')
+    argumentos = parser.parse_args()
+
+    print('publicação no processo:')
+    resultados = [medir_publicacao(argumentos.operacoes * 20)]
+    print('notificações pelo servidor:')
+    for deslocamento, motor in enumerate(('threading', 'asyncio')):
+        resultados.append(medir_servidor(argumentos.porta + deslocamento, motor, argumentos.operacoes, argumentos.lentos))
+    print('notificações entre partições:')
+    resultados.append(medir_particoes(argumentos.porta + 10, argumentos.operacoes))
+    print('OK' if all(resultados) else 'FALHA')
+    if not all(resultados):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
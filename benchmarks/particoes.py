@@ -0,0 +1,55 @@
+"""
+Benchmark de escalabilidade do servidor particionado.
+
+Para cada quantidade de partições, inicia um servidor numa cópia temporária de `contas/` e executa o
+gerador de carga com clientes distribuídos entre processos, medindo a vazão agregada.
+
+Uso: PYTHONPATH=$(pwd) python3 -m benchmarks.particoes --particoes 1 2 4 --clientes 64 --duracao 5
+"""
+from __future__ import annotations
+
+import os
+import argparse
+
+from pixson import carga
+from benchmarks.comum import RAIZ, servidor_temporario
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark do servidor particionado do PIXSON')
+    parser.add_argument('--porta', type=int, default=5500)
+    parser.add_argument('--particoes', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--clientes', type=int, default=64, help='clientes simulados')
+    parser.add_argument('--processos', type=int, default=os.cpu_count(), help='processos do gerador de carga')
+    parser.add_argument('--duracao', type=float, default=5.0, help='duração de cada medição, em segundos')
+    parser.add_argument('--mistura', default=carga.MISTURA_PADRAO, help='peso de cada operação')
+    argumentos = parser.parse_args()
+
+    rgs = sorted(arquivo.stem for arquivo in (RAIZ / 'contas').glob('*.json'))
+    base = None
+    for indice, particoes in enumerate(argumentos.particoes):
+        porta = argumentos.porta + indice * 100
+        configuracao = {
+            'host': 'localhost',
+            'porta': porta,
+            'rgs': rgs,
+            'mistura': carga.ler_mistura(argumentos.mistura),
+            'zipf': 0.0,
+            'valor': carga.VALOR_PADRAO,
+            'codificacao': carga.CODIFICACAO_BINARIA,
+            'duracao': argumentos.duracao,
+            'semente': 0,
+        }
+        with servidor_temporario(porta, ['--particoes', str(particoes)]):
+            resultado = carga.executar(configuracao, carga.MODO_PROCESSOS, argumentos.clientes, argumentos.processos)
+        base = base or resultado['ops_por_segundo']
+        print(
+            f"{particoes:>3} partições: {resultado['ops_por_segundo']:10.0f} op/s"
+            f" ({resultado['ops_por_segundo'] / base:.2f}x)"
+            f" | p50={resultado['latencia_ms']['p50']:.2f}ms p99={resultado['latencia_ms']['p99']:.2f}ms"
+            f" | erros={resultado['taxa_erros']:.4f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark da biblioteca cliente: compara uma conexão nova por chamada com o conjunto de conexões
+persistentes (`PoolClientes`), com várias threads, e com o `PoolClientesAsyncio`, com várias corrotinas.
+
+Uso: PYTHONPATH=$(pwd) python3 -m benchmarks.pool --chamadores 16 --operacoes 500
+"""
+from __future__ import annotations
+
+import time
+import asyncio
+import argparse
+import threading
+from typing import Callable
+
+from pixson.cliente import Cliente
+from pixson.pool import PoolClientes, PoolClientesAsyncio, ler_saldo
+from pixson.recursos.protocolo import OperacaoSaldo, CODIFICACAO_BINARIA
+from benchmarks.comum import servidor_temporario
+
+RG_PADRAO = '1111111111'
+
+
+def saldo_sem_pool(porta: int) -> int:
+    """
+    Consulta o saldo abrindo, autenticando e fechando uma conexão, como faria o `Cliente` a cada chamada.
+    :rtype: int
+    """
+    cliente = Cliente(RG_PADRAO, codificacao=CODIFICACAO_BINARIA, porta=porta, interativo=False)
+    cliente.conectar()
+    cliente.login()
+    cliente.enviar_solicitacao(OperacaoSaldo(tempo=cliente.obter_e_incrementar_tempo(), rg=RG_PADRAO))
+    saldo = ler_saldo(cliente.receber_resposta())
+    cliente.desconectar()
+    return saldo
+
+
+def medir_threads(descricao: str, chamada: Callable[[], int], chamadores: int, operacoes: int) -> None:
+    """
+    Executa a chamada em várias threads e imprime a vazão.
+    """
+    largada = threading.Barrier(chamadores + 1)
+
+    def chamar() -> None:
+        largada.wait()
+        for _ in range(operacoes):
+            chamada()
+
+    threads = [threading.Thread(target=chamar) for _ in range(chamadores)]
+    for thread in threads:
+        thread.start()
+    largada.wait()
+    inicio = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    duracao = time.perf_counter() - inicio
+    print(f'{descricao:<24} {chamadores * operacoes / duracao:10.0f} op/s')
+
+
+async def medir_asyncio(porta: int, tamanho: int, chamadores: int, operacoes: int) -> None:
+    """
+    Executa as consultas em várias corrotinas, com um conjunto de conexões assíncrono, e imprime a vazão.
+    """
+    pool = await PoolClientesAsyncio(RG_PADRAO, porta=porta, tamanho=tamanho).iniciar()
+
+    async def chamar() -> None:
+        for _ in range(operacoes):
+            await pool.saldo(RG_PADRAO)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(chamar() for _ in range(chamadores)))
+    duracao = time.perf_counter() - inicio
+    await pool.fechar()
+    print(f'{"pool asyncio":<24} {chamadores * operacoes / duracao:10.0f} op/s')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark da biblioteca cliente do PIXSON')
+    parser.add_argument('--porta', type=int, default=5800)
+    parser.add_argument('--chamadores', type=int, default=16, help='threads ou corrotinas simultâneas')
+    parser.add_argument('--operacoes', type=int, default=500, help='consultas por chamador')
+    parser.add_argument('--tamanho', type=int, default=8, help='conexões do conjunto')
+    argumentos = parser.parse_args()
+
+    with servidor_temporario(argumentos.porta):
+        medir_threads(
+            'conexão por chamada', lambda: saldo_sem_pool(argumentos.porta),
+            argumentos.chamadores, max(1, argumentos.operacoes // 10)
+        )
+        pool = PoolClientes(RG_PADRAO, porta=argumentos.porta, tamanho=argumentos.tamanho).iniciar()
+        medir_threads('pool threads', lambda: pool.saldo(RG_PADRAO), argumentos.chamadores, argumentos.operacoes)
+        pool.fechar()
+        asyncio.run(medir_asyncio(argumentos.porta, argumentos.tamanho, argumentos.chamadores, argumentos.operacoes))
+
+
+if __name__ == '__main__':
+    main()
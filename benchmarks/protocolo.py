@@ -0,0 +1,67 @@
+"""
+Microbenchmark de codificação e decodificação das mensagens do protocolo, em texto e em binário, nas mesmas
+condições em que o servidor e o cliente as usam: a mensagem de texto é enquadrada com o separador e analisada
+por `Protocolo.analisar`, que seleciona a classe pelo opcode, como `Protocolo.desempacotar` faz com o quadro
+binário. Informa também o tamanho de cada mensagem nas duas codificações.
+
+Uso: PYTHONPATH=$(pwd) python3 -m benchmarks.protocolo --repeticoes 200000
+"""
+from __future__ import annotations
+
+import timeit
+import argparse
+
+from pixson.recursos.protocolo import *
+
+MENSAGENS = [
+    OperacaoSaldo(tempo=10, rg='1111111111'),
+    OperacaoSaque(tempo=10, rg='1111111111', valor=850),
+    OperacaoDeposito(tempo=10, rg='1111111111', valor=1400),
+    OperacaoTransferencia(tempo=10, rg_origem='1111111111', rg_destino='2222222222', valor=550),
+    RespostaSucesso(tempo=10, resposta='Transferência realizada com sucesso'),
+]
+
+
+def medir(funcao, repeticoes: int) -> float:
+    """
+    Executa a função repetidamente e retorna o custo médio por chamada, em segundos.
+    :rtype: float
+    """
+    return min(timeit.repeat(funcao, number=repeticoes, repeat=3)) / repeticoes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Microbenchmark do protocolo PIXSON')
+    parser.add_argument('--repeticoes', type=int, default=100000)
+    argumentos = parser.parse_args()
+
+    print(f'{"mensagem":<22} {"operação":<12} {"texto":>9} {"binário":>9} {"binário/texto":>14}')
+    for mensagem in MENSAGENS:
+        classe = type(mensagem)
+        enquadrada = mensagem.enquadrar()
+        texto = enquadrada[:-len(SEPARADOR)].decode()
+        quadro = mensagem.empacotar()
+        # As respostas são analisadas pelo cliente, e as solicitações pelo servidor.
+        analisar = Protocolo.analisar_resposta if mensagem.operacao is None else Protocolo.analisar
+        medidas = [
+            ('codificar', medir(mensagem.enquadrar, argumentos.repeticoes), medir(mensagem.empacotar, argumentos.repeticoes)),
+            (
+                'decodificar',
+                medir(lambda: analisar(texto), argumentos.repeticoes),
+                medir(lambda: Protocolo.desempacotar(quadro), argumentos.repeticoes)
+            ),
+        ]
+        for operacao, duracao_texto, duracao_binaria in medidas:
+            print(
+                f'{classe.__name__:<22} {operacao:<12} {duracao_texto * 1e9:6.0f} ns {duracao_binaria * 1e9:6.0f} ns'
+                f' {duracao_binaria / duracao_texto:13.2f}x'
+            )
+        print(
+            f'{classe.__name__:<22} {"tamanho":<12} {len(enquadrada):7d} B {len(quadro):7d} B'
+            f' {len(quadro) / len(enquadrada):13.2f}x'
+        )
+    print(f'O quadro binário inclui o cabeçalho fixo de {CABECALHO.size} bytes, com o id da requisição e o tempo lógico.')
+
+
+if __name__ == '__main__':
+    main()
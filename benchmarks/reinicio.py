@@ -0,0 +1,201 @@
+"""
+Benchmark do reinício sem interrupção: clientes fazem depósitos de um centavo, metade numa conexão nova por
+depósito e metade em conexões persistentes, que reconectam ao serem encerradas, enquanto o servidor é
+reiniciado várias vezes com SIGUSR2. O socket de escuta passa ao novo processo, e nenhuma conexão deve ser
+recusada. Ao final, o saldo total deve ser o inicial mais os depósitos confirmados: um depósito sem
+resposta, numa conexão encerrada pela drenagem, não pode ter sido aplicado.
+
+Uso: PYTHONPATH=$(pwd) python3 -m benchmarks.reinicio --clientes 16 --reinicios 5
+"""
+from __future__ import annotations
+
+import os
+import sys
+import time
+import random
+import shutil
+import signal
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from re import match
+from typing import Dict
+
+from pixson.recursos.dinheiro import ler_valor, formatar_valor
+from pixson.recursos.protocolo import OperacaoDeposito, OperacaoSaldo, RespostaSucesso, SEPARADOR
+from benchmarks.comum import RAIZ, aguardar_porta
+
+RGS = sorted(arquivo.stem for arquivo in Path(RAIZ / 'contas').glob('*.json'))
+
+
+class Contadores:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.confirmados = 0
+        self.interrompidos = 0
+        self.recusadas = 0
+        self.maior_espera = 0.0
+
+    def registrar(self, confirmado: bool, espera: float) -> None:
+        with self.lock:
+            if confirmado:
+                self.confirmados += 1
+            else:
+                self.interrompidos += 1
+            self.maior_espera = max(self.maior_espera, espera)
+
+
+def depositar(s: socket.socket, rg: str) -> bool:
+    """
+    Envia um depósito de um centavo e aguarda a resposta.
+    :return: Se o depósito foi confirmado; falso se a conexão foi encerrada antes da resposta.
+    :rtype: bool
+    """
+    s.sendall(OperacaoDeposito(0, rg, 1).enquadrar())
+    resposta = b''
+    while not resposta.endswith(SEPARADOR):
+        dados = s.recv(1024)
+        if not dados:
+            return False
+        resposta += dados
+    return RespostaSucesso.regex.match(resposta.rstrip(SEPARADOR).decode()) is not None
+
+
+def cliente(porta: int, persistente: bool, semente: int, parar: threading.Event, contadores: Contadores) -> None:
+    """
+    Faz depósitos até o fim do benchmark, reconectando quando a conexão é encerrada.
+    """
+    aleatorio = random.Random(semente)
+    s = None
+    while not parar.is_set():
+        inicio = time.perf_counter()
+        try:
+            if s is None:
+                s = socket.create_connection(('localhost', porta))
+            confirmado = depositar(s, aleatorio.choice(RGS))
+        except ConnectionRefusedError:
+            with contadores.lock:
+                contadores.recusadas += 1
+            s = None
+            continue
+        except OSError:
+            confirmado = False
+        contadores.registrar(confirmado, time.perf_counter() - inicio)
+        if not confirmado or not persistente:
+            s.close()
+            s = None
+    if s is not None:
+        s.close()
+
+
+def consultar_saldos(porta: int) -> Dict[str, int]:
+    """
+    Consulta o saldo de todas as contas, em centavos.
+    :rtype: dict
+    """
+    saldos = {}
+    with socket.create_connection(('localhost', porta)) as s:
+        arquivo = s.makefile('rb')
+        for rg in RGS:
+            s.sendall(OperacaoSaldo(0, rg).enquadrar())
+            resposta = RespostaSucesso.desencapsular(arquivo.readline().rstrip(SEPARADOR).decode())
+            saldos[rg] = ler_valor(match(r'^Saldo: (.*)$', resposta.resposta).group(1))
+    return saldos
+
+
+def aguardar_pid(arquivo: Path, anterior: str, limite: float = 30.0) -> str:
+    """
+    Aguarda o arquivo de pid ter o número de um processo diferente do anterior.
+    :rtype: str
+    """
+    fim = time.monotonic() + limite
+    while time.monotonic() < fim:
+        try:
+            pid = arquivo.read_text()
+        except OSError:
+            pid = ''
+        if pid and pid != anterior:
+            return pid
+        time.sleep(0.01)
+    raise TimeoutError('O servidor não reiniciou')
+
+
+def aguardar_fim(pid: int, limite: float = 30.0) -> None:
+    """
+    Aguarda o fim do processo do servidor, que, depois de um reinício, não é filho deste processo.
+    """
+    fim = time.monotonic() + limite
+    while time.monotonic() < fim:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return
+        time.sleep(0.05)
+    raise TimeoutError('O servidor não encerrou')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark do reinício sem interrupção do servidor PIXSON')
+    parser.add_argument('--porta', type=int, default=5850)
+    parser.add_argument('--clientes', type=int, default=16)
+    parser.add_argument('--reinicios', type=int, default=5)
+    parser.add_argument('--intervalo', type=float, default=1.0, help='segundos entre os reinícios')
+    parser.add_argument('--motor', default='threading')
+    argumentos = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        shutil.copytree(RAIZ / 'contas', Path(pasta) / 'contas')
+        arquivo_pid = Path(pasta) / 'servidor.pid'
+        processo = subprocess.Popen(
+            [
+                sys.executable, '-m', 'pixson.servidor', '--porta', str(argumentos.porta),
+                '--motor', argumentos.motor, '--arquivo-pid', str(arquivo_pid)
+            ],
+            cwd=pasta, env=dict(os.environ, PYTHONPATH=str(RAIZ)), stdout=subprocess.DEVNULL
+        )
+        pid = aguardar_pid(arquivo_pid, '')
+        aguardar_porta(argumentos.porta)
+        try:
+            total_inicial = sum(consultar_saldos(argumentos.porta).values())
+            contadores = Contadores()
+            parar = threading.Event()
+            threads = [
+                threading.Thread(target=cliente, args=(argumentos.porta, indice % 2 == 0, indice, parar, contadores))
+                for indice in range(argumentos.clientes)
+            ]
+            inicio = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for _ in range(argumentos.reinicios):
+                time.sleep(argumentos.intervalo)
+                os.kill(int(pid), signal.SIGUSR2)
+                pid = aguardar_pid(arquivo_pid, pid)
+            time.sleep(argumentos.intervalo)
+            parar.set()
+            for thread in threads:
+                thread.join()
+            duracao = time.perf_counter() - inicio
+            total_final = sum(consultar_saldos(argumentos.porta).values())
+        finally:
+            os.kill(int(pid), signal.SIGTERM)
+            if int(pid) == processo.pid:
+                processo.wait()
+            else:
+                aguardar_fim(int(pid))
+
+    esperado = total_inicial + contadores.confirmados
+    print(f'reinícios: {argumentos.reinicios} | depósitos confirmados: {contadores.confirmados} '
+          f'({contadores.confirmados / duracao:.0f}/s) | sem resposta: {contadores.interrompidos} '
+          f'| conexões recusadas: {contadores.recusadas} | maior espera: {contadores.maior_espera * 1000:.0f} ms')
+    print(f'saldo total: {formatar_valor(total_final)} (esperado {formatar_valor(esperado)})')
+    if contadores.recusadas or total_final != esperado:
+        print('FALHA')
+        raise SystemExit(1)
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
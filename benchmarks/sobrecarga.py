@@ -0,0 +1,210 @@
+"""
+Benchmark do servidor sob sobrecarga: para cada motor, verifica que as conexões além do limite são recusadas
+de imediato, que as conexões ociosas são encerradas após o tempo ocioso, que clientes que enviam operações
+sem ler as respostas não bloqueiam os outros clientes da mesma conta além do prazo de envio, e que o limite
+de requisições por conexão recusa o excedente de um cliente que envia sem pausa.
+
+Uso: PYTHONPATH=$(pwd) python3 -m benchmarks.sobrecarga --max-conexoes 50 --lentos 8
+"""
+from __future__ import annotations
+
+import time
+import socket
+import argparse
+import threading
+from typing import List
+
+from pixson.recursos.protocolo import OperacaoEstatisticas, OperacaoSaldo, RespostaErro, RespostaSucesso, SEPARADOR
+from pixson.servidor import MOTORES
+from benchmarks.comum import servidor_temporario
+
+RG_PADRAO = '1111111111'
+TEMPO_OCIOSO = 2.0
+PRAZO_ENVIO = 2.0
+LIMITE_TAXA = 500
+
+
+def ler_linha(s: socket.socket) -> bytes:
+    """
+    Lê uma linha da conexão, ou os dados lidos até ela ser encerrada.
+    :rtype: bytes
+    """
+    linha = b''
+    while not linha.endswith(SEPARADOR):
+        dados = s.recv(1)
+        if not dados:
+            break
+        linha += dados
+    return linha
+
+
+def saldo(s: socket.socket) -> bool:
+    """
+    Consulta o saldo e informa se a resposta foi de sucesso.
+    :rtype: bool
+    """
+    s.sendall(OperacaoSaldo(0, RG_PADRAO).enquadrar())
+    return RespostaSucesso.regex.match(ler_linha(s).rstrip(SEPARADOR).decode()) is not None
+
+
+def medir_limite_conexoes(porta: int, max_conexoes: int, excedentes: int) -> bool:
+    """
+    Ocupa todas as conexões e mede a recusa das excedentes.
+    :return: Se todas as excedentes foram recusadas com a resposta de sobrecarga.
+    :rtype: bool
+    """
+    # A conexão de teste de `servidor_temporario` ainda pode estar sendo encerrada pelo servidor.
+    time.sleep(0.5)
+    ocupadas = [socket.create_connection(('localhost', porta)) for _ in range(max_conexoes)]
+    for s in ocupadas:
+        saldo(s)
+    recusadas = 0
+    maior = 0.0
+    for _ in range(excedentes):
+        inicio = time.perf_counter()
+        with socket.create_connection(('localhost', porta), timeout=5) as s:
+            resposta = ler_linha(s).rstrip(SEPARADOR).decode()
+        maior = max(maior, time.perf_counter() - inicio)
+        if RespostaErro.regex.match(resposta) and resposta.endswith('Servidor sobrecarregado'):
+            recusadas += 1
+    for s in ocupadas:
+        s.close()
+    print(f'  limite de conexões: {recusadas} de {excedentes} recusadas | maior espera pela recusa: {maior * 1000:.1f} ms')
+    return recusadas == excedentes
+
+
+def medir_ociosas(porta: int, quantidade: int) -> bool:
+    """
+    Abre conexões ociosas e mede quando o servidor as encerra.
+    :return: Se todas foram encerradas até um segundo e meio após o tempo ocioso.
+    :rtype: bool
+    """
+    conexoes = [socket.create_connection(('localhost', porta)) for _ in range(quantidade)]
+    inicio = time.perf_counter()
+    tempos = []
+    for s in conexoes:
+        s.settimeout(TEMPO_OCIOSO + 5)
+        try:
+            fechada = s.recv(1) == b''
+        except OSError:
+            fechada = False
+        if fechada:
+            tempos.append(time.perf_counter() - inicio)
+        s.close()
+    maior = max(tempos) if tempos else float('inf')
+    print(f'  tempo ocioso de {TEMPO_OCIOSO:.0f} s: {len(tempos)} de {quantidade} encerradas | última após {maior:.2f} s')
+    return len(tempos) == quantidade and maior < TEMPO_OCIOSO + 1.5
+
+
+def inundar(porta: int, parar: threading.Event) -> None:
+    """
+    Envia operações sem ler as respostas, reconectando quando o servidor encerra a conexão. As respostas
+    das estatísticas, grandes, enchem logo os buffers da conexão, e o envio fica bloqueado, na maioria
+    das vezes, na resposta de uma consulta de saldo, com a trava da conta mantida.
+    """
+    lote = (OperacaoEstatisticas(0).enquadrar() + OperacaoSaldo(0, RG_PADRAO).enquadrar() * 5) * 100
+    while not parar.is_set():
+        s = socket.socket()
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        s.settimeout(1)
+        try:
+            s.connect(('localhost', porta))
+            while not parar.is_set():
+                try:
+                    s.sendall(lote)
+                except socket.timeout:
+                    continue
+        except OSError:
+            pass
+        finally:
+            s.close()
+
+
+def medir_lentos(porta: int, lentos: int, duracao: float) -> bool:
+    """
+    Mede a latência de um cliente normal enquanto outros clientes da mesma conta não leem as respostas.
+    :return: Se nenhuma consulta do cliente normal esperou mais que o prazo de envio, com uma margem.
+    :rtype: bool
+    """
+    parar = threading.Event()
+    threads = [threading.Thread(target=inundar, args=(porta, parar)) for _ in range(lentos)]
+    for thread in threads:
+        thread.start()
+    latencias: List[float] = []
+    fim = time.monotonic() + duracao
+    while time.monotonic() < fim:
+        with socket.create_connection(('localhost', porta), timeout=PRAZO_ENVIO * 5) as s:
+            inicio = time.perf_counter()
+            try:
+                saldo(s)
+            except OSError:
+                latencias.append(float('inf'))
+                continue
+            latencias.append(time.perf_counter() - inicio)
+        time.sleep(0.01)
+    parar.set()
+    for thread in threads:
+        thread.join()
+    latencias.sort()
+    print(
+        f'  {lentos} clientes sem ler as respostas: {len(latencias)} consultas de outro cliente'
+        f' | p50={latencias[len(latencias) // 2] * 1000:.1f} ms | máx={latencias[-1] * 1000:.1f} ms'
+    )
+    return latencias[-1] < PRAZO_ENVIO + 1
+
+
+def medir_taxa(porta: int, duracao: float) -> bool:
+    """
+    Envia consultas sem pausa por uma conexão e conta as aceitas e as recusadas pelo limite de requisições.
+    :return: Se as aceitas não excederam a taxa no período mais a rajada inicial.
+    :rtype: bool
+    """
+    aceitas = recusadas = 0
+    with socket.create_connection(('localhost', porta)) as s:
+        arquivo = s.makefile('rb')
+        inicio = time.perf_counter()
+        while time.perf_counter() - inicio < duracao:
+            s.sendall(OperacaoSaldo(0, RG_PADRAO).enquadrar() * 100)
+            for _ in range(100):
+                resposta = arquivo.readline().rstrip(SEPARADOR).decode()
+                if RespostaSucesso.regex.match(resposta):
+                    aceitas += 1
+                else:
+                    recusadas += 1
+        decorrido = time.perf_counter() - inicio
+    print(
+        f'  limite de {LIMITE_TAXA} req/s: {aceitas / decorrido:.0f} aceitas/s e {recusadas / decorrido:.0f} recusadas/s'
+        f' em {decorrido:.1f} s'
+    )
+    return recusadas > 0 and aceitas <= LIMITE_TAXA * (decorrido + 1) + 100
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark do servidor PIXSON sob sobrecarga')
+    parser.add_argument('--porta', type=int, default=5950)
+    parser.add_argument('--max-conexoes', type=int, default=50)
+    parser.add_argument('--excedentes', type=int, default=50, help='conexões além do limite')
+    parser.add_argument('--lentos', type=int, default=8, help='clientes que não leem as respostas')
+    parser.add_argument('--duracao', type=float, default=5.0, help='segundos de cada medição de carga')
+    argumentos = parser.parse_args()
+
+    resultados = []
+    for deslocamento, motor in enumerate(MOTORES):
+        print(f'{motor}:')
+        with servidor_temporario(argumentos.porta + deslocamento, [
+            '--motor', motor, '--max-conexoes', str(argumentos.max_conexoes), '--tempo-ocioso', str(TEMPO_OCIOSO),
+            '--prazo-envio', str(PRAZO_ENVIO)
+        ]):
+            porta = argumentos.porta + deslocamento
+            resultados.append(medir_limite_conexoes(porta, argumentos.max_conexoes, argumentos.excedentes))
+            resultados.append(medir_ociosas(porta, argumentos.max_conexoes // 2))
+            resultados.append(medir_lentos(porta, argumentos.lentos, argumentos.duracao))
+        with servidor_temporario(argumentos.porta + deslocamento, ['--motor', motor, '--limite-taxa', str(LIMITE_TAXA)]):
+            resultados.append(medir_taxa(argumentos.porta + deslocamento, argumentos.duracao))
+    print('OK' if all(resultados) else 'FALHA')
+    if not all(resultados):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
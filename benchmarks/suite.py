@@ -0,0 +1,70 @@
+"""
+Suíte de carga: executa o gerador de carga (`pixson.carga`) contra servidores temporários, em cada
+combinação de motor e codificação, e imprime os resultados em JSON, para comparar execuções e detectar
+regressões no caminho das operações do servidor.
+
+Uso: PYTHONPATH=$(pwd) python3 -m benchmarks.suite --clientes 200 --duracao 10 > resultado.json
+"""
+from __future__ import annotations
+
+import sys
+import json
+import argparse
+
+from pixson import carga
+from pixson.cliente import Cliente
+from pixson.recursos.protocolo import CODIFICACAO_BINARIA, CODIFICACAO_TEXTO
+from pixson.servidor import MOTORES
+from benchmarks.comum import RAIZ, memoria_processo, servidor_temporario
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Suíte de carga do servidor PIXSON')
+    parser.add_argument('--porta', type=int, default=5300)
+    parser.add_argument('--modo', choices=carga.MODOS, default=carga.MODO_ASYNCIO, help='execução dos clientes simulados')
+    parser.add_argument('--clientes', type=int, default=100, help='clientes simulados por cenário')
+    parser.add_argument('--duracao', type=float, default=5.0, help='duração de cada cenário, em segundos')
+    parser.add_argument('--mistura', default=carga.MISTURA_PADRAO, help='peso de cada operação')
+    parser.add_argument('--zipf', type=float, default=1.0, help='concentração da carga nas contas quentes')
+    parser.add_argument('--motores', nargs='+', choices=MOTORES, default=list(MOTORES))
+    argumentos = parser.parse_args()
+
+    rgs = sorted(arquivo.stem for arquivo in (RAIZ / 'contas').glob('*.json'))
+    cenarios = []
+    for motor in argumentos.motores:
+        for codificacao in (CODIFICACAO_TEXTO, CODIFICACAO_BINARIA):
+            porta = argumentos.porta + len(cenarios)
+            configuracao = {
+                'host': 'localhost',
+                'porta': porta,
+                'rgs': rgs,
+                'mistura': carga.ler_mistura(argumentos.mistura),
+                'zipf': argumentos.zipf,
+                'valor': carga.VALOR_PADRAO,
+                'codificacao': codificacao,
+                'duracao': argumentos.duracao,
+                'semente': 0,
+            }
+            with servidor_temporario(porta, ['--motor', motor]) as processo:
+                resultado = carga.executar(configuracao, argumentos.modo, argumentos.clientes)
+                resultado['memoria_servidor'] = memoria_processo(processo.pid)
+                cliente = Cliente(rgs[0], host='localhost', porta=porta, interativo=False)
+                cliente.conectar()
+                resultado['metricas_servidor'] = cliente.consultar_estatisticas()
+                cliente.desconectar()
+            cenarios.append({'motor': motor, 'codificacao': codificacao, **resultado})
+            print(f"{motor}/{codificacao}: {resultado['ops_por_segundo']:.0f} op/s", file=sys.stderr)
+
+    json.dump({
+        'modo': argumentos.modo,
+        'clientes': argumentos.clientes,
+        'duracao': argumentos.duracao,
+        'mistura': argumentos.mistura,
+        'zipf': argumentos.zipf,
+        'cenarios': cenarios,
+    }, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+"""
+Benchmark do TLS e das sessões por token. No próprio processo, confere a emissão e a validação dos tokens de
+sessão, inclusive os adulterados, expirados e de outro segredo. Em seguida, em cada motor do servidor, mede o
+estabelecimento da conexão com o login, sem TLS e, em TLS 1.3 e 1.2, com o handshake completo e com a sessão
+TLS retomada, e confere pelas métricas do servidor que as retomadas dispensaram o handshake completo; mede também a latência
+de uma consulta de saldo e a vazão das páginas do extrato, em texto e binário, com e sem TLS. Por fim, num servidor
+com duas partições, compara a retomada da sessão pelo token com o login, que a partição que não é a dona da
+conta encaminha à outra.
+
+O certificado autoassinado é gerado pelo comando `openssl`, que deve estar disponível.
+
+Uso: PYTHONPATH=$(pwd) python3 -m benchmarks.tls --conexoes 300 --operacoes 2000
+"""
+from __future__ import annotations
+
+import ssl
+import json
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from pixson.cliente import Cliente
+from pixson.recursos.sessoes import TokensSessao
+from pixson.recursos.tls import criar_contexto_cliente
+from pixson.recursos.protocolo import (
+    OperacaoDeposito, OperacaoSaldo, RespostaSucesso, CODIFICACAO_BINARIA, CODIFICACAO_TEXTO
+)
+from pixson.recursos.extrato import PAGINA_MAXIMA
+from benchmarks.comum import servidor_temporario
+
+RG_PADRAO = '1111111111'
+
+
+def percentis(amostras: List[float]) -> str:
+    amostras = sorted(amostras)
+    return (
+        f'p50={amostras[len(amostras) // 2] * 1e6:.0f} µs | p99={amostras[int(len(amostras) * 0.99)] * 1e6:.0f} µs'
+    )
+
+
+def mediana(amostras: List[float]) -> float:
+    return sorted(amostras)[len(amostras) // 2]
+
+
+def gerar_certificado(pasta: Path) -> Tuple[str, str]:
+    """
+    Gera um certificado autoassinado para 'localhost', com uma chave de curva elíptica P-256.
+    :return: Os caminhos do certificado e da chave.
+    :rtype: tuple
+    """
+    if shutil.which('openssl') is None:
+        raise SystemExit('O comando openssl é necessário para gerar o certificado do benchmark')
+    certificado, chave = pasta / 'certificado.pem', pasta / 'chave.pem'
+    subprocess.run(
+        [
+            'openssl', 'req', '-x509', '-newkey', 'ec', '-pkeyopt', 'ec_paramgen_curve:prime256v1', '-nodes',
+            '-keyout', str(chave), '-out', str(certificado), '-days', '1', '-subj', '/CN=localhost',
+            '-addext', 'subjectAltName=DNS:localhost'
+        ],
+        check=True, capture_output=True
+    )
+    return str(certificado), str(chave)
+
+
+def verificar_tokens() -> bool:
+    """
+    Confere a validação dos tokens de sessão e mede o custo da emissão e da validação.
+    :rtype: bool
+    """
+    tokens = TokensSessao()
+    token = tokens.emitir(RG_PADRAO)
+    rg, expira, assinatura = token.split('.')
+    adulterado = f'2222222222.{expira}.{assinatura}'
+    prorrogado = f'{rg}.{int(expira) + 1}.{assinatura}'
+    expirado = TokensSessao(segredo=tokens.segredo, validade=-1).emitir(RG_PADRAO)
+    resultados = [
+        tokens.validar(token) == RG_PADRAO,
+        tokens.validar(adulterado) is None,
+        tokens.validar(prorrogado) is None,
+        tokens.validar(expirado) is None,
+        TokensSessao().validar(token) is None,
+        TokensSessao(segredo=tokens.segredo).validar(token) == RG_PADRAO,
+    ]
+    inicio = time.perf_counter()
+    for _ in range(10000):
+        tokens.validar(tokens.emitir(RG_PADRAO))
+    custo = (time.perf_counter() - inicio) / 10000
+    print(
+        f'  tokens adulterados, prorrogados, expirados e de outro segredo: {"recusados" if all(resultados) else resultados}'
+        f' | emissão e validação: {custo * 1e6:.1f} µs'
+    )
+    return all(resultados)
+
+
+def abrir(porta: int, tls: ssl.SSLContext | None, sessao_tls: ssl.SSLSession | None = None) -> Cliente:
+    cliente = Cliente(rg=RG_PADRAO, host='localhost', porta=porta, interativo=False, tls=tls)
+    cliente.sessao_tls = sessao_tls
+    cliente.conectar()
+    cliente.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return cliente
+
+
+def medir_conexoes(porta: int, tls: ssl.SSLContext | None, conexoes: int, retomar: bool) -> Tuple[List[float], int]:
+    """
+    Mede a conexão seguida do login, retomando ou não a sessão TLS da conexão anterior.
+    :return: As latências e a quantidade de conexões cuja sessão TLS foi retomada.
+    :rtype: tuple
+    """
+    latencias, retomadas, sessao_tls = [], 0, None
+    for _ in range(conexoes):
+        inicio = time.perf_counter()
+        cliente = abrir(porta, tls, sessao_tls if retomar else None)
+        cliente.login()
+        latencias.append(time.perf_counter() - inicio)
+        if tls is not None:
+            retomadas += cliente.socket.session_reused
+            sessao_tls = cliente.sessao_tls
+        cliente.desconectar()
+    return latencias, retomadas
+
+
+def medir_operacoes(porta: int, tls: ssl.SSLContext | None, codificacao: str, operacoes: int) -> Tuple[List[float], float]:
+    """
+    Mede a latência das consultas de saldo, uma por vez, e a vazão das páginas completas do extrato, respostas
+    grandes em que predomina o custo da cifragem. Cada solicitação tem uma única resposta, sem o atraso das
+    respostas seguidas pelo algoritmo de Nagle nas conexões sem TLS.
+    :return: As latências das consultas e os bytes de extrato recebidos por segundo.
+    :rtype: tuple
+    """
+    cliente = Cliente(rg=RG_PADRAO, codificacao=codificacao, host='localhost', porta=porta, interativo=False, tls=tls)
+    cliente.conectar()
+    cliente.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    cliente.login()
+    cliente.enviar_lote([OperacaoDeposito(tempo=0, rg=RG_PADRAO, valor=1) for _ in range(PAGINA_MAXIMA)])
+    consultas = []
+    for _ in range(operacoes):
+        inicio = time.perf_counter()
+        cliente.enviar_solicitacao(OperacaoSaldo(tempo=cliente.obter_e_incrementar_tempo(), rg=None))
+        cliente.receber_resposta()
+        consultas.append(time.perf_counter() - inicio)
+    recebidos = 0
+    inicio = time.perf_counter()
+    for _ in range(operacoes // 10):
+        extrato = cliente.consultar_extrato(limite=PAGINA_MAXIMA)
+        recebidos += len(json.dumps(extrato))
+    vazao = recebidos / (time.perf_counter() - inicio)
+    cliente.desconectar()
+    return consultas, vazao
+
+
+def medir_servidor(porta: int, motor: str, certificado: str, chave: str, conexoes: int, operacoes: int) -> bool:
+    """
+    Compara as conexões e as operações com e sem TLS num servidor com o motor informado.
+    :return: Se as conexões com a sessão anterior a retomaram, segundo o cliente e o servidor.
+    :rtype: bool
+    """
+    contexto = criar_contexto_cliente(ca=certificado)
+    # No TLS 1.3, a retomada ainda faz a troca de chaves efêmera; no TLS 1.2, dispensa-a.
+    contexto_12 = criar_contexto_cliente(ca=certificado)
+    contexto_12.maximum_version = ssl.TLSVersion.TLSv1_2
+    medicoes: Dict[str, List[float]] = {}
+    vazoes: Dict[str, float] = {}
+    with servidor_temporario(porta, ['--motor', motor, '--max-conexoes', '0']):
+        medicoes['sem TLS'], _ = medir_conexoes(porta, None, conexoes, retomar=False)
+        for codificacao in (CODIFICACAO_TEXTO, CODIFICACAO_BINARIA):
+            medicoes[f'consulta sem TLS ({codificacao})'], vazoes[f'sem TLS ({codificacao})'] = medir_operacoes(
+                porta, None, codificacao, operacoes
+            )
+    argumentos = ['--motor', motor, '--max-conexoes', '0', '--tls-certificado', certificado, '--tls-chave', chave]
+    with servidor_temporario(porta, argumentos):
+        # A porta já aceita conexões antes de o servidor registrar as métricas da verificação de `aguardar_porta`.
+        inicial = abrir(porta, contexto)
+        inicial.login()
+        antes = inicial.consultar_estatisticas()['contadores']
+        retomadas = 0
+        for versao, contexto_versao in (('TLS 1.3', contexto), ('TLS 1.2', contexto_12)):
+            medicoes[f'{versao} completo'], _ = medir_conexoes(porta, contexto_versao, conexoes, retomar=False)
+            medicoes[f'{versao} retomado'], retomadas_versao = medir_conexoes(porta, contexto_versao, conexoes, retomar=True)
+            retomadas += retomadas_versao
+        depois = inicial.consultar_estatisticas()['contadores']
+        inicial.desconectar()
+        for codificacao in (CODIFICACAO_TEXTO, CODIFICACAO_BINARIA):
+            medicoes[f'consulta com TLS ({codificacao})'], vazoes[f'com TLS ({codificacao})'] = medir_operacoes(
+                porta, contexto, codificacao, operacoes
+            )
+    handshakes = depois.get('tls.handshakes', 0) - antes.get('tls.handshakes', 0)
+    retomadas_servidor = depois.get('tls.retomadas', 0) - antes.get('tls.retomadas', 0)
+
+    base = mediana(medicoes['sem TLS'])
+    for descricao in ('sem TLS', 'TLS 1.3 completo', 'TLS 1.3 retomado', 'TLS 1.2 completo', 'TLS 1.2 retomado'):
+        acrescimo = (mediana(medicoes[descricao]) - base) * 1e6
+        print(f'  {motor}: conexão e login {descricao:<17} {percentis(medicoes[descricao])} | +{acrescimo:.0f} µs')
+    # A primeira conexão de cada série retomada faz o handshake completo, para obter a sessão.
+    correto = retomadas == 2 * (conexoes - 1) and retomadas_servidor == retomadas and handshakes == 4 * conexoes
+    print(
+        f'    sessões retomadas: {retomadas} de {2 * (conexoes - 1)} pelo cliente, {retomadas_servidor} pelo servidor'
+        f' em {handshakes} handshakes | {"correto" if correto else "INCORRETO"}'
+    )
+    for codificacao in (CODIFICACAO_TEXTO, CODIFICACAO_BINARIA):
+        sem, com = vazoes[f'sem TLS ({codificacao})'], vazoes[f'com TLS ({codificacao})']
+        print(
+            f'    {codificacao}: consulta sem TLS {percentis(medicoes[f"consulta sem TLS ({codificacao})"])}'
+            f' | com TLS {percentis(medicoes[f"consulta com TLS ({codificacao})"])}'
+        )
+        print(
+            f'    {codificacao}: páginas de {PAGINA_MAXIMA} movimentos do extrato {sem / 2 ** 20:.1f} MiB/s sem TLS'
+            f' | {com / 2 ** 20:.1f} MiB/s com TLS ({com / sem:.0%})'
+        )
+    return correto
+
+
+def medir_particoes(porta: int, conexoes: int) -> bool:
+    """
+    Compara o login e a retomada da sessão pelo token num servidor com duas partições. A conexão cai em
+    qualquer partição; na que não é dona da conta, o login é encaminhado, e a retomada não.
+    :return: Se todas as retomadas foram aceitas e um token inválido foi recusado.
+    :rtype: bool
+    """
+    with servidor_temporario(porta, ['--particoes', '2']):
+        cliente = abrir(porta, None)
+        cliente.login(sessao=True)
+        token = cliente.token
+        cliente.desconectar()
+        logins, retomadas, aceitas = [], [], 0
+        for _ in range(conexoes):
+            cliente = abrir(porta, None)
+            inicio = time.perf_counter()
+            cliente.login()
+            logins.append(time.perf_counter() - inicio)
+            cliente.desconectar()
+            cliente = abrir(porta, None)
+            inicio = time.perf_counter()
+            resposta = cliente.retomar(token)
+            retomadas.append(time.perf_counter() - inicio)
+            cliente.enviar_solicitacao(OperacaoSaldo(tempo=cliente.obter_e_incrementar_tempo(), rg=None))
+            aceitas += isinstance(resposta, RespostaSucesso) and isinstance(cliente.receber_resposta(), RespostaSucesso)
+            cliente.desconectar()
+        cliente = abrir(porta, None)
+        rg, expira, assinatura = token.split('.')
+        recusado = not isinstance(cliente.retomar(f'{rg}.{int(expira) + 60}.{assinatura}'), RespostaSucesso)
+        cliente.desconectar()
+    correto = aceitas == conexoes and recusado
+    print(f'  2 partições: login {percentis(logins)} | retomada pelo token {percentis(retomadas)}')
+    print(
+        f'    retomadas com a consulta sem RG aceitas: {aceitas} de {conexoes}, token adulterado'
+        f' {"recusado" if recusado else "ACEITO"} | {"correto" if correto else "INCORRETO"}'
+    )
+    return correto
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark do TLS e das sessões por token do PIXSON')
+    parser.add_argument('--porta', type=int, default=6350)
+    parser.add_argument('--conexoes', type=int, default=300, help='conexões abertas em cada medição')
+    parser.add_argument('--operacoes', type=int, default=2000, help='consultas de saldo em cada medição')
+    argumentos = parser.parse_args()
+
+    print('tokens de sessão no processo:')
+    resultados = [verificar_tokens()]
+    with tempfile.TemporaryDirectory() as pasta:
+        certificado, chave = gerar_certificado(Path(pasta))
+        print('TLS pelo servidor:')
+        for deslocamento, motor in enumerate(('threading', 'asyncio')):
+            resultados.append(medir_servidor(
+                argumentos.porta + deslocamento, motor, certificado, chave, argumentos.conexoes, argumentos.operacoes
+            ))
+    print('sessões entre partições:')
+    resultados.append(medir_particoes(argumentos.porta + 10, argumentos.conexoes))
+    print('OK' if all(resultados) else 'FALHA')
+    if not all(resultados):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,459 @@
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import argparse
+import threading
+import multiprocessing
+from itertools import accumulate
+from typing import Dict, List, Tuple
+
+from pixson.cliente import Cliente, HOST_SERVIDOR, PORTA_SERVIDOR
+from pixson.recursos.conta import Conta
+from pixson.recursos.protocolo import *
+from pixson.recursos.dinheiro import ler_valor
+
+MODO_THREADS = 'threads'
+MODO_PROCESSOS = 'processos'
+MODO_ASYNCIO = 'asyncio'
+MODOS = (MODO_THREADS, MODO_PROCESSOS, MODO_ASYNCIO)
+OPERACOES_CARGA = ('saldo', 'saque', 'deposito', 'transferencia')
+MISTURA_PADRAO = 'saldo=40,saque=20,deposito=20,transferencia=20'
+CLIENTES_PADRAO = 100
+DURACAO_PADRAO = 10.0
+VALOR_PADRAO = 100
+LIMITE_CONEXAO = 30.0
+
+
+def ler_mistura(texto: str) -> Dict[str, float]:
+    """
+    Lê a proporção de cada operação no formato 'saldo=40,saque=20,...'. Operações omitidas não são sorteadas.
+    :param texto: Mistura de operações.
+    :type texto: str
+    :rtype: dict
+    """
+    mistura = {}
+    for item in texto.split(','):
+        nome, _, peso = item.partition('=')
+        nome = nome.strip()
+        if nome not in OPERACOES_CARGA or not peso:
+            raise ValueError(f"Operação inválida na mistura: '{item}'")
+        mistura[nome] = float(peso)
+    if sum(mistura.values()) <= 0:
+        raise ValueError('A mistura precisa de ao menos uma operação com peso positivo')
+    return mistura
+
+
+class Gerador:
+    def __init__(self, rgs: List[str], mistura: Dict[str, float], zipf: float = 0.0, valor: int = VALOR_PADRAO, semente: int | None = None):
+        """
+        Sorteia as operações dos clientes simulados.
+        :param rgs: RGs das contas usadas na carga.
+        :type rgs: list
+        :param mistura: Peso de cada operação.
+        :type mistura: dict
+        :param zipf: Expoente da distribuição de Zipf das contas; 0 sorteia as contas uniformemente, e valores
+        maiores concentram a carga nas primeiras contas da lista (contas quentes).
+        :type zipf: float
+        :param valor: Valor dos saques, depósitos e transferências, em centavos.
+        :type valor: int
+        :param semente: Semente do gerador pseudoaleatório, para repetir a mesma sequência.
+        :type semente: int or None
+        """
+        self.rgs = rgs
+        self.operacoes = list(mistura)
+        self.pesos_operacoes = list(accumulate(mistura.values()))
+        self.pesos_rgs = list(accumulate(1 / (posicao + 1) ** zipf for posicao in range(len(rgs))))
+        self.valor = valor
+        self.aleatorio = random.Random(semente)
+
+    def sortear_rg(self) -> str:
+        """
+        Sorteia uma conta, respeitando a concentração configurada.
+        :rtype: str
+        """
+        return self.aleatorio.choices(self.rgs, cum_weights=self.pesos_rgs)[0]
+
+    def sortear(self, tempo: int) -> Tuple[str, Protocolo]:
+        """
+        Sorteia a próxima operação e monta a solicitação correspondente.
+        :param tempo: Tempo lógico da solicitação.
+        :type tempo: int
+        :rtype: tuple
+        """
+        nome = self.aleatorio.choices(self.operacoes, cum_weights=self.pesos_operacoes)[0]
+        rg = self.sortear_rg()
+        if nome == 'saldo':
+            return nome, OperacaoSaldo(tempo=tempo, rg=rg)
+        if nome == 'saque':
+            return nome, OperacaoSaque(tempo=tempo, rg=rg, valor=self.valor)
+        if nome == 'deposito':
+            return nome, OperacaoDeposito(tempo=tempo, rg=rg, valor=self.valor)
+        destino = self.sortear_rg()
+        while destino == rg and len(self.rgs) > 1:
+            destino = self.sortear_rg()
+        return nome, OperacaoTransferencia(tempo=tempo, rg_origem=rg, rg_destino=destino, valor=self.valor)
+
+
+class Medicoes:
+    def __init__(self):
+        """
+        Latências e contadores de um ou mais clientes simulados. Cada cliente usa as suas próprias medições,
+        combinadas ao final, para não disputar um lock no caminho medido.
+        """
+        self.latencias: Dict[str, List[float]] = {nome: [] for nome in OPERACOES_CARGA}
+        self.recusas: Dict[str, int] = {nome: 0 for nome in OPERACOES_CARGA}
+        self.erros = 0
+        self.falhas_conexao = 0
+
+    def registrar(self, nome: str, latencia: float, resposta: Protocolo) -> None:
+        """
+        Registra uma operação concluída.
+        :param nome: Nome da operação.
+        :type nome: str
+        :param latencia: Tempo entre o envio e a resposta, em segundos.
+        :type latencia: float
+        :param resposta: Resposta do servidor.
+        :type resposta: Protocolo
+        """
+        self.latencias[nome].append(latencia)
+        if isinstance(resposta, RespostaErro):
+            self.recusas[nome] += 1
+
+    def combinar(self, outras: Medicoes) -> None:
+        """
+        Acrescenta as medições de outro cliente.
+        :param outras: Medições a serem acrescentadas.
+        :type outras: Medicoes
+        """
+        for nome in OPERACOES_CARGA:
+            self.latencias[nome].extend(outras.latencias[nome])
+            self.recusas[nome] += outras.recusas[nome]
+        self.erros += outras.erros
+        self.falhas_conexao += outras.falhas_conexao
+
+    @staticmethod
+    def resumir_latencias(latencias: List[float]) -> Dict[str, float]:
+        """
+        Calcula os percentis das latências, em milissegundos.
+        :rtype: dict
+        """
+        if not latencias:
+            return {'p50': 0.0, 'p99': 0.0, 'p999': 0.0, 'max': 0.0}
+        ordenadas = sorted(latencias)
+
+        def percentil(fracao: float) -> float:
+            return round(ordenadas[int(fracao * (len(ordenadas) - 1))] * 1000, 3)
+
+        return {'p50': percentil(0.5), 'p99': percentil(0.99), 'p999': percentil(0.999), 'max': percentil(1.0)}
+
+    def resumo(self, duracao: float) -> Dict:
+        """
+        Resume as medições num dicionário serializável em JSON.
+        :param duracao: Duração da medição, em segundos.
+        :type duracao: float
+        :rtype: dict
+        """
+        todas = [latencia for nome in OPERACOES_CARGA for latencia in self.latencias[nome]]
+        total = len(todas)
+        recusas = sum(self.recusas.values())
+        tentativas = total + self.erros
+        return {
+            'operacoes': total,
+            'ops_por_segundo': round(total / duracao, 1) if duracao else 0.0,
+            'latencia_ms': Medicoes.resumir_latencias(todas),
+            'taxa_erros': round(self.erros / tentativas, 6) if tentativas else 0.0,
+            'taxa_recusas': round(recusas / total, 6) if total else 0.0,
+            'falhas_conexao': self.falhas_conexao,
+            'por_operacao': {
+                nome: {
+                    'operacoes': len(self.latencias[nome]),
+                    'recusas': self.recusas[nome],
+                    'latencia_ms': Medicoes.resumir_latencias(self.latencias[nome]),
+                }
+                for nome in OPERACOES_CARGA if self.latencias[nome]
+            },
+        }
+
+
+def simular_cliente(configuracao: Dict, semente: int, largada: threading.Barrier, medicoes: Medicoes) -> None:
+    """
+    Cliente simulado numa thread: conecta, faz login, aguarda a largada e envia operações até o fim da duração.
+    :param configuracao: Parâmetros da carga.
+    :type configuracao: dict
+    :param semente: Semente do gerador deste cliente.
+    :type semente: int
+    :param largada: Barreira que libera todos os clientes ao mesmo tempo, depois de conectados.
+    :type largada: threading.Barrier
+    :param medicoes: Medições deste cliente.
+    :type medicoes: Medicoes
+    """
+    gerador = Gerador(configuracao['rgs'], configuracao['mistura'], configuracao['zipf'], configuracao['valor'], semente)
+    cliente = Cliente(
+        gerador.sortear_rg(), codificacao=configuracao['codificacao'],
+        host=configuracao['host'], porta=configuracao['porta'], interativo=False
+    )
+    try:
+        cliente.conectar()
+        cliente.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if isinstance(cliente.login(), RespostaErro):
+            raise ConnectionError('Login recusado')
+    except (OSError, ValueError):
+        medicoes.falhas_conexao += 1
+        largada.wait()
+        return
+
+    largada.wait()
+    fim = time.perf_counter() + configuracao['duracao']
+    try:
+        while time.perf_counter() < fim:
+            nome, solicitacao = gerador.sortear(cliente.obter_e_incrementar_tempo())
+            inicio = time.perf_counter()
+            cliente.enviar_solicitacao(solicitacao)
+            resposta = cliente.receber_resposta()
+            medicoes.registrar(nome, time.perf_counter() - inicio, resposta)
+    except (OSError, ValueError):
+        medicoes.erros += 1
+    finally:
+        cliente.desconectar()
+
+
+def executar_threads(configuracao: Dict, clientes: int, deslocamento: int = 0) -> Medicoes:
+    """
+    Executa a carga com uma thread por cliente simulado.
+    :param configuracao: Parâmetros da carga.
+    :type configuracao: dict
+    :param clientes: Quantidade de clientes simulados.
+    :type clientes: int
+    :param deslocamento: Deslocamento das sementes, para que processos diferentes não repitam a mesma sequência.
+    :type deslocamento: int
+    :rtype: Medicoes
+    """
+    largada = threading.Barrier(clientes, timeout=LIMITE_CONEXAO)
+    medicoes = [Medicoes() for _ in range(clientes)]
+    threads = [
+        threading.Thread(
+            target=simular_cliente,
+            args=(configuracao, configuracao['semente'] + deslocamento + indice, largada, medicoes[indice]),
+            daemon=True
+        )
+        for indice in range(clientes)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    total = Medicoes()
+    for parcial in medicoes:
+        total.combinar(parcial)
+    return total
+
+
+def executar_processos(configuracao: Dict, clientes: int, processos: int) -> Medicoes:
+    """
+    Executa a carga distribuindo os clientes simulados entre processos, cada um com uma thread por cliente,
+    para que o próprio gerador não fique limitado pelo GIL.
+    :param configuracao: Parâmetros da carga.
+    :type configuracao: dict
+    :param clientes: Quantidade total de clientes simulados.
+    :type clientes: int
+    :param processos: Quantidade de processos.
+    :type processos: int
+    :rtype: Medicoes
+    """
+    processos = max(1, min(processos, clientes))
+    partes = [clientes // processos + (1 if indice < clientes % processos else 0) for indice in range(processos)]
+    deslocamentos = list(accumulate([0] + partes[:-1]))
+    with multiprocessing.Pool(processos) as pool:
+        parciais = pool.starmap(executar_threads, [(configuracao, parte, deslocamento) for parte, deslocamento in zip(partes, deslocamentos)])
+
+    total = Medicoes()
+    for parcial in parciais:
+        total.combinar(parcial)
+    return total
+
+
+async def receber_resposta_asyncio(reader: asyncio.StreamReader, codificacao: str) -> Protocolo:
+    """
+    Recebe uma resposta do servidor por um stream do asyncio.
+    :param reader: Stream de leitura da conexão.
+    :type reader: asyncio.StreamReader
+    :param codificacao: Codificação negociada no login.
+    :type codificacao: str
+    :rtype: Protocolo
+    """
+    if codificacao == CODIFICACAO_BINARIA:
+        cabecalho = await reader.readexactly(CABECALHO.size)
+        _, comprimento, _, _ = Protocolo.ler_cabecalho(cabecalho)
+        return Protocolo.desempacotar(cabecalho + await reader.readexactly(comprimento))
+    linha = await reader.readline()
+    if not linha:
+        raise ConnectionError('Conexão encerrada pelo servidor')
+    return Protocolo.analisar_resposta(linha.rstrip(SEPARADOR).decode())
+
+
+async def simular_cliente_asyncio(
+        configuracao: Dict,
+        semente: int,
+        chegada: asyncio.Queue,
+        largada: asyncio.Event,
+        medicoes: Medicoes
+) -> None:
+    """
+    Cliente simulado como corrotina, equivalente a `simular_cliente`.
+    :param configuracao: Parâmetros da carga.
+    :type configuracao: dict
+    :param semente: Semente do gerador deste cliente.
+    :type semente: int
+    :param chegada: Fila em que o cliente avisa que terminou o login, com ou sem sucesso.
+    :type chegada: asyncio.Queue
+    :param largada: Evento que libera todos os clientes ao mesmo tempo, depois de conectados.
+    :type largada: asyncio.Event
+    :param medicoes: Medições deste cliente.
+    :type medicoes: Medicoes
+    """
+    gerador = Gerador(configuracao['rgs'], configuracao['mistura'], configuracao['zipf'], configuracao['valor'], semente)
+    relogio = 0
+    try:
+        reader, writer = await asyncio.open_connection(configuracao['host'], configuracao['porta'])
+        writer.write(OperacaoLogin(tempo=relogio, rg=gerador.sortear_rg(), codificacao=configuracao['codificacao']).enquadrar())
+        resposta = await receber_resposta_asyncio(reader, CODIFICACAO_TEXTO)
+        if isinstance(resposta, RespostaErro):
+            raise ConnectionError('Login recusado')
+        relogio = max(relogio, resposta.tempo) + 1
+    except (OSError, ValueError, asyncio.IncompleteReadError):
+        medicoes.falhas_conexao += 1
+        chegada.put_nowait(None)
+        return
+
+    chegada.put_nowait(None)
+    await largada.wait()
+    fim = time.perf_counter() + configuracao['duracao']
+    try:
+        while time.perf_counter() < fim:
+            relogio += 1
+            nome, solicitacao = gerador.sortear(relogio)
+            inicio = time.perf_counter()
+            if configuracao['codificacao'] == CODIFICACAO_BINARIA:
+                writer.write(solicitacao.empacotar())
+            else:
+                writer.write(solicitacao.enquadrar())
+            resposta = await receber_resposta_asyncio(reader, configuracao['codificacao'])
+            medicoes.registrar(nome, time.perf_counter() - inicio, resposta)
+            relogio = max(relogio, resposta.tempo) + 1
+    except (OSError, ValueError, asyncio.IncompleteReadError):
+        medicoes.erros += 1
+    finally:
+        writer.close()
+
+
+async def executar_asyncio(configuracao: Dict, clientes: int) -> Medicoes:
+    """
+    Executa a carga com todos os clientes simulados como corrotinas de um único laço de eventos.
+    :param configuracao: Parâmetros da carga.
+    :type configuracao: dict
+    :param clientes: Quantidade de clientes simulados.
+    :type clientes: int
+    :rtype: Medicoes
+    """
+    chegada = asyncio.Queue()
+    largada = asyncio.Event()
+    medicoes = [Medicoes() for _ in range(clientes)]
+    tarefas = [
+        asyncio.ensure_future(simular_cliente_asyncio(configuracao, configuracao['semente'] + indice, chegada, largada, medicoes[indice]))
+        for indice in range(clientes)
+    ]
+    for _ in range(clientes):
+        await asyncio.wait_for(chegada.get(), timeout=LIMITE_CONEXAO)
+    largada.set()
+    await asyncio.gather(*tarefas)
+
+    total = Medicoes()
+    for parcial in medicoes:
+        total.combinar(parcial)
+    return total
+
+
+def executar(configuracao: Dict, modo: str = MODO_THREADS, clientes: int = CLIENTES_PADRAO, processos: int | None = None) -> Dict:
+    """
+    Executa a carga no modo informado e retorna o resumo das medições.
+    :param configuracao: Parâmetros da carga: host, porta, rgs, mistura, zipf, valor, codificacao, duracao e semente.
+    :type configuracao: dict
+    :param modo: 'threads', 'processos' ou 'asyncio'.
+    :type modo: str
+    :param clientes: Quantidade de clientes simulados, cada um com a sua conexão.
+    :type clientes: int
+    :param processos: Quantidade de processos no modo 'processos' (padrão: número de CPUs).
+    :type processos: int or None
+    :rtype: dict
+    """
+    inicio = time.perf_counter()
+    if modo == MODO_ASYNCIO:
+        medicoes = asyncio.run(executar_asyncio(configuracao, clientes))
+    elif modo == MODO_PROCESSOS:
+        medicoes = executar_processos(configuracao, clientes, processos or os.cpu_count() or 1)
+    else:
+        medicoes = executar_threads(configuracao, clientes)
+    # A vazão considera só a duração configurada, em que os clientes enviam operações, e não o tempo de conexão.
+    resumo = medicoes.resumo(configuracao['duracao'])
+    resumo['tempo_total'] = round(time.perf_counter() - inicio, 3)
+    return resumo
+
+
+def main() -> None:
+    """
+    Gera carga sintética contra um servidor em execução e imprime as medições em JSON na saída padrão.
+    """
+    parser = argparse.ArgumentParser(description='Gerador de carga do PIXSON')
+    parser.add_argument('--host', default=HOST_SERVIDOR, help='endereço do servidor')
+    parser.add_argument('--porta', type=int, default=PORTA_SERVIDOR, help='porta do servidor')
+    parser.add_argument('--modo', choices=MODOS, default=MODO_THREADS, help='como os clientes simulados são executados')
+    parser.add_argument('--clientes', type=int, default=CLIENTES_PADRAO, help='quantidade de clientes simulados')
+    parser.add_argument('--processos', type=int, help="processos no modo 'processos' (padrão: número de CPUs)")
+    parser.add_argument('--duracao', type=float, default=DURACAO_PADRAO, help='duração da medição, em segundos')
+    parser.add_argument('--mistura', default=MISTURA_PADRAO, help='peso de cada operação')
+    parser.add_argument('--zipf', type=float, default=0.0, help='concentração da carga nas contas quentes (0 = uniforme)')
+    parser.add_argument('--rgs', help='RGs das contas, separados por vírgula (padrão: contas do armazenamento local)')
+    parser.add_argument('--valor', type=ler_valor, default=VALOR_PADRAO, help='valor dos saques, depósitos e transferências, em reais')
+    parser.add_argument('--binario', action='store_true', help='usa a codificação binária após o login')
+    parser.add_argument('--semente', type=int, default=0, help='semente dos geradores pseudoaleatórios')
+    argumentos = parser.parse_args()
+
+    try:
+        mistura = ler_mistura(argumentos.mistura)
+    except ValueError as erro:
+        parser.error(str(erro))
+    rgs = argumentos.rgs.split(',') if argumentos.rgs else sorted(Conta.listar_rgs())
+    if not rgs:
+        parser.error('Nenhuma conta encontrada; informe --rgs')
+
+    configuracao = {
+        'host': argumentos.host,
+        'porta': argumentos.porta,
+        'rgs': rgs,
+        'mistura': mistura,
+        'zipf': argumentos.zipf,
+        'valor': argumentos.valor,
+        'codificacao': CODIFICACAO_BINARIA if argumentos.binario else CODIFICACAO_TEXTO,
+        'duracao': argumentos.duracao,
+        'semente': argumentos.semente,
+    }
+    resultado = executar(configuracao, argumentos.modo, argumentos.clientes, argumentos.processos)
+    resultado['configuracao'] = {
+        'modo': argumentos.modo,
+        'clientes': argumentos.clientes,
+        **{chave: valor for chave, valor in configuracao.items() if chave != 'rgs'},
+        'contas': len(rgs),
+    }
+    json.dump(resultado, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,41 +1,83 @@
 from __future__ import annotations
 
-import sys
+import json
 import socket
 import signal
+import argparse
+from collections import deque
+from typing import TYPE_CHECKING, Deque, Dict, List
 
 from pixson.recursos import utils
 from pixson.recursos.protocolo import *
+from pixson.recursos.dinheiro import ler_valor
+
+if TYPE_CHECKING:
+    # Importados apenas pelo `ClienteAsyncio` e pelo TLS, para não atrasar o início do cliente interativo.
+    import ssl
+    import asyncio
 
 HOST_SERVIDOR = 'localhost'
 PORTA_SERVIDOR = 5000
 
 
 class Cliente:
-    def __init__(self, rg: str) -> None:
+    def __init__(
+            self,
+            rg: str,
+            codificacao: str = CODIFICACAO_TEXTO,
+            host: str = HOST_SERVIDOR,
+            porta: int = PORTA_SERVIDOR,
+            interativo: bool = True,
+            tls: ssl.SSLContext | None = None
+    ) -> None:
         """
         Construtor da classe Cliente.
         :param rg: string com o RG do cliente.
         :type rg: str
+        :param codificacao: Codificação solicitada no login ('texto' ou 'binario').
+        :type codificacao: str
+        :param host: Endereço do servidor.
+        :type host: str
+        :param porta: Porta do servidor.
+        :type porta: int
+        :param interativo: Se falso, o cliente não imprime mensagens e propaga os erros de conexão em vez de encerrar o processo.
+        :type interativo: bool
+        :param tls: Contexto TLS da conexão com o servidor.
+        :type tls: ssl.SSLContext or None
         """
         self.rg = rg
+        self.host = host
+        self.porta = porta
+        self.interativo = interativo
+        self.codificacao_solicitada = codificacao
+        self.codificacao = CODIFICACAO_TEXTO
         self.socket = None
         self.conectado = False
         self.relogio = 0
+        self.buffer = b''
+        self.proximo_id = 0
+        # Notificações das contas assinadas recebidas enquanto o cliente aguardava uma resposta.
+        self.notificacoes: Deque[NotificacaoSaldo] = deque()
+        self.tls = tls
+        # Sessão TLS da última conexão, retomada na próxima, e token da sessão do último login com `sessao`.
+        self.sessao_tls: ssl.SSLSession | None = None
+        self.token: str | None = None
 
     def incrementar_relogio(self) -> None:
         """
         Incrementa o relógio.
         """
         self.relogio += 1
-        print(f'Relógio Lógico Atualizado: {self.relogio}')
+        if self.interativo:
+            print(f'Relógio Lógico Atualizado: {self.relogio}')
 
     def atualizar_tempo(self, tempo: int) -> None:
         """
         Atualiza o relógio com o tempo recebido, se ele for maior que o tempo atual e incrementa o relógio.
         """
         self.relogio = max(self.relogio, tempo) + 1
-        print(f'Relógio Lógico Atualizado: {self.relogio}')
+        if self.interativo:
+            print(f'Relógio Lógico Atualizado: {self.relogio}')
 
     def obter_e_incrementar_tempo(self) -> int:
         """
@@ -46,17 +88,72 @@ class Cliente:
 
     def conectar(self) -> None:
         """
-        Conecta o cliente ao servidor.
+        Conecta o cliente ao servidor. Com TLS, a sessão TLS da conexão anterior, se houver, é retomada, sem
+        a troca de chaves completa, se o servidor ainda a aceitar.
         """
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         try:
-            self.socket.connect((HOST_SERVIDOR, PORTA_SERVIDOR))
+            self.socket.connect((self.host, self.porta))
+            if self.tls is not None:
+                # O handshake e o login são mensagens pequenas e seguidas, que o algoritmo de Nagle atrasaria
+                # até a confirmação das anteriores.
+                self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self.socket = self.tls.wrap_socket(self.socket, server_hostname=self.host, session=self.sessao_tls)
             self.conectado = True
-            print(f"Conectado ao servidor")
+            if self.interativo:
+                print(f"Conectado ao servidor")
         except ConnectionRefusedError:
+            if not self.interativo:
+                raise
             print('Erro ao conectar ao servidor')
             self.encerrar()
 
+    def login(self, sessao: bool = False) -> RespostaSucesso | RespostaErro:
+        """
+        Realiza o login com o RG do cliente, solicitando a codificação informada na criação do cliente.
+        Se o login for bem-sucedido, as mensagens seguintes passam a usar essa codificação.
+        :param sessao: Solicita um token de sessão, guardado em `token`, para retomar a sessão por `retomar`.
+        :type sessao: bool
+        :rtype: RespostaSucesso or RespostaErro
+        """
+        login = OperacaoLogin(
+            tempo=self.obter_e_incrementar_tempo(), rg=self.rg, codificacao=self.codificacao_solicitada, sessao=sessao
+        )
+        return self.autenticar(login)
+
+    def retomar(self, token: str | None = None) -> RespostaSucesso | RespostaErro:
+        """
+        Retoma, numa nova conexão, a sessão de um login anterior com `sessao`, sem um novo login. Se a retomada
+        for bem-sucedida, as mensagens seguintes passam a usar a codificação informada na criação do cliente.
+        :param token: Token da sessão. Por padrão, o do último login do cliente.
+        :type token: str or None
+        :rtype: RespostaSucesso or RespostaErro
+        """
+        retomada = OperacaoRetomar(
+            tempo=self.obter_e_incrementar_tempo(), token=token or self.token, codificacao=self.codificacao_solicitada
+        )
+        return self.autenticar(retomada)
+
+    def autenticar(self, solicitacao: OperacaoLogin | OperacaoRetomar) -> RespostaSucesso | RespostaErro:
+        """
+        Envia o login ou a retomada da sessão, sempre em texto, e adota a codificação solicitada se a
+        resposta for de sucesso. Com TLS, guarda a sessão TLS, cujo ticket o servidor envia após o handshake,
+        para a próxima conexão.
+        :rtype: RespostaSucesso or RespostaErro
+        """
+        self.enviar_mensagem(solicitacao.enquadrar())
+        resposta = self.receber_mensagem()
+        if self.tls is not None:
+            self.sessao_tls = self.socket.session
+        if not RespostaSucesso.regex.match(resposta):
+            return RespostaErro.desencapsular(resposta)
+        self.codificacao = self.codificacao_solicitada
+        resposta = RespostaSucesso.desencapsular(resposta)
+        _, _, token = resposta.resposta.partition(SEPARADOR_TOKEN)
+        if token:
+            self.token = token
+        return resposta
+
     def desconectar(self) -> None:
         """
         Desconecta o cliente do servidor.
@@ -82,95 +179,531 @@ class Cliente:
             mensagem = mensagem.encode()
         self.socket.send(mensagem)
 
+    def receber(self) -> None:
+        """
+        Lê do socket e acumula os dados recebidos no buffer da conexão.
+        """
+        dados = self.socket.recv(utils.TAMANHO_BUFFER_PADRAO)
+        if not dados:
+            raise ConnectionError('Conexão encerrada pelo servidor')
+        self.buffer += dados
+
+    def receber_linha(self) -> str:
+        """
+        Recebe uma mensagem de texto completa, delimitada por quebra de linha.
+        :rtype: str
+        """
+        while SEPARADOR not in self.buffer:
+            self.receber()
+        linha, _, self.buffer = self.buffer.partition(SEPARADOR)
+        return linha.decode()
+
     def receber_mensagem(self) -> str:
         """
         Recebe uma mensagem do servidor e atualiza o relógio lógico.
         :rtype: str
         """
-        mensagem = self.socket.recv(utils.TAMANHO_BUFFER_PADRAO).decode()
+        _, mensagem = Protocolo.separar_id(self.receber_linha())
         self.atualizar_tempo(tempo=Protocolo.obter_tempo(mensagem))
         return mensagem
 
-    def enviar_mensagem_e_imprimir_resposta(self, mensagem: str) -> None:
+    def receber_exatamente(self, tamanho: int) -> bytes:
+        """
+        Recebe exatamente a quantidade de bytes informada.
+        :param tamanho: Quantidade de bytes.
+        :type tamanho: int
+        :rtype: bytes
+        """
+        while len(self.buffer) < tamanho:
+            self.receber()
+        dados, self.buffer = self.buffer[:tamanho], self.buffer[tamanho:]
+        return dados
+
+    def enviar_solicitacao(self, solicitacao: Protocolo) -> None:
+        """
+        Envia uma solicitação ao servidor, na codificação negociada no login.
+        :param solicitacao: Solicitação a ser enviada.
+        :type solicitacao: Protocolo
+        """
+        if self.codificacao == CODIFICACAO_BINARIA:
+            self.enviar_mensagem(solicitacao.empacotar())
+        else:
+            self.enviar_mensagem(solicitacao.enquadrar())
+
+    def receber_resposta(self) -> RespostaSucesso | RespostaErro | RespostaLote:
+        """
+        Recebe e desencapsula uma resposta do servidor, atualizando o relógio lógico. As notificações das
+        contas assinadas recebidas antes da resposta são guardadas em `notificacoes`.
+        :rtype: RespostaSucesso or RespostaErro or RespostaLote
+        """
+        while True:
+            mensagem = self.receber_protocolo()
+            if not isinstance(mensagem, NotificacaoSaldo):
+                return mensagem
+            self.notificacoes.append(mensagem)
+
+    def receber_protocolo(self) -> Protocolo:
+        """
+        Recebe e desencapsula uma mensagem do servidor, resposta ou notificação, atualizando o relógio lógico.
+        :rtype: Protocolo
+        """
+        if self.codificacao == CODIFICACAO_BINARIA:
+            cabecalho = self.receber_exatamente(CABECALHO.size)
+            _, comprimento, _, tempo = Protocolo.ler_cabecalho(cabecalho)
+            resposta = Protocolo.desempacotar(cabecalho + self.receber_exatamente(comprimento))
+            self.atualizar_tempo(tempo=tempo)
+            return resposta
+
+        resposta = Protocolo.analisar_resposta(self.receber_linha())
+        self.atualizar_tempo(tempo=resposta.tempo)
+        return resposta
+
+    def mensagem_completa(self) -> bool:
+        """
+        Verifica se o buffer contém uma mensagem completa, na codificação negociada no login.
+        :rtype: bool
+        """
+        if self.codificacao == CODIFICACAO_BINARIA:
+            if len(self.buffer) < CABECALHO.size:
+                return False
+            _, comprimento, _, _ = Protocolo.ler_cabecalho(self.buffer)
+            return len(self.buffer) >= CABECALHO.size + comprimento
+        return SEPARADOR in self.buffer
+
+    def assinar(self, rg: str | None = None, cancelar: bool = False) -> None:
+        """
+        Assina as alterações de saldo de uma conta, ou cancela a assinatura. Depois da assinatura, o servidor
+        envia o saldo atual e o novo saldo a cada alteração, recebidos por `receber_notificacao`.
+        :param rg: RG da conta. Por padrão, a conta do cliente.
+        :type rg: str or None
+        :param cancelar: Cancela a assinatura em vez de assinar.
+        :type cancelar: bool
+        """
+        self.enviar_solicitacao(OperacaoAssinar(tempo=self.obter_e_incrementar_tempo(), rg=rg or self.rg, cancelar=cancelar))
+        resposta = self.receber_resposta()
+        if isinstance(resposta, RespostaErro):
+            raise ValueError(resposta.resposta)
+
+    def receber_notificacao(self, prazo: float | None = None) -> NotificacaoSaldo | None:
+        """
+        Recebe a próxima notificação de uma conta assinada, começando pelas guardadas enquanto o cliente
+        aguardava uma resposta.
+        :param prazo: Tempo máximo, em segundos, aguardando dados do servidor. Por padrão, aguarda indefinidamente.
+        :type prazo: float or None
+        :return: A notificação, ou None se nenhuma chegou no prazo.
+        :rtype: NotificacaoSaldo or None
+        """
+        if self.notificacoes:
+            return self.notificacoes.popleft()
+        self.socket.settimeout(prazo)
+        try:
+            while not self.mensagem_completa():
+                self.receber()
+        except socket.timeout:
+            return None
+        finally:
+            self.socket.settimeout(None)
+        mensagem = self.receber_protocolo()
+        if not isinstance(mensagem, NotificacaoSaldo):
+            raise ValueError(f'Resposta sem solicitação: {mensagem.encapsular()}')
+        return mensagem
+
+    def enviar_pipeline(self, solicitacoes: List[Protocolo]) -> List[RespostaSucesso | RespostaErro]:
+        """
+        Envia várias solicitações de uma vez, sem aguardar cada resposta, e recebe as respostas em seguida.
+        Cada solicitação recebe um id, e as respostas são devolvidas na ordem das solicitações.
+        :param solicitacoes: Solicitações a serem enviadas.
+        :type solicitacoes: list
+        :rtype: list
+        """
+        pendentes = {}
+        dados = b''
+        for solicitacao in solicitacoes:
+            self.proximo_id += 1
+            solicitacao.id_requisicao = self.proximo_id
+            pendentes[self.proximo_id] = None
+            if self.codificacao == CODIFICACAO_BINARIA:
+                dados += solicitacao.empacotar()
+            else:
+                dados += solicitacao.enquadrar()
+        self.socket.sendall(dados)
+
+        for _ in solicitacoes:
+            resposta = self.receber_resposta()
+            pendentes[resposta.id_requisicao] = resposta
+        return [pendentes[solicitacao.id_requisicao] for solicitacao in solicitacoes]
+
+    def enviar_lote(
+            self,
+            operacoes: List[OperacaoSaque | OperacaoDeposito | OperacaoTransferencia]
+    ) -> List[StatusLote]:
+        """
+        Envia várias operações numa única solicitação de lote, aplicadas pelo servidor com uma única
+        persistência, e retorna o status de cada operação, na mesma ordem.
+        :param operacoes: Saques, depósitos e transferências a serem aplicados.
+        :type operacoes: list
+        :rtype: list
+        """
+        self.enviar_solicitacao(OperacaoLote(tempo=self.obter_e_incrementar_tempo(), itens=operacoes))
+        resposta = self.receber_resposta()
+        if isinstance(resposta, RespostaErro):
+            raise ValueError(resposta.resposta)
+        return resposta.status
+
+    def consultar_estatisticas(self) -> Dict:
+        """
+        Consulta as métricas do servidor: contadores e histogramas de latência.
+        :rtype: dict
+        """
+        self.enviar_solicitacao(OperacaoEstatisticas(tempo=self.obter_e_incrementar_tempo()))
+        resposta = self.receber_resposta()
+        if isinstance(resposta, RespostaErro):
+            raise ValueError(resposta.resposta)
+        return json.loads(resposta.resposta)
+
+    def consultar_extrato(self, antes: int | None = None, limite: int | None = None) -> Dict:
+        """
+        Consulta uma página do extrato da conta do cliente, do movimento mais recente para o mais antigo.
+        :param antes: Número sequencial em que a página começa, exclusive; o campo `proximo` da página anterior.
+        :type antes: int or None
+        :param limite: Número máximo de movimentos da página.
+        :type limite: int or None
+        :rtype: dict
+        """
+        self.enviar_solicitacao(OperacaoExtrato(tempo=self.obter_e_incrementar_tempo(), rg=self.rg, antes=antes, limite=limite))
+        resposta = self.receber_resposta()
+        if isinstance(resposta, RespostaErro):
+            raise ValueError(resposta.resposta)
+        return json.loads(resposta.resposta)
+
+    def consultar_relatorio(self, verificar: bool = False) -> Dict:
+        """
+        Consulta o relatório dos agregados das contas: quantidade, soma e histograma dos saldos e as contas de
+        maior saldo.
+        :param verificar: Se uma varredura de verificação dos agregados deve ser iniciada em segundo plano.
+        :type verificar: bool
+        :rtype: dict
+        """
+        self.enviar_solicitacao(OperacaoRelatorio(tempo=self.obter_e_incrementar_tempo(), verificar=verificar))
+        resposta = self.receber_resposta()
+        if isinstance(resposta, RespostaErro):
+            raise ValueError(resposta.resposta)
+        return json.loads(resposta.resposta)
+
+    def enviar_mensagem_e_imprimir_resposta(self, mensagem: Protocolo) -> None:
         """
         Envia uma mensagem para o servidor e imprime a resposta.
-        :param mensagem:
-        :type mensagem:
+        :param mensagem: Solicitação a ser enviada.
+        :type mensagem: Protocolo
         """
-        self.enviar_mensagem(mensagem)
-        resposta = self.receber_mensagem()
-        if match(RespostaSucesso.pattern, resposta):
-            resposta = RespostaSucesso.desencapsular(resposta)
-        elif match(RespostaErro.pattern, resposta):
-            resposta = RespostaErro.desencapsular(resposta)
+        self.enviar_solicitacao(mensagem)
+        resposta = self.receber_resposta()
         print(resposta.resposta)
 
     @staticmethod
-    def criar() -> Cliente | None:
+    def criar(
+            rg: str | None = None,
+            codificacao: str = CODIFICACAO_TEXTO,
+            host: str = HOST_SERVIDOR,
+            porta: int = PORTA_SERVIDOR,
+            tls: ssl.SSLContext | None = None
+    ) -> Cliente | None:
         """
         Cria um cliente.
+        :param rg: RG associado à conta. Se não for informado, é solicitado ao usuário.
+        :type rg: str or None
+        :param codificacao: Codificação solicitada no login ('texto' ou 'binario').
+        :type codificacao: str
+        :param host: Endereço do servidor.
+        :type host: str
+        :param porta: Porta do servidor.
+        :type porta: int
+        :param tls: Contexto TLS da conexão com o servidor.
+        :type tls: ssl.SSLContext or None
         :rtype: Cliente or None
         """
-        rg = sys.argv[1] if len(sys.argv) > 1 else str(input('Digite o RG associado a conta: '))
+        rg = rg if rg is not None else str(input('Digite o RG associado a conta: '))
 
-        cliente = Cliente(rg)
+        cliente = Cliente(rg, codificacao=codificacao, host=host, porta=porta, tls=tls)
         cliente.conectar()
         signal.signal(signal.SIGINT, lambda signum, frame: cliente.encerrar())
 
-        cliente.enviar_mensagem(OperacaoLogin(tempo=cliente.obter_e_incrementar_tempo(), rg=rg).encapsular())
-        resposta = cliente.receber_mensagem()
-        if match(RespostaErro.pattern, resposta):
-            resposta = RespostaErro.desencapsular(resposta)
-            print(resposta.resposta)
+        resposta = cliente.login()
+        print(resposta.resposta)
+        if isinstance(resposta, RespostaErro):
             cliente.encerrar()
             return None
-        elif match(RespostaSucesso.pattern, resposta):
-            resposta = RespostaSucesso.desencapsular(resposta)
-            print(resposta.resposta)
-            return cliente
+        return cliente
 
     def processar_comando_saldo(self) -> None:
         """
         Processa o comando de consulta de saldo.
         """
         mensagem = OperacaoSaldo(self.obter_e_incrementar_tempo(), self.rg)
-        self.enviar_mensagem_e_imprimir_resposta(mensagem=mensagem.encapsular())
+        self.enviar_mensagem_e_imprimir_resposta(mensagem=mensagem)
 
     def processar_comando_saque(self) -> None:
         """
         Processa o comando de saque.
         """
-        valor = float(input('Digite o valor do saque: '))
+        valor = ler_valor(input('Digite o valor do saque: '))
         mensagem = OperacaoSaque(self.obter_e_incrementar_tempo(), self.rg, valor)
-        self.enviar_mensagem_e_imprimir_resposta(mensagem=mensagem.encapsular())
+        self.enviar_mensagem_e_imprimir_resposta(mensagem=mensagem)
 
     def processar_comando_deposito(self) -> None:
         """
         Processa o comando de depósito.
         """
-        valor = float(input('Digite o valor do deposito: '))
+        valor = ler_valor(input('Digite o valor do deposito: '))
         mensagem = OperacaoDeposito(self.obter_e_incrementar_tempo(), self.rg, valor)
-        self.enviar_mensagem_e_imprimir_resposta(mensagem=mensagem.encapsular())
+        self.enviar_mensagem_e_imprimir_resposta(mensagem=mensagem)
 
     def processar_comando_transferencia(self) -> None:
         """
         Processa o comando de transferencia.
         """
         rg_destino = str(input('Digite o RG do destinatário: '))
-        valor = float(input('Digite o valor da transferência: '))
+        valor = ler_valor(input('Digite o valor da transferência: '))
         mensagem = OperacaoTransferencia(self.obter_e_incrementar_tempo(), self.rg, rg_destino, valor)
-        self.enviar_mensagem_e_imprimir_resposta(mensagem=mensagem.encapsular())
+        self.enviar_mensagem_e_imprimir_resposta(mensagem=mensagem)
+
+    def processar_comando_extrato(self) -> None:
+        """
+        Processa o comando de extrato, imprimindo os movimentos página a página enquanto o usuário pedir.
+        """
+        antes = None
+        while True:
+            try:
+                extrato = self.consultar_extrato(antes=antes)
+            except ValueError as erro:
+                print(erro)
+                return
+            for movimento in extrato['movimentos']:
+                contraparte = f" ({movimento['contraparte']})" if movimento['contraparte'] else ''
+                print(
+                    f"#{movimento['seq']} t:{movimento['tempo']} {movimento['operacao']}{contraparte}: "
+                    f"{formatar_valor(movimento['valor_centavos'])} | saldo {formatar_valor(movimento['saldo_centavos'])}"
+                )
+            antes = extrato['proximo']
+            if antes is None or input('Mais movimentos? (s/n) ').lower() != 's':
+                return
+
+
+class ClienteAsyncio:
+    """
+    Equivalente do `Cliente`, sem interação com o usuário, para uso em corrotinas: as mensagens são
+    enviadas e recebidas pelos streams do asyncio, com o mesmo protocolo e o mesmo relógio lógico.
+    """
+
+    def __init__(
+            self,
+            rg: str,
+            codificacao: str = CODIFICACAO_TEXTO,
+            host: str = HOST_SERVIDOR,
+            porta: int = PORTA_SERVIDOR,
+            tls: ssl.SSLContext | None = None
+    ) -> None:
+        """
+        Construtor da classe ClienteAsyncio. Com TLS, cada conexão faz o handshake completo: os streams do
+        asyncio não permitem informar a sessão TLS a ser retomada.
+        :param rg: RG usado no login.
+        :type rg: str
+        :param codificacao: Codificação solicitada no login ('texto' ou 'binario').
+        :type codificacao: str
+        :param host: Endereço do servidor.
+        :type host: str
+        :param porta: Porta do servidor.
+        :type porta: int
+        :param tls: Contexto TLS da conexão com o servidor.
+        :type tls: ssl.SSLContext or None
+        """
+        self.rg = rg
+        self.host = host
+        self.porta = porta
+        self.tls = tls
+        self.token: str | None = None
+        self.codificacao_solicitada = codificacao
+        self.codificacao = CODIFICACAO_TEXTO
+        self.reader: asyncio.StreamReader | None = None
+        self.writer: asyncio.StreamWriter | None = None
+        self.conectado = False
+        self.relogio = 0
+        # Cabeçalho binário já lido de um quadro cuja leitura foi cancelada, retomada na leitura seguinte.
+        self.cabecalho: bytes | None = None
+        self.notificacoes: Deque[NotificacaoSaldo] = deque()
+
+    def atualizar_tempo(self, tempo: int) -> None:
+        """
+        Atualiza o relógio com o tempo recebido, se ele for maior que o tempo atual e incrementa o relógio.
+        """
+        self.relogio = max(self.relogio, tempo) + 1
+
+    def obter_e_incrementar_tempo(self) -> int:
+        """
+        Incrementa o relógio e retorna o tempo atual.
+        """
+        self.relogio += 1
+        return self.relogio
+
+    async def conectar(self) -> None:
+        """
+        Conecta o cliente ao servidor.
+        """
+        import asyncio
+        self.reader, self.writer = await asyncio.open_connection(
+            self.host, self.porta, ssl=self.tls, server_hostname=self.host if self.tls is not None else None
+        )
+        self.writer.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.conectado = True
+
+    async def login(self, sessao: bool = False) -> RespostaSucesso | RespostaErro:
+        """
+        Realiza o login com o RG do cliente, solicitando a codificação informada na criação do cliente.
+        :param sessao: Solicita um token de sessão, guardado em `token`, para retomar a sessão por `retomar`.
+        :type sessao: bool
+        :rtype: RespostaSucesso or RespostaErro
+        """
+        login = OperacaoLogin(
+            tempo=self.obter_e_incrementar_tempo(), rg=self.rg, codificacao=self.codificacao_solicitada, sessao=sessao
+        )
+        return await self.autenticar(login)
+
+    async def retomar(self, token: str | None = None) -> RespostaSucesso | RespostaErro:
+        """
+        Retoma, numa nova conexão, a sessão de um login anterior com `sessao`, sem um novo login.
+        :param token: Token da sessão. Por padrão, o do último login do cliente.
+        :type token: str or None
+        :rtype: RespostaSucesso or RespostaErro
+        """
+        retomada = OperacaoRetomar(
+            tempo=self.obter_e_incrementar_tempo(), token=token or self.token, codificacao=self.codificacao_solicitada
+        )
+        return await self.autenticar(retomada)
+
+    async def autenticar(self, solicitacao: OperacaoLogin | OperacaoRetomar) -> RespostaSucesso | RespostaErro:
+        """
+        Envia o login ou a retomada da sessão, sempre em texto, e adota a codificação solicitada se a
+        resposta for de sucesso.
+        :rtype: RespostaSucesso or RespostaErro
+        """
+        self.writer.write(solicitacao.enquadrar())
+        resposta = await self.receber_resposta()
+        if isinstance(resposta, RespostaSucesso):
+            self.codificacao = self.codificacao_solicitada
+            _, _, token = resposta.resposta.partition(SEPARADOR_TOKEN)
+            if token:
+                self.token = token
+        return resposta
+
+    async def desconectar(self) -> None:
+        """
+        Desconecta o cliente do servidor.
+        """
+        self.conectado = False
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except OSError:
+            pass
+
+    async def enviar_solicitacao(self, solicitacao: Protocolo) -> None:
+        """
+        Envia uma solicitação ao servidor, na codificação negociada no login.
+        :param solicitacao: Solicitação a ser enviada.
+        :type solicitacao: Protocolo
+        """
+        if self.codificacao == CODIFICACAO_BINARIA:
+            self.writer.write(solicitacao.empacotar())
+        else:
+            self.writer.write(solicitacao.enquadrar())
+        await self.writer.drain()
+
+    async def receber_resposta(self) -> RespostaSucesso | RespostaErro | RespostaLote:
+        """
+        Recebe e desencapsula uma resposta do servidor, atualizando o relógio lógico. As notificações das
+        contas assinadas recebidas antes da resposta são guardadas em `notificacoes`.
+        :rtype: RespostaSucesso or RespostaErro or RespostaLote
+        """
+        while True:
+            mensagem = await self.receber_protocolo()
+            if not isinstance(mensagem, NotificacaoSaldo):
+                return mensagem
+            self.notificacoes.append(mensagem)
+
+    async def assinar(self, rg: str | None = None, cancelar: bool = False) -> None:
+        """
+        Assina as alterações de saldo de uma conta, ou cancela a assinatura.
+        :param rg: RG da conta. Por padrão, a conta do cliente.
+        :type rg: str or None
+        :param cancelar: Cancela a assinatura em vez de assinar.
+        :type cancelar: bool
+        """
+        await self.enviar_solicitacao(OperacaoAssinar(tempo=self.obter_e_incrementar_tempo(), rg=rg or self.rg, cancelar=cancelar))
+        resposta = await self.receber_resposta()
+        if isinstance(resposta, RespostaErro):
+            raise ValueError(resposta.resposta)
+
+    async def receber_notificacao(self) -> NotificacaoSaldo:
+        """
+        Recebe a próxima notificação de uma conta assinada. A espera pode ser limitada com `asyncio.wait_for`,
+        pois uma leitura cancelada é retomada pela seguinte.
+        :rtype: NotificacaoSaldo
+        """
+        if self.notificacoes:
+            return self.notificacoes.popleft()
+        mensagem = await self.receber_protocolo()
+        if not isinstance(mensagem, NotificacaoSaldo):
+            raise ValueError(f'Resposta sem solicitação: {mensagem.encapsular()}')
+        return mensagem
+
+    async def receber_protocolo(self) -> Protocolo:
+        """
+        Recebe e desencapsula uma mensagem do servidor, resposta ou notificação, atualizando o relógio lógico.
+        :rtype: Protocolo
+        """
+        try:
+            if self.codificacao == CODIFICACAO_BINARIA:
+                if self.cabecalho is None:
+                    self.cabecalho = await self.reader.readexactly(CABECALHO.size)
+                _, comprimento, _, _ = Protocolo.ler_cabecalho(self.cabecalho)
+                carga = await self.reader.readexactly(comprimento)
+                cabecalho, self.cabecalho = self.cabecalho, None
+                resposta = Protocolo.desempacotar(cabecalho + carga)
+            else:
+                linha = await self.reader.readline()
+                if not linha:
+                    raise ConnectionError('Conexão encerrada pelo servidor')
+                resposta = Protocolo.analisar_resposta(linha.rstrip(SEPARADOR).decode())
+        except EOFError:
+            # `asyncio.IncompleteReadError`, quando a conexão termina no meio de um quadro.
+            raise ConnectionError('Conexão encerrada pelo servidor')
+        self.atualizar_tempo(tempo=resposta.tempo)
+        return resposta
 
 
 def main() -> None:
     """
     Função principal que inicia o cliente e processa os comandos.
     """
-    cliente = Cliente.criar()
+    parser = argparse.ArgumentParser(description='Cliente PIXSON')
+    parser.add_argument('rg', nargs='?', help='RG associado à conta')
+    parser.add_argument('--binario', action='store_true', help='usa o protocolo binário após o login')
+    parser.add_argument('--host', default=HOST_SERVIDOR, help='endereço do servidor')
+    parser.add_argument('--porta', type=int, default=PORTA_SERVIDOR, help='porta do servidor')
+    parser.add_argument('--tls', action='store_true', help='conecta com TLS, verificando o certificado pelas autoridades do sistema')
+    parser.add_argument('--tls-ca', help='arquivo PEM das autoridades, ou do certificado autoassinado, aceitos no TLS; implica --tls')
+    argumentos = parser.parse_args()
+
+    tls = None
+    if argumentos.tls or argumentos.tls_ca:
+        from pixson.recursos.tls import criar_contexto_cliente
+        tls = criar_contexto_cliente(ca=argumentos.tls_ca)
+    codificacao = CODIFICACAO_BINARIA if argumentos.binario else CODIFICACAO_TEXTO
+    cliente = Cliente.criar(rg=argumentos.rg, codificacao=codificacao, host=argumentos.host, porta=argumentos.porta, tls=tls)
 
     if cliente is not None:
         while cliente.conectado:
-            print('\n1 - SALDO\n2 - SAQUE\n3 - DEPOSITO\n4 - TRANSFERENCIA\n0 - SAIR\n')
+            print('\n1 - SALDO\n2 - SAQUE\n3 - DEPOSITO\n4 - TRANSFERENCIA\n11 - EXTRATO\n0 - SAIR\n')
             comando = input('Digite o comando: ')
             if isinstance(comando, str) and comando.isdigit():
                 comando = int(comando)
@@ -183,6 +716,8 @@ def main() -> None:
                 cliente.processar_comando_deposito()
             elif comando == Operacoes.TRANSFERENCIA.value:
                 cliente.processar_comando_transferencia()
+            elif comando == Operacoes.EXTRATO.value:
+                cliente.processar_comando_extrato()
             elif comando == Operacoes.SAIR.value:
                 break
             else:
@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import re
+import csv
+import sys
+import json
+import time
+import argparse
+from decimal import InvalidOperation
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Set, TextIO, Tuple
+
+from pixson.recursos.conta import Conta
+from pixson.recursos.dinheiro import CENTAVOS_MAXIMO, REGEX_VALOR, analisar_valor, formatar_valor, para_centavos
+from pixson.recursos.armazenamento import ARMAZENAMENTO_JSON, ARMAZENAMENTOS, criar_armazenamento
+
+FORMATO_CSV = 'csv'
+FORMATO_JSONL = 'jsonl'
+FORMATOS = (FORMATO_CSV, FORMATO_JSONL)
+CAMPOS = ('rg', 'nome', 'saldo')
+TRABALHADORES_PADRAO = 8
+# Contas gravadas por tarefa de cada thread e tarefas em andamento por thread, que limitam a memória.
+LOTE_GRAVACAO = 64
+TAREFAS_POR_TRABALHADOR = 4
+# RG como no protocolo, e o tamanho máximo do nome em bytes, o do armazenamento mmap.
+REGEX_RG = re.compile(r'^[0-9]{1,10}$')
+TAMANHO_NOME = 64
+# Linhas recusadas informadas uma a uma; as seguintes são apenas contadas.
+RECUSAS_INFORMADAS = 20
+
+
+def ler_saldo_csv(texto: str) -> int:
+    """
+    Converte o saldo de uma linha do CSV, em reais, em centavos. Saldos com mais de duas casas decimais,
+    de exportações anteriores aos centavos inteiros, são arredondados para o centavo mais próximo.
+    :rtype: int
+    """
+    if REGEX_VALOR.match(texto):
+        return analisar_valor(texto)
+    return para_centavos(texto)
+
+
+def ler_registros(arquivo: TextIO, formato: str) -> Iterator[Tuple[int, Dict | None]]:
+    """
+    Lê as linhas do arquivo uma a uma, sem carregá-lo inteiro em memória.
+    :param arquivo: Arquivo de entrada.
+    :type arquivo: TextIO
+    :param formato: 'csv' ou 'jsonl'.
+    :type formato: str
+    :return: O número de cada linha e os seus campos, ainda não validados, ou None se a linha do JSONL não
+    for um objeto JSON.
+    :rtype: Iterator[Tuple[int, dict or None]]
+    """
+    if formato == FORMATO_CSV:
+        leitor = csv.DictReader(arquivo)
+        for linha in leitor:
+            yield leitor.line_num, linha
+    else:
+        for numero, linha in enumerate(arquivo, start=1):
+            if linha.strip():
+                try:
+                    registro = json.loads(linha)
+                except ValueError:
+                    registro = None
+                yield numero, registro if isinstance(registro, dict) else None
+
+
+def criar_conta(registro: Dict | None, formato: str) -> Conta:
+    """
+    Valida os campos de uma linha e cria a conta: o RG, de 1 a 10 dígitos, como no protocolo, o nome, de até
+    `TAMANHO_NOME` bytes, e o saldo, em reais no CSV e em centavos ou em reais no JSONL.
+    :param registro: Campos da linha, ou None se ela não for um objeto JSON.
+    :type registro: dict or None
+    :param formato: 'csv' ou 'jsonl'.
+    :type formato: str
+    :raises ValueError: Se a linha não for um objeto JSON, ou algum campo estiver ausente ou for inválido.
+    :rtype: Conta
+    """
+    if registro is None:
+        raise ValueError('a linha não é um objeto JSON')
+    rg, nome = registro.get('rg'), registro.get('nome')
+    if not isinstance(rg, (str, int)) or not REGEX_RG.match(str(rg)):
+        raise ValueError(f'RG inválido: {rg!r}')
+    if not isinstance(nome, str) or len(nome.encode()) > TAMANHO_NOME:
+        raise ValueError(f'Nome ausente ou com mais de {TAMANHO_NOME} bytes: {nome!r}')
+    try:
+        if formato == FORMATO_CSV:
+            saldo = ler_saldo_csv(registro['saldo'])
+        elif isinstance(registro.get('saldo_centavos'), int):
+            saldo = registro['saldo_centavos']
+        else:
+            saldo = para_centavos(registro['saldo'])
+    except (KeyError, TypeError, ValueError, InvalidOperation):
+        saldo = None
+    if saldo is None or isinstance(saldo, bool) or abs(saldo) > CENTAVOS_MAXIMO:
+        raise ValueError(f'Saldo ausente ou inválido: {registro.get("saldo", registro.get("saldo_centavos"))!r}')
+    return Conta(rg=str(rg), nome=nome, saldo=saldo)
+
+
+def gravar_contas(contas: List[Conta]) -> int:
+    """
+    Grava um lote de contas, na thread de um trabalhador.
+    :return: Número de contas gravadas.
+    :rtype: int
+    """
+    for conta in contas:
+        conta.gravar_arquivo()
+    return len(contas)
+
+
+def importar(arquivo: TextIO, formato: str, trabalhadores: int = TRABALHADORES_PADRAO) -> Tuple[int, int]:
+    """
+    Importa as contas do arquivo para a pasta de contas. As linhas inválidas são recusadas e informadas, e as
+    válidas são gravadas em lotes por várias threads em paralelo, com um número limitado de lotes em andamento.
+    A primeira falha de gravação interrompe a leitura e é propagada, depois de as gravações em andamento
+    terminarem.
+    :param arquivo: Arquivo de entrada.
+    :type arquivo: TextIO
+    :param formato: 'csv' ou 'jsonl'.
+    :type formato: str
+    :param trabalhadores: Número de threads de gravação.
+    :type trabalhadores: int
+    :return: Número de contas gravadas e de linhas recusadas.
+    :rtype: Tuple[int, int]
+    """
+    gravadas = 0
+    recusadas = 0
+    pendentes: Set[Future] = set()
+
+    def concluir(concluidas: Set[Future]) -> None:
+        nonlocal gravadas
+        for tarefa in concluidas:
+            gravadas += tarefa.result()
+
+    with ThreadPoolExecutor(max_workers=trabalhadores) as executor:
+        try:
+            lote: List[Conta] = []
+            for numero, registro in ler_registros(arquivo, formato):
+                try:
+                    lote.append(criar_conta(registro, formato))
+                except ValueError as erro:
+                    recusadas += 1
+                    if recusadas <= RECUSAS_INFORMADAS:
+                        print(f'Linha {numero} recusada: {erro}', file=sys.stderr)
+                    continue
+                if len(lote) < LOTE_GRAVACAO:
+                    continue
+                pendentes.add(executor.submit(gravar_contas, lote))
+                lote = []
+                if len(pendentes) >= trabalhadores * TAREFAS_POR_TRABALHADOR:
+                    concluidas, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+                    concluir(concluidas)
+            if lote:
+                pendentes.add(executor.submit(gravar_contas, lote))
+            concluidas, pendentes = wait(pendentes)
+            concluir(concluidas)
+        except BaseException:
+            for tarefa in pendentes:
+                tarefa.cancel()
+            raise
+    if recusadas > RECUSAS_INFORMADAS:
+        print(f'... e mais {recusadas - RECUSAS_INFORMADAS} linhas recusadas', file=sys.stderr)
+    return gravadas, recusadas
+
+
+def exportar(arquivo: TextIO, formato: str) -> int:
+    """
+    Exporta todas as contas da pasta de contas para o arquivo, percorrendo a pasta sob demanda.
+    :param arquivo: Arquivo de saída.
+    :type arquivo: TextIO
+    :param formato: 'csv' ou 'jsonl'.
+    :type formato: str
+    :return: Número de contas exportadas.
+    :rtype: int
+    """
+    escritor = None
+    if formato == FORMATO_CSV:
+        escritor = csv.DictWriter(arquivo, fieldnames=CAMPOS)
+        escritor.writeheader()
+
+    quantidade = 0
+    for rg in Conta.listar_rgs():
+        conta = Conta.ler_arquivo(rg=rg)
+        if conta is None:
+            continue
+        if escritor is not None:
+            escritor.writerow({'rg': conta.rg, 'nome': conta.nome, 'saldo': formatar_valor(conta.saldo)})
+        else:
+            arquivo.write(json.dumps({'rg': conta.rg, 'nome': conta.nome, 'saldo_centavos': conta.saldo}) + '\n')
+        quantidade += 1
+    return quantidade
+
+
+def migrar() -> int:
+    """
+    Regrava todas as contas no formato atual, com o saldo em centavos inteiros. Contas do formato antigo,
+    com o saldo em reais, são convertidas na leitura; regravar as contas já convertidas não as altera.
+    :return: Número de contas regravadas.
+    :rtype: int
+    """
+    quantidade = 0
+    for rg in Conta.listar_rgs():
+        conta = Conta.ler_arquivo(rg=rg)
+        if conta is not None:
+            conta.gravar_arquivo()
+            quantidade += 1
+    return quantidade
+
+
+def main() -> None:
+    """
+    Importa ou exporta contas em CSV ou JSONL, ou converte as contas do formato antigo para centavos.
+    Deve ser executada com o servidor parado, para que os arquivos das contas reflitam todas as operações.
+    """
+    parser = argparse.ArgumentParser(description='Importação e exportação de contas do PIXSON')
+    parser.add_argument('acao', choices=('importar', 'exportar', 'migrar'))
+    parser.add_argument('arquivo', nargs='?', default='-', help="arquivo de entrada ou saída ('-' para stdin/stdout)")
+    parser.add_argument('--formato', choices=FORMATOS, help='formato do arquivo (padrão: pela extensão)')
+    parser.add_argument('--armazenamento', choices=ARMAZENAMENTOS, default=ARMAZENAMENTO_JSON, help='meio de persistência das contas')
+    parser.add_argument('--trabalhadores', type=int, default=TRABALHADORES_PADRAO, help='threads de gravação na importação')
+    argumentos = parser.parse_args()
+
+    participios = {'importar': 'importadas', 'exportar': 'exportadas', 'migrar': 'migradas'}
+    recusadas = 0
+    formato = argumentos.formato or (FORMATO_CSV if argumentos.arquivo.endswith('.csv') else FORMATO_JSONL)
+    Conta.armazenamento = criar_armazenamento(argumentos.armazenamento)
+    inicio = time.perf_counter()
+    if argumentos.acao == 'importar':
+        with (sys.stdin if argumentos.arquivo == '-' else open(argumentos.arquivo, newline='')) as arquivo:
+            try:
+                quantidade, recusadas = importar(arquivo, formato, argumentos.trabalhadores)
+            except Exception as erro:
+                Conta.armazenamento.fechar()
+                print(f'Importação interrompida: {erro}', file=sys.stderr)
+                sys.exit(1)
+    elif argumentos.acao == 'migrar':
+        quantidade = migrar()
+    else:
+        with (sys.stdout if argumentos.arquivo == '-' else open(argumentos.arquivo, 'w', newline='')) as arquivo:
+            quantidade = exportar(arquivo, formato)
+    duracao = time.perf_counter() - inicio
+    Conta.armazenamento.fechar()
+
+    print(
+        f'{quantidade} contas {participios[argumentos.acao]} em {duracao:.2f}s'
+        f' ({quantidade / duracao if duracao else 0:.0f} contas/s)',
+        file=sys.stderr
+    )
+    if recusadas:
+        print(f'{recusadas} linhas recusadas', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,609 @@
+from __future__ import annotations
+
+import json
+import time
+import uuid
+import ssl
+import random
+import select
+import socket
+import struct
+import asyncio
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, Iterator, List
+
+from pixson.cliente import Cliente, ClienteAsyncio, HOST_SERVIDOR, PORTA_SERVIDOR
+from pixson.recursos.protocolo import *
+from pixson.recursos.dinheiro import analisar_valor
+
+TAMANHO_PADRAO = 8
+TENTATIVAS_PADRAO = 5
+ESPERA_INICIAL = 0.05
+ESPERA_MAXIMA = 2.0
+LIMITE_EMPRESTIMO = 30.0
+# Recusa de uma repetição cuja solicitação original, com a mesma chave de idempotência, ainda está em andamento.
+EM_ANDAMENTO = 'Solicitação em andamento'
+
+
+class OperacaoRecusada(ValueError):
+    """
+    O servidor respondeu com erro. A resposta original fica em `resposta`.
+    """
+
+    def __init__(self, resposta: str) -> None:
+        super().__init__(resposta)
+        self.resposta = resposta
+
+
+class SaldoInsuficiente(OperacaoRecusada):
+    pass
+
+
+class ContaNaoEncontrada(OperacaoRecusada):
+    pass
+
+
+RECUSAS: Dict[str, type] = {
+    'Saldo insuficiente': SaldoInsuficiente,
+    'Cliente não encontrado': ContaNaoEncontrada,
+    'Conta de origem não encontrada': ContaNaoEncontrada,
+    'Conta de destino não encontrada': ContaNaoEncontrada,
+}
+
+
+def verificar(resposta: Protocolo) -> Protocolo:
+    """
+    Retorna a resposta de sucesso ou lança a exceção correspondente à resposta de erro.
+    :param resposta: Resposta do servidor.
+    :type resposta: Protocolo
+    :rtype: RespostaSucesso or RespostaLote
+    """
+    if isinstance(resposta, RespostaErro):
+        raise RECUSAS.get(resposta.resposta, OperacaoRecusada)(resposta.resposta)
+    return resposta
+
+
+def ler_saldo(resposta: Protocolo) -> int:
+    """
+    Obtém o saldo, em centavos, da resposta de uma consulta de saldo.
+    :rtype: int
+    """
+    return analisar_valor(verificar(resposta).resposta[len('Saldo: '):])
+
+
+def esperas(tentativas: int, inicial: float = ESPERA_INICIAL, maxima: float = ESPERA_MAXIMA) -> Iterator[float]:
+    """
+    Gera as esperas entre as tentativas de conexão: dobram a cada tentativa, até o máximo, com uma variação
+    aleatória para que clientes desconectados ao mesmo tempo não reconectem todos juntos.
+    :param tentativas: Quantidade de tentativas; são geradas `tentativas - 1` esperas.
+    :type tentativas: int
+    :rtype: Iterator[float]
+    """
+    for tentativa in range(tentativas - 1):
+        yield min(maxima, inicial * 2 ** tentativa) * random.uniform(0.5, 1.0)
+
+
+class PoolClientes:
+    """
+    Conjunto de conexões persistentes com o servidor, já autenticadas, compartilhado por várias threads.
+
+    Cada chamada empresta uma conexão exclusiva, que volta ao conjunto ao final; se todas estiverem em uso
+    e o limite não tiver sido atingido, uma nova é aberta. Conexões que falham são descartadas, e as
+    novas são abertas com novas tentativas e espera exponencial. Consultas são repetidas numa nova conexão
+    se a conexão cair; operações que alteram saldos não são repetidas, pois o servidor pode tê-las aplicado,
+    exceto com `idempotente`: cada uma é enviada com uma chave de idempotência própria, e o servidor responde
+    a repetição com a resposta original, sem aplicá-la de novo.
+    """
+
+    def __init__(
+            self,
+            rg: str,
+            host: str = HOST_SERVIDOR,
+            porta: int = PORTA_SERVIDOR,
+            tamanho: int = TAMANHO_PADRAO,
+            codificacao: str = CODIFICACAO_BINARIA,
+            tentativas: int = TENTATIVAS_PADRAO,
+            limite_emprestimo: float = LIMITE_EMPRESTIMO,
+            idempotente: bool = False,
+            tls: ssl.SSLContext | None = None
+    ) -> None:
+        """
+        Construtor da classe PoolClientes.
+        :param rg: RG usado no login das conexões. As operações podem envolver quaisquer contas.
+        :type rg: str
+        :param host: Endereço do servidor.
+        :type host: str
+        :param porta: Porta do servidor.
+        :type porta: int
+        :param tamanho: Quantidade máxima de conexões abertas.
+        :type tamanho: int
+        :param codificacao: Codificação das conexões ('texto' ou 'binario').
+        :type codificacao: str
+        :param tentativas: Tentativas de conexão antes de propagar o erro.
+        :type tentativas: int
+        :param limite_emprestimo: Tempo máximo de espera por uma conexão livre, em segundos.
+        :type limite_emprestimo: float
+        :param idempotente: Envia as operações que alteram saldos com chaves de idempotência e as repete numa
+        nova conexão se a conexão cair. O servidor não deve ter as chaves desativadas (`--sem-idempotencia`).
+        :type idempotente: bool
+        :param tls: Contexto TLS das conexões. Cada nova conexão retoma a sessão TLS da última aberta, sem a
+        troca de chaves completa.
+        :type tls: ssl.SSLContext or None
+        """
+        self.rg = rg
+        self.host = host
+        self.porta = porta
+        self.tamanho = tamanho
+        self.codificacao = codificacao
+        self.tentativas = tentativas
+        self.limite_emprestimo = limite_emprestimo
+        self.idempotente = idempotente
+        self.tls = tls
+        self.sessao_tls: ssl.SSLSession | None = None
+        self.livres: List[Cliente] = []
+        self.vagas = threading.BoundedSemaphore(tamanho)
+        self.lock = threading.Lock()
+
+    def conectar(self) -> Cliente:
+        """
+        Abre e autentica uma nova conexão, tentando novamente com espera exponencial se o servidor não aceitar.
+        :rtype: Cliente
+        """
+        for espera in [*esperas(self.tentativas), None]:
+            cliente = Cliente(
+                self.rg, codificacao=self.codificacao, host=self.host, porta=self.porta, interativo=False, tls=self.tls
+            )
+            cliente.sessao_tls = self.sessao_tls
+            try:
+                cliente.conectar()
+                resposta = cliente.login()
+                self.sessao_tls = cliente.sessao_tls
+            except OSError:
+                cliente.desconectar()
+                if espera is None:
+                    raise
+                time.sleep(espera)
+                continue
+            if isinstance(resposta, RespostaErro):
+                cliente.desconectar()
+                raise OperacaoRecusada(resposta.resposta)
+            return cliente
+
+    @staticmethod
+    def conexao_viva(cliente: Cliente) -> bool:
+        """
+        Verifica, sem bloquear, se uma conexão livre não foi encerrada pelo servidor enquanto estava parada.
+        Os dados de uma conexão TLS não podem ser espiados (MSG_PEEK): parada e legível, ela é descartada.
+        :rtype: bool
+        """
+        try:
+            legivel, _, _ = select.select([cliente.socket], [], [], 0)
+            if legivel and isinstance(cliente.socket, ssl.SSLSocket):
+                return False
+            return not legivel or bool(cliente.socket.recv(1, socket.MSG_PEEK))
+        except (OSError, ValueError):
+            return False
+
+    def iniciar(self, quantidade: int | None = None) -> PoolClientes:
+        """
+        Abre antecipadamente as conexões, para que as primeiras chamadas não esperem o login.
+        :param quantidade: Quantidade de conexões. Por padrão, o tamanho do conjunto.
+        :type quantidade: int or None
+        :rtype: PoolClientes
+        """
+        clientes = [self.conectar() for _ in range(quantidade or self.tamanho)]
+        with self.lock:
+            self.livres.extend(clientes)
+        return self
+
+    @contextmanager
+    def emprestar(self) -> Iterator[Cliente]:
+        """
+        Empresta uma conexão exclusiva ao bloco. Se o bloco falhar por erro de conexão ou de protocolo,
+        a conexão é descartada; caso contrário, volta ao conjunto.
+        :rtype: Iterator[Cliente]
+        """
+        if not self.vagas.acquire(timeout=self.limite_emprestimo):
+            raise TimeoutError('Nenhuma conexão livre com o servidor')
+        try:
+            cliente = None
+            while cliente is None:
+                with self.lock:
+                    cliente = self.livres.pop() if self.livres else None
+                if cliente is None:
+                    cliente = self.conectar()
+                elif not self.conexao_viva(cliente):
+                    cliente.desconectar()
+                    cliente = None
+            try:
+                yield cliente
+            except (OSError, ValueError, struct.error) as erro:
+                if isinstance(erro, OperacaoRecusada):
+                    self.devolver(cliente)
+                else:
+                    cliente.desconectar()
+                raise
+            else:
+                self.devolver(cliente)
+        finally:
+            self.vagas.release()
+
+    def devolver(self, cliente: Cliente) -> None:
+        """
+        Devolve uma conexão ao conjunto.
+        :param cliente: Conexão emprestada.
+        :type cliente: Cliente
+        """
+        with self.lock:
+            self.livres.append(cliente)
+
+    def nova_chave(self) -> str | None:
+        """
+        Gera a chave de idempotência de uma operação que altera saldos, se o conjunto for idempotente.
+        :rtype: str or None
+        """
+        return uuid.uuid4().hex if self.idempotente else None
+
+    def solicitar(self, criar: Callable[[int], Protocolo], repetir: bool = False, chave: str | None = None) -> Protocolo:
+        """
+        Envia uma solicitação por uma conexão emprestada e retorna a resposta. Com a chave de idempotência, a
+        repetição que encontra a solicitação original ainda em andamento no servidor é enviada de novo após
+        uma espera, até obter a resposta original.
+        :param criar: Cria a solicitação a partir do tempo lógico da conexão.
+        :type criar: callable
+        :param repetir: Se a solicitação pode ser repetida numa nova conexão, caso a conexão caia.
+        :type repetir: bool
+        :param chave: Chave de idempotência da solicitação.
+        :type chave: str or None
+        :rtype: Protocolo
+        """
+        andamento = esperas(self.tentativas)
+        while True:
+            try:
+                with self.emprestar() as cliente:
+                    solicitacao = criar(cliente.obter_e_incrementar_tempo())
+                    solicitacao.chave_idempotencia = chave
+                    cliente.enviar_solicitacao(solicitacao)
+                    resposta = cliente.receber_resposta()
+            except OSError:
+                if not repetir:
+                    raise
+                repetir = False
+                continue
+            espera = next(andamento, None) if isinstance(resposta, RespostaErro) and resposta.resposta == EM_ANDAMENTO else None
+            if espera is None:
+                return resposta
+            time.sleep(espera)
+
+    def saldo(self, rg: str) -> int:
+        """
+        Consulta o saldo da conta.
+        :param rg: RG da conta.
+        :type rg: str
+        :return: Saldo, em centavos.
+        :rtype: int
+        """
+        return ler_saldo(self.solicitar(lambda tempo: OperacaoSaldo(tempo=tempo, rg=rg), repetir=True))
+
+    def sacar(self, rg: str, valor: int) -> None:
+        """
+        Saca um valor da conta.
+        :param rg: RG da conta.
+        :type rg: str
+        :param valor: Valor, em centavos.
+        :type valor: int
+        """
+        verificar(self.solicitar(
+            lambda tempo: OperacaoSaque(tempo=tempo, rg=rg, valor=valor), repetir=self.idempotente, chave=self.nova_chave()
+        ))
+
+    def depositar(self, rg: str, valor: int) -> None:
+        """
+        Deposita um valor na conta.
+        :param rg: RG da conta.
+        :type rg: str
+        :param valor: Valor, em centavos.
+        :type valor: int
+        """
+        verificar(self.solicitar(
+            lambda tempo: OperacaoDeposito(tempo=tempo, rg=rg, valor=valor), repetir=self.idempotente, chave=self.nova_chave()
+        ))
+
+    def transferir(self, rg_origem: str, rg_destino: str, valor: int) -> None:
+        """
+        Transfere um valor entre duas contas.
+        :param rg_origem: RG da conta de origem.
+        :type rg_origem: str
+        :param rg_destino: RG da conta de destino.
+        :type rg_destino: str
+        :param valor: Valor, em centavos.
+        :type valor: int
+        """
+        verificar(self.solicitar(
+            lambda tempo: OperacaoTransferencia(tempo=tempo, rg_origem=rg_origem, rg_destino=rg_destino, valor=valor),
+            repetir=self.idempotente,
+            chave=self.nova_chave()
+        ))
+
+    def lote(self, operacoes: List[OperacaoSaque | OperacaoDeposito | OperacaoTransferencia]) -> List[StatusLote]:
+        """
+        Aplica várias operações numa única solicitação e retorna o status de cada uma, na mesma ordem.
+        :param operacoes: Saques, depósitos e transferências.
+        :type operacoes: list
+        :rtype: list
+        """
+        resposta = self.solicitar(
+            lambda tempo: OperacaoLote(tempo=tempo, itens=operacoes), repetir=self.idempotente, chave=self.nova_chave()
+        )
+        return verificar(resposta).status
+
+    def estatisticas(self) -> Dict:
+        """
+        Consulta as métricas do servidor.
+        :rtype: dict
+        """
+        return json.loads(verificar(self.solicitar(lambda tempo: OperacaoEstatisticas(tempo=tempo), repetir=True)).resposta)
+
+    def extrato(
+            self,
+            rg: str,
+            inicio: int | None = None,
+            fim: int | None = None,
+            chave: str = CHAVES_EXTRATO[0],
+            antes: int | None = None,
+            limite: int | None = None
+    ) -> Dict:
+        """
+        Consulta uma página do extrato da conta, do movimento mais recente para o mais antigo. A próxima página
+        é consultada com `antes` igual ao campo `proximo` da resposta, que é nulo na última.
+        :param rg: RG da conta.
+        :type rg: str
+        :param inicio: Menor tempo lógico, ou instante em milissegundos, dos movimentos.
+        :type inicio: int or None
+        :param fim: Maior tempo lógico, ou instante em milissegundos, dos movimentos.
+        :type fim: int or None
+        :param chave: Chave do intervalo: 'tempo' ou 'instante'.
+        :type chave: str
+        :param antes: Número sequencial em que a página começa, exclusive.
+        :type antes: int or None
+        :param limite: Número máximo de movimentos da página.
+        :type limite: int or None
+        :rtype: dict
+        """
+        resposta = self.solicitar(
+            lambda tempo: OperacaoExtrato(tempo=tempo, rg=rg, inicio=inicio, fim=fim, chave=chave, antes=antes, limite=limite),
+            repetir=True
+        )
+        return json.loads(verificar(resposta).resposta)
+
+    def relatorio(self, verificar_agregados: bool = False) -> Dict:
+        """
+        Consulta o relatório dos agregados das contas do servidor.
+        :param verificar_agregados: Se uma varredura de verificação dos agregados deve ser iniciada em segundo plano.
+        :type verificar_agregados: bool
+        :rtype: dict
+        """
+        resposta = self.solicitar(lambda tempo: OperacaoRelatorio(tempo=tempo, verificar=verificar_agregados), repetir=True)
+        return json.loads(verificar(resposta).resposta)
+
+    def fechar(self) -> None:
+        """
+        Fecha as conexões livres. Conexões emprestadas são fechadas ao serem devolvidas, se necessário.
+        """
+        with self.lock:
+            livres, self.livres = self.livres, []
+        for cliente in livres:
+            cliente.desconectar()
+
+
+class PoolClientesAsyncio:
+    """
+    Equivalente do `PoolClientes` para corrotinas de um laço de eventos, com as mesmas operações.
+    """
+
+    def __init__(
+            self,
+            rg: str,
+            host: str = HOST_SERVIDOR,
+            porta: int = PORTA_SERVIDOR,
+            tamanho: int = TAMANHO_PADRAO,
+            codificacao: str = CODIFICACAO_BINARIA,
+            tentativas: int = TENTATIVAS_PADRAO,
+            limite_emprestimo: float = LIMITE_EMPRESTIMO,
+            idempotente: bool = False,
+            tls: ssl.SSLContext | None = None
+    ) -> None:
+        """
+        Construtor da classe PoolClientesAsyncio. Os parâmetros são os mesmos do `PoolClientes`; com TLS, cada
+        conexão faz o handshake completo, como no `ClienteAsyncio`.
+        """
+        self.rg = rg
+        self.host = host
+        self.porta = porta
+        self.tamanho = tamanho
+        self.codificacao = codificacao
+        self.tentativas = tentativas
+        self.limite_emprestimo = limite_emprestimo
+        self.idempotente = idempotente
+        self.tls = tls
+        self.livres: List[ClienteAsyncio] = []
+        self.vagas: asyncio.Semaphore | None = None
+
+    async def conectar(self) -> ClienteAsyncio:
+        """
+        Abre e autentica uma nova conexão, tentando novamente com espera exponencial se o servidor não aceitar.
+        :rtype: ClienteAsyncio
+        """
+        for espera in [*esperas(self.tentativas), None]:
+            cliente = ClienteAsyncio(self.rg, codificacao=self.codificacao, host=self.host, porta=self.porta, tls=self.tls)
+            try:
+                await cliente.conectar()
+                resposta = await cliente.login()
+            except OSError:
+                if cliente.conectado:
+                    await cliente.desconectar()
+                if espera is None:
+                    raise
+                await asyncio.sleep(espera)
+                continue
+            if isinstance(resposta, RespostaErro):
+                await cliente.desconectar()
+                raise OperacaoRecusada(resposta.resposta)
+            return cliente
+
+    async def iniciar(self, quantidade: int | None = None) -> PoolClientesAsyncio:
+        """
+        Abre antecipadamente as conexões, para que as primeiras chamadas não esperem o login.
+        :param quantidade: Quantidade de conexões. Por padrão, o tamanho do conjunto.
+        :type quantidade: int or None
+        :rtype: PoolClientesAsyncio
+        """
+        self.livres.extend(await asyncio.gather(*(self.conectar() for _ in range(quantidade or self.tamanho))))
+        return self
+
+    @asynccontextmanager
+    async def emprestar(self) -> AsyncIterator[ClienteAsyncio]:
+        """
+        Empresta uma conexão exclusiva ao bloco, como `PoolClientes.emprestar`.
+        :rtype: AsyncIterator[ClienteAsyncio]
+        """
+        # O semáforo é criado no primeiro uso, dentro do laço de eventos que o usará.
+        if self.vagas is None:
+            self.vagas = asyncio.Semaphore(self.tamanho)
+        await asyncio.wait_for(self.vagas.acquire(), timeout=self.limite_emprestimo)
+        try:
+            cliente = None
+            while cliente is None:
+                cliente = self.livres.pop() if self.livres else await self.conectar()
+                if cliente.reader.at_eof():
+                    await cliente.desconectar()
+                    cliente = None
+            try:
+                yield cliente
+            except (OSError, ValueError, struct.error) as erro:
+                if isinstance(erro, OperacaoRecusada):
+                    self.livres.append(cliente)
+                else:
+                    await cliente.desconectar()
+                raise
+            else:
+                self.livres.append(cliente)
+        finally:
+            self.vagas.release()
+
+    def nova_chave(self) -> str | None:
+        """
+        Gera a chave de idempotência de uma operação que altera saldos, se o conjunto for idempotente.
+        :rtype: str or None
+        """
+        return uuid.uuid4().hex if self.idempotente else None
+
+    async def solicitar(self, criar: Callable[[int], Protocolo], repetir: bool = False, chave: str | None = None) -> Protocolo:
+        """
+        Envia uma solicitação por uma conexão emprestada e retorna a resposta, como `PoolClientes.solicitar`.
+        :rtype: Protocolo
+        """
+        andamento = esperas(self.tentativas)
+        while True:
+            try:
+                async with self.emprestar() as cliente:
+                    solicitacao = criar(cliente.obter_e_incrementar_tempo())
+                    solicitacao.chave_idempotencia = chave
+                    await cliente.enviar_solicitacao(solicitacao)
+                    resposta = await cliente.receber_resposta()
+            except OSError:
+                if not repetir:
+                    raise
+                repetir = False
+                continue
+            espera = next(andamento, None) if isinstance(resposta, RespostaErro) and resposta.resposta == EM_ANDAMENTO else None
+            if espera is None:
+                return resposta
+            await asyncio.sleep(espera)
+
+    async def saldo(self, rg: str) -> int:
+        """
+        Consulta o saldo da conta, em centavos.
+        :rtype: int
+        """
+        return ler_saldo(await self.solicitar(lambda tempo: OperacaoSaldo(tempo=tempo, rg=rg), repetir=True))
+
+    async def sacar(self, rg: str, valor: int) -> None:
+        """
+        Saca um valor, em centavos, da conta.
+        """
+        verificar(await self.solicitar(
+            lambda tempo: OperacaoSaque(tempo=tempo, rg=rg, valor=valor), repetir=self.idempotente, chave=self.nova_chave()
+        ))
+
+    async def depositar(self, rg: str, valor: int) -> None:
+        """
+        Deposita um valor, em centavos, na conta.
+        """
+        verificar(await self.solicitar(
+            lambda tempo: OperacaoDeposito(tempo=tempo, rg=rg, valor=valor), repetir=self.idempotente, chave=self.nova_chave()
+        ))
+
+    async def transferir(self, rg_origem: str, rg_destino: str, valor: int) -> None:
+        """
+        Transfere um valor, em centavos, entre duas contas.
+        """
+        verificar(await self.solicitar(
+            lambda tempo: OperacaoTransferencia(tempo=tempo, rg_origem=rg_origem, rg_destino=rg_destino, valor=valor),
+            repetir=self.idempotente,
+            chave=self.nova_chave()
+        ))
+
+    async def lote(self, operacoes: List[OperacaoSaque | OperacaoDeposito | OperacaoTransferencia]) -> List[StatusLote]:
+        """
+        Aplica várias operações numa única solicitação e retorna o status de cada uma.
+        :rtype: list
+        """
+        resposta = await self.solicitar(
+            lambda tempo: OperacaoLote(tempo=tempo, itens=operacoes), repetir=self.idempotente, chave=self.nova_chave()
+        )
+        return verificar(resposta).status
+
+    async def estatisticas(self) -> Dict:
+        """
+        Consulta as métricas do servidor.
+        :rtype: dict
+        """
+        resposta = await self.solicitar(lambda tempo: OperacaoEstatisticas(tempo=tempo), repetir=True)
+        return json.loads(verificar(resposta).resposta)
+
+    async def extrato(
+            self,
+            rg: str,
+            inicio: int | None = None,
+            fim: int | None = None,
+            chave: str = CHAVES_EXTRATO[0],
+            antes: int | None = None,
+            limite: int | None = None
+    ) -> Dict:
+        """
+        Consulta uma página do extrato da conta, do movimento mais recente para o mais antigo.
+        :rtype: dict
+        """
+        resposta = await self.solicitar(
+            lambda tempo: OperacaoExtrato(tempo=tempo, rg=rg, inicio=inicio, fim=fim, chave=chave, antes=antes, limite=limite),
+            repetir=True
+        )
+        return json.loads(verificar(resposta).resposta)
+
+    async def relatorio(self, verificar_agregados: bool = False) -> Dict:
+        """
+        Consulta o relatório dos agregados das contas do servidor.
+        :rtype: dict
+        """
+        resposta = await self.solicitar(lambda tempo: OperacaoRelatorio(tempo=tempo, verificar=verificar_agregados), repetir=True)
+        return json.loads(verificar(resposta).resposta)
+
+    async def fechar(self) -> None:
+        """
+        Fecha as conexões livres.
+        """
+        livres, self.livres = self.livres, []
+        for cliente in livres:
+            await cliente.desconectar()
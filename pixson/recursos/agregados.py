@@ -0,0 +1,352 @@
+from __future__ import annotations
+
+import time
+import heapq
+import threading
+from bisect import bisect_right
+from contextlib import nullcontext
+from typing import Callable, ContextManager, Dict, List, Sequence, Tuple
+
+from pixson.recursos.conta import Conta
+
+# Limites, em centavos, das faixas do histograma de saldos: abaixo de zero, de 0 a R$ 1, de R$ 1 a R$ 10 etc.
+FAIXAS_PADRAO = (0, 1_00, 10_00, 100_00, 1_000_00, 10_000_00, 100_000_00, 1_000_000_00)
+TOPO_PADRAO = 10
+# Intervalo mínimo, em segundos, entre as reconstruções automáticas, feitas quando o topo deixa de ser exato.
+INTERVALO_RECONSTRUCAO_PADRAO = 60.0
+
+
+class EstadoAgregados:
+    """
+    Agregados dos saldos de um conjunto de contas: quantidade, soma, histograma por faixas e as contas de maior
+    saldo. Cada alteração custa O(log n) no tamanho da reserva do topo, e nunca no número de contas.
+
+    O topo é uma reserva de `reserva` contas num heap de mínimo, com remoção preguiçosa: a entrada de uma conta
+    cujo saldo mudou continua no heap e é ignorada ao chegar ao início dele. Como uma conta do topo pode ter o
+    saldo reduzido abaixo do de contas fora dele, que não são acompanhadas, `limiar_fora` guarda o maior saldo
+    possível de uma conta fora da reserva: as contas da reserva com saldo não menor que ele são exatas.
+    """
+
+    def __init__(self, faixas: Sequence[int], reserva: int) -> None:
+        """
+        Construtor da classe EstadoAgregados.
+        :param faixas: Limites das faixas do histograma, em centavos, em ordem crescente.
+        :type faixas: Sequence[int]
+        :param reserva: Número de contas de maior saldo acompanhadas.
+        :type reserva: int
+        """
+        self.faixas = list(faixas)
+        self.reserva = reserva
+        self.quantidade = 0
+        self.total = 0
+        self.histograma = [0] * (len(self.faixas) + 1)
+        self.topo: Dict[str, int] = {}
+        self.heap: List[Tuple[int, str]] = []
+        self.limiar_fora: int | None = None
+
+    def adicionar(self, rg: str, saldo: int) -> None:
+        """
+        Inclui uma conta nos agregados.
+        """
+        self.quantidade += 1
+        self.total += saldo
+        self.histograma[bisect_right(self.faixas, saldo)] += 1
+        self.entrar_topo(rg, saldo)
+
+    def remover(self, rg: str, saldo: int) -> None:
+        """
+        Exclui dos agregados uma conta com o saldo informado.
+        """
+        self.quantidade -= 1
+        self.total -= saldo
+        self.histograma[bisect_right(self.faixas, saldo)] -= 1
+        self.topo.pop(rg, None)
+
+    def alterar(self, rg: str, anterior: int, saldo: int) -> None:
+        """
+        Atualiza os agregados com o novo saldo de uma conta.
+        """
+        self.total += saldo - anterior
+        self.histograma[bisect_right(self.faixas, anterior)] -= 1
+        self.histograma[bisect_right(self.faixas, saldo)] += 1
+        if rg in self.topo:
+            self.topo[rg] = saldo
+            heapq.heappush(self.heap, (saldo, rg))
+            self.compactar()
+        else:
+            self.entrar_topo(rg, saldo)
+
+    def entrar_topo(self, rg: str, saldo: int) -> None:
+        """
+        Inclui a conta na reserva do topo se ela ainda não estiver cheia, ou se o saldo superar o menor dela.
+        """
+        if len(self.topo) >= self.reserva:
+            menor = self.menor_do_topo()
+            if saldo <= menor[0]:
+                self.limiar_fora = saldo if self.limiar_fora is None else max(self.limiar_fora, saldo)
+                return
+            heapq.heappop(self.heap)
+            del self.topo[menor[1]]
+            self.limiar_fora = menor[0] if self.limiar_fora is None else max(self.limiar_fora, menor[0])
+        self.topo[rg] = saldo
+        heapq.heappush(self.heap, (saldo, rg))
+        self.compactar()
+
+    def menor_do_topo(self) -> Tuple[int, str]:
+        """
+        Obtém a entrada válida de menor saldo da reserva, descartando as entradas desatualizadas.
+        :rtype: tuple
+        """
+        while self.topo.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        return self.heap[0]
+
+    def compactar(self) -> None:
+        """
+        Reconstrói o heap apenas com as entradas válidas, quando as desatualizadas se acumulam.
+        """
+        if len(self.heap) > 4 * self.reserva + 64:
+            self.heap = [(saldo, rg) for rg, saldo in self.topo.items()]
+            heapq.heapify(self.heap)
+
+    def maiores(self, quantidade: int) -> Tuple[List[Tuple[str, int]], bool]:
+        """
+        Obtém as contas de maior saldo, da maior para a menor.
+        :param quantidade: Número de contas.
+        :type quantidade: int
+        :return: As contas, com o saldo, e se elas são exatamente as de maior saldo entre todas.
+        :rtype: tuple
+        """
+        ordenadas = sorted(self.topo.items(), key=lambda item: item[1], reverse=True)[:quantidade]
+        if self.limiar_fora is None:
+            return ordenadas, True
+        return ordenadas, len(ordenadas) == quantidade and ordenadas[-1][1] >= self.limiar_fora
+
+    def comparar(self, outro: EstadoAgregados, quantidade: int) -> Dict:
+        """
+        Lista as diferenças entre estes agregados e outros, calculados de outra forma.
+        :param outro: Agregados de referência.
+        :type outro: EstadoAgregados
+        :param quantidade: Número de contas do topo comparadas.
+        :type quantidade: int
+        :return: Para cada agregado divergente, o valor destes agregados e o de referência.
+        :rtype: dict
+        """
+        divergencias = {}
+        for nome in ('quantidade', 'total', 'histograma'):
+            if getattr(self, nome) != getattr(outro, nome):
+                divergencias[nome] = [getattr(self, nome), getattr(outro, nome)]
+        topo, exato = self.maiores(quantidade)
+        referencia, _ = outro.maiores(quantidade)
+        # Contas empatadas podem aparecer em qualquer ordem; apenas os saldos do topo são comparados.
+        if exato and [saldo for _, saldo in topo] != [saldo for _, saldo in referencia]:
+            divergencias['topo'] = [topo, referencia]
+        return divergencias
+
+
+class Reconstrucao:
+    """
+    Agregados calculados por uma varredura de todas as contas, enquanto elas continuam sendo alteradas.
+
+    Cada conta é lida com a sua trava adquirida, portanto a leitura e as alterações de uma conta têm uma ordem.
+    Uma conta alterada antes de ser lida é ignorada pela varredura e incluída, ao final, com o último saldo.
+    Uma conta lida antes da sua primeira alteração entra com o saldo lido, que é o saldo anterior dessa
+    alteração, substituído, ao final, pelo último saldo. Apenas as contas alteradas durante a varredura são
+    guardadas, e não todas as lidas.
+    """
+
+    def __init__(self, faixas: Sequence[int], reserva: int) -> None:
+        self.estado = EstadoAgregados(faixas, reserva)
+        # Para cada conta alterada: o saldo anterior à primeira alteração, o último saldo e se a varredura a ignorou.
+        self.alteradas: Dict[str, List] = {}
+
+    def alterar(self, rg: str, anterior: int, saldo: int) -> None:
+        alterada = self.alteradas.get(rg)
+        if alterada is None:
+            self.alteradas[rg] = [anterior, saldo, False]
+        else:
+            alterada[1] = saldo
+
+    def varrer(self, rg: str, saldo: int) -> None:
+        alterada = self.alteradas.get(rg)
+        if alterada is None:
+            self.estado.adicionar(rg, saldo)
+        else:
+            alterada[2] = True
+
+    def concluir(self) -> EstadoAgregados:
+        for rg, (anterior, saldo, ignorada) in self.alteradas.items():
+            if not ignorada:
+                self.estado.remover(rg, anterior)
+            self.estado.adicionar(rg, saldo)
+        return self.estado
+
+
+class Agregados:
+    """
+    Agregados de todas as contas do servidor, atualizados a cada alteração de saldo e consultados em tempo
+    constante: quantidade de contas, soma dos saldos, histograma dos saldos por faixas e as contas de maior saldo.
+
+    Os agregados iniciais são calculados por uma varredura das contas em segundo plano, sem suspender as operações
+    além da leitura de cada bloco de contas; até o fim dela, o relatório não está disponível. A verificação refaz
+    a varredura, compara o resultado com os agregados incrementais e os substitui pelo resultado. Quando uma
+    conta do topo tem o saldo reduzido e o topo deixa de ser exato, ou quando um cliente pede a verificação, uma
+    nova varredura é iniciada em segundo plano, no máximo uma a cada `intervalo_reconstrucao` segundos.
+    """
+
+    def __init__(
+            self,
+            faixas: Sequence[int] = FAIXAS_PADRAO,
+            topo: int = TOPO_PADRAO,
+            intervalo_reconstrucao: float = INTERVALO_RECONSTRUCAO_PADRAO
+    ) -> None:
+        """
+        Construtor da classe Agregados.
+        :param faixas: Limites das faixas do histograma, em centavos.
+        :type faixas: Sequence[int]
+        :param topo: Número de contas de maior saldo do relatório, ao menos uma.
+        :type topo: int
+        :param intervalo_reconstrucao: Intervalo mínimo, em segundos, entre as reconstruções automáticas.
+        :type intervalo_reconstrucao: float
+        :raises ValueError: Se o topo não tiver ao menos uma conta.
+        """
+        if topo < 1:
+            raise ValueError('O relatório deve ter ao menos uma conta de maior saldo')
+        self.faixas = sorted(faixas)
+        self.topo = topo
+        # A reserva com o dobro das contas do topo absorve reduções de saldo sem perder a exatidão.
+        self.reserva = 2 * topo
+        self.intervalo_reconstrucao = intervalo_reconstrucao
+        self.estado: EstadoAgregados | None = None
+        self.reconstrucao: Reconstrucao | None = None
+        self.ultima_reconstrucao = 0.0
+        self.ultima_varredura: Dict | None = None
+        self.pausar: Callable[[], ContextManager] = nullcontext
+        self.pertence: Callable[[str], bool] = lambda rg: True
+        self.lock = threading.Lock()
+        self.lock_reconstrucao = threading.Lock()
+
+    def iniciar(
+            self,
+            pausar: Callable[[], ContextManager] = nullcontext,
+            pertence: Callable[[str], bool] = lambda rg: True
+    ) -> None:
+        """
+        Inicia a varredura que calcula os agregados iniciais, em segundo plano.
+        :param pausar: Função que suspende as alterações de todas as contas enquanto um bloco é lido.
+        :type pausar: callable
+        :param pertence: Função que informa se uma conta do armazenamento é atendida por este servidor.
+        :type pertence: callable
+        """
+        self.pausar = pausar
+        self.pertence = pertence
+        self.reconstruir_em_segundo_plano()
+
+    def atualizar(self, saldos: Dict[str, Tuple[int, int]]) -> None:
+        """
+        Atualiza os agregados com os novos saldos de uma operação aplicada. Deve ser chamado com as travas das
+        contas adquiridas, depois de os novos saldos serem salvos.
+        :param saldos: Saldo anterior e saldo final de cada conta envolvida, em centavos.
+        :type saldos: dict
+        """
+        with self.lock:
+            for rg, (anterior, saldo) in saldos.items():
+                if self.estado is not None:
+                    self.estado.alterar(rg, anterior, saldo)
+                if self.reconstrucao is not None:
+                    self.reconstrucao.alterar(rg, anterior, saldo)
+
+    def relatorio(self) -> Dict | None:
+        """
+        Monta o relatório dos agregados, em tempo constante no número de contas.
+        :return: O relatório, ou None se a varredura inicial ainda não terminou.
+        :rtype: dict or None
+        """
+        with self.lock:
+            if self.estado is None:
+                return None
+            estado = self.estado
+            topo, exato = estado.maiores(self.topo)
+            limites = [None, *self.faixas, None]
+            relatorio = {
+                'quantidade': estado.quantidade,
+                'total_centavos': estado.total,
+                'histograma': [
+                    {'de_centavos': limites[indice], 'ate_centavos': limites[indice + 1], 'contas': contas}
+                    for indice, contas in enumerate(estado.histograma)
+                ],
+                'abaixo_de': {str(limite): sum(estado.histograma[:indice + 1]) for indice, limite in enumerate(self.faixas)},
+                'topo': [{'rg': rg, 'saldo_centavos': saldo} for rg, saldo in topo],
+                'topo_exato': exato,
+                'ultima_varredura': self.ultima_varredura,
+            }
+        if not exato:
+            self.reconstruir_em_segundo_plano()
+        return relatorio
+
+    def reconstruir_em_segundo_plano(self) -> bool:
+        """
+        Inicia uma varredura em segundo plano, se nenhuma estiver em andamento e o intervalo mínimo já passou.
+        :return: Se a varredura foi iniciada.
+        :rtype: bool
+        """
+        with self.lock:
+            if self.reconstrucao is not None:
+                return False
+            if self.estado is not None and time.monotonic() - self.ultima_reconstrucao < self.intervalo_reconstrucao:
+                return False
+            self.ultima_reconstrucao = time.monotonic()
+        threading.Thread(target=self.reconstruir, daemon=True).start()
+        return True
+
+    def reconstruir(self) -> Dict:
+        """
+        Recalcula os agregados com uma varredura de todas as contas e substitui os incrementais pelo resultado.
+        As alterações de todas as contas são suspensas apenas durante a leitura de cada bloco.
+        :return: As divergências entre os agregados incrementais e os recalculados, e a duração da varredura.
+        :rtype: dict
+        """
+        with self.lock_reconstrucao:
+            inicio = time.perf_counter()
+            reconstrucao = Reconstrucao(self.faixas, self.reserva)
+            with self.lock:
+                self.reconstrucao = reconstrucao
+            try:
+                blocos = Conta.armazenamento.percorrer_saldos()
+                while True:
+                    with self.pausar():
+                        bloco = next(blocos, None)
+                        if bloco is None:
+                            break
+                        self.varrer_bloco(reconstrucao, bloco)
+            finally:
+                with self.lock:
+                    self.reconstrucao = None
+
+            with self.lock:
+                recalculado = reconstrucao.concluir()
+                divergencias = self.estado.comparar(recalculado, self.topo) if self.estado is not None else {}
+                self.estado = recalculado
+                self.ultima_reconstrucao = time.monotonic()
+                self.ultima_varredura = {
+                    'instante': int(time.time() * 1000),
+                    'contas': recalculado.quantidade,
+                    'duracao_s': round(time.perf_counter() - inicio, 3),
+                    'divergencias': divergencias,
+                }
+                return self.ultima_varredura
+
+    def varrer_bloco(self, reconstrucao: Reconstrucao, bloco: List[Tuple[str, int]]) -> None:
+        """
+        Inclui na varredura um bloco de contas lido do armazenamento. O saldo de uma conta no cache em memória,
+        ainda não gravado, prevalece sobre o lido. Deve ser chamado com as alterações suspensas.
+        """
+        with self.lock:
+            for rg, saldo in bloco:
+                if not self.pertence(rg):
+                    continue
+                if Conta.armazem is not None:
+                    conta = Conta.armazem.obter_em_memoria(rg)
+                    if conta is not None:
+                        saldo = conta.saldo
+                reconstrucao.varrer(rg, saldo)
@@ -0,0 +1,179 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from typing import Dict, Set
+
+from pixson.recursos.conta import Conta
+
+CAPACIDADE_PADRAO = 10000
+INTERVALO_PADRAO = 1.0
+LIMITE_SUJAS_PADRAO = 100
+
+
+class ArmazemContas:
+    """
+    Cache em memória das contas, com descarte LRU e persistência adiada (write-behind).
+
+    Garantias de durabilidade: uma operação confirmada ao cliente fica apenas em memória até o próximo
+    descarregamento, que ocorre a cada `intervalo` segundos ou quando `limite_sujas` contas estiverem
+    pendentes, o que vier primeiro. Uma queda do processo pode perder as alterações desse intervalo.
+    Com `intervalo` igual a 0 cada alteração é gravada imediatamente (write-through), como sem o cache.
+    O encerramento do armazém sempre grava todas as contas pendentes.
+    """
+
+    def __init__(
+            self,
+            capacidade: int = CAPACIDADE_PADRAO,
+            intervalo: float = INTERVALO_PADRAO,
+            limite_sujas: int = LIMITE_SUJAS_PADRAO
+    ) -> None:
+        """
+        Construtor da classe ArmazemContas.
+        :param capacidade: Número máximo de contas limpas mantidas em memória.
+        :type capacidade: int
+        :param intervalo: Intervalo, em segundos, entre descarregamentos das contas alteradas.
+        :type intervalo: float
+        :param limite_sujas: Número de contas alteradas que antecipa o descarregamento.
+        :type limite_sujas: int
+        """
+        self.capacidade = capacidade
+        self.intervalo = intervalo
+        self.limite_sujas = limite_sujas
+        self.contas: OrderedDict[str, Conta] = OrderedDict()
+        self.sujas: Dict[str, Conta] = {}
+        # Contas retiradas de `sujas` pelo descarregamento em andamento, ainda não gravadas no disco.
+        self.gravando: Set[str] = set()
+        self.lock = threading.Lock()
+        self.lock_escrita = threading.Lock()
+        self.evento = threading.Event()
+        self.disponivel = False
+        self.thread = None
+
+    def iniciar(self) -> None:
+        """
+        Inicia a thread de descarregamento periódico.
+        """
+        self.disponivel = True
+        if self.intervalo > 0:
+            self.thread = threading.Thread(target=self.descarregar_periodicamente, daemon=True)
+            self.thread.start()
+
+    def encerrar(self) -> None:
+        """
+        Interrompe o descarregamento periódico e grava todas as contas pendentes.
+        """
+        self.disponivel = False
+        self.evento.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.descarregar()
+
+    def obter(self, rg: str) -> Conta | None:
+        """
+        Obtém uma conta do cache, carregando-a do disco apenas na primeira consulta.
+        :param rg: RG do cliente.
+        :type rg: str
+        :rtype: Conta or None
+        """
+        with self.lock:
+            conta = self.contas.get(rg)
+            if conta is not None:
+                self.contas.move_to_end(rg)
+                return conta
+
+        conta = Conta.ler_arquivo(rg=rg)
+        if conta is None:
+            return None
+
+        with self.lock:
+            # Outra thread pode ter carregado a mesma conta enquanto o arquivo era lido.
+            conta = self.contas.setdefault(rg, conta)
+            self.contas.move_to_end(rg)
+            self.descartar_excedentes()
+            return conta
+
+    def obter_em_memoria(self, rg: str) -> Conta | None:
+        """
+        Obtém uma conta apenas se ela estiver no cache, sem lê-la do disco nem alterar a ordem de descarte.
+        :param rg: RG do cliente.
+        :type rg: str
+        :rtype: Conta or None
+        """
+        with self.lock:
+            return self.contas.get(rg)
+
+    def salvar(self, conta: Conta) -> None:
+        """
+        Marca a conta como alterada, para ser gravada no próximo descarregamento.
+        :param conta: Conta alterada.
+        :type conta: Conta
+        """
+        if self.intervalo <= 0:
+            conta.gravar_arquivo()
+            with self.lock:
+                # Uma conta fixada numa conexão pode ter sido descartada e lida de novo; o cache passa
+                # a guardar o objeto alterado, e não a cópia lida antes da alteração.
+                if conta.rg in self.contas:
+                    self.contas[conta.rg] = conta
+            return
+
+        with self.lock:
+            self.contas[conta.rg] = conta
+            self.contas.move_to_end(conta.rg)
+            self.sujas[conta.rg] = conta
+            pendentes = len(self.sujas)
+
+        if pendentes >= self.limite_sujas:
+            self.evento.set()
+
+    def descarregar(self) -> None:
+        """
+        Grava no disco, em lote, todas as contas alteradas desde o último descarregamento. Até a gravação
+        terminar, as contas ficam em `gravando` e não são descartadas, para que não sejam lidas de novo do
+        arquivo anterior. Se a gravação falhar, voltam a ficar pendentes.
+        """
+        with self.lock_escrita:
+            with self.lock:
+                sujas, self.sujas = self.sujas, {}
+                self.gravando = set(sujas)
+                instantaneos = [dict(conta.__dict__) for conta in sujas.values()]
+            try:
+                for dados in instantaneos:
+                    Conta(**dados).gravar_arquivo()
+            except BaseException:
+                with self.lock:
+                    for rg, conta in sujas.items():
+                        self.sujas.setdefault(rg, conta)
+                raise
+            finally:
+                with self.lock:
+                    self.gravando = set()
+                    self.descartar_excedentes()
+
+    def descarregar_periodicamente(self) -> None:
+        """
+        Laço da thread de descarregamento.
+        """
+        while self.disponivel:
+            self.evento.wait(self.intervalo)
+            self.evento.clear()
+            self.descarregar()
+
+    def descartar_excedentes(self) -> None:
+        """
+        Remove do cache as contas limpas menos usadas recentemente, até respeitar a capacidade.
+        Contas pendentes de gravação, ou sendo gravadas, nunca são descartadas. Deve ser chamado com o lock
+        adquirido.
+        """
+        excedentes = len(self.contas) - self.capacidade
+        if excedentes <= 0:
+            return
+        descartadas = []
+        for rg in self.contas:
+            if len(descartadas) >= excedentes:
+                break
+            if rg not in self.sujas and rg not in self.gravando:
+                descartadas.append(rg)
+        for rg in descartadas:
+            del self.contas[rg]
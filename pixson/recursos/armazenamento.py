@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+import os
+import json
+import mmap
+import struct
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+from pixson.recursos.dinheiro import para_centavos
+
+PASTA_CONTAS = "contas"
+ARQUIVO_MMAP = f"{PASTA_CONTAS}/contas.dat"
+
+ARMAZENAMENTO_JSON = 'json'
+ARMAZENAMENTO_MMAP = 'mmap'
+ARMAZENAMENTOS = (ARMAZENAMENTO_JSON, ARMAZENAMENTO_MMAP)
+
+
+class Armazenamento(ABC):
+    """
+    Meio de persistência das contas. As contas são lidas e gravadas como dicionários com os campos
+    `rg`, `nome` e `saldo`, este em centavos inteiros.
+    """
+
+    # Contas lidas por bloco na varredura dos saldos.
+    BLOCO_VARREDURA = 64
+
+    @abstractmethod
+    def ler(self, rg: str) -> Dict | None:
+        """
+        Lê os dados de uma conta.
+        :param rg: RG do cliente.
+        :type rg: str
+        :rtype: dict or None
+        """
+        pass
+
+    @abstractmethod
+    def gravar(self, dados: Dict) -> None:
+        """
+        Grava os dados de uma conta, criando-a se ela não existir.
+        :param dados: Dados da conta.
+        :type dados: dict
+        """
+        pass
+
+    @abstractmethod
+    def listar_rgs(self) -> Iterator[str]:
+        """
+        Percorre os RGs de todas as contas armazenadas.
+        :rtype: Iterator[str]
+        """
+        pass
+
+    def percorrer_saldos(self) -> Iterator[List[Tuple[str, int]]]:
+        """
+        Percorre o RG e o saldo, em centavos, de todas as contas armazenadas, em blocos de até `BLOCO_VARREDURA`
+        contas. Cada bloco é lido apenas quando solicitado, o que permite ao chamador suspender as operações
+        sobre as contas durante a leitura de um bloco, e não da varredura inteira.
+        :rtype: Iterator[list]
+        """
+        bloco = []
+        for rg in self.listar_rgs():
+            dados = self.ler(rg=rg)
+            if dados is not None:
+                bloco.append((rg, dados['saldo']))
+            if len(bloco) >= self.BLOCO_VARREDURA:
+                yield bloco
+                bloco = []
+        if bloco:
+            yield bloco
+
+    def sincronizar(self) -> None:
+        """
+        Garante que as gravações feitas até aqui estão no disco.
+        """
+        pass
+
+    def fechar(self) -> None:
+        """
+        Libera os recursos do armazenamento.
+        """
+        self.sincronizar()
+
+
+class ArmazenamentoJson(Armazenamento):
+    """
+    Um arquivo JSON por conta, com o RG como nome do arquivo e o saldo em centavos no campo `saldo_centavos`.
+    Arquivos do formato antigo, com o saldo em reais no campo `saldo`, são convertidos na leitura e
+    regravados no formato novo na próxima gravação da conta.
+    """
+
+    def __init__(self, pasta: str = PASTA_CONTAS) -> None:
+        """
+        Construtor da classe ArmazenamentoJson.
+        :param pasta: Pasta dos arquivos das contas.
+        :type pasta: str
+        """
+        self.pasta = pasta
+        # Se há arquivos substituídos desde o último `sincronizar`, cujas entradas na pasta ainda não estão no disco.
+        self.pasta_alterada = False
+
+    def ler(self, rg: str) -> Dict | None:
+        arquivo = Path(f"{self.pasta}/{rg}.json")
+        if arquivo.exists():
+            with open(arquivo, "r") as f:
+                dados = json.load(f)
+            saldo = dados.pop("saldo_centavos", None)
+            dados["saldo"] = saldo if saldo is not None else para_centavos(dados["saldo"])
+            return dados
+        return None
+
+    def gravar(self, dados: Dict) -> None:
+        """
+        Grava a conta num arquivo temporário, que substitui o original de forma atômica. O conteúdo é levado
+        ao disco antes da substituição, para que uma queda não deixe um arquivo vazio no lugar do original; a
+        substituição em si é levada ao disco pelo `sincronizar` seguinte.
+        """
+        arquivo = Path(f"{self.pasta}/{dados['rg']}.json")
+        temporario = arquivo.with_suffix(".json.tmp")
+        with open(temporario, "w") as f:
+            json.dump({"rg": dados["rg"], "nome": dados["nome"], "saldo_centavos": dados["saldo"]}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, arquivo)
+        self.pasta_alterada = True
+
+    def sincronizar(self) -> None:
+        """
+        Leva ao disco a pasta das contas, com as substituições dos arquivos gravados desde a última chamada.
+        """
+        if not self.pasta_alterada:
+            return
+        self.pasta_alterada = False
+        descritor = os.open(self.pasta, os.O_RDONLY)
+        try:
+            os.fsync(descritor)
+        finally:
+            os.close(descritor)
+
+    def listar_rgs(self) -> Iterator[str]:
+        """
+        Percorre a pasta de contas sob demanda, sem carregar a listagem inteira em memória.
+        """
+        with os.scandir(self.pasta) as entradas:
+            for entrada in entradas:
+                if entrada.name.endswith(".json") and entrada.is_file():
+                    yield entrada.name[:-len(".json")]
+
+
+class ArmazenamentoMmap(Armazenamento):
+    """
+    Todas as contas num único arquivo de registros de tamanho fixo, mapeado em memória.
+
+    Um índice em memória, montado na abertura, associa cada RG à posição do seu registro, de modo que
+    ler ou atualizar uma conta é uma operação O(1) sobre os bytes do registro, sem interpretar JSON.
+    Novas contas são acrescentadas ao final, e o arquivo dobra de tamanho quando fica cheio.
+    Arquivos da versão 1, com o saldo em reais como `double`, são convertidos para centavos na abertura.
+    """
+
+    # Cabeçalho: identificador, versão, tamanho do registro e quantidade de registros.
+    CABECALHO = struct.Struct('!4sHHI')
+    IDENTIFICADOR = b'PXSN'
+    VERSAO = 2
+    # Registro: RG, nome em UTF-8 e saldo em centavos.
+    REGISTRO = struct.Struct('!10s64sq')
+    # Registro da versão 1, com o saldo em reais. Tem o mesmo tamanho, o que permite a conversão no próprio arquivo.
+    REGISTRO_V1 = struct.Struct('!10s64sd')
+    CAPACIDADE_INICIAL = 1024
+    BLOCO_VARREDURA = 4096
+
+    def __init__(self, caminho: str = ARQUIVO_MMAP) -> None:
+        """
+        Construtor da classe ArmazenamentoMmap. Cria o arquivo se ele não existir.
+        :param caminho: Caminho do arquivo de registros.
+        :type caminho: str
+        """
+        self.caminho = caminho
+        self.lock = threading.RLock()
+        self.indice: Dict[str, int] = {}
+
+        novo = not os.path.exists(caminho) or os.path.getsize(caminho) == 0
+        if not novo:
+            self.converter_versao_1(caminho)
+        self.arquivo = open(caminho, "a+b")
+        if novo:
+            self.arquivo.truncate(self.posicao(self.CAPACIDADE_INICIAL))
+        self.mapa = mmap.mmap(self.arquivo.fileno(), 0)
+
+        if novo:
+            self.CABECALHO.pack_into(self.mapa, 0, self.IDENTIFICADOR, self.VERSAO, self.REGISTRO.size, 0)
+        identificador, versao, tamanho, quantidade = self.CABECALHO.unpack_from(self.mapa, 0)
+        if identificador != self.IDENTIFICADOR or versao != self.VERSAO or tamanho != self.REGISTRO.size:
+            raise ValueError(f'Arquivo de contas incompatível: {caminho}')
+
+        for i in range(quantidade):
+            posicao = self.posicao(i)
+            self.indice[self.mapa[posicao:posicao + 10].rstrip(b'\0').decode('ascii')] = posicao
+
+    @classmethod
+    def converter_versao_1(cls, caminho: str) -> None:
+        """
+        Converte um arquivo da versão 1 para a versão atual, com os saldos em centavos. A conversão é gravada
+        numa cópia, que substitui o original de forma atômica, para que uma interrupção não deixe o arquivo
+        com registros dos dois formatos. Arquivos de outras versões não são alterados.
+        :param caminho: Caminho do arquivo de registros.
+        :type caminho: str
+        """
+        with open(caminho, "rb") as original:
+            identificador, versao, tamanho, quantidade = cls.CABECALHO.unpack(original.read(cls.CABECALHO.size))
+            if identificador != cls.IDENTIFICADOR or versao != 1 or tamanho != cls.REGISTRO_V1.size:
+                return
+            temporario = f"{caminho}.tmp"
+            with open(temporario, "wb") as convertido:
+                convertido.write(cls.CABECALHO.pack(cls.IDENTIFICADOR, cls.VERSAO, cls.REGISTRO.size, quantidade))
+                for _ in range(quantidade):
+                    rg, nome, saldo = cls.REGISTRO_V1.unpack(original.read(cls.REGISTRO_V1.size))
+                    convertido.write(cls.REGISTRO.pack(rg, nome, para_centavos(saldo)))
+                # O restante do arquivo é a capacidade reservada para novas contas.
+                convertido.truncate(os.path.getsize(caminho))
+                convertido.flush()
+                os.fsync(convertido.fileno())
+        os.replace(temporario, caminho)
+
+    def posicao(self, registro: int) -> int:
+        """
+        Calcula a posição, no arquivo, do registro de índice informado.
+        :rtype: int
+        """
+        return self.CABECALHO.size + registro * self.REGISTRO.size
+
+    def ler(self, rg: str) -> Dict | None:
+        with self.lock:
+            posicao = self.indice.get(str(rg))
+            if posicao is None:
+                return None
+            rg, nome, saldo = self.REGISTRO.unpack_from(self.mapa, posicao)
+        return {
+            "rg": rg.rstrip(b'\0').decode('ascii'),
+            "nome": nome.rstrip(b'\0').decode(),
+            "saldo": saldo
+        }
+
+    def gravar(self, dados: Dict) -> None:
+        rg = str(dados['rg'])
+        nome = dados['nome'].encode()
+        if len(nome) > 64:
+            raise ValueError(f'Nome com mais de 64 bytes: {dados["nome"]}')
+
+        with self.lock:
+            posicao = self.indice.get(rg)
+            if posicao is None:
+                posicao = self.acrescentar(rg)
+            self.REGISTRO.pack_into(self.mapa, posicao, rg.encode('ascii'), nome, dados['saldo'])
+
+    def acrescentar(self, rg: str) -> int:
+        """
+        Reserva um registro ao final do arquivo para uma nova conta. Deve ser chamado com o lock adquirido.
+        :rtype: int
+        """
+        _, _, _, quantidade = self.CABECALHO.unpack_from(self.mapa, 0)
+        posicao = self.posicao(quantidade)
+        if posicao + self.REGISTRO.size > len(self.mapa):
+            self.mapa.flush()
+            self.mapa.close()
+            self.arquivo.truncate(self.posicao(quantidade * 2))
+            self.mapa = mmap.mmap(self.arquivo.fileno(), 0)
+        self.CABECALHO.pack_into(self.mapa, 0, self.IDENTIFICADOR, self.VERSAO, self.REGISTRO.size, quantidade + 1)
+        self.indice[rg] = posicao
+        return posicao
+
+    def listar_rgs(self) -> Iterator[str]:
+        with self.lock:
+            rgs = list(self.indice)
+        return iter(rgs)
+
+    def percorrer_saldos(self) -> Iterator[List[Tuple[str, int]]]:
+        """
+        Decodifica os registros de cada bloco de uma só vez (`struct.iter_unpack`), sem consultar o índice.
+        """
+        inicio = 0
+        while True:
+            with self.lock:
+                _, _, _, quantidade = self.CABECALHO.unpack_from(self.mapa, 0)
+                if inicio >= quantidade:
+                    return
+                fim = min(quantidade, inicio + self.BLOCO_VARREDURA)
+                dados = self.mapa[self.posicao(inicio):self.posicao(fim)]
+            yield [(rg.rstrip(b'\0').decode('ascii'), saldo) for rg, _, saldo in self.REGISTRO.iter_unpack(dados)]
+            inicio = fim
+
+    def sincronizar(self) -> None:
+        with self.lock:
+            self.mapa.flush()
+
+    def fechar(self) -> None:
+        with self.lock:
+            self.mapa.flush()
+            self.mapa.close()
+            self.arquivo.close()
+
+
+def criar_armazenamento(tipo: str, pasta: str = PASTA_CONTAS) -> Armazenamento:
+    """
+    Cria o armazenamento do tipo informado ('json' ou 'mmap') na pasta das contas.
+    :param tipo: Tipo do armazenamento.
+    :type tipo: str
+    :param pasta: Pasta das contas.
+    :type pasta: str
+    :rtype: Armazenamento
+    """
+    if tipo == ARMAZENAMENTO_MMAP:
+        return ArmazenamentoMmap(caminho=f"{pasta}/contas.dat")
+    if tipo == ARMAZENAMENTO_JSON:
+        return ArmazenamentoJson(pasta=pasta)
+    raise ValueError(f'Armazenamento inválido: {tipo}')
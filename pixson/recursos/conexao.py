@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import time
+import socket
+import struct
+import threading
+from typing import TYPE_CHECKING, List
+
+from pixson.recursos.metricas import metricas
+from pixson.recursos.protocolo import CABECALHO, CODIFICACAO_TEXTO, CODIFICACAO_BINARIA, SEPARADOR, Protocolo
+
+if TYPE_CHECKING:
+    import asyncio
+
+    from pixson.recursos.conta import Conta
+    from pixson.recursos.limites import LimiteTaxa
+    from pixson.recursos.notificacoes import Assinatura
+
+
+class Conexao:
+    def __init__(self, cliente_socket: socket.socket | None) -> None:
+        """
+        Construtor da classe Conexao, que guarda o estado de uma conexão de cliente no servidor.
+        :param cliente_socket: Socket do cliente.
+        :type cliente_socket: socket.socket
+        """
+        self.socket = cliente_socket
+        self.codificacao = CODIFICACAO_TEXTO
+        self.buffer = b''
+        self.delimitada = False
+        # Se o buffer começa por um cabeçalho binário inválido, a partir do qual não há como delimitar os quadros.
+        self.invalida = False
+        self.id_requisicao = None
+        # Última resposta enviada, guardada pelo servidor para as solicitações com chave de idempotência.
+        self.ultima_resposta: Protocolo | None = None
+        # Respostas retidas até o líder do grupo de réplicas confirmar as alterações; ver `adiar_respostas`.
+        self.adiadas: List[Protocolo] | None = None
+        # RG autenticado no login e a conta fixada nesta conexão; ver `Sessoes`.
+        self.rg: str | None = None
+        self.conta: Conta | None = None
+        # Limite de requisições por segundo, ausente nas conexões entre os processos do servidor.
+        self.limite: LimiteTaxa | None = None
+        # Se a conexão é de outro processo do servidor, pela porta interna; ver `OPERACOES_INTERNAS`.
+        self.interna = False
+        # Contas assinadas pela conexão, criada na primeira assinatura; ver `Notificacoes`.
+        self.assinatura: Assinatura | None = None
+
+    def send(self, dados: bytes) -> int:
+        """
+        Envia todos os dados ao cliente. Com o prazo de envio do socket, um cliente que não lê as respostas
+        faz o envio falhar com `socket.timeout` em vez de bloquear a thread indefinidamente.
+        :param dados: Dados a serem enviados.
+        :type dados: bytes
+        :rtype: int
+        """
+        metricas.incrementar('bytes.enviados', len(dados))
+        self.socket.sendall(dados)
+        return len(dados)
+
+    def responder(self, resposta: Protocolo) -> None:
+        """
+        Envia uma resposta ao cliente, na codificação negociada no login,
+        identificada com o id da requisição em processamento.
+        :param resposta: Resposta a ser enviada.
+        :type resposta: Protocolo
+        """
+        resposta.id_requisicao = self.id_requisicao
+        self.ultima_resposta = resposta
+        if self.adiadas is not None:
+            self.adiadas.append(resposta)
+        elif self.codificacao == CODIFICACAO_BINARIA:
+            self.send(resposta.empacotar())
+        else:
+            self.send(resposta.enquadrar())
+
+    def adiar_respostas(self) -> None:
+        """
+        Retém as respostas seguintes, em vez de enviá-las, até `liberar_respostas`.
+        """
+        self.adiadas = []
+
+    def liberar_respostas(self, enviar: bool) -> None:
+        """
+        Volta a enviar as respostas imediatamente, enviando ou descartando as retidas.
+        :param enviar: Se as respostas retidas são enviadas, em ordem, ou descartadas.
+        :type enviar: bool
+        """
+        adiadas, self.adiadas = self.adiadas or [], None
+        if enviar:
+            for resposta in adiadas:
+                self.responder(resposta)
+
+    def extrair_mensagens(self, dados: bytes) -> List[str]:
+        """
+        Acumula os dados recebidos e extrai as mensagens de texto completas, delimitadas por quebra de linha.
+        Enquanto o cliente não enviar nenhuma quebra de linha, cada leitura do socket é tratada como uma
+        única mensagem, como nos clientes anteriores à delimitação.
+        :param dados: Dados recebidos do socket.
+        :type dados: bytes
+        :rtype: list
+        """
+        self.buffer += dados
+        if not self.delimitada:
+            if SEPARADOR not in self.buffer:
+                mensagem, self.buffer = self.buffer, b''
+                return [mensagem.decode(errors='replace')]
+            self.delimitada = True
+        *mensagens, self.buffer = self.buffer.split(SEPARADOR)
+        # Bytes que não são UTF-8 tornam a mensagem inválida, sem interromper a conexão.
+        return [mensagem.decode(errors='replace') for mensagem in mensagens if mensagem]
+
+    def extrair_quadros(self, dados: bytes) -> List[bytes]:
+        """
+        Acumula os dados recebidos e extrai os quadros binários completos. Os quadros anteriores a um cabeçalho
+        inválido são extraídos normalmente, e a conexão é marcada como inválida.
+        :param dados: Dados recebidos do socket.
+        :type dados: bytes
+        :rtype: list
+        """
+        self.buffer += dados
+        quadros = []
+        while len(self.buffer) >= CABECALHO.size:
+            try:
+                _, comprimento, _, _ = Protocolo.ler_cabecalho(self.buffer)
+            except (ValueError, struct.error):
+                self.invalida = True
+                break
+            fim = CABECALHO.size + comprimento
+            if len(self.buffer) < fim:
+                break
+            quadros.append(self.buffer[:fim])
+            self.buffer = self.buffer[fim:]
+        return quadros
+
+
+class ConexaoAsyncio(Conexao):
+    def __init__(self, writer: asyncio.StreamWriter, laco: asyncio.AbstractEventLoop) -> None:
+        """
+        Adapta um ‘StreamWriter’ para a interface de envio usada pelos processadores de operação, que são
+        executados nas threads do executor do servidor.
+        :param writer: Canal de escrita da conexão.
+        :type writer: asyncio.StreamWriter
+        :param laco: Laço de eventos que atende a conexão.
+        :type laco: asyncio.AbstractEventLoop
+        """
+        super().__init__(cliente_socket=None)
+        self.writer = writer
+        self.laco = laco
+        self.thread_laco = threading.get_ident()
+        # Instante dos últimos dados recebidos e o do início do envio pendente, verificados periodicamente
+        # pelo servidor para encerrar as conexões ociosas e as que não leem as respostas.
+        self.atividade = time.monotonic()
+        self.envio: float | None = None
+
+    def send(self, dados: bytes) -> int:
+        """
+        Enfileira os dados para envio ao cliente. Fora do laço de eventos, a escrita é agendada nele, na
+        ordem dos envios.
+        :param dados: Dados a serem enviados.
+        :type dados: bytes
+        :rtype: int
+        """
+        if threading.get_ident() != self.thread_laco:
+            self.laco.call_soon_threadsafe(self.send, dados)
+            return len(dados)
+        if self.writer.is_closing():
+            # Conexão perdida ou abortada por não ler as respostas: as respostas seguintes não têm destino.
+            return 0
+        metricas.incrementar('bytes.enviados', len(dados))
+        self.writer.write(dados)
+        return len(dados)
@@ -1,20 +1,40 @@
 from __future__ import annotations
-import json
-from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterator, List
 
-PASTA_CONTAS = "contas"
+from pixson.recursos.enums import Operacoes
+from pixson.recursos.metricas import metricas
+from pixson.recursos.armazenamento import Armazenamento, ArmazenamentoJson
+
+if TYPE_CHECKING:
+    from pixson.recursos.agregados import Agregados
+    from pixson.recursos.armazem import ArmazemContas
+    from pixson.recursos.diario import AnexoDiario, Diario
+    from pixson.recursos.extrato import Extrato
+    from pixson.recursos.notificacoes import Notificacoes
+    from pixson.recursos.replicacao import Replicacao
+    from pixson.recursos.sessoes import Sessoes
 
 
 class Conta:
-    def __init__(self, rg: str, nome: str, saldo: float):
+    armazenamento: Armazenamento = ArmazenamentoJson()
+    armazem: ArmazemContas | None = None
+    agregados: Agregados | None = None
+    anexos: List[AnexoDiario] = []
+    diario: Diario | None = None
+    extrato: Extrato | None = None
+    notificacoes: Notificacoes | None = None
+    replicacao: Replicacao | None = None
+    sessoes: Sessoes | None = None
+
+    def __init__(self, rg: str, nome: str, saldo: int):
         """
         Construtor da classe Conta.
         :param rg: RG do cliente.
         :type rg: str
         :param nome: Nome do cliente.
         :type nome: str
-        :param saldo: Saldo da conta.
-        :type saldo: float
+        :param saldo: Saldo da conta, em centavos.
+        :type saldo: int
         """
         self.rg = rg
         self.nome = nome
@@ -23,50 +43,117 @@ class Conta:
     @staticmethod
     def obter_conta(rg: str) -> Conta | None:
         """
-        Obtém uma conta a partir do RG do cliente.
+        Obtém uma conta a partir do RG do cliente, pelo armazém em memória se ele estiver configurado.
         :rtype: Conta or None
         """
-        arquivo = Path(f"{PASTA_CONTAS}/{rg}.json")
-        if arquivo.exists():
-            with open(arquivo, "r") as f:
-                return Conta(**json.load(f))
+        if Conta.armazem is not None:
+            return Conta.armazem.obter(rg=rg)
+        return Conta.ler_arquivo(rg=rg)
+
+    @staticmethod
+    def ler_arquivo(rg: str) -> Conta | None:
+        """
+        Lê uma conta diretamente do armazenamento.
+        :rtype: Conta or None
+        """
+        dados = Conta.armazenamento.ler(rg=rg)
+        if dados is not None:
+            return Conta(**dados)
         return None
 
+    @staticmethod
+    def listar_rgs() -> Iterator[str]:
+        """
+        Percorre os RGs de todas as contas do armazenamento sob demanda.
+        :rtype: Iterator[str]
+        """
+        return Conta.armazenamento.listar_rgs()
+
     def salvar(self) -> None:
         """
-        Salva a conta no arquivo de banco de dados.
+        Salva a conta, pelo armazém em memória se ele estiver configurado.
+        """
+        with metricas.medir('conta.salvar'):
+            if Conta.armazem is not None:
+                Conta.armazem.salvar(conta=self)
+            else:
+                self.gravar_arquivo()
+
+    def gravar_arquivo(self) -> None:
+        """
+        Grava a conta diretamente no armazenamento.
+        """
+        Conta.armazenamento.gravar(dados=self.__dict__)
+
+    @staticmethod
+    def aplicar(operacao: Operacoes, saldos: Dict[Conta, int], anotacoes: Dict | None = None) -> None:
+        """
+        Registra a operação no diário, se ele estiver configurado, e aplica os novos saldos,
+        salvando cada conta envolvida uma única vez, e as anotações, aos anexos das contas. Os movimentos são registrados no extrato das contas e nos
+        agregados de todas as contas, e as contas fixadas em conexões por outros objetos são invalidadas. Num
+        grupo de réplicas, o líder envia a alteração aos demais nós antes de retornar. Por fim, os novos saldos
+        são publicados às conexões que assinam as contas, sem aguardar o envio.
+        :param operacao: Operação que originou a alteração.
+        :type operacao: Operacoes
+        :param saldos: Saldo final de cada conta envolvida, em centavos.
+        :type saldos: dict
+        :param anotacoes: Anotações da operação, gravadas no mesmo registro do diário.
+        :type anotacoes: dict or None
         """
-        arquivo = Path(f"{PASTA_CONTAS}/{self.rg}.json")
-        with open(arquivo, "w") as f:
-            json.dump(self.__dict__, f)
+        if Conta.diario is not None:
+            with metricas.medir('diario.registrar'):
+                Conta.diario.registrar(
+                    operacao=operacao.value,
+                    saldos={conta.rg: saldo for conta, saldo in saldos.items()},
+                    anotacoes=anotacoes
+                )
+        variacoes = {conta.rg: (conta.saldo, saldo) for conta, saldo in saldos.items()}
+        try:
+            if Conta.extrato is not None:
+                Conta.extrato.registrar(operacao=operacao, saldos=variacoes)
+            for conta, saldo in saldos.items():
+                conta.saldo = saldo
+                conta.salvar()
+            if anotacoes:
+                for anexo in Conta.anexos:
+                    anexo.anotar(anotacoes)
+            if Conta.agregados is not None:
+                Conta.agregados.atualizar(saldos=variacoes)
+            if Conta.sessoes is not None:
+                Conta.sessoes.invalidar(saldos)
+            if Conta.replicacao is not None:
+                Conta.replicacao.registrar(operacao=operacao, saldos={conta.rg: saldo for conta, saldo in saldos.items()})
+            if Conta.notificacoes is not None:
+                Conta.notificacoes.publicar(saldos={conta.rg: saldo for conta, saldo in saldos.items()})
+        finally:
+            if Conta.diario is not None:
+                Conta.diario.concluir()
 
-    def depositar(self, valor: float) -> None:
+    def depositar(self, valor: int) -> None:
         """
         Deposita um valor na conta.
-        :param valor: Valor a ser depositado.
-        :type valor: float
+        :param valor: Valor a ser depositado, em centavos.
+        :type valor: int
         """
-        self.saldo += valor
-        self.salvar()
+        Conta.aplicar(operacao=Operacoes.DEPOSITO, saldos={self: self.saldo + valor})
 
-    def sacar(self, valor: float) -> None:
+    def sacar(self, valor: int) -> None:
         """
         Sacar um valor da conta.
-        :param valor: Valor a ser sacado.
-        :type valor: float
+        :param valor: Valor a ser sacado, em centavos.
+        :type valor: int
         """
-        self.saldo -= valor
-        self.salvar()
+        Conta.aplicar(operacao=Operacoes.SAQUE, saldos={self: self.saldo - valor})
 
-    def transferir(self, conta_destino: Conta, valor: float) -> None:
+    def transferir(self, conta_destino: Conta, valor: int) -> None:
         """
         Transfere um valor de uma conta para outra.
         :param conta_destino: Conta de destino.
         :type conta_destino: Conta
-        :param valor: Valor a ser transferido.
-        :type valor: float
+        :param valor: Valor a ser transferido, em centavos.
+        :type valor: int
         """
-        self.sacar(valor)
-        conta_destino.depositar(valor)
-        self.salvar()
-        conta_destino.salvar()
+        Conta.aplicar(
+            operacao=Operacoes.TRANSFERENCIA,
+            saldos={self: self.saldo - valor, conta_destino: conta_destino.saldo + valor}
+        )
@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import os
+import json
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from pixson.recursos.conta import Conta
+from pixson.recursos.dinheiro import para_centavos
+from pixson.recursos.armazenamento import PASTA_CONTAS
+
+ARQUIVO_DIARIO = f"{PASTA_CONTAS}/diario.jsonl"
+INTERVALO_CHECKPOINT_PADRAO = 1000
+# Chaves de cada registro do diário que não são anotações.
+CHAVES_REGISTRO = frozenset(("seq", "op", "saldos"))
+
+
+class AnexoDiario(ABC):
+    """
+    Estado mantido em memória junto com as contas e reconstruído a partir do diário: as anotações gravadas
+    com cada operação são repassadas a `anotar` quando ela é aplicada e, numa recuperação, quando o registro
+    é reaplicado. Como o diário é esvaziado a cada checkpoint, os registros retornados por `conservar`
+    são regravados nele.
+    """
+
+    @abstractmethod
+    def anotar(self, anotacoes: Dict) -> None:
+        """
+        Aplica as anotações de uma operação, ignorando as chaves de outros anexos.
+        :param anotacoes: Anotações da operação, ou um registro retornado por `conservar`.
+        :type anotacoes: dict
+        """
+        pass
+
+    @abstractmethod
+    def conservar(self) -> List[Dict]:
+        """
+        Retorna as anotações que reconstroem o estado atual, regravadas no diário a cada checkpoint.
+        :rtype: List[Dict]
+        """
+        pass
+
+
+class Diario:
+    """
+    Registro sequencial (write-ahead log) das alterações de saldo, em JSONL.
+
+    Cada operação é gravada uma única vez, com os saldos finais de todas as contas envolvidas, antes de
+    ser aplicada às contas. Gravações concorrentes são agrupadas num único `fsync` (group commit).
+    Como os registros guardam saldos finais, reaplicá-los é idempotente: na recuperação, o último saldo
+    registrado de cada conta é gravado no arquivo dela. A cada `intervalo_checkpoint` registros, as contas
+    são persistidas e o diário é esvaziado, restando apenas as anotações conservadas pelos anexos das contas
+    (`Conta.anexos`).
+    """
+
+    def __init__(
+            self,
+            caminho: str = ARQUIVO_DIARIO,
+            intervalo_checkpoint: int = INTERVALO_CHECKPOINT_PADRAO,
+            persistir: Optional[Callable[[], None]] = None
+    ) -> None:
+        """
+        Construtor da classe Diario.
+        :param caminho: Caminho do arquivo do diário.
+        :type caminho: str
+        :param intervalo_checkpoint: Número de registros entre checkpoints.
+        :type intervalo_checkpoint: int
+        :param persistir: Função que grava nos arquivos todas as contas alteradas, chamada a cada checkpoint.
+        :type persistir: callable or None
+        """
+        self.caminho = Path(caminho)
+        self.intervalo_checkpoint = intervalo_checkpoint
+        self.persistir = persistir
+        self.arquivo = None
+        self.condicao = threading.Condition()
+        self.lock_escrita = threading.Lock()
+        self.pendentes: List[str] = []
+        self.seq = 0
+        self.seq_duravel = 0
+        self.em_andamento = 0
+        self.desde_checkpoint = 0
+        self.pausado = False
+        self.disponivel = False
+        self.thread = None
+
+    def recuperar(self) -> int:
+        """
+        Reaplica às contas os registros do diário deixados por uma execução anterior, e aos anexos das contas
+        as anotações deles, e esvazia o diário, apenas depois de as contas reaplicadas estarem no disco. Uma
+        última linha incompleta, de uma gravação interrompida, é ignorada.
+        :return: Número de registros reaplicados.
+        :rtype: int
+        """
+        if not self.caminho.exists():
+            return 0
+
+        saldos: Dict[str, int] = {}
+        registros = 0
+        with open(self.caminho, "r") as f:
+            for linha in f:
+                try:
+                    registro = json.loads(linha)
+                except ValueError:
+                    break
+                # Diários anteriores aos centavos inteiros guardam os saldos em reais, como `float`.
+                saldos.update(
+                    (rg, saldo if isinstance(saldo, int) else para_centavos(saldo))
+                    for rg, saldo in registro.get("saldos", {}).items()
+                )
+                anotacoes = {chave: valor for chave, valor in registro.items() if chave not in CHAVES_REGISTRO}
+                if anotacoes:
+                    for anexo in Conta.anexos:
+                        anexo.anotar(anotacoes)
+                if "seq" in registro:
+                    registros += 1
+
+        for rg, saldo in saldos.items():
+            conta = Conta.ler_arquivo(rg=rg)
+            if conta is not None:
+                conta.saldo = saldo
+                conta.gravar_arquivo()
+        Conta.armazenamento.sincronizar()
+
+        self.reescrever()
+        return registros
+
+    def reescrever(self) -> None:
+        """
+        Substitui o diário por um arquivo com apenas as anotações conservadas pelos anexos das contas. O novo
+        arquivo é gravado ao lado e trocado atomicamente, para que uma queda no meio não perca as anotações.
+        """
+        temporario = self.caminho.with_name(self.caminho.name + ".tmp")
+        with open(temporario, "w") as f:
+            for anexo in Conta.anexos:
+                f.writelines(json.dumps(anotacoes) + "\n" for anotacoes in anexo.conservar())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, self.caminho)
+        pasta = os.open(self.caminho.parent, os.O_RDONLY)
+        try:
+            os.fsync(pasta)
+        finally:
+            os.close(pasta)
+
+    def iniciar(self) -> None:
+        """
+        Abre o diário e inicia a thread de gravação.
+        """
+        self.arquivo = open(self.caminho, "a")
+        self.disponivel = True
+        self.thread = threading.Thread(target=self.gravar_continuamente, daemon=True)
+        self.thread.start()
+
+    def encerrar(self) -> None:
+        """
+        Interrompe a thread de gravação e faz um último checkpoint.
+        """
+        with self.condicao:
+            self.disponivel = False
+            self.condicao.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+        self.checkpoint()
+        self.arquivo.close()
+
+    def registrar(self, operacao: int, saldos: Dict[str, int], anotacoes: Optional[Dict] = None) -> None:
+        """
+        Registra uma operação e aguarda até que ela esteja gravada em disco.
+        Após aplicar a operação às contas, o chamador deve chamar `concluir`.
+        :param operacao: Código da operação (Operacoes).
+        :type operacao: int
+        :param saldos: Saldo final de cada conta envolvida, em centavos, por RG.
+        :type saldos: dict
+        :param anotacoes: Anotações da operação para os anexos das contas, gravadas no mesmo registro.
+        :type anotacoes: dict or None
+        """
+        with self.condicao:
+            while self.pausado:
+                self.condicao.wait()
+            self.seq += 1
+            seq = self.seq
+            self.pendentes.append(json.dumps({"seq": seq, "op": operacao, "saldos": saldos, **(anotacoes or {})}) + "\n")
+            self.em_andamento += 1
+            self.condicao.notify_all()
+            while self.seq_duravel < seq:
+                self.condicao.wait()
+
+    def concluir(self) -> None:
+        """
+        Sinaliza que uma operação registrada já foi aplicada às contas.
+        """
+        with self.condicao:
+            self.em_andamento -= 1
+            self.condicao.notify_all()
+
+    def gravar_lote(self) -> int:
+        """
+        Grava todos os registros pendentes com um único `fsync` e acorda quem os aguardava.
+        :return: Número de registros gravados.
+        :rtype: int
+        """
+        with self.lock_escrita:
+            with self.condicao:
+                lote, self.pendentes = self.pendentes, []
+                seq = self.seq
+            if lote:
+                self.arquivo.writelines(lote)
+                self.arquivo.flush()
+                os.fsync(self.arquivo.fileno())
+            with self.condicao:
+                self.seq_duravel = seq
+                self.desde_checkpoint += len(lote)
+                self.condicao.notify_all()
+            return len(lote)
+
+    def gravar_continuamente(self) -> None:
+        """
+        Laço da thread de gravação.
+        """
+        while True:
+            with self.condicao:
+                while self.disponivel and not self.pendentes:
+                    self.condicao.wait()
+                if not self.disponivel and not self.pendentes:
+                    return
+            self.gravar_lote()
+            if self.desde_checkpoint >= self.intervalo_checkpoint:
+                self.checkpoint()
+
+    def checkpoint(self) -> None:
+        """
+        Persiste as contas e esvazia o diário, apenas depois de as contas estarem no disco, regravando nele as
+        anotações conservadas pelos anexos. Novas operações aguardam até o fim do checkpoint.
+        """
+        with self.condicao:
+            self.pausado = True
+        try:
+            self.gravar_lote()
+            with self.condicao:
+                while self.em_andamento > 0:
+                    self.condicao.wait()
+            if self.persistir is not None:
+                self.persistir()
+            Conta.armazenamento.sincronizar()
+            with self.lock_escrita:
+                self.arquivo.close()
+                self.reescrever()
+                self.arquivo = open(self.caminho, "a")
+        finally:
+            with self.condicao:
+                self.pausado = False
+                self.desde_checkpoint = 0
+                self.condicao.notify_all()
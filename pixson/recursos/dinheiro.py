@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import re
+from decimal import Decimal, ROUND_HALF_UP
+
+# Valores monetários são inteiros em centavos em todo o sistema: no protocolo binário, nas contas, no diário
+# e no armazenamento. Apenas o protocolo de texto e a interface do cliente usam reais com até duas casas decimais.
+PADRAO_VALOR = r'([0-9]{1,15}(?:\.[0-9]{1,2})?)'
+REGEX_VALOR = re.compile(f'^{PADRAO_VALOR}$')
+# Maior valor aceito, para que saldos e valores caibam nos inteiros de 64 bits do protocolo binário.
+CENTAVOS_MAXIMO = 10 ** 17 - 1
+
+
+def analisar_valor(texto: str) -> int:
+    """
+    Converte um valor em reais, já validado por `PADRAO_VALOR`, em centavos, sem passar por `float`.
+    :param texto: Valor com até duas casas decimais, como '10', '10.5' ou '10.50'.
+    :type texto: str
+    :rtype: int
+    """
+    inteiro, _, fracao = texto.partition('.')
+    if not fracao:
+        return int(inteiro) * 100
+    return int(inteiro) * 100 + int(fracao) * (10 if len(fracao) == 1 else 1)
+
+
+def ler_valor(texto: str) -> int:
+    """
+    Valida e converte um valor em reais, informado pelo usuário ou num item de lote, em centavos.
+    :param texto: Valor com até duas casas decimais.
+    :type texto: str
+    :rtype: int
+    """
+    texto = texto.strip()
+    if not REGEX_VALOR.match(texto):
+        raise ValueError(f'Valor inválido: {texto}')
+    return analisar_valor(texto)
+
+
+def validar_centavos(centavos: int) -> int:
+    """
+    Verifica se um valor recebido em centavos, como nos quadros binários, não é negativo nem excede o máximo.
+    :param centavos: Valor em centavos.
+    :type centavos: int
+    :rtype: int
+    """
+    if not 0 <= centavos <= CENTAVOS_MAXIMO:
+        raise ValueError(f'Valor inválido: {centavos}')
+    return centavos
+
+
+def formatar_valor(centavos: int) -> str:
+    """
+    Formata um valor em centavos em reais, sempre com duas casas decimais.
+    :param centavos: Valor em centavos.
+    :type centavos: int
+    :rtype: str
+    """
+    sinal = '-' if centavos < 0 else ''
+    reais, resto = divmod(abs(centavos), 100)
+    return f"{sinal}{reais}.{resto:02d}"
+
+
+def para_centavos(valor: float | str) -> int:
+    """
+    Converte um saldo do formato antigo, em reais como `float`, em centavos, arredondando para o centavo
+    mais próximo, e as metades para longe do zero. Usado apenas na migração de contas e diários gravados
+    antes dos centavos inteiros.
+    :param valor: Saldo em reais.
+    :type valor: float or str
+    :rtype: int
+    """
+    return int((Decimal(str(valor)) * 100).quantize(Decimal(1), rounding=ROUND_HALF_UP))
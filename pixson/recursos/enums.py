@@ -8,9 +8,32 @@ class Operacoes(Enum):
     TRANSFERENCIA = 4
     SINCRONIZAR_RELOGIO = 5
     LOGIN = 6
+    LOTE = 7
+    ESTATISTICAS = 8
+    REPLICAR = 9
+    ESTADO = 10
+    EXTRATO = 11
+    RELATORIO = 12
+    ASSINAR = 13
+    RETOMAR = 14
+    CREDITO = 15
     SAIR = 0
 
 
 class Resposta(Enum):
     OK = 0
     ERRO = 1
+
+
+class StatusLote(Enum):
+    OK = 0
+    SALDO_INSUFICIENTE = 1
+    CONTA_NAO_ENCONTRADA = 2
+    OPERACAO_INVALIDA = 3
+
+
+class SituacaoChave(Enum):
+    NOVA = 0
+    REPETIDA = 1
+    EM_ANDAMENTO = 2
+    DIVERGENTE = 3
@@ -0,0 +1,508 @@
+from __future__ import annotations
+
+import os
+import json
+import time
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from pixson.recursos.enums import Operacoes
+from pixson.recursos.armazenamento import PASTA_CONTAS
+
+PASTA_EXTRATOS = f"{PASTA_CONTAS}/extratos"
+ARQUIVO_VIVO = 'vivo.jsonl'
+PASTA_ARQUIVO = 'arquivo'
+# Movimentos por segmento: ao atingir o tamanho, o segmento vivo de uma conta é fechado e um novo é iniciado.
+SEGMENTO_PADRAO = 4096
+# Segmentos fechados consultáveis de cada conta; os mais antigos são movidos para o arquivo morto.
+RETENCAO_PADRAO = 4
+# Movimentos mais recentes de cada conta mantidos em memória, respondidos sem acesso ao disco.
+MEMORIA_PADRAO = 128
+CAPACIDADE_PADRAO = 4096
+INTERVALO_PADRAO = 1.0
+LIMITE_PENDENTES_PADRAO = 10000
+# Segmentos fechados lidos mantidos em memória, para a paginação dos movimentos antigos.
+SEGMENTOS_LIDOS = 8
+PAGINA_PADRAO = 20
+PAGINA_MAXIMA = 100
+
+CHAVE_TEMPO = 'tempo'
+CHAVE_INSTANTE = 'instante'
+CHAVES = (CHAVE_TEMPO, CHAVE_INSTANTE)
+
+# Movimento de uma conta: número sequencial na conta, tempo lógico, instante em milissegundos desde a época,
+# opcode da operação, valor em centavos (negativo nos débitos), saldo final em centavos e RG da contraparte.
+Movimento = Tuple[int, int, int, int, int, int, Optional[str]]
+SEQ, TEMPO, INSTANTE, OPERACAO, VALOR, SALDO, CONTRAPARTE = range(7)
+
+
+def movimento_para_dict(movimento: Movimento) -> Dict:
+    """
+    Converte um movimento no dicionário enviado nas respostas do extrato.
+    :rtype: dict
+    """
+    return {
+        'seq': movimento[SEQ],
+        'tempo': movimento[TEMPO],
+        'instante': movimento[INSTANTE],
+        'operacao': Operacoes(movimento[OPERACAO]).name.lower(),
+        'valor_centavos': movimento[VALOR],
+        'saldo_centavos': movimento[SALDO],
+        'contraparte': movimento[CONTRAPARTE],
+    }
+
+
+def ler_segmento(caminho: Path) -> List[Movimento]:
+    """
+    Lê os movimentos de um segmento. Uma linha incompleta, deixada por uma queda durante a gravação, é ignorada.
+    :rtype: list
+    """
+    movimentos = []
+    try:
+        linhas = caminho.read_bytes().splitlines()
+    except FileNotFoundError:
+        return movimentos
+    for linha in linhas:
+        try:
+            movimentos.append(tuple(json.loads(linha)))
+        except ValueError:
+            continue
+    return movimentos
+
+
+class HistoricoConta:
+    """
+    Índice em memória do extrato de uma conta: os movimentos mais recentes, em ordem crescente, com listas
+    paralelas do número sequencial, do tempo lógico e do instante, para a busca binária das páginas.
+    """
+
+    def __init__(self, seq: int, vivos: int, segmentos: List[int], movimentos: List[Movimento]) -> None:
+        """
+        Construtor da classe HistoricoConta.
+        :param seq: Número sequencial do último movimento da conta.
+        :type seq: int
+        :param vivos: Movimentos já gravados no segmento vivo.
+        :type vivos: int
+        :param segmentos: Segmentos fechados consultáveis, identificados pelo número sequencial do seu primeiro
+        movimento, em ordem crescente.
+        :type segmentos: list
+        :param movimentos: Movimentos mais recentes, em ordem crescente.
+        :type movimentos: list
+        """
+        self.seq = seq
+        self.seq_gravado = seq
+        self.vivos = vivos
+        self.segmentos = segmentos
+        self.movimentos = movimentos
+        self.seqs = [movimento[SEQ] for movimento in movimentos]
+        self.tempos = [movimento[TEMPO] for movimento in movimentos]
+        self.instantes = [movimento[INSTANTE] for movimento in movimentos]
+        self.pendentes: List[Movimento] = []
+
+    def adicionar(self, movimento: Movimento, memoria: int) -> None:
+        """
+        Adiciona um movimento ao índice, descartando os mais antigos já gravados além da capacidade.
+        :param movimento: Movimento a ser adicionado.
+        :type movimento: Movimento
+        :param memoria: Movimentos mantidos em memória.
+        :type memoria: int
+        """
+        self.seq = movimento[SEQ]
+        self.movimentos.append(movimento)
+        self.seqs.append(movimento[SEQ])
+        self.tempos.append(movimento[TEMPO])
+        self.instantes.append(movimento[INSTANTE])
+        self.pendentes.append(movimento)
+        self.descartar_gravados(memoria)
+
+    def descartar_gravados(self, memoria: int) -> None:
+        """
+        Remove da memória os movimentos mais antigos além da capacidade. O descarte é feito em blocos, para não
+        deslocar as listas a cada movimento, e nunca remove um movimento ainda não gravado, que não seria
+        encontrado no disco.
+        :param memoria: Movimentos mantidos em memória.
+        :type memoria: int
+        """
+        excedentes = min(len(self.movimentos) - memoria, bisect_right(self.seqs, self.seq_gravado))
+        if excedentes > 0 and excedentes >= memoria // 2:
+            for lista in (self.movimentos, self.seqs, self.tempos, self.instantes):
+                del lista[:excedentes]
+
+
+class Extrato:
+    """
+    Extrato das contas: um índice por conta, ordenado no tempo, dos movimentos de saldo aplicados.
+
+    Cada conta tem uma pasta com o segmento vivo, em que os movimentos são acrescentados, e os segmentos
+    fechados, em JSONL, nomeados pelo número sequencial do seu primeiro movimento. O segmento vivo é fechado ao atingir `segmento` movimentos e, além de `retencao`
+    segmentos fechados, os mais antigos são movidos para o arquivo morto, fora das consultas; assim, o
+    índice de cada conta tem no máximo `segmento * (retencao + 1)` movimentos. Os `memoria` movimentos mais
+    recentes das contas usadas recentemente ficam em memória e são consultados por busca binária, sem
+    acesso ao disco; os mais antigos são lidos dos segmentos.
+
+    Os movimentos são ordenados pelo número sequencial na conta. O tempo lógico e o instante de um movimento
+    nunca são menores que os do anterior da mesma conta, para que as consultas por intervalo também sejam
+    buscas binárias. A gravação é adiada (write-behind), como a do armazém das contas: uma queda do processo
+    pode perder os movimentos do último intervalo, embora os saldos sejam recuperados pelo diário.
+    """
+
+    def __init__(
+            self,
+            pasta: str = PASTA_EXTRATOS,
+            segmento: int = SEGMENTO_PADRAO,
+            retencao: int = RETENCAO_PADRAO,
+            memoria: int = MEMORIA_PADRAO,
+            capacidade: int = CAPACIDADE_PADRAO,
+            intervalo: float = INTERVALO_PADRAO,
+            limite_pendentes: int = LIMITE_PENDENTES_PADRAO
+    ) -> None:
+        """
+        Construtor da classe Extrato.
+        :param pasta: Pasta dos extratos.
+        :type pasta: str
+        :param segmento: Movimentos por segmento.
+        :type segmento: int
+        :param retencao: Segmentos fechados consultáveis de cada conta.
+        :type retencao: int
+        :param memoria: Movimentos mais recentes de cada conta mantidos em memória.
+        :type memoria: int
+        :param capacidade: Número máximo de contas com movimentos em memória.
+        :type capacidade: int
+        :param intervalo: Intervalo, em segundos, entre gravações dos movimentos pendentes (0 grava imediatamente).
+        :type intervalo: float
+        :param limite_pendentes: Número de movimentos pendentes que antecipa a gravação.
+        :type limite_pendentes: int
+        """
+        self.pasta = Path(pasta)
+        self.segmento = segmento
+        self.retencao = retencao
+        self.memoria = memoria
+        self.capacidade = capacidade
+        self.intervalo = intervalo
+        self.limite_pendentes = limite_pendentes
+        self.historicos: OrderedDict[str, HistoricoConta] = OrderedDict()
+        self.segmentos_lidos: OrderedDict[Path, List[Movimento]] = OrderedDict()
+        self.pendentes = 0
+        self.obter_tempo: Callable[[], int] = lambda: 0
+        self.lock = threading.Lock()
+        self.lock_escrita = threading.Lock()
+        self.evento = threading.Event()
+        self.disponivel = False
+        self.thread = None
+
+    def iniciar(self, obter_tempo: Callable[[], int]) -> None:
+        """
+        Inicia a thread de gravação periódica.
+        :param obter_tempo: Função que retorna o tempo lógico atual do servidor, registrado nos movimentos.
+        :type obter_tempo: callable
+        """
+        self.obter_tempo = obter_tempo
+        self.pasta.mkdir(parents=True, exist_ok=True)
+        self.disponivel = True
+        if self.intervalo > 0:
+            self.thread = threading.Thread(target=self.descarregar_periodicamente, daemon=True)
+            self.thread.start()
+
+    def encerrar(self) -> None:
+        """
+        Interrompe a gravação periódica e grava todos os movimentos pendentes.
+        """
+        self.disponivel = False
+        self.evento.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.descarregar()
+
+    def pasta_conta(self, rg: str) -> Path:
+        """
+        Obtém a pasta dos segmentos de uma conta.
+        :rtype: Path
+        """
+        return self.pasta / rg
+
+    def carregar(self, rg: str) -> HistoricoConta:
+        """
+        Lê do disco o índice de uma conta: os segmentos fechados e os movimentos mais recentes.
+        :param rg: RG do cliente.
+        :type rg: str
+        :rtype: HistoricoConta
+        """
+        pasta = self.pasta_conta(rg)
+        try:
+            nomes = os.listdir(pasta)
+        except FileNotFoundError:
+            nomes = []
+        segmentos = sorted(int(nome.split('.')[0]) for nome in nomes if nome != ARQUIVO_VIVO)
+        movimentos = ler_segmento(pasta / ARQUIVO_VIVO)
+        vivos = len(movimentos)
+        if not movimentos and segmentos:
+            movimentos = ler_segmento(pasta / f"{segmentos[-1]:012d}.jsonl")
+        seq = movimentos[-1][SEQ] if movimentos else 0
+        movimentos = movimentos[-self.memoria:] if self.memoria > 0 else []
+        return HistoricoConta(seq=seq, vivos=vivos, segmentos=segmentos, movimentos=movimentos)
+
+    def obter(self, rg: str) -> HistoricoConta:
+        """
+        Obtém o índice de uma conta, carregando-o do disco apenas no primeiro uso.
+        :param rg: RG do cliente.
+        :type rg: str
+        :rtype: HistoricoConta
+        """
+        with self.lock:
+            historico = self.historicos.get(rg)
+            if historico is not None:
+                self.historicos.move_to_end(rg)
+                return historico
+
+        historico = self.carregar(rg)
+
+        with self.lock:
+            # Outra thread pode ter carregado a mesma conta enquanto os segmentos eram lidos.
+            historico = self.historicos.setdefault(rg, historico)
+            self.historicos.move_to_end(rg)
+            return historico
+
+    def registrar(self, operacao: Operacoes, saldos: Dict[str, Tuple[int, int]]) -> None:
+        """
+        Registra os movimentos de uma operação aplicada, um por conta cujo saldo foi alterado. Deve ser
+        chamado com as travas das contas adquiridas, que ordenam os movimentos de cada conta.
+        :param operacao: Operação que originou a alteração.
+        :type operacao: Operacoes
+        :param saldos: Saldo anterior e saldo final de cada conta envolvida, em centavos.
+        :type saldos: dict
+        """
+        tempo = self.obter_tempo()
+        instante = int(time.time() * 1000)
+        pendentes = 0
+        for rg, (anterior, saldo) in saldos.items():
+            if saldo == anterior:
+                continue
+            contraparte = None
+            if operacao is Operacoes.TRANSFERENCIA and len(saldos) == 2:
+                contraparte = next(outro for outro in saldos if outro != rg)
+            historico = self.obter(rg)
+            with self.lock:
+                # O índice pode ter sido descartado da memória desde que foi obtido, se não tinha pendentes.
+                historico = self.historicos.setdefault(rg, historico)
+                movimento = (
+                    historico.seq + 1,
+                    max(tempo, historico.tempos[-1]) if historico.tempos else tempo,
+                    max(instante, historico.instantes[-1]) if historico.instantes else instante,
+                    operacao.value,
+                    saldo - anterior,
+                    saldo,
+                    contraparte
+                )
+                historico.adicionar(movimento, self.memoria)
+                self.pendentes += 1
+                pendentes = self.pendentes
+
+        if not pendentes:
+            return
+        if self.intervalo <= 0:
+            self.descarregar()
+        elif pendentes >= self.limite_pendentes:
+            self.evento.set()
+
+    def consultar(
+            self,
+            rg: str,
+            inicio: int | None = None,
+            fim: int | None = None,
+            chave: str = CHAVE_TEMPO,
+            antes: int | None = None,
+            limite: int = PAGINA_PADRAO
+    ) -> Tuple[List[Movimento], int | None]:
+        """
+        Consulta uma página do extrato de uma conta, do movimento mais recente para o mais antigo.
+        :param rg: RG do cliente.
+        :type rg: str
+        :param inicio: Menor tempo lógico, ou instante, dos movimentos; sem limite se None.
+        :type inicio: int or None
+        :param fim: Maior tempo lógico, ou instante, dos movimentos; sem limite se None.
+        :type fim: int or None
+        :param chave: Chave do intervalo: 'tempo' (lógico) ou 'instante' (milissegundos desde a época).
+        :type chave: str
+        :param antes: Número sequencial a partir do qual, exclusive, a página começa, vindo da página anterior.
+        :type antes: int or None
+        :param limite: Número máximo de movimentos da página.
+        :type limite: int
+        :return: Movimentos da página e o número sequencial para a próxima página, ou None se ela for a última.
+        :rtype: tuple
+        """
+        if chave not in CHAVES:
+            raise ValueError(f'Chave inválida: {chave}')
+        indice = TEMPO if chave == CHAVE_TEMPO else INSTANTE
+        historico = self.obter(rg)
+        pagina: List[Movimento] = []
+
+        with self.lock:
+            chaves = historico.tempos if chave == CHAVE_TEMPO else historico.instantes
+            alto = len(historico.movimentos)
+            if antes is not None:
+                alto = min(alto, bisect_left(historico.seqs, antes))
+            if fim is not None:
+                alto = min(alto, bisect_right(chaves, fim))
+            baixo = bisect_left(chaves, inicio) if inicio is not None else 0
+            if baixo < alto:
+                pagina.extend(reversed(historico.movimentos[max(baixo, alto - limite - 1):alto]))
+            # Os movimentos anteriores aos da memória, se houver, estão nos segmentos.
+            primeiro = historico.seqs[0] if historico.seqs else historico.seq + 1
+            no_disco = baixo == 0 and primeiro > 1 and len(pagina) <= limite
+            segmentos = list(historico.segmentos)
+            primeiro_vivo = historico.seq_gravado - historico.vivos + 1
+
+        if no_disco:
+            limite_seq = min(primeiro, antes) if antes is not None else primeiro
+            for movimento in self.percorrer_disco(rg, segmentos, primeiro_vivo, limite_seq):
+                if inicio is not None and movimento[indice] < inicio:
+                    break
+                if fim is not None and movimento[indice] > fim:
+                    continue
+                pagina.append(movimento)
+                if len(pagina) > limite:
+                    break
+
+        if len(pagina) > limite:
+            return pagina[:limite], pagina[limite - 1][SEQ]
+        return pagina, None
+
+    def percorrer_disco(self, rg: str, segmentos: List[int], primeiro_vivo: int, antes: int) -> Iterator[Movimento]:
+        """
+        Percorre, do mais recente para o mais antigo, os movimentos gravados de uma conta anteriores a um
+        número sequencial. Os segmentos que começam depois dele não são lidos. A gravação e o fechamento dos
+        segmentos aguardam a leitura.
+        :param rg: RG do cliente.
+        :type rg: str
+        :param segmentos: Segmentos fechados consultáveis da conta.
+        :type segmentos: list
+        :param primeiro_vivo: Número sequencial do primeiro movimento do segmento vivo.
+        :type primeiro_vivo: int
+        :param antes: Número sequencial a partir do qual, exclusive, os movimentos são percorridos.
+        :type antes: int
+        :rtype: Iterator[Movimento]
+        """
+        pasta = self.pasta_conta(rg)
+        with self.lock_escrita:
+            if primeiro_vivo < antes:
+                for movimento in reversed(ler_segmento(pasta / ARQUIVO_VIVO)):
+                    if movimento[SEQ] < antes:
+                        yield movimento
+            for primeiro in reversed(segmentos):
+                if primeiro >= antes:
+                    continue
+                for movimento in reversed(self.ler_segmento_fechado(pasta / f"{primeiro:012d}.jsonl")):
+                    if movimento[SEQ] < antes:
+                        yield movimento
+
+    def ler_segmento_fechado(self, caminho: Path) -> List[Movimento]:
+        """
+        Lê um segmento fechado, que não é mais alterado, pelos segmentos lidos recentemente em memória.
+        :rtype: list
+        """
+        with self.lock:
+            movimentos = self.segmentos_lidos.get(caminho)
+            if movimentos is not None:
+                self.segmentos_lidos.move_to_end(caminho)
+                return movimentos
+        movimentos = ler_segmento(caminho)
+        with self.lock:
+            self.segmentos_lidos[caminho] = movimentos
+            while len(self.segmentos_lidos) > SEGMENTOS_LIDOS:
+                self.segmentos_lidos.popitem(last=False)
+        return movimentos
+
+    def descarregar(self) -> None:
+        """
+        Acrescenta aos segmentos vivos os movimentos pendentes, fecha os segmentos que atingiram o tamanho,
+        move para o arquivo morto os segmentos além da retenção e remove da memória as contas excedentes.
+        """
+        with self.lock_escrita:
+            with self.lock:
+                lotes = []
+                for rg, historico in self.historicos.items():
+                    if historico.pendentes:
+                        lotes.append((rg, historico, historico.pendentes))
+                        historico.pendentes = []
+                self.pendentes = 0
+
+            for rg, historico, movimentos in lotes:
+                self.gravar(rg, historico, movimentos)
+
+            with self.lock:
+                self.descartar_excedentes()
+
+    def gravar(self, rg: str, historico: HistoricoConta, movimentos: List[Movimento]) -> None:
+        """
+        Acrescenta movimentos ao segmento vivo de uma conta, fechando-o sempre que atinge o tamanho. Deve ser
+        chamado com o lock de escrita adquirido.
+        :param rg: RG do cliente.
+        :type rg: str
+        :param historico: Índice da conta.
+        :type historico: HistoricoConta
+        :param movimentos: Movimentos pendentes, em ordem crescente.
+        :type movimentos: list
+        """
+        pasta = self.pasta_conta(rg)
+        pasta.mkdir(exist_ok=True)
+        while movimentos:
+            with self.lock:
+                espaco = max(self.segmento - historico.vivos, 1)
+            parte, movimentos = movimentos[:espaco], movimentos[espaco:]
+            linhas = ''.join(json.dumps(movimento, separators=(',', ':')) + '\n' for movimento in parte)
+            with open(pasta / ARQUIVO_VIVO, 'a+b') as arquivo:
+                # Uma linha incompleta deixada por uma queda é encerrada, para não corromper a seguinte.
+                if arquivo.tell() > 0:
+                    arquivo.seek(-1, os.SEEK_END)
+                    if arquivo.read(1) != b'\n':
+                        arquivo.write(b'\n')
+                arquivo.write(linhas.encode())
+
+            arquivar = []
+            with self.lock:
+                historico.seq_gravado = parte[-1][SEQ]
+                historico.vivos += len(parte)
+                fechar = historico.vivos >= self.segmento
+                if fechar:
+                    numero = historico.seq_gravado - historico.vivos + 1
+                    historico.segmentos.append(numero)
+                    historico.vivos = 0
+                    arquivar = historico.segmentos[:-self.retencao] if self.retencao > 0 else list(historico.segmentos)
+                    del historico.segmentos[:len(arquivar)]
+                historico.descartar_gravados(self.memoria)
+            if fechar:
+                os.replace(pasta / ARQUIVO_VIVO, pasta / f"{numero:012d}.jsonl")
+            if arquivar:
+                pasta_arquivo = self.pasta / PASTA_ARQUIVO / rg
+                pasta_arquivo.mkdir(parents=True, exist_ok=True)
+                for antigo in arquivar:
+                    os.replace(pasta / f"{antigo:012d}.jsonl", pasta_arquivo / f"{antigo:012d}.jsonl")
+
+    def descarregar_periodicamente(self) -> None:
+        """
+        Laço da thread de gravação.
+        """
+        while self.disponivel:
+            self.evento.wait(self.intervalo)
+            self.evento.clear()
+            self.descarregar()
+
+    def descartar_excedentes(self) -> None:
+        """
+        Remove da memória os índices das contas menos usadas recentemente, até respeitar a capacidade.
+        Contas com movimentos pendentes nunca são descartadas. Deve ser chamado com o lock adquirido.
+        """
+        excedentes = len(self.historicos) - self.capacidade
+        if excedentes <= 0:
+            return
+        descartadas = []
+        for rg, historico in self.historicos.items():
+            if len(descartadas) >= excedentes:
+                break
+            if not historico.pendentes:
+                descartadas.append(rg)
+        for rg in descartadas:
+            del self.historicos[rg]
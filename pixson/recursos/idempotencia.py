@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from pixson.recursos.diario import AnexoDiario
+from pixson.recursos.enums import SituacaoChave, StatusLote
+from pixson.recursos.protocolo import Protocolo, RespostaErro, RespostaLote, RespostaSucesso
+
+CAPACIDADE_CHAVES_PADRAO = 100000
+# Tempo, em segundos, durante o qual uma chave repetida retorna a resposta original.
+JANELA_PADRAO = 600.0
+# Nome de cada classe de resposta nas anotações do diário.
+CLASSES_RESPOSTA = {'sucesso': RespostaSucesso, 'erro': RespostaErro, 'lote': RespostaLote}
+NOMES_CLASSES = {classe: nome for nome, classe in CLASSES_RESPOSTA.items()}
+
+
+class Idempotencia(AnexoDiario):
+    """
+    Respostas das operações que alteram saldos enviadas com uma chave de idempotência. Uma solicitação repetida
+    com a mesma chave, por exemplo após o cliente perder a resposta por um prazo esgotado, recebe a resposta
+    original sem que a operação seja aplicada de novo.
+
+    Cada chave é guardada por no máximo `janela` segundos desde a primeira solicitação; além de `capacidade`
+    chaves, a usada há mais tempo é descartada (LRU). As chaves são de todos os clientes, então devem ser
+    únicas, como um UUID: a mesma chave numa solicitação diferente é recusada, e não respondida com a resposta
+    de outra. Cada entrada guarda apenas o instante, uma impressão de 64 bits da solicitação e a classe e o
+    conteúdo da resposta, que, nas respostas fixas dos processadores, é a mesma ‘string’ em todas as entradas.
+
+    Com o diário, cada resposta guardada é registrada nele, na anotação "idempotencia", num registro gravado
+    logo depois do da operação, e as chaves ainda na janela são conservadas nos checkpoints; assim, elas
+    sobrevivem a um reinício. Uma queda entre os dois registros perde a chave, e a repetição é aplicada de
+    novo. Sem o diário, as chaves ficam apenas na memória.
+    """
+
+    def __init__(self, capacidade: int = CAPACIDADE_CHAVES_PADRAO, janela: float = JANELA_PADRAO) -> None:
+        """
+        Construtor da classe Idempotencia.
+        :param capacidade: Número máximo de chaves guardadas.
+        :type capacidade: int
+        :param janela: Tempo, em segundos, durante o qual cada chave é guardada.
+        :type janela: float
+        """
+        self.capacidade = capacidade
+        self.janela = janela
+        # Para cada chave: instante da primeira solicitação, em segundos desde a época Unix, pois é gravado no
+        # diário, impressão da solicitação, classe e conteúdo da resposta. A classe é None enquanto a operação
+        # está em andamento.
+        self.chaves: OrderedDict[str, Tuple[float, int, type | None, object]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def impressao(solicitacao: Protocolo) -> int:
+        """
+        Calcula a impressão da solicitação pelos campos empacotados, sem o tempo lógico e o id da requisição,
+        que mudam a cada tentativa. O RG omitido deve ter sido preenchido com o da sessão. A impressão é a
+        mesma em todas as execuções, pois é gravada no diário.
+        :rtype: int
+        """
+        resumo = hashlib.blake2b(bytes((solicitacao.opcode,)) + solicitacao.empacotar_carga(), digest_size=8)
+        return int.from_bytes(resumo.digest(), 'big')
+
+    def reservar(self, chave: str, impressao: int) -> Tuple[SituacaoChave, Protocolo | None]:
+        """
+        Consulta a chave e, se ela for nova ou tiver expirado, a reserva para a operação que será aplicada.
+        :param chave: Chave de idempotência da solicitação.
+        :type chave: str
+        :param impressao: Impressão da solicitação.
+        :type impressao: int
+        :return: A situação da chave e, se ela for repetida, a resposta original, com o tempo lógico zerado.
+        :rtype: tuple
+        """
+        agora = time.time()
+        with self.lock:
+            entrada = self.chaves.get(chave)
+            if entrada is not None and agora - entrada[0] <= self.janela:
+                self.chaves.move_to_end(chave)
+                _, registrada, classe, conteudo = entrada
+                if registrada != impressao:
+                    return SituacaoChave.DIVERGENTE, None
+                if classe is None:
+                    return SituacaoChave.EM_ANDAMENTO, None
+                return SituacaoChave.REPETIDA, Idempotencia.recriar(classe, conteudo)
+            self.chaves[chave] = (agora, impressao, None, None)
+            self.chaves.move_to_end(chave)
+            self.descartar_excedentes(agora)
+        return SituacaoChave.NOVA, None
+
+    def concluir(self, chave: str, resposta: Protocolo) -> Dict | None:
+        """
+        Guarda a resposta da operação aplicada com a chave reservada.
+        :param chave: Chave de idempotência da solicitação.
+        :type chave: str
+        :param resposta: Resposta enviada ao cliente.
+        :type resposta: Protocolo
+        :return: A anotação que registra a resposta no diário, ou None se a chave já foi descartada.
+        :rtype: dict or None
+        """
+        if isinstance(resposta, RespostaLote):
+            classe, conteudo = RespostaLote, tuple(resposta.status)
+        else:
+            classe, conteudo = type(resposta), resposta.resposta
+        with self.lock:
+            entrada = self.chaves.get(chave)
+            if entrada is None:
+                return None
+            self.chaves[chave] = (entrada[0], entrada[1], classe, conteudo)
+            return Idempotencia.anotacao(chave, self.chaves[chave])
+
+    def liberar(self, chave: str) -> None:
+        """
+        Remove a reserva de uma chave cuja operação não foi concluída, para que ela possa ser tentada de novo.
+        :param chave: Chave de idempotência da solicitação.
+        :type chave: str
+        """
+        with self.lock:
+            entrada = self.chaves.get(chave)
+            if entrada is not None and entrada[2] is None:
+                del self.chaves[chave]
+
+    @staticmethod
+    def recriar(classe: type, conteudo: object) -> Protocolo:
+        """
+        Recria a resposta guardada, com o tempo lógico zerado, a ser preenchido por quem a envia.
+        :rtype: Protocolo
+        """
+        if classe is RespostaLote:
+            return RespostaLote(tempo=0, status=list(conteudo))
+        return classe(tempo=0, resposta=conteudo)
+
+    @staticmethod
+    def anotacao(chave: str, entrada: Tuple[float, int, type, object]) -> Dict:
+        """
+        Monta a anotação do diário de uma chave com a resposta guardada.
+        :rtype: dict
+        """
+        criada, impressao, classe, conteudo = entrada
+        if classe is RespostaLote:
+            conteudo = [status.value for status in conteudo]
+        return {'idempotencia': [chave, criada, impressao, NOMES_CLASSES[classe], conteudo]}
+
+    def anotar(self, anotacoes: Dict) -> None:
+        registro = anotacoes.get('idempotencia')
+        if registro is None:
+            return
+        chave, criada, impressao, nome, conteudo = registro
+        classe = CLASSES_RESPOSTA[nome]
+        if classe is RespostaLote:
+            conteudo = tuple(StatusLote(status) for status in conteudo)
+        with self.lock:
+            if chave not in self.chaves:
+                self.chaves[chave] = (criada, impressao, classe, conteudo)
+                self.descartar_excedentes(time.time())
+            elif self.chaves[chave][2] is None:
+                self.chaves[chave] = (criada, impressao, classe, conteudo)
+
+    def conservar(self) -> List[Dict]:
+        agora = time.time()
+        with self.lock:
+            return [
+                Idempotencia.anotacao(chave, entrada) for chave, entrada in self.chaves.items()
+                if entrada[2] is not None and agora - entrada[0] <= self.janela
+            ]
+
+    def descartar_excedentes(self, agora: float) -> None:
+        """
+        Descarta as chaves mais antigas que a janela, a partir da usada há mais tempo, e as excedentes da
+        capacidade. Uma chave expirada depois de uma mais recente na ordem de uso é descartada quando for
+        consultada ou quando chegar ao início da ordem. Deve ser chamado com o lock adquirido.
+        """
+        while self.chaves:
+            chave, (criada, _, _, _) = next(iter(self.chaves.items()))
+            if agora - criada <= self.janela and len(self.chaves) <= self.capacidade:
+                break
+            del self.chaves[chave]
+
+    def __len__(self) -> int:
+        return len(self.chaves)
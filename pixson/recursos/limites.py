@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import time
+
+
+class LimiteTaxa:
+    """
+    Limite de requisições por segundo de uma conexão, pelo algoritmo do balde de fichas: o balde recebe
+    `taxa` fichas por segundo, até a capacidade de `rajada` fichas, e cada requisição consome uma ficha
+    por operação. Uma conexão ociosa acumula fichas para uma rajada curta, mas a sua taxa média nunca
+    excede a configurada. Cada conexão é atendida por uma única thread ou tarefa, então não há trava.
+    """
+
+    def __init__(self, taxa: float, rajada: float | None = None) -> None:
+        """
+        Construtor da classe LimiteTaxa.
+        :param taxa: Requisições por segundo.
+        :type taxa: float
+        :param rajada: Requisições aceitas de uma só vez após um período ocioso. Por padrão, as de um segundo.
+        :type rajada: float or None
+        """
+        self.taxa = taxa
+        self.rajada = rajada if rajada is not None else max(taxa, 1.0)
+        self.fichas = self.rajada
+        self.atualizacao = time.monotonic()
+
+    def consumir(self, quantidade: int = 1) -> bool:
+        """
+        Consome as fichas de uma requisição, se houver fichas suficientes no balde.
+        :param quantidade: Fichas consumidas pela requisição.
+        :type quantidade: int
+        :return: Falso se a requisição excede o limite e deve ser recusada.
+        :rtype: bool
+        """
+        # Um lote maior que o balde consome o balde cheio, para não ser recusado para sempre.
+        quantidade = min(quantidade, self.rajada)
+        agora = time.monotonic()
+        self.fichas = min(self.rajada, self.fichas + (agora - self.atualizacao) * self.taxa)
+        self.atualizacao = agora
+        if self.fichas < quantidade:
+            return False
+        self.fichas -= quantidade
+        return True
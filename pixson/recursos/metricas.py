@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import time
+import queue
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterator
+
+if TYPE_CHECKING:
+    from logging.handlers import QueueListener
+
+# Limites dos intervalos dos histogramas, em segundos: de 1 µs a cerca de 1000 s, dobrando a cada intervalo.
+LIMITES_HISTOGRAMA = [0.000001 * 2 ** expoente for expoente in range(31)]
+
+registro = logging.getLogger('pixson')
+
+
+class Histograma:
+    """
+    Histograma de durações com intervalos exponenciais fixos. Registrar uma duração custa uma busca binária
+    e alguns incrementos, sem guardar as amostras; os percentis são aproximados pelo limite do intervalo.
+    """
+
+    def __init__(self) -> None:
+        """
+        Construtor da classe Histograma.
+        """
+        self.contagens = [0] * (len(LIMITES_HISTOGRAMA) + 1)
+        self.quantidade = 0
+        self.soma = 0.0
+        self.maximo = 0.0
+        self.lock = threading.Lock()
+
+    def registrar(self, duracao: float) -> None:
+        """
+        Registra uma duração.
+        :param duracao: Duração, em segundos.
+        :type duracao: float
+        """
+        indice = bisect_left(LIMITES_HISTOGRAMA, duracao)
+        with self.lock:
+            self.contagens[indice] += 1
+            self.quantidade += 1
+            self.soma += duracao
+            if duracao > self.maximo:
+                self.maximo = duracao
+
+    def percentil(self, fracao: float) -> float:
+        """
+        Obtém o limite superior do intervalo que contém o percentil informado.
+        :param fracao: Percentil, entre 0 e 1.
+        :type fracao: float
+        :rtype: float
+        """
+        alvo = fracao * self.quantidade
+        acumulado = 0
+        for indice, contagem in enumerate(self.contagens):
+            acumulado += contagem
+            if contagem and acumulado >= alvo:
+                return min(LIMITES_HISTOGRAMA[indice], self.maximo) if indice < len(LIMITES_HISTOGRAMA) else self.maximo
+        return self.maximo
+
+    def resumo(self) -> Dict[str, float]:
+        """
+        Resume o histograma, com as durações em milissegundos.
+        :rtype: dict
+        """
+        with self.lock:
+            return {
+                'quantidade': self.quantidade,
+                'media_ms': round(self.soma / self.quantidade * 1000, 3) if self.quantidade else 0.0,
+                'p50_ms': round(self.percentil(0.5) * 1000, 3),
+                'p99_ms': round(self.percentil(0.99) * 1000, 3),
+                'p999_ms': round(self.percentil(0.999) * 1000, 3),
+                'max_ms': round(self.maximo * 1000, 3),
+            }
+
+
+class Metricas:
+    """
+    Contadores e histogramas do servidor, identificados por nome e criados no primeiro uso.
+    """
+
+    def __init__(self) -> None:
+        """
+        Construtor da classe Metricas.
+        """
+        self.inicio = time.monotonic()
+        self.contadores: Dict[str, int] = {}
+        self.histogramas: Dict[str, Histograma] = {}
+        self.lock = threading.Lock()
+
+    def incrementar(self, nome: str, quantidade: int = 1) -> None:
+        """
+        Soma uma quantidade, que pode ser negativa, ao contador.
+        :param nome: Nome do contador.
+        :type nome: str
+        :param quantidade: Quantidade a ser somada.
+        :type quantidade: int
+        """
+        with self.lock:
+            self.contadores[nome] = self.contadores.get(nome, 0) + quantidade
+
+    def histograma(self, nome: str) -> Histograma:
+        """
+        Obtém o histograma pelo nome, criando-o se necessário.
+        :param nome: Nome do histograma.
+        :type nome: str
+        :rtype: Histograma
+        """
+        histograma = self.histogramas.get(nome)
+        if histograma is None:
+            with self.lock:
+                histograma = self.histogramas.setdefault(nome, Histograma())
+        return histograma
+
+    def registrar(self, nome: str, duracao: float) -> None:
+        """
+        Registra uma duração no histograma.
+        :param nome: Nome do histograma.
+        :type nome: str
+        :param duracao: Duração, em segundos.
+        :type duracao: float
+        """
+        self.histograma(nome).registrar(duracao)
+
+    @contextmanager
+    def medir(self, nome: str) -> Iterator[None]:
+        """
+        Registra no histograma a duração do bloco.
+        :param nome: Nome do histograma.
+        :type nome: str
+        """
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.registrar(nome, time.perf_counter() - inicio)
+
+    def instantaneo(self) -> Dict:
+        """
+        Obtém uma cópia de todas as métricas, serializável em JSON.
+        :rtype: dict
+        """
+        with self.lock:
+            contadores = dict(self.contadores)
+            histogramas = dict(self.histogramas)
+        return {
+            'tempo_ativo': round(time.monotonic() - self.inicio, 3),
+            'contadores': contadores,
+            'histogramas': {nome: histograma.resumo() for nome, histograma in sorted(histogramas.items())},
+        }
+
+
+metricas = Metricas()
+
+
+def iniciar_registro(arquivo: str | None = None, nivel: int = logging.DEBUG) -> QueueListener:
+    """
+    Ativa o registro das operações. As mensagens são apenas enfileiradas por quem as emite e escritas por
+    uma thread separada, de modo que a escrita na saída ou no arquivo não fica no caminho das requisições.
+    :param arquivo: Arquivo do registro. Sem ele, o registro é escrito na saída de erro.
+    :type arquivo: str or None
+    :param nivel: Nível mínimo das mensagens registradas.
+    :type nivel: int
+    :return: Thread de escrita do registro, que deve ser parada no encerramento.
+    :rtype: QueueListener
+    """
+    # Importado apenas quando o registro é ativado, pois é lento de carregar na inicialização.
+    from logging.handlers import QueueHandler, QueueListener
+
+    destino = logging.FileHandler(arquivo) if arquivo else logging.StreamHandler()
+    destino.setFormatter(logging.Formatter('%(asctime)s %(threadName)s %(message)s'))
+    fila = queue.SimpleQueue()
+    registro.addHandler(QueueHandler(fila))
+    registro.setLevel(nivel)
+    registro.propagate = False
+    ouvinte = QueueListener(fila, destino)
+    ouvinte.start()
+    return ouvinte
@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import time
+import socket
+import threading
+from collections import Counter
+from typing import Callable, Dict, Set, Tuple
+
+from pixson.recursos.metricas import metricas
+from pixson.recursos.protocolo import (
+    CODIFICACAO_BINARIA, SEPARADOR, NotificacaoSaldo, OperacaoAssinar, Protocolo
+)
+
+# Contas assinadas ao mesmo tempo por uma conexão.
+MAX_ASSINATURAS_PADRAO = 64
+# Tempo, em segundos, entre as tentativas de reabrir a conexão com a partição de uma conta assinada.
+INTERVALO_REPASSE = 1.0
+
+
+class Assinatura:
+    """
+    Contas assinadas por uma conexão e os saldos ainda não enviados a ela. Quem altera uma conta apenas
+    guarda o novo saldo e, se a conexão não tinha nada pendente, a desperta; o envio é feito por quem atende
+    a conexão. Enquanto o envio anterior não termina, as alterações seguintes da mesma conta substituem o
+    saldo pendente, de modo que um cliente lento recebe menos notificações, e nunca atrasa quem altera as contas.
+    """
+
+    def __init__(self, despertar: Callable[[], None] | None = None) -> None:
+        """
+        Construtor da classe Assinatura.
+        :param despertar: Agenda o envio dos saldos pendentes. Sem ele, a conexão é despertada por um par de
+        sockets, cujo lado de leitura é monitorado pela thread da conexão junto com o socket do cliente.
+        :type despertar: callable or None
+        """
+        self.rgs: Set[str] = set()
+        self.pendentes: Dict[str, int] = {}
+        self.agendada = False
+        self.lock = threading.Lock()
+        self.leitura: socket.socket | None = None
+        self.escrita: socket.socket | None = None
+        if despertar is None:
+            self.leitura, self.escrita = socket.socketpair()
+            self.leitura.setblocking(False)
+            self.escrita.setblocking(False)
+            despertar = self.sinalizar
+        self.despertar = despertar
+
+    def sinalizar(self) -> None:
+        """
+        Desperta a thread da conexão, sem bloquear quem alterou a conta.
+        """
+        try:
+            self.escrita.send(b'\0')
+        except OSError:
+            # Conexão já encerrada, ou um sinal anterior ainda não lido, que basta para despertá-la.
+            pass
+
+    def publicar(self, rg: str, saldo: int) -> None:
+        """
+        Guarda o novo saldo de uma conta assinada e agenda o envio, se ele ainda não estiver agendado.
+        :param rg: RG da conta alterada.
+        :type rg: str
+        :param saldo: Saldo da conta após a alteração, em centavos.
+        :type saldo: int
+        """
+        with self.lock:
+            if rg in self.pendentes:
+                metricas.incrementar('notificacoes.agrupadas')
+            self.pendentes[rg] = saldo
+            if self.agendada:
+                return
+            self.agendada = True
+        self.despertar()
+
+    def retirar(self) -> Dict[str, int]:
+        """
+        Retira os saldos pendentes, para envio. Uma alteração publicada depois agenda um novo envio.
+        No par de sockets, o sinal deve ser lido antes, para que o sinal dessa alteração não seja perdido.
+        :return: Saldo pendente de cada conta, em centavos, por RG.
+        :rtype: dict
+        """
+        with self.lock:
+            pendentes, self.pendentes = self.pendentes, {}
+            self.agendada = False
+        return pendentes
+
+    def fechar(self) -> None:
+        """
+        Fecha o par de sockets, se houver.
+        """
+        if self.leitura is not None:
+            self.leitura.close()
+            self.escrita.close()
+
+
+class Notificacoes:
+    """
+    Assinaturas das contas pelas conexões. `Conta.aplicar` publica os novos saldos a cada alteração,
+    com as travas das contas mantidas, de modo que o último saldo publicado de uma conta é sempre o atual.
+
+    A publicação consulta as assinaturas sem adquirir um lock: as assinaturas de cada conta são uma tupla,
+    substituída, e não alterada, ao assinar e cancelar. Sem assinaturas, ela custa uma consulta a um dicionário
+    por conta alterada.
+    """
+
+    def __init__(self, max_assinaturas: int = MAX_ASSINATURAS_PADRAO) -> None:
+        """
+        Construtor da classe Notificacoes.
+        :param max_assinaturas: Contas assinadas ao mesmo tempo por uma conexão.
+        :type max_assinaturas: int
+        """
+        self.max_assinaturas = max_assinaturas
+        self.assinaturas: Dict[str, Tuple[Assinatura, ...]] = {}
+        self.lock = threading.Lock()
+        self.obter_tempo: Callable[[], int] = lambda: 0
+
+    def iniciar(self, obter_tempo: Callable[[], int]) -> None:
+        """
+        Define o relógio lógico do servidor, usado como tempo das notificações.
+        :param obter_tempo: Incrementa e retorna o relógio lógico.
+        :type obter_tempo: callable
+        """
+        self.obter_tempo = obter_tempo
+
+    def assinar(self, assinatura: Assinatura, rg: str, saldo: int | None) -> bool:
+        """
+        Assina as alterações de uma conta e agenda o envio do saldo atual, como primeira notificação.
+        O chamador deve manter a trava da conta, para que nenhuma alteração ocorra entre a leitura do saldo
+        e a assinatura.
+        :param assinatura: Assinaturas da conexão.
+        :type assinatura: Assinatura
+        :param rg: RG da conta.
+        :type rg: str
+        :param saldo: Saldo atual da conta, ou None se ele for enviado por outra partição.
+        :type saldo: int or None
+        :return: Se a conta não estava assinada pela conexão.
+        :rtype: bool
+        :raises ValueError: Se a conexão já assina o número máximo de contas.
+        """
+        with self.lock:
+            nova = rg not in assinatura.rgs
+            if nova:
+                if len(assinatura.rgs) >= self.max_assinaturas:
+                    raise ValueError('Limite de assinaturas excedido')
+                assinatura.rgs.add(rg)
+                self.assinaturas[rg] = self.assinaturas.get(rg, ()) + (assinatura,)
+                metricas.incrementar('notificacoes.assinaturas')
+        if saldo is not None:
+            assinatura.publicar(rg=rg, saldo=saldo)
+        return nova
+
+    def cancelar(self, assinatura: Assinatura, rg: str) -> bool:
+        """
+        Cancela a assinatura de uma conta. Um saldo dela ainda pendente não é enviado.
+        :param assinatura: Assinaturas da conexão.
+        :type assinatura: Assinatura
+        :param rg: RG da conta.
+        :type rg: str
+        :return: Se a conta estava assinada pela conexão.
+        :rtype: bool
+        """
+        with self.lock:
+            if rg not in assinatura.rgs:
+                return False
+            assinatura.rgs.discard(rg)
+            restantes = tuple(outra for outra in self.assinaturas.get(rg, ()) if outra is not assinatura)
+            if restantes:
+                self.assinaturas[rg] = restantes
+            else:
+                self.assinaturas.pop(rg, None)
+            metricas.incrementar('notificacoes.assinaturas', -1)
+        with assinatura.lock:
+            assinatura.pendentes.pop(rg, None)
+        return True
+
+    def cancelar_todas(self, assinatura: Assinatura) -> Set[str]:
+        """
+        Cancela todas as assinaturas de uma conexão, ao encerrá-la.
+        :param assinatura: Assinaturas da conexão.
+        :type assinatura: Assinatura
+        :return: Os RGs das contas que estavam assinadas.
+        :rtype: set
+        """
+        rgs = set(assinatura.rgs)
+        for rg in rgs:
+            self.cancelar(assinatura=assinatura, rg=rg)
+        return rgs
+
+    def publicar(self, saldos: Dict[str, int]) -> None:
+        """
+        Publica os novos saldos das contas alteradas às conexões que as assinam. Chamado por `Conta.aplicar`,
+        com as travas das contas mantidas.
+        :param saldos: Saldo de cada conta alterada, em centavos, por RG.
+        :type saldos: dict
+        """
+        if not self.assinaturas:
+            return
+        for rg, saldo in saldos.items():
+            for assinatura in self.assinaturas.get(rg, ()):
+                assinatura.publicar(rg=rg, saldo=saldo)
+
+    def empacotar(self, assinatura: Assinatura, codificacao: str) -> bytes:
+        """
+        Retira os saldos pendentes de uma conexão e os empacota em notificações, na codificação da conexão.
+        :param assinatura: Assinaturas da conexão.
+        :type assinatura: Assinatura
+        :param codificacao: Codificação negociada no login da conexão.
+        :type codificacao: str
+        :rtype: bytes
+        """
+        pendentes = assinatura.retirar()
+        if not pendentes:
+            return b''
+        metricas.incrementar('notificacoes.enviadas', len(pendentes))
+        notificacoes = (
+            NotificacaoSaldo(tempo=self.obter_tempo(), rg=rg, saldo=saldo) for rg, saldo in pendentes.items()
+        )
+        if codificacao == CODIFICACAO_BINARIA:
+            return b''.join(notificacao.empacotar() for notificacao in notificacoes)
+        return b''.join(notificacao.enquadrar() for notificacao in notificacoes)
+
+
+class RepasseNotificacoes:
+    """
+    Assinaturas, numa outra partição, das contas dela assinadas por clientes conectados a esta. Uma única
+    conexão com a partição responsável, aberta na primeira assinatura, recebe as notificações dessas contas,
+    que são publicadas aqui às conexões assinantes. Cada nova assinatura local é repassada, para que a
+    partição responsável envie o saldo atual pela mesma conexão, na ordem das alterações. Se a conexão cair,
+    ela é reaberta, e as contas são assinadas de novo.
+    """
+
+    def __init__(self, host: str, porta: int, notificacoes: Notificacoes) -> None:
+        """
+        Construtor da classe RepasseNotificacoes.
+        :param host: Endereço da partição responsável.
+        :type host: str
+        :param porta: Porta interna da partição responsável.
+        :type porta: int
+        :param notificacoes: Assinaturas locais, às quais as notificações recebidas são publicadas.
+        :type notificacoes: Notificacoes
+        """
+        self.host = host
+        self.porta = porta
+        self.notificacoes = notificacoes
+        # Conexões locais que assinam cada conta.
+        self.rgs: Counter = Counter()
+        self.socket: socket.socket | None = None
+        self.thread: threading.Thread | None = None
+        self.fechado = False
+        self.lock = threading.Lock()
+
+    def enviar(self, rg: str, cancelar: bool = False) -> None:
+        """
+        Envia a assinatura, ou o seu cancelamento, à partição responsável, se a conexão estiver aberta; se não
+        estiver, as contas assinadas são enviadas ao reabri-la. Deve ser chamado com o lock adquirido.
+        """
+        if self.socket is None:
+            return
+        try:
+            self.socket.sendall(OperacaoAssinar(tempo=self.notificacoes.obter_tempo(), rg=rg, cancelar=cancelar).enquadrar())
+        except OSError:
+            # A thread de leitura detecta a queda e reabre a conexão.
+            pass
+
+    def assinar(self, rg: str, nova: bool) -> None:
+        """
+        Repassa a assinatura local de uma conta, abrindo a conexão na primeira assinatura.
+        :param rg: RG da conta.
+        :type rg: str
+        :param nova: Se a conta não estava assinada pela conexão local; uma repetição apenas pede o saldo atual.
+        :type nova: bool
+        """
+        with self.lock:
+            if nova:
+                self.rgs[rg] += 1
+            self.enviar(rg)
+            if self.thread is None and not self.fechado:
+                self.thread = threading.Thread(target=self.executar, daemon=True)
+                self.thread.start()
+
+    def cancelar(self, rg: str) -> None:
+        """
+        Repassa o cancelamento da assinatura local de uma conta, cancelando-a na partição responsável
+        quando nenhuma conexão local a assina mais.
+        :param rg: RG da conta.
+        :type rg: str
+        """
+        with self.lock:
+            self.rgs[rg] -= 1
+            if self.rgs[rg] <= 0:
+                del self.rgs[rg]
+                self.enviar(rg, cancelar=True)
+
+    def executar(self) -> None:
+        """
+        Mantém a conexão com a partição responsável enquanto houver contas assinadas, publicando as
+        notificações recebidas. As respostas às assinaturas são descartadas.
+        """
+        while True:
+            with self.lock:
+                if self.fechado or not self.rgs:
+                    self.thread = None
+                    return
+            try:
+                conexao = socket.create_connection((self.host, self.porta))
+            except OSError:
+                time.sleep(INTERVALO_REPASSE)
+                continue
+            with self.lock:
+                self.socket = conexao
+                for rg in self.rgs:
+                    self.enviar(rg)
+            try:
+                with conexao.makefile('rb') as leitor:
+                    for linha in leitor:
+                        mensagem = Protocolo.analisar_resposta(linha.rstrip(SEPARADOR).decode())
+                        if isinstance(mensagem, NotificacaoSaldo):
+                            metricas.incrementar('notificacoes.repassadas')
+                            self.notificacoes.publicar(saldos={mensagem.rg: mensagem.saldo})
+            except (OSError, ValueError):
+                pass
+            finally:
+                with self.lock:
+                    self.socket = None
+                conexao.close()
+            if not self.fechado:
+                time.sleep(INTERVALO_REPASSE)
+
+    def fechar(self) -> None:
+        """
+        Fecha a conexão com a partição responsável.
+        """
+        with self.lock:
+            self.fechado = True
+            if self.socket is not None:
+                try:
+                    self.socket.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
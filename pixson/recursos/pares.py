@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import time
+import select
+import socket
+import threading
+from typing import List
+
+from pixson.recursos.protocolo import SEPARADOR, Protocolo
+
+LIMITE_CONEXAO_PAR = 10.0
+# Tempo máximo, em segundos, de cada envio e da espera pela resposta do outro processo.
+PRAZO_RESPOSTA_PAR = 5.0
+
+
+class ConexaoPar:
+    def __init__(
+            self,
+            host: str,
+            porta: int,
+            limite_conexao: float = LIMITE_CONEXAO_PAR,
+            prazo: float = PRAZO_RESPOSTA_PAR
+    ) -> None:
+        """
+        Conexão síncrona com outro processo do servidor: envia uma solicitação de texto e aguarda a resposta.
+        O destino pode ainda estar iniciando, então a conexão recusada é repetida até o limite informado.
+        Um destino que não responde no prazo faz o envio falhar com `socket.timeout`, sem que se saiba se a
+        solicitação foi processada.
+        :param host: Endereço do destino.
+        :type host: str
+        :param porta: Porta do destino.
+        :type porta: int
+        :param limite_conexao: Tempo máximo, em segundos, tentando conectar.
+        :type limite_conexao: float
+        :param prazo: Tempo máximo, em segundos, de cada conexão, envio e espera pela resposta.
+        :type prazo: float
+        """
+        fim = time.monotonic() + limite_conexao
+        while True:
+            try:
+                self.socket = socket.create_connection((host, porta), timeout=prazo)
+                break
+            except ConnectionRefusedError:
+                if time.monotonic() >= fim:
+                    raise
+                time.sleep(0.05)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.leitor = self.socket.makefile('rb')
+
+    def enviar(self, solicitacao: Protocolo) -> Protocolo:
+        """
+        Envia a solicitação e retorna a resposta do destino.
+        :param solicitacao: Solicitação a ser enviada.
+        :type solicitacao: Protocolo
+        :rtype: Protocolo
+        """
+        self.socket.sendall(solicitacao.enquadrar())
+        linha = self.leitor.readline()
+        if not linha:
+            raise ConnectionError('Conexão encerrada pelo destino')
+        return Protocolo.analisar_resposta(linha.rstrip(SEPARADOR).decode())
+
+    def ociosa(self) -> bool:
+        """
+        Verifica, sem bloquear, se a conexão parada no pool ainda pode ser usada: legível, ela foi encerrada
+        pelo destino, por exemplo num reinício, ou recebeu dados inesperados.
+        :rtype: bool
+        """
+        try:
+            legivel, _, _ = select.select([self.socket], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return not legivel
+
+    def fechar(self) -> None:
+        """
+        Fecha a conexão.
+        """
+        self.leitor.close()
+        self.socket.close()
+
+
+class PoolPar:
+    def __init__(
+            self,
+            host: str,
+            porta: int,
+            limite_conexao: float = LIMITE_CONEXAO_PAR,
+            prazo: float = PRAZO_RESPOSTA_PAR
+    ) -> None:
+        """
+        Conexões reutilizáveis com outro processo do servidor. Cada solicitação encaminhada usa uma conexão
+        livre, ou abre uma nova, de modo que solicitações concorrentes são processadas em paralelo pelo
+        destino, uma thread por conexão, e podem ser agrupadas no mesmo `fsync` do diário dele.
+        :param host: Endereço do destino.
+        :type host: str
+        :param porta: Porta do destino.
+        :type porta: int
+        :param limite_conexao: Tempo máximo, em segundos, tentando abrir cada conexão.
+        :type limite_conexao: float
+        :param prazo: Tempo máximo, em segundos, de cada envio e espera pela resposta.
+        :type prazo: float
+        """
+        self.host = host
+        self.porta = porta
+        self.limite_conexao = limite_conexao
+        self.prazo = prazo
+        self.livres: List[ConexaoPar] = []
+        self.lock = threading.Lock()
+
+    def enviar(self, solicitacao: Protocolo, idempotente: bool = False) -> Protocolo:
+        """
+        Envia a solicitação por uma conexão livre e retorna a resposta. As conexões livres encerradas pelo
+        destino, por exemplo num reinício, são descartadas antes do envio. Uma conexão que falhar durante o
+        envio é descartada, e a falha é repassada ao chamador, pois a solicitação pode ter sido processada;
+        apenas uma solicitação idempotente é repetida, uma vez, numa conexão nova.
+        :param solicitacao: Solicitação a ser enviada.
+        :type solicitacao: Protocolo
+        :param idempotente: Se a solicitação pode ser processada mais de uma vez sem efeitos adicionais.
+        :type idempotente: bool
+        :raises ConnectionRefusedError: Se o destino recusou a conexão nova, sem receber a solicitação.
+        :rtype: Protocolo
+        """
+        conexao = None
+        with self.lock:
+            while self.livres and conexao is None:
+                conexao = self.livres.pop()
+                if not conexao.ociosa():
+                    conexao.fechar()
+                    conexao = None
+        if conexao is not None:
+            try:
+                resposta = conexao.enviar(solicitacao)
+            except (OSError, ValueError):
+                conexao.fechar()
+                if not idempotente:
+                    raise
+                conexao = None
+        if conexao is None:
+            conexao = ConexaoPar(self.host, self.porta, self.limite_conexao, self.prazo)
+            try:
+                resposta = conexao.enviar(solicitacao)
+            except (OSError, ValueError):
+                conexao.fechar()
+                raise
+        with self.lock:
+            self.livres.append(conexao)
+        return resposta
+
+    def fechar(self) -> None:
+        """
+        Fecha todas as conexões livres.
+        """
+        with self.lock:
+            livres, self.livres = self.livres, []
+        for conexao in livres:
+            conexao.fechar()
@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+import zlib
+
+HOST_PARTICOES = 'localhost'
+
+
+def particao_do_rg(rg: str, particoes: int) -> int:
+    """
+    Obtém a partição responsável pela conta. Usa o CRC32 do RG, e não `hash`, que varia entre processos,
+    para que todas as partições e todas as execuções concordem sobre o dono de cada conta.
+    :param rg: RG do cliente.
+    :type rg: str
+    :param particoes: Quantidade de partições.
+    :type particoes: int
+    :rtype: int
+    """
+    return zlib.crc32(str(rg).encode()) % particoes
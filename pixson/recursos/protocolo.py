@@ -1,13 +1,119 @@
 from __future__ import annotations
-from re import match
+import re
+import struct
 from abc import abstractmethod
-
-from pixson.recursos.enums import Operacoes, Resposta
+from typing import Dict, List, Tuple, Type
+
+from pixson.recursos.enums import Operacoes, Resposta, StatusLote
+from pixson.recursos.dinheiro import PADRAO_VALOR, analisar_valor, ler_valor, validar_centavos, formatar_valor
+
+CODIFICACAO_TEXTO = 'texto'
+CODIFICACAO_BINARIA = 'binario'
+
+# Mensagens de texto são delimitadas por quebra de linha e podem ter o prefixo "id:<n>|".
+SEPARADOR = b'\n'
+PREFIXO_ID = 'id:'
+# Chave de idempotência escolhida pelo cliente, no prefixo "chave:<chave>|", depois do id da requisição.
+PREFIXO_CHAVE = 'chave:'
+PADRAO_CHAVE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+VERSAO_BINARIA = 1
+# Cabeçalho dos quadros binários: versão, opcode, comprimento da carga, id da requisição e tempo lógico.
+CABECALHO = struct.Struct('!BBIIQ')
+OPCODE_RESPOSTA = 0x80
+# Bit do opcode dos quadros cuja carga começa pela chave de idempotência, precedida do seu tamanho.
+BANDEIRA_CHAVE = 0x40
+TAMANHO_CHAVE = struct.Struct('!B')
+
+RG = struct.Struct('!10s')
+RG_VALOR = struct.Struct('!10sq')
+RG_RG_VALOR = struct.Struct('!10s10sq')
+QUANTIDADE = struct.Struct('!I')
+NO = struct.Struct('!H')
+EPOCA = struct.Struct('!Q')
+OPCODE = struct.Struct('!B')
+# Consulta do extrato: RG, chave do intervalo, início, fim, número sequencial da página e tamanho da página.
+EXTRATO = struct.Struct('!10sBQQQH')
+CHAVES_EXTRATO = ('tempo', 'instante')
+BANDEIRA = struct.Struct('!?')
+RG_BANDEIRA = struct.Struct('!10s?')
+CREDITO = struct.Struct('!HQQ10sq')
+# Opcode das notificações enviadas pelo servidor sem uma solicitação, às conexões que assinaram uma conta.
+OPCODE_NOTIFICACAO = OPCODE_RESPOSTA | 3
+# Separador do token de sessão na resposta de um login com "sessao:1".
+SEPARADOR_TOKEN = '; token: '
+
+
+def empacotar_rg(rg: str) -> bytes:
+    """
+    Converte o RG nos 10 bytes ASCII usados nos quadros binários.
+    :rtype: bytes
+    """
+    return str(rg).encode('ascii')
+
+
+def desempacotar_rg(dados: bytes) -> str:
+    """
+    Converte os 10 bytes de um RG empacotado de volta numa ‘string’. Como no protocolo de texto, o RG tem
+    de 1 a 10 dígitos: qualquer outro conteúdo, que poderia apontar para fora da pasta das contas, é recusado.
+    :raises ValueError: Se o RG não for formado apenas por dígitos.
+    :rtype: str
+    """
+    rg = dados.rstrip(b'\0').decode('ascii')
+    if not (rg.isdigit() and len(rg) <= 10):
+        raise ValueError(f'RG inválido: {rg!r}')
+    return rg
+
+
+def empacotar_rg_sessao(rg: str | None) -> bytes:
+    """
+    Converte um RG que pode ser omitido nos quadros binários: o RG omitido é enviado com 10 bytes nulos.
+    :rtype: bytes
+    """
+    return empacotar_rg(rg) if rg is not None else b''
+
+
+def desempacotar_rg_sessao(dados: bytes) -> str | None:
+    """
+    Converte um RG que pode ser omitido, retornando None se ele foi enviado com 10 bytes nulos.
+    :raises ValueError: Se o RG informado não for formado apenas por dígitos.
+    :rtype: str or None
+    """
+    return desempacotar_rg(dados) if dados.rstrip(b'\0') else None
+
+
+def campo_rg(campo: str, rg: str | None) -> str:
+    """
+    Formata o campo de RG de uma mensagem de texto, ou nada, se o RG for omitido.
+    :rtype: str
+    """
+    return f"|{campo}:{rg}" if rg is not None else ''
 
 
 class Protocolo:
     pattern = '^t:([0-9]+).*$'
+    regex = re.compile(pattern)
     tempo = 0
+    id_requisicao: int | None = None
+    chave_idempotencia: str | None = None
+    operacao: Operacoes | None = None
+    opcode = None
+    # Campo com o RG da conta que, se omitido, é a conta autenticada no login da conexão.
+    campo_sessao: str | None = None
+    estrutura: struct.Struct | None = None
+    classes_por_opcode: Dict[int, Type[Protocolo]] = {}
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        """
+        Compila a expressão da mensagem uma única vez e registra a classe pelo seu opcode,
+        para que novas mensagens sejam reconhecidas por `analisar` e `desempacotar` sem outras alterações.
+        """
+        super().__init_subclass__(**kwargs)
+        cls.regex = re.compile(cls.pattern)
+        if cls.operacao is not None:
+            cls.opcode = cls.operacao.value
+        if cls.opcode is not None:
+            Protocolo.classes_por_opcode[cls.opcode] = cls
 
     @abstractmethod
     def encapsular(self) -> str:
@@ -34,100 +140,772 @@ class Protocolo:
         :type mensagem: str
         :rtype: int
         """
-        return int(match(Protocolo.pattern, mensagem).group(1))
+        return int(Protocolo.regex.match(mensagem).group(1))
+
+    @staticmethod
+    def separar_id(mensagem: str) -> Tuple[int | None, str]:
+        """
+        Separa o id da requisição, se houver, do restante da mensagem de texto.
+        :param mensagem: Mensagem recebida, sem o separador.
+        :type mensagem: str
+        :return: Id da requisição, ou None, e a mensagem sem o prefixo.
+        :rtype: tuple
+        """
+        if not mensagem.startswith(PREFIXO_ID):
+            return None, mensagem
+        id_requisicao, _, mensagem = mensagem[len(PREFIXO_ID):].partition('|')
+        if not id_requisicao.isdigit():
+            raise ValueError(f'Id de requisição inválido: {id_requisicao}')
+        return int(id_requisicao), mensagem
+
+    @staticmethod
+    def validar_chave(chave: str) -> str:
+        """
+        Valida a chave de idempotência: de 1 a 64 letras, dígitos, '-' ou '_'.
+        :rtype: str
+        """
+        if not PADRAO_CHAVE.match(chave):
+            raise ValueError(f'Chave de idempotência inválida: {chave}')
+        return chave
+
+    @staticmethod
+    def separar_chave(mensagem: str) -> Tuple[str | None, str]:
+        """
+        Separa a chave de idempotência, se houver, do restante da mensagem de texto.
+        :param mensagem: Mensagem recebida, sem o separador e sem o id da requisição.
+        :type mensagem: str
+        :return: Chave de idempotência, ou None, e a mensagem sem o prefixo.
+        :rtype: tuple
+        """
+        if not mensagem.startswith(PREFIXO_CHAVE):
+            return None, mensagem
+        chave, _, mensagem = mensagem[len(PREFIXO_CHAVE):].partition('|')
+        return Protocolo.validar_chave(chave), mensagem
+
+    def enquadrar(self) -> bytes:
+        """
+        Encapsula o objeto numa mensagem de texto delimitada, com os prefixos do id da requisição e da chave
+        de idempotência, se houver.
+        :rtype: bytes
+        """
+        mensagem = self.encapsular()
+        if self.chave_idempotencia is not None:
+            mensagem = f"{PREFIXO_CHAVE}{self.chave_idempotencia}|{mensagem}"
+        if self.id_requisicao is not None:
+            mensagem = f"{PREFIXO_ID}{self.id_requisicao}|{mensagem}"
+        return mensagem.encode() + SEPARADOR
+
+    @staticmethod
+    def analisar(mensagem: str) -> Protocolo:
+        """
+        Desencapsula uma solicitação de texto com uma única leitura: o opcode é extraído do campo `op`
+        e seleciona a classe da mensagem, cuja expressão compilada valida e extrai os campos.
+        Os prefixos opcionais com o id da requisição e a chave de idempotência são preservados em
+        `id_requisicao` e `chave_idempotencia`.
+        :param mensagem: Mensagem a ser analisada.
+        :type mensagem: str
+        :rtype: Protocolo
+        """
+        id_requisicao, mensagem = Protocolo.separar_id(mensagem)
+        chave, mensagem = Protocolo.separar_chave(mensagem)
+        _, _, resto = mensagem.partition('|op:')
+        opcode, _, _ = resto.partition('|')
+        classe = Protocolo.classes_por_opcode.get(int(opcode)) if opcode.isdigit() else None
+        if classe is None or classe.operacao is None:
+            raise ValueError(f'Operação desconhecida: {mensagem}')
+        try:
+            solicitacao = classe.desencapsular(mensagem)
+        except (AttributeError, ValueError):
+            raise ValueError(f'Mensagem inválida: {mensagem}')
+        solicitacao.id_requisicao = id_requisicao
+        solicitacao.chave_idempotencia = chave
+        return solicitacao
+
+    @staticmethod
+    def analisar_resposta(mensagem: str) -> Protocolo:
+        """
+        Desencapsula uma resposta de texto do servidor, ou uma notificação de uma conta assinada,
+        preservando o id da requisição.
+        :param mensagem: Resposta recebida, sem o separador.
+        :type mensagem: str
+        :rtype: RespostaSucesso or RespostaErro or RespostaLote or NotificacaoSaldo
+        """
+        id_requisicao, mensagem = Protocolo.separar_id(mensagem)
+        if RespostaSucesso.regex.match(mensagem):
+            resposta = RespostaSucesso.desencapsular(mensagem)
+        elif RespostaLote.regex.match(mensagem):
+            resposta = RespostaLote.desencapsular(mensagem)
+        elif NotificacaoSaldo.regex.match(mensagem):
+            resposta = NotificacaoSaldo.desencapsular(mensagem)
+        else:
+            resposta = RespostaErro.desencapsular(mensagem)
+        resposta.id_requisicao = id_requisicao
+        return resposta
+
+    def empacotar_carga(self) -> bytes:
+        """
+        Empacota os campos da mensagem, sem o cabeçalho.
+        :rtype: bytes
+        """
+        return b''
+
+    @classmethod
+    @abstractmethod
+    def desempacotar_carga(cls, tempo: int, carga: bytes) -> Protocolo:
+        """
+        Cria a mensagem a partir do tempo do cabeçalho e dos campos empacotados.
+        :param tempo: Tempo lógico do cabeçalho.
+        :type tempo: int
+        :param carga: Campos empacotados.
+        :type carga: bytes
+        """
+        pass
+
+    def empacotar(self) -> bytes:
+        """
+        Empacota o objeto num quadro binário: cabeçalho de tamanho fixo seguido dos campos. A chave de
+        idempotência, se houver, é marcada no opcode e precede os campos.
+        :rtype: bytes
+        """
+        carga = self.empacotar_carga()
+        opcode = self.opcode
+        if self.chave_idempotencia is not None:
+            chave = self.chave_idempotencia.encode('ascii')
+            carga = TAMANHO_CHAVE.pack(len(chave)) + chave + carga
+            opcode |= BANDEIRA_CHAVE
+        return CABECALHO.pack(VERSAO_BINARIA, opcode, len(carga), self.id_requisicao or 0, self.tempo) + carga
+
+    @staticmethod
+    def ler_cabecalho(dados: bytes) -> Tuple[int, int, int, int]:
+        """
+        Lê o cabeçalho de um quadro binário.
+        :param dados: Quadro binário, ou ao menos os seus primeiros `CABECALHO.size` bytes.
+        :type dados: bytes
+        :return: Opcode, comprimento da carga, id da requisição e tempo lógico.
+        :rtype: tuple
+        """
+        versao, opcode, comprimento, id_requisicao, tempo = CABECALHO.unpack_from(dados)
+        if versao != VERSAO_BINARIA:
+            raise ValueError(f'Versão do protocolo binário não suportada: {versao}')
+        return opcode, comprimento, id_requisicao, tempo
+
+    @staticmethod
+    def desempacotar(dados: bytes) -> Protocolo:
+        """
+        Desempacota um quadro binário completo na mensagem correspondente ao seu opcode.
+        :param dados: Quadro binário.
+        :type dados: bytes
+        """
+        opcode, comprimento, id_requisicao, tempo = Protocolo.ler_cabecalho(dados)
+        carga = dados[CABECALHO.size:CABECALHO.size + comprimento]
+        chave = None
+        if opcode & BANDEIRA_CHAVE:
+            opcode &= ~BANDEIRA_CHAVE
+            tamanho, = TAMANHO_CHAVE.unpack_from(carga)
+            fim = TAMANHO_CHAVE.size + tamanho
+            chave = Protocolo.validar_chave(carga[TAMANHO_CHAVE.size:fim].decode('ascii'))
+            carga = carga[fim:]
+        classe = Protocolo.classes_por_opcode.get(opcode)
+        if classe is None:
+            raise ValueError(f'Opcode desconhecido: {opcode}')
+        mensagem = classe.desempacotar_carga(tempo, carga)
+        mensagem.id_requisicao = id_requisicao
+        mensagem.chave_idempotencia = chave
+        return mensagem
 
 
 class OperacaoSaldo(Protocolo):
-    pattern = '^t:([0-9]+)\|op:1\|rg:([0-9]{1,10})$'
+    pattern = '^t:([0-9]+)\|op:1(?:\|rg:([0-9]{1,10}))?$'
+    operacao = Operacoes.SALDO
+    estrutura = RG
+    campo_sessao = 'rg'
 
-    def __init__(self, tempo: int, rg: str):
+    def __init__(self, tempo: int, rg: str | None):
         self.tempo = tempo
         self.rg = rg
 
     def encapsular(self) -> str:
-        return f"t:{self.tempo}|op:{Operacoes.SALDO.value}|rg:{self.rg}"
+        return f"t:{self.tempo}|op:{Operacoes.SALDO.value}{campo_rg('rg', self.rg)}"
 
     @staticmethod
     def desencapsular(mensagem: str) -> OperacaoSaldo:
-        tempo, rg = match(OperacaoSaldo.pattern, mensagem).groups()
-        return OperacaoSaldo(tempo=int(tempo), rg=str(rg))
+        tempo, rg = OperacaoSaldo.regex.match(mensagem).groups()
+        return OperacaoSaldo(tempo=int(tempo), rg=rg)
+
+    def empacotar_carga(self) -> bytes:
+        return self.estrutura.pack(empacotar_rg_sessao(self.rg))
+
+    @classmethod
+    def desempacotar_carga(cls, tempo: int, carga: bytes) -> OperacaoSaldo:
+        rg, = cls.estrutura.unpack(carga)
+        return OperacaoSaldo(tempo=tempo, rg=desempacotar_rg_sessao(rg))
 
 
 class OperacaoSaque(Protocolo):
-    pattern = r'^t:([0-9]+)\|op:2\|rg:([0-9]{1,10})\|valor:(.*)$'
+    pattern = rf'^t:([0-9]+)\|op:2(?:\|rg:([0-9]{{1,10}}))?\|valor:{PADRAO_VALOR}$'
+    operacao = Operacoes.SAQUE
+    estrutura = RG_VALOR
+    campo_sessao = 'rg'
 
-    def __init__(self, tempo: int, rg: str, valor: float):
+    def __init__(self, tempo: int, rg: str | None, valor: int):
         self.tempo = tempo
         self.rg = rg
         self.valor = valor
 
     def encapsular(self) -> str:
-        return f"t:{self.tempo}|op:{Operacoes.SAQUE.value}|rg:{self.rg}|valor:{self.valor}"
+        return f"t:{self.tempo}|op:{Operacoes.SAQUE.value}{campo_rg('rg', self.rg)}|valor:{formatar_valor(self.valor)}"
 
     @staticmethod
     def desencapsular(mensagem: str) -> OperacaoSaque:
-        tempo, rg, valor = match(OperacaoSaque.pattern, mensagem).groups()
-        return OperacaoSaque(tempo=int(tempo), rg=str(rg), valor=float(valor))
+        tempo, rg, valor = OperacaoSaque.regex.match(mensagem).groups()
+        return OperacaoSaque(tempo=int(tempo), rg=rg, valor=analisar_valor(valor))
+
+    def empacotar_carga(self) -> bytes:
+        return self.estrutura.pack(empacotar_rg_sessao(self.rg), self.valor)
+
+    @classmethod
+    def desempacotar_carga(cls, tempo: int, carga: bytes) -> OperacaoSaque:
+        rg, centavos = cls.estrutura.unpack(carga)
+        return OperacaoSaque(tempo=tempo, rg=desempacotar_rg_sessao(rg), valor=validar_centavos(centavos))
 
 
 class OperacaoDeposito(Protocolo):
-    pattern = r'^t:([0-9]+)\|op:3\|rg:([0-9]{1,10})\|valor:(.*)$'
+    pattern = rf'^t:([0-9]+)\|op:3(?:\|rg:([0-9]{{1,10}}))?\|valor:{PADRAO_VALOR}$'
+    operacao = Operacoes.DEPOSITO
+    estrutura = RG_VALOR
+    campo_sessao = 'rg'
 
-    def __init__(self, tempo: int, rg: str, valor: float):
+    def __init__(self, tempo: int, rg: str | None, valor: int):
         self.tempo = tempo
         self.rg = rg
         self.valor = valor
 
     def encapsular(self) -> str:
-        return f"t:{self.tempo}|op:{Operacoes.DEPOSITO.value}|rg:{self.rg}|valor:{self.valor}"
+        return f"t:{self.tempo}|op:{Operacoes.DEPOSITO.value}{campo_rg('rg', self.rg)}|valor:{formatar_valor(self.valor)}"
 
     @staticmethod
     def desencapsular(mensagem: str) -> OperacaoDeposito:
-        tempo, rg, valor = match(OperacaoDeposito.pattern, mensagem).groups()
-        return OperacaoDeposito(tempo=int(tempo), rg=str(rg), valor=float(valor))
+        tempo, rg, valor = OperacaoDeposito.regex.match(mensagem).groups()
+        return OperacaoDeposito(tempo=int(tempo), rg=rg, valor=analisar_valor(valor))
+
+    def empacotar_carga(self) -> bytes:
+        return self.estrutura.pack(empacotar_rg_sessao(self.rg), self.valor)
+
+    @classmethod
+    def desempacotar_carga(cls, tempo: int, carga: bytes) -> OperacaoDeposito:
+        rg, centavos = cls.estrutura.unpack(carga)
+        return OperacaoDeposito(tempo=tempo, rg=desempacotar_rg_sessao(rg), valor=validar_centavos(centavos))
 
 
 class OperacaoTransferencia(Protocolo):
-    pattern = r'^t:([0-9]+)\|op:4\|rg_origem:([0-9]{1,10})\|rg_destino:([0-9]{1,10})\|valor:(.*)$'
+    pattern = rf'^t:([0-9]+)\|op:4(?:\|rg_origem:([0-9]{{1,10}}))?\|rg_destino:([0-9]{{1,10}})\|valor:{PADRAO_VALOR}$'
+    operacao = Operacoes.TRANSFERENCIA
+    estrutura = RG_RG_VALOR
+    campo_sessao = 'rg_origem'
 
-    def __init__(self, tempo: int, rg_origem: str, rg_destino: str, valor: float):
+    def __init__(self, tempo: int, rg_origem: str | None, rg_destino: str, valor: int):
         self.tempo = tempo
         self.rg_origem = rg_origem
         self.rg_destino = rg_destino
         self.valor = valor
 
     def encapsular(self) -> str:
-        return f"t:{self.tempo}|op:{Operacoes.TRANSFERENCIA.value}|rg_origem:{self.rg_origem}|rg_destino:{self.rg_destino}|valor:{self.valor}"
+        return f"t:{self.tempo}|op:{Operacoes.TRANSFERENCIA.value}{campo_rg('rg_origem', self.rg_origem)}|rg_destino:{self.rg_destino}|valor:{formatar_valor(self.valor)}"
 
     @staticmethod
     def desencapsular(mensagem: str) -> OperacaoTransferencia:
-        tempo, rg_origem, rg_destino, valor = match(OperacaoTransferencia.pattern, mensagem).groups()
+        tempo, rg_origem, rg_destino, valor = OperacaoTransferencia.regex.match(mensagem).groups()
         return OperacaoTransferencia(
             tempo=int(tempo),
-            rg_origem=str(rg_origem),
+            rg_origem=rg_origem,
             rg_destino=str(rg_destino),
-            valor=float(valor)
+            valor=analisar_valor(valor)
         )
 
+    def empacotar_carga(self) -> bytes:
+        return self.estrutura.pack(empacotar_rg_sessao(self.rg_origem), empacotar_rg(self.rg_destino), self.valor)
 
+    @classmethod
+    def desempacotar_carga(cls, tempo: int, carga: bytes) -> OperacaoTransferencia:
+        rg_origem, rg_destino, centavos = cls.estrutura.unpack(carga)
+        return OperacaoTransferencia(
+            tempo=tempo,
+            rg_origem=desempacotar_rg_sessao(rg_origem),
+            rg_destino=desempacotar_rg(rg_destino),
+            valor=validar_centavos(centavos)
+        )
+
+
+# Com "sessao:1", a resposta do login traz um token de sessão, com o qual uma nova conexão retoma a sessão
+# por `OperacaoRetomar`, sem um novo login.
 class OperacaoLogin(Protocolo):
-    pattern = r'^t:([0-9]+)\|op:6\|rg:([0-9]{1,10})$'
+    pattern = r'^t:([0-9]+)\|op:6\|rg:([0-9]{1,10})(?:\|cod:(texto|binario))?(?:\|sessao:([01]))?$'
+    operacao = Operacoes.LOGIN
+    estrutura = RG
 
-    def __init__(self, tempo: int, rg: str):
+    def __init__(self, tempo: int, rg: str, codificacao: str = CODIFICACAO_TEXTO, sessao: bool = False):
         self.tempo = tempo
         self.rg = rg
+        self.codificacao = codificacao
+        self.sessao = sessao
 
     def encapsular(self) -> str:
-        return f"t:{self.tempo}|op:{Operacoes.LOGIN.value}|rg:{self.rg}"
+        mensagem = f"t:{self.tempo}|op:{Operacoes.LOGIN.value}|rg:{self.rg}"
+        if self.codificacao != CODIFICACAO_TEXTO:
+            mensagem += f"|cod:{self.codificacao}"
+        if self.sessao:
+            mensagem += "|sessao:1"
+        return mensagem
 
     @staticmethod
     def desencapsular(mensagem: str) -> OperacaoLogin:
-        tempo, rg = match(OperacaoLogin.pattern, mensagem).groups()
-        return OperacaoLogin(tempo=int(tempo), rg=str(rg))
+        tempo, rg, codificacao, sessao = OperacaoLogin.regex.match(mensagem).groups()
+        return OperacaoLogin(tempo=int(tempo), rg=str(rg), codificacao=codificacao or CODIFICACAO_TEXTO, sessao=sessao == '1')
+
+    def empacotar_carga(self) -> bytes:
+        # A bandeira da sessão é enviada apenas quando solicitada, mantendo o quadro dos logins anteriores.
+        if self.sessao:
+            return RG_BANDEIRA.pack(empacotar_rg(self.rg), True)
+        return self.estrutura.pack(empacotar_rg(self.rg))
+
+    @classmethod
+    def desempacotar_carga(cls, tempo: int, carga: bytes) -> OperacaoLogin:
+        if len(carga) == RG_BANDEIRA.size:
+            rg, sessao = RG_BANDEIRA.unpack(carga)
+        else:
+            (rg,), sessao = cls.estrutura.unpack(carga), False
+        return OperacaoLogin(tempo=tempo, rg=desempacotar_rg(rg), codificacao=CODIFICACAO_BINARIA, sessao=sessao)
+
+
+class OperacaoLote(Protocolo):
+    pattern = r'^t:([0-9]+)\|op:7\|itens:(.*)$'
+    operacao = Operacoes.LOTE
+    classes_itens = (OperacaoSaque, OperacaoDeposito, OperacaoTransferencia)
+
+    def __init__(self, tempo: int, itens: List[OperacaoSaque | OperacaoDeposito | OperacaoTransferencia]):
+        self.tempo = tempo
+        self.itens = itens
+
+    @staticmethod
+    def encapsular_item(item: Protocolo) -> str:
+        """
+        Encapsula uma operação do lote como opcode e campos separados por vírgula.
+        :rtype: str
+        """
+        if isinstance(item, OperacaoTransferencia):
+            return f"{item.opcode},{item.rg_origem},{item.rg_destino},{formatar_valor(item.valor)}"
+        return f"{item.opcode},{item.rg},{formatar_valor(item.valor)}"
+
+    @staticmethod
+    def desencapsular_item(tempo: int, texto: str) -> Protocolo:
+        """
+        Desencapsula uma operação do lote.
+        :rtype: Protocolo
+        """
+        opcode, *campos = texto.split(',')
+        classe = Protocolo.classes_por_opcode.get(int(opcode))
+        if classe not in OperacaoLote.classes_itens:
+            raise ValueError(f'Operação não permitida em lote: {opcode}')
+        *rgs, valor = campos
+        if len(rgs) != (2 if classe is OperacaoTransferencia else 1):
+            raise ValueError(f'Campos inválidos na operação do lote: {texto}')
+        if not all(rg.isdigit() and len(rg) <= 10 for rg in rgs):
+            raise ValueError(f'RG inválido na operação do lote: {texto}')
+        return classe(tempo, *rgs, ler_valor(valor))
+
+    def encapsular(self) -> str:
+        itens = ';'.join(OperacaoLote.encapsular_item(item) for item in self.itens)
+        return f"t:{self.tempo}|op:{Operacoes.LOTE.value}|itens:{itens}"
+
+    @staticmethod
+    def desencapsular(mensagem: str) -> OperacaoLote:
+        tempo, itens = OperacaoLote.regex.match(mensagem).groups()
+        tempo = int(tempo)
+        return OperacaoLote(
+            tempo=tempo,
+            itens=[OperacaoLote.desencapsular_item(tempo, item) for item in itens.split(';') if item]
+        )
+
+    def empacotar_carga(self) -> bytes:
+        partes = [QUANTIDADE.pack(len(self.itens))]
+        for item in self.itens:
+            partes.append(OPCODE.pack(item.opcode))
+            partes.append(item.empacotar_carga())
+        return b''.join(partes)
+
+    @classmethod
+    def desempacotar_carga(cls, tempo: int, carga: bytes) -> OperacaoLote:
+        quantidade, = QUANTIDADE.unpack_from(carga)
+        posicao = QUANTIDADE.size
+        itens = []
+        for _ in range(quantidade):
+            opcode, = OPCODE.unpack_from(carga, posicao)
+            classe = Protocolo.classes_por_opcode.get(opcode)
+            if classe not in OperacaoLote.classes_itens:
+                raise ValueError(f'Operação não permitida em lote: {opcode}')
+            posicao += OPCODE.size
+            item = classe.desempacotar_carga(tempo, carga[posicao:posicao + classe.estrutura.size])
+            if getattr(item, item.campo_sessao) is None:
+                raise ValueError('RG omitido na operação do lote')
+            itens.append(item)
+            posicao += classe.estrutura.size
+        return OperacaoLote(tempo=tempo, itens=itens)
+
+
+class OperacaoEstatisticas(Protocolo):
+    pattern = r'^t:([0-9]+)\|op:8$'
+    operacao = Operacoes.ESTATISTICAS
+
+    def __init__(self, tempo: int):
+        self.tempo = tempo
+
+    def encapsular(self) -> str:
+        return f"t:{self.tempo}|op:{Operacoes.ESTATISTICAS.value}"
+
+    @staticmethod
+    def desencapsular(mensagem: str) -> OperacaoEstatisticas:
+        tempo, = OperacaoEstatisticas.regex.match(mensagem).groups()
+        return OperacaoEstatisticas(tempo=int(tempo))
+
+    @classmethod
+    def desempacotar_carga(cls, tempo: int, carga: bytes) -> OperacaoEstatisticas:
+        return OperacaoEstatisticas(tempo=tempo)
+
+
+# Alteração replicada pelo líder: o saldo final, em centavos, de cada conta envolvida, identificado pela época
+# da liderança, pelo tempo lógico do líder e pelo número do nó dele. A mensagem leva também os nós que recebem
+# as alterações na visão do líder; sem saldos, é o batimento periódico que mantém a concessão das réplicas.
+class OperacaoReplicar(Protocolo):
+    pattern = r'^t:([0-9]+)\|op:9\|no:([0-9]+)\|epoca:([0-9]+)\|ativos:((?:[0-9]+,?)*)\|saldos:((?:[0-9]{1,10}=-?[0-9]{1,18};?)*)$'
+    operacao = Operacoes.REPLICAR
+
+    def __init__(self, tempo: int, no: int, epoca: int, ativos: List[int], saldos: Dict[str, int]):
+        self.tempo = tempo
+        self.no = no
+        self.epoca = epoca
+        self.ativos = ativos
+        self.saldos = saldos
+
+    def encapsular(self) -> str:
+        ativos = ','.join(map(str, self.ativos))
+        saldos = ';'.join(f"{rg}={saldo}" for rg, saldo in self.saldos.items())
+        return f"t:{self.tempo}|op:{Operacoes.REPLICAR.value}|no:{self.no}|epoca:{self.epoca}|ativos:{ativos}|saldos:{saldos}"
+
+    @staticmethod
+    def desencapsular(mensagem: str) -> OperacaoReplicar:
+        tempo, no, epoca, ativos, saldos = OperacaoReplicar.regex.match(mensagem).groups()
+        itens = (item.partition('=') for item in saldos.split(';') if item)
+        return OperacaoReplicar(
+            tempo=int(tempo),
+            no=int(no),
+            epoca=int(epoca),
+            ativos=[int(outro) for outro in ativos.split(',') if outro],
+            saldos={rg: int(saldo) for rg, _, saldo in itens}
+        )
+
+    def empacotar_carga(self) -> bytes:
+        partes = [NO.pack(self.no), EPOCA.pack(self.epoca), QUANTIDADE.pack(len(self.ativos))]
+        partes.extend(NO.pack(outro) for outro in self.ativos)
+        partes.append(QUANTIDADE.pack(len(self.saldos)))
+        partes.extend(RG_VALOR.pack(empacotar_rg(rg), saldo) for rg, saldo in self.saldos.items())
+        return b''.join(partes)
+
+    @classmethod
+    def desempacotar_carga(cls, tempo: int, carga: bytes) -> OperacaoReplicar:
+        no, = NO.unpack_from(carga)
+        epoca, = EPOCA.unpack_from(carga, NO.size)
+        posicao = NO.size + EPOCA.size
+        quantidade, = QUANTIDADE.unpack_from(carga, posicao)
+        posicao += QUANTIDADE.size
+        ativos = []
+        for _ in range(quantidade):
+            outro, = NO.unpack_from(carga, posicao)
+            ativos.append(outro)
+            posicao += NO.size
+        quantidade, = QUANTIDADE.unpack_from(carga, posicao)
+        posicao += QUANTIDADE.size
+        saldos = {}
+        for _ in range(quantidade):
+            rg, centavos = RG_VALOR.unpack_from(carga, posicao)
+            saldos[desempacotar_rg(rg)] = centavos
+            posicao += RG_VALOR.size
+        return OperacaoReplicar(tempo=tempo, no=no, epoca=epoca, ativos=ativos, saldos=saldos)
+
+
+class OperacaoEstado(Protocolo):
+    pattern = r'^t:([0-9]+)\|op:10\|no:([0-9]+)$'
+    operacao = Operacoes.ESTADO
+    estrutura = NO
+
+    def __init__(self, tempo: int, no: int):
+        self.tempo = tempo
+        self.no = no
+
+    def encapsular(self) -> str:
+        return f"t:{self.tempo}|op:{Operacoes.ESTADO.value}|no:{self.no}"
+
+    @staticmethod
+    def desencapsular(mensagem: str) -> OperacaoEstado:
+        tempo, no = OperacaoEstado.regex.match(mensagem).groups()
+        return OperacaoEstado(tempo=int(tempo), no=int(no))
+
+    def empacotar_carga(self) -> bytes:
+        return self.estrutura.pack(self.no)
+
+    @classmethod
+    def desempacotar_carga(cls, tempo: int, carga: bytes) -> OperacaoEstado:
+        no, = cls.estrutura.unpack(carga)
+        return OperacaoEstado(tempo=tempo, no=no)
+
+
+# Consulta de uma página do extrato, do movimento mais recente para o mais antigo. O intervalo, inclusivo,
+# é de tempo lógico ou, com "por:instante", de milissegundos desde a época; "antes" é o número sequencial
+# retornado pela página anterior. Nos quadros binários, os campos omitidos são enviados com zero.
+class OperacaoExtrato(Protocolo):
+    pattern = (
+        r'^t:([0-9]+)\|op:11(?:\|rg:([0-9]{1,10}))?(?:\|de:([0-9]{1,18}))?(?:\|ate:([0-9]{1,18}))?'
+        r'(?:\|por:(tempo|instante))?(?:\|antes:([0-9]{1,18}))?(?:\|limite:([0-9]{1,4}))?$'
+    )
+    operacao = Operacoes.EXTRATO
+    estrutura = EXTRATO
+    campo_sessao = 'rg'
+
+    def __init__(
+            self,
+            tempo: int,
+            rg: str | None,
+            inicio: int | None = None,
+            fim: int | None = None,
+            chave: str = CHAVES_EXTRATO[0],
+            antes: int | None = None,
+            limite: int | None = None
+    ):
+        self.tempo = tempo
+        self.rg = rg
+        self.inicio = inicio
+        self.fim = fim
+        self.chave = chave
+        self.antes = antes
+        self.limite = limite
+
+    def encapsular(self) -> str:
+        campos = [f"t:{self.tempo}|op:{Operacoes.EXTRATO.value}{campo_rg('rg', self.rg)}"]
+        if self.inicio is not None:
+            campos.append(f"|de:{self.inicio}")
+        if self.fim is not None:
+            campos.append(f"|ate:{self.fim}")
+        if self.chave != CHAVES_EXTRATO[0]:
+            campos.append(f"|por:{self.chave}")
+        if self.antes is not None:
+            campos.append(f"|antes:{self.antes}")
+        if self.limite is not None:
+            campos.append(f"|limite:{self.limite}")
+        return ''.join(campos)
+
+    @staticmethod
+    def desencapsular(mensagem: str) -> OperacaoExtrato:
+        tempo, rg, inicio, fim, chave, antes, limite = OperacaoExtrato.regex.match(mensagem).groups()
+        return OperacaoExtrato(
+            tempo=int(tempo),
+            rg=rg,
+            inicio=int(inicio) if inicio is not None else None,
+            fim=int(fim) if fim is not None else None,
+            chave=chave or CHAVES_EXTRATO[0],
+            antes=int(antes) if antes is not None else None,
+            limite=int(limite) if limite is not None else None
+        )
+
+    def empacotar_carga(self) -> bytes:
+        return self.estrutura.pack(
+            empacotar_rg_sessao(self.rg), CHAVES_EXTRATO.index(self.chave), self.inicio or 0, self.fim or 0,
+            self.antes or 0, self.limite or 0
+        )
+
+    @classmethod
+    def desempacotar_carga(cls, tempo: int, carga: bytes) -> OperacaoExtrato:
+        rg, chave, inicio, fim, antes, limite = cls.estrutura.unpack(carga)
+        if chave >= len(CHAVES_EXTRATO):
+            raise ValueError(f'Chave do extrato inválida: {chave}')
+        return OperacaoExtrato(
+            tempo=tempo, rg=desempacotar_rg_sessao(rg), inicio=inicio or None, fim=fim or None,
+            chave=CHAVES_EXTRATO[chave], antes=antes or None, limite=limite or None
+        )
+
+
+# Consulta do relatório dos agregados de todas as contas; com "verificar:1", o servidor inicia em segundo plano
+# uma varredura de todas as contas, cujo resultado é comparado com os agregados mantidos por ele.
+class OperacaoRelatorio(Protocolo):
+    pattern = r'^t:([0-9]+)\|op:12(?:\|verificar:([01]))?$'
+    operacao = Operacoes.RELATORIO
+    estrutura = BANDEIRA
+
+    def __init__(self, tempo: int, verificar: bool = False):
+        self.tempo = tempo
+        self.verificar = verificar
+
+    def encapsular(self) -> str:
+        return f"t:{self.tempo}|op:{Operacoes.RELATORIO.value}" + ("|verificar:1" if self.verificar else '')
+
+    @staticmethod
+    def desencapsular(mensagem: str) -> OperacaoRelatorio:
+        tempo, verificar = OperacaoRelatorio.regex.match(mensagem).groups()
+        return OperacaoRelatorio(tempo=int(tempo), verificar=verificar == '1')
+
+    def empacotar_carga(self) -> bytes:
+        return self.estrutura.pack(self.verificar)
+
+    @classmethod
+    def desempacotar_carga(cls, tempo: int, carga: bytes) -> OperacaoRelatorio:
+        verificar, = cls.estrutura.unpack(carga)
+        return OperacaoRelatorio(tempo=tempo, verificar=verificar)
+
+
+# Assinatura das alterações de saldo de uma conta: o servidor passa a enviar à conexão uma `NotificacaoSaldo`
+# a cada alteração, agrupando as alterações seguidas; com "cancelar:1", a assinatura é desfeita.
+class OperacaoAssinar(Protocolo):
+    pattern = r'^t:([0-9]+)\|op:13(?:\|rg:([0-9]{1,10}))?(?:\|cancelar:([01]))?$'
+    operacao = Operacoes.ASSINAR
+    estrutura = RG_BANDEIRA
+    campo_sessao = 'rg'
+
+    def __init__(self, tempo: int, rg: str | None, cancelar: bool = False):
+        self.tempo = tempo
+        self.rg = rg
+        self.cancelar = cancelar
+
+    def encapsular(self) -> str:
+        mensagem = f"t:{self.tempo}|op:{Operacoes.ASSINAR.value}{campo_rg('rg', self.rg)}"
+        return mensagem + ("|cancelar:1" if self.cancelar else '')
+
+    @staticmethod
+    def desencapsular(mensagem: str) -> OperacaoAssinar:
+        tempo, rg, cancelar = OperacaoAssinar.regex.match(mensagem).groups()
+        return OperacaoAssinar(tempo=int(tempo), rg=rg, cancelar=cancelar == '1')
+
+    def empacotar_carga(self) -> bytes:
+        return self.estrutura.pack(empacotar_rg_sessao(self.rg), self.cancelar)
+
+    @classmethod
+    def desempacotar_carga(cls, tempo: int, carga: bytes) -> OperacaoAssinar:
+        rg, cancelar = cls.estrutura.unpack(carga)
+        return OperacaoAssinar(tempo=tempo, rg=desempacotar_rg_sessao(rg), cancelar=cancelar)
+
+
+# Saldo atual de uma conta assinada, enviado pelo servidor sem id de requisição. Alterações seguidas da
+# mesma conta podem ser agrupadas numa única notificação, com o saldo após a última delas.
+class NotificacaoSaldo(Protocolo):
+    pattern = r'^t:([0-9]+)\|evento:saldo\|rg:([0-9]{1,10})\|saldo:(-?[0-9]{1,15}\.[0-9]{2})$'
+    opcode = OPCODE_NOTIFICACAO
+    estrutura = RG_VALOR
+
+    def __init__(self, tempo: int, rg: str, saldo: int):
+        self.tempo = tempo
+        self.rg = rg
+        self.saldo = saldo
+
+    def encapsular(self) -> str:
+        return f"t:{self.tempo}|evento:saldo|rg:{self.rg}|saldo:{formatar_valor(self.saldo)}"
+
+    @staticmethod
+    def desencapsular(mensagem: str) -> NotificacaoSaldo:
+        tempo, rg, saldo = NotificacaoSaldo.regex.match(mensagem).groups()
+        negativo = saldo.startswith('-')
+        centavos = analisar_valor(saldo.lstrip('-'))
+        return NotificacaoSaldo(tempo=int(tempo), rg=rg, saldo=-centavos if negativo else centavos)
+
+    def empacotar_carga(self) -> bytes:
+        return self.estrutura.pack(empacotar_rg(self.rg), self.saldo)
+
+    @classmethod
+    def desempacotar_carga(cls, tempo: int, carga: bytes) -> NotificacaoSaldo:
+        rg, saldo = cls.estrutura.unpack(carga)
+        return NotificacaoSaldo(tempo=tempo, rg=desempacotar_rg(rg), saldo=saldo)
+
+
+# Retomada, numa nova conexão, da sessão de um login anterior com "sessao:1", pelo token da resposta dele. Como
+# no login, a mensagem é enviada em texto e define a codificação das mensagens seguintes.
+class OperacaoRetomar(Protocolo):
+    pattern = r'^t:([0-9]+)\|op:14\|token:([0-9]{1,10}\.[0-9]{1,12}\.[0-9a-f]{32})(?:\|cod:(texto|binario))?$'
+    operacao = Operacoes.RETOMAR
+
+    def __init__(self, tempo: int, token: str, codificacao: str = CODIFICACAO_TEXTO):
+        self.tempo = tempo
+        self.token = token
+        self.codificacao = codificacao
+
+    def encapsular(self) -> str:
+        mensagem = f"t:{self.tempo}|op:{Operacoes.RETOMAR.value}|token:{self.token}"
+        if self.codificacao != CODIFICACAO_TEXTO:
+            mensagem += f"|cod:{self.codificacao}"
+        return mensagem
+
+    @staticmethod
+    def desencapsular(mensagem: str) -> OperacaoRetomar:
+        tempo, token, codificacao = OperacaoRetomar.regex.match(mensagem).groups()
+        return OperacaoRetomar(tempo=int(tempo), token=token, codificacao=codificacao or CODIFICACAO_TEXTO)
+
+    def empacotar_carga(self) -> bytes:
+        return self.token.encode('ascii')
+
+    @classmethod
+    def desempacotar_carga(cls, tempo: int, carga: bytes) -> OperacaoRetomar:
+        return OperacaoRetomar(tempo=tempo, token=carga.decode('ascii'), codificacao=CODIFICACAO_BINARIA)
+
+
+# Crédito de uma transferência entre partições, enviado pela partição da conta de origem à da conta de destino
+# pela porta interna. O id identifica a transferência na partição de origem, para que um crédito repetido não
+# seja aplicado duas vezes; "resolvidas" indica que todas as transferências de ids menores da origem já foram
+# creditadas ou estornadas, e que o destino pode esquecê-las.
+class OperacaoCredito(Protocolo):
+    pattern = rf'^t:([0-9]+)\|op:15\|particao:([0-9]+)\|id:([0-9]+)\|resolvidas:([0-9]+)\|rg:([0-9]{{1,10}})\|valor:{PADRAO_VALOR}$'
+    operacao = Operacoes.CREDITO
+    estrutura = CREDITO
+
+    def __init__(self, tempo: int, particao: int, id: int, resolvidas: int, rg: str, valor: int):
+        self.tempo = tempo
+        self.particao = particao
+        self.id = id
+        self.resolvidas = resolvidas
+        self.rg = rg
+        self.valor = valor
+
+    def encapsular(self) -> str:
+        return (
+            f"t:{self.tempo}|op:{Operacoes.CREDITO.value}|particao:{self.particao}|id:{self.id}"
+            f"|resolvidas:{self.resolvidas}|rg:{self.rg}|valor:{formatar_valor(self.valor)}"
+        )
+
+    @staticmethod
+    def desencapsular(mensagem: str) -> OperacaoCredito:
+        tempo, particao, id, resolvidas, rg, valor = OperacaoCredito.regex.match(mensagem).groups()
+        return OperacaoCredito(
+            tempo=int(tempo),
+            particao=int(particao),
+            id=int(id),
+            resolvidas=int(resolvidas),
+            rg=rg,
+            valor=analisar_valor(valor)
+        )
+
+    def empacotar_carga(self) -> bytes:
+        return self.estrutura.pack(self.particao, self.id, self.resolvidas, empacotar_rg(self.rg), self.valor)
+
+    @classmethod
+    def desempacotar_carga(cls, tempo: int, carga: bytes) -> OperacaoCredito:
+        particao, id, resolvidas, rg, centavos = cls.estrutura.unpack(carga)
+        return OperacaoCredito(
+            tempo=tempo,
+            particao=particao,
+            id=id,
+            resolvidas=resolvidas,
+            rg=desempacotar_rg(rg),
+            valor=validar_centavos(centavos)
+        )
 
 
 class RespostaSucesso(Protocolo):
     pattern = r'^t:([0-9]+)\|s:0\|resposta:(.*)$'
+    opcode = OPCODE_RESPOSTA | Resposta.OK.value
 
     def __init__(self, tempo: int, resposta: str):
         self.tempo = tempo
@@ -138,12 +916,20 @@ class RespostaSucesso(Protocolo):
 
     @staticmethod
     def desencapsular(mensagem: str) -> RespostaSucesso:
-        tempo, resposta = match(RespostaSucesso.pattern, mensagem).groups()
+        tempo, resposta = RespostaSucesso.regex.match(mensagem).groups()
         return RespostaSucesso(tempo=int(tempo), resposta=str(resposta))
 
+    def empacotar_carga(self) -> bytes:
+        return self.resposta.encode()
+
+    @classmethod
+    def desempacotar_carga(cls, tempo: int, carga: bytes) -> RespostaSucesso:
+        return RespostaSucesso(tempo=tempo, resposta=carga.decode())
+
 
 class RespostaErro(Protocolo):
     pattern = r'^t:([0-9]+)\|s:1\|resposta:(.*)$'
+    opcode = OPCODE_RESPOSTA | Resposta.ERRO.value
 
     def __init__(self, tempo: int, resposta: str):
         self.tempo = tempo
@@ -154,5 +940,37 @@ class RespostaErro(Protocolo):
 
     @staticmethod
     def desencapsular(mensagem: str) -> RespostaErro:
-        tempo, resposta = match(RespostaErro.pattern, mensagem).groups()
+        tempo, resposta = RespostaErro.regex.match(mensagem).groups()
         return RespostaErro(tempo=int(tempo), resposta=str(resposta))
+
+    def empacotar_carga(self) -> bytes:
+        return self.resposta.encode()
+
+    @classmethod
+    def desempacotar_carga(cls, tempo: int, carga: bytes) -> RespostaErro:
+        return RespostaErro(tempo=tempo, resposta=carga.decode())
+
+
+class RespostaLote(Protocolo):
+    pattern = r'^t:([0-9]+)\|s:0\|status:([0-9]*)$'
+    opcode = OPCODE_RESPOSTA | 2
+
+    def __init__(self, tempo: int, status: List[StatusLote]):
+        self.tempo = tempo
+        self.status = status
+
+    def encapsular(self) -> str:
+        status = ''.join(str(item.value) for item in self.status)
+        return f"t:{self.tempo}|s:{Resposta.OK.value}|status:{status}"
+
+    @staticmethod
+    def desencapsular(mensagem: str) -> RespostaLote:
+        tempo, status = RespostaLote.regex.match(mensagem).groups()
+        return RespostaLote(tempo=int(tempo), status=[StatusLote(int(item)) for item in status])
+
+    def empacotar_carga(self) -> bytes:
+        return bytes(item.value for item in self.status)
+
+    @classmethod
+    def desempacotar_carga(cls, tempo: int, carga: bytes) -> RespostaLote:
+        return RespostaLote(tempo=tempo, status=[StatusLote(item) for item in carga])
@@ -0,0 +1,483 @@
+from __future__ import annotations
+
+import time
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Set, Tuple
+
+from pixson.recursos.enums import Operacoes
+from pixson.recursos.metricas import metricas, registro
+from pixson.recursos.pares import PoolPar
+from pixson.recursos.protocolo import OperacaoReplicar, RespostaErro
+
+# Versão de uma conta: época da liderança, tempo lógico do líder que a alterou e número do nó dele,
+# comparados nessa ordem.
+Versao = Tuple[int, int, int]
+VERSAO_INICIAL: Versao = (0, 0, -1)
+HOST_REPLICAS = 'localhost'
+# Tempo máximo, em segundos, de cada envio de uma alteração ou batimento e da espera pela resposta.
+PRAZO_REPLICACAO = 0.5
+# Intervalo, em segundos, entre os batimentos do líder e entre as tentativas de um nó sem líder de encontrá-lo.
+INTERVALO_BATIMENTO = 0.2
+# Falhas seguidas após as quais o líder retira um nó do grupo.
+LIMITE_FALHAS = 3
+# Tempo, em segundos, desde a última mensagem do líder durante o qual uma réplica atende consultas.
+PRAZO_CONCESSAO = 2.0
+# Respostas de um nó à alteração ou ao pedido de estado que não vêm do líder atual.
+EPOCA_ANTIGA = 'Época antiga'
+NAO_LIDER = 'Nó não é o líder'
+
+
+class ForaDoGrupo(Exception):
+    """
+    O líder não conseguiu replicar uma alteração à maioria do grupo, ou foi substituído por outro líder.
+    """
+
+
+class Replicacao:
+    """
+    Estado de um nó do grupo de réplicas. Apenas o líder aplica as alterações, que são enviadas a todos os
+    nós ativos antes da resposta ao cliente, e só as confirma se a maioria do grupo, contando com ele, as
+    recebeu; os demais nós encaminham as alterações ao líder e respondem às consultas com as suas próprias
+    cópias das contas.
+
+    Cada liderança tem uma época, maior que a de todas as anteriores. O líder envia um batimento aos nós
+    ativos a cada `INTERVALO_BATIMENTO` segundos, e cada mensagem renova a concessão da réplica: por
+    `PRAZO_CONCESSAO` segundos, ela atende consultas e encaminha as escritas ao líder. O líder retira do grupo
+    um nó que falhou `LIMITE_FALHAS` vezes seguidas e, antes de confirmar outras alterações, aguarda a
+    concessão dele expirar, para que ele não responda consultas com saldos antigos. Um nó sem concessão
+    responde às consultas com `Réplica desatualizada` e procura o líder, pelas estatísticas dos outros nós:
+    se houver um, copia o estado das contas dele e volta ao grupo; se não houver, e a maioria do grupo
+    responder, o nó ativo de menor número entre os que acompanharam o último líder assume uma nova época.
+    Uma alteração de uma época anterior é recusada, e o líder que a enviou deixa a liderança.
+
+    Cada alteração carrega o saldo final das contas e a versão (época, tempo de Lamport do líder, número do
+    nó). Uma réplica só aplica uma alteração mais recente que a última aplicada a cada conta, de modo que
+    alterações repetidas ou recebidas fora de ordem não têm efeito.
+    """
+
+    def __init__(self, no: int, portas: List[int]) -> None:
+        """
+        Construtor da classe Replicacao.
+        :param no: Número deste nó, o índice da sua porta na lista.
+        :type no: int
+        :param portas: Portas de todos os nós do grupo, na mesma ordem em todos eles.
+        :type portas: list
+        """
+        self.no = no
+        self.maioria = len(portas) // 2 + 1
+        # Alterações, batimentos e consultas entre os nós, com o prazo curto da detecção de falhas.
+        self.pares: Dict[int, PoolPar] = {
+            outro: PoolPar(HOST_REPLICAS, porta, limite_conexao=0, prazo=PRAZO_REPLICACAO)
+            for outro, porta in enumerate(portas) if outro != no
+        }
+        # Escritas encaminhadas ao líder e cópias do estado, que podem demorar mais.
+        self.encaminhamentos: Dict[int, PoolPar] = {
+            outro: PoolPar(HOST_REPLICAS, porta, limite_conexao=0) for outro, porta in enumerate(portas) if outro != no
+        }
+        self.epoca = 0
+        # Época cujo estado das contas este nó tem: a inicial, das pastas, ou a do líder de quem o copiou.
+        self.sincronizada = 0
+        self.lider_atual: int | None = None
+        # Nós que recebem as alterações na visão do líder, e o tempo da mensagem de onde ela veio.
+        self.ativos: Set[int] = set(range(len(portas)))
+        self.tempo_ativos = -1
+        self.contato = float('-inf')
+        self.concessao = float('-inf')
+        self.falhas: Dict[int, int] = {}
+        self.exclusao = float('-inf')
+        self.versoes: Dict[str, Versao] = {}
+        self.lock = threading.Lock()
+        # Alterações acumuladas por `adiar`, por thread.
+        self.locais = threading.local()
+        self.obter_tempo: Callable[[], int] = lambda: 0
+        self.atualizar_tempo: Callable[[int], None] = lambda tempo: None
+
+    def iniciar(self, obter_tempo: Callable[[], int], atualizar_tempo: Callable[[int], None]) -> None:
+        """
+        Associa o relógio lógico do servidor, usado para versionar e propagar as alterações.
+        :param obter_tempo: Incrementa o relógio e retorna o tempo atualizado.
+        :type obter_tempo: callable
+        :param atualizar_tempo: Atualiza o relógio com um tempo recebido.
+        :type atualizar_tempo: callable
+        """
+        self.obter_tempo = obter_tempo
+        self.atualizar_tempo = atualizar_tempo
+
+    def eh_lider(self) -> bool:
+        """
+        Indica se este nó é o líder.
+        :rtype: bool
+        """
+        return self.lider_atual == self.no
+
+    def lider(self) -> int | None:
+        """
+        Obtém o número do líder a quem as escritas são encaminhadas, ou None se este nó não tem uma
+        concessão vigente do líder.
+        :rtype: int or None
+        """
+        with self.lock:
+            if self.lider_atual == self.no or time.monotonic() - self.contato < PRAZO_CONCESSAO:
+                return self.lider_atual
+            return None
+
+    def atualizada(self) -> bool:
+        """
+        Indica se este nó pode responder às consultas: o líder, enquanto a maioria do grupo confirma os
+        seus batimentos, e uma réplica, enquanto tem a concessão do líder cujo estado copiou.
+        :rtype: bool
+        """
+        agora = time.monotonic()
+        with self.lock:
+            if self.lider_atual == self.no:
+                return agora < self.concessao
+            return (
+                self.lider_atual is not None and self.sincronizada == self.epoca and self.no in self.ativos
+                and agora - self.contato < PRAZO_CONCESSAO
+            )
+
+    def com_maioria(self) -> bool:
+        """
+        Indica se os nós ativos formam a maioria do grupo, condição para o líder aplicar uma alteração.
+        :rtype: bool
+        """
+        with self.lock:
+            return len(self.ativos) >= self.maioria
+
+    def informacoes(self) -> Dict:
+        """
+        Retorna a visão deste nó sobre o grupo, publicada nas estatísticas e usada pelos outros nós
+        para encontrar o líder.
+        :rtype: dict
+        """
+        atualizada = self.atualizada()
+        with self.lock:
+            return {
+                'no': self.no,
+                'epoca': self.epoca,
+                'lider': self.lider_atual,
+                'ativos': sorted(self.ativos),
+                'sincronizada': self.sincronizada == self.epoca,
+                'atualizada': atualizada,
+            }
+
+    def receber(self, no: int, epoca: int, tempo: int, ativos: List[int]) -> bool:
+        """
+        Registra uma mensagem do líder e renova a concessão deste nó, se ele estiver entre os ativos e
+        tiver o estado da época do líder.
+        :param no: Número do nó que enviou a mensagem.
+        :type no: int
+        :param epoca: Época do remetente.
+        :type epoca: int
+        :param tempo: Tempo lógico da mensagem.
+        :type tempo: int
+        :param ativos: Nós que recebem as alterações na visão do remetente.
+        :type ativos: list
+        :return: Falso se o remetente é de uma época anterior e não é mais o líder.
+        :rtype: bool
+        """
+        with self.lock:
+            if epoca < self.epoca or (epoca == self.epoca and self.lider_atual == self.no and no > self.no):
+                return False
+            if epoca > self.epoca or self.lider_atual != no:
+                if self.lider_atual == self.no:
+                    registro.warning('Nó %d deixou a liderança; novo líder: %d', self.no, no)
+                self.epoca = epoca
+                self.lider_atual = no
+                self.tempo_ativos = -1
+            if tempo > self.tempo_ativos:
+                self.ativos = set(ativos)
+                self.tempo_ativos = tempo
+            if self.no in self.ativos and self.sincronizada == epoca:
+                self.contato = time.monotonic()
+        return True
+
+    def assumir(self, epoca: int) -> None:
+        """
+        Assume a liderança numa época posterior à informada, inicialmente sem outros nós ativos, que
+        voltam ao grupo ao copiar o estado das contas.
+        :param epoca: Maior época conhecida no grupo.
+        :type epoca: int
+        """
+        with self.lock:
+            self.epoca = epoca + 1
+            self.sincronizada = self.epoca
+            self.lider_atual = self.no
+            self.ativos = {self.no}
+            self.falhas.clear()
+            # Os nós têm uma concessão para voltar ao grupo antes que o líder sem maioria a deixe.
+            self.concessao = time.monotonic()
+        metricas.incrementar('replicacao.liderancas')
+        registro.warning('Nó %d assumiu a liderança na época %d', self.no, self.epoca)
+
+    def destituir(self) -> None:
+        """
+        Deixa a liderança, por ter sido substituído ou por ter perdido a maioria do grupo.
+        """
+        with self.lock:
+            if self.lider_atual != self.no:
+                return
+            self.lider_atual = None
+            self.concessao = float('-inf')
+        registro.warning('Nó %d deixou a liderança', self.no)
+
+    def bater(self) -> None:
+        """
+        Envia o batimento do líder aos nós ativos e deixa a liderança se a maioria do grupo não o confirma
+        há mais de `PRAZO_CONCESSAO` segundos além da concessão, pois outro nó pode ter assumido.
+        """
+        try:
+            self.replicar({})
+        except ForaDoGrupo:
+            return
+        with self.lock:
+            expirada = time.monotonic() > self.concessao + PRAZO_CONCESSAO
+        if expirada:
+            self.destituir()
+
+    def incluir(self, no: int) -> None:
+        """
+        Inclui no grupo um nó que está copiando o estado das contas, para que ele passe a receber as alterações.
+        :param no: Número do nó.
+        :type no: int
+        """
+        with self.lock:
+            self.ativos.add(no)
+            self.falhas[no] = 0
+
+    def falhar(self, no: int) -> bool:
+        """
+        Registra uma falha de comunicação com um nó ativo e o retira do grupo após `LIMITE_FALHAS` falhas
+        seguidas. As alterações seguintes só são confirmadas depois de a concessão dele expirar.
+        :param no: Número do nó.
+        :type no: int
+        :return: Se o nó foi retirado do grupo.
+        :rtype: bool
+        """
+        with self.lock:
+            if no not in self.ativos:
+                return True
+            self.falhas[no] = self.falhas.get(no, 0) + 1
+            if self.falhas[no] < LIMITE_FALHAS:
+                return False
+            self.ativos.discard(no)
+            self.exclusao = max(self.exclusao, time.monotonic() + PRAZO_CONCESSAO + PRAZO_REPLICACAO)
+        metricas.incrementar('replicacao.falhas')
+        registro.warning('Nó %d retirado do grupo pelo líder %d', no, self.no)
+        return True
+
+    def avaliar(self, visoes: Dict[int, Dict]) -> Tuple[str, int] | None:
+        """
+        Decide, a partir das visões dos outros nós que responderam, o que um nó sem concessão deve fazer.
+        Sem um líder, apenas um nó que tem o estado da última época, e que os nós dela ainda veem como ativo,
+        pode assumir, e somente com a maioria do grupo respondendo e nenhum nó com uma concessão vigente.
+        :param visoes: Visão de cada nó que respondeu, por número do nó.
+        :type visoes: dict
+        :return: ('seguir', líder), ('assumir', época atual) ou None, para aguardar.
+        :rtype: tuple or None
+        """
+        visoes = {**visoes, self.no: self.informacoes()}
+        lideres = [(visao['epoca'], no) for no, visao in visoes.items() if visao['lider'] == no and no != self.no]
+        if lideres and max(lideres)[0] >= self.epoca:
+            return 'seguir', max(lideres)[1]
+        if any(visao['atualizada'] for visao in visoes.values()) or len(visoes) < self.maioria:
+            return None
+        epoca = max(visao['epoca'] for visao in visoes.values())
+        ultimas = [visao for visao in visoes.values() if visao['epoca'] == epoca]
+        candidatos = set.intersection(*(set(visao['ativos']) for visao in ultimas))
+        elegiveis = sorted(visao['no'] for visao in ultimas if visao['sincronizada'] and visao['no'] in candidatos)
+        if elegiveis and elegiveis[0] == self.no:
+            return 'assumir', epoca
+        return None
+
+    def versao(self, rg: str) -> Versao:
+        """
+        Obtém a versão da última alteração aplicada à conta.
+        :rtype: tuple
+        """
+        with self.lock:
+            return self.versoes.get(rg, VERSAO_INICIAL)
+
+    def filtrar_recentes(self, saldos: Dict[str, Tuple[int, Versao]]) -> Dict[str, int]:
+        """
+        Seleciona os saldos mais recentes que os já aplicados e registra as suas versões.
+        O chamador deve manter as travas das contas até aplicá-los.
+        :param saldos: Saldo e versão de cada conta.
+        :type saldos: dict
+        :return: Saldo de cada conta que deve ser aplicado.
+        :rtype: dict
+        """
+        recentes = {}
+        with self.lock:
+            for rg, (saldo, versao) in saldos.items():
+                if versao > self.versoes.get(rg, VERSAO_INICIAL):
+                    self.versoes[rg] = versao
+                    recentes[rg] = saldo
+        return recentes
+
+    def adotar_estado(self, lider: int, tempo: int, estado: Dict) -> Dict[str, int]:
+        """
+        Adota o estado das contas copiado do líder e a visão dele sobre o grupo. Os saldos locais de épocas
+        anteriores são substituídos, mesmo que mais recentes, pois podem ter alterações que o líder anterior
+        não confirmou; apenas os já recebidos do próprio líder, depois da cópia, são mantidos.
+        O chamador deve manter as travas de todas as contas até aplicá-los.
+        :param lider: Número do líder.
+        :type lider: int
+        :param tempo: Tempo lógico da resposta do líder.
+        :type tempo: int
+        :param estado: Época, nós ativos e saldo e versão de cada conta, como enviados pelo líder.
+        :type estado: dict
+        :return: Saldo de cada conta que deve ser aplicado.
+        :rtype: dict
+        """
+        epoca = estado['epoca']
+        adotados = {}
+        with self.lock:
+            if epoca < self.epoca:
+                return adotados
+            for rg, (saldo, *versao) in estado['contas'].items():
+                versao = tuple(versao)
+                local = self.versoes.get(rg, VERSAO_INICIAL)
+                if local[0] == epoca and local >= versao:
+                    continue
+                self.versoes[rg] = versao
+                adotados[rg] = saldo
+            self.epoca = epoca
+            self.sincronizada = epoca
+            self.lider_atual = lider
+            if tempo > self.tempo_ativos:
+                self.ativos = set(estado['ativos'])
+                self.tempo_ativos = tempo
+            self.contato = time.monotonic()
+        return adotados
+
+    def preparar(self, saldos: Dict[str, int]) -> OperacaoReplicar:
+        """
+        Versiona uma alteração, ou um batimento, com o tempo lógico atual e a visão do líder sobre o grupo.
+        :param saldos: Saldo final de cada conta alterada, em centavos, por RG; vazio num batimento.
+        :type saldos: dict
+        :raises ForaDoGrupo: Se este nó não é mais o líder.
+        :rtype: OperacaoReplicar
+        """
+        with self.lock:
+            if self.lider_atual != self.no:
+                raise ForaDoGrupo()
+            replica = OperacaoReplicar(
+                tempo=self.obter_tempo(), no=self.no, epoca=self.epoca, ativos=sorted(self.ativos), saldos=saldos
+            )
+            for rg in saldos:
+                self.versoes[rg] = (replica.epoca, replica.tempo, self.no)
+        return replica
+
+    def difundir(self, replica: OperacaoReplicar) -> bool:
+        """
+        Envia uma alteração, ou um batimento, a todos os nós ativos, repetindo o envio a cada nó até
+        `LIMITE_FALHAS` vezes. Se algum nó for retirado do grupo, um batimento leva a nova visão do grupo aos
+        demais, para que nenhum deles eleja o nó retirado, e a alteração só é confirmada depois de a
+        concessão dele expirar. A maioria que confirma a mensagem renova a concessão do líder.
+        :param replica: Mensagem versionada por `preparar`.
+        :type replica: OperacaoReplicar
+        :raises ForaDoGrupo: Se outro nó assumiu a liderança numa época posterior.
+        :return: Se a maioria do grupo, contando com o líder, recebeu a mensagem.
+        :rtype: bool
+        """
+        inicio = time.monotonic()
+        with self.lock:
+            destinos = sorted(self.ativos - {self.no})
+        confirmacoes = 1
+        retirados = False
+        for no in destinos:
+            resposta = None
+            while resposta is None:
+                try:
+                    resposta = self.pares[no].enviar(replica, idempotente=True)
+                except (OSError, ValueError):
+                    if self.falhar(no):
+                        retirados = True
+                        break
+            if resposta is None:
+                continue
+            if isinstance(resposta, RespostaErro) and resposta.resposta == EPOCA_ANTIGA:
+                self.destituir()
+                raise ForaDoGrupo()
+            self.atualizar_tempo(resposta.tempo)
+            with self.lock:
+                self.falhas[no] = 0
+            confirmacoes += 1
+        if retirados:
+            self.difundir(self.preparar({}))
+
+        maioria = confirmacoes >= self.maioria
+        with self.lock:
+            if maioria and self.lider_atual == self.no:
+                self.concessao = max(self.concessao, inicio + PRAZO_CONCESSAO)
+            espera = self.exclusao - time.monotonic()
+        if replica.saldos and espera > 0:
+            time.sleep(espera)
+        return maioria
+
+    def replicar(self, saldos: Dict[str, int]) -> bool:
+        """
+        Versiona e envia uma alteração, ou um batimento, a todos os nós ativos; ver `difundir`.
+        :param saldos: Saldo final de cada conta alterada, em centavos, por RG; vazio num batimento.
+        :type saldos: dict
+        :raises ForaDoGrupo: Se este nó não é mais o líder.
+        :return: Se a maioria do grupo, contando com o líder, recebeu a mensagem.
+        :rtype: bool
+        """
+        return self.difundir(self.preparar(saldos))
+
+    @contextmanager
+    def adiar(self) -> Iterator[List[OperacaoReplicar]]:
+        """
+        Acumula as alterações registradas pela thread atual, já versionadas, em vez de enviá-las, para que
+        sejam enviadas por `confirmar` depois de liberadas as travas das contas.
+        :return: Lista das alterações acumuladas.
+        :rtype: Iterator[List[OperacaoReplicar]]
+        """
+        self.locais.adiadas = []
+        try:
+            yield self.locais.adiadas
+        finally:
+            self.locais.adiadas = None
+
+    def confirmar(self, adiadas: List[OperacaoReplicar]) -> None:
+        """
+        Envia as alterações acumuladas por `adiar` aos demais nós ativos, aguardando as respostas.
+        :param adiadas: Alterações acumuladas.
+        :type adiadas: list
+        :raises ForaDoGrupo: Se alguma alteração não chegou à maioria do grupo, e não pode ser confirmada ao
+        cliente.
+        """
+        while adiadas:
+            if not self.difundir(adiadas.pop(0)):
+                raise ForaDoGrupo()
+            metricas.incrementar('replicacao.alteracoes')
+
+    def registrar(self, operacao: Operacoes, saldos: Dict[str, int]) -> None:
+        """
+        Versiona uma alteração aplicada pelo líder e a envia aos demais nós ativos. Chamado por `Conta.aplicar`,
+        com as travas das contas mantidas, para que as versões de cada conta sigam a ordem em que as alterações
+        foram aplicadas; dentro de `adiar`, a alteração só é acumulada, e o envio fica para depois das travas.
+        Alterações recebidas de outro nó não são reenviadas.
+        :param operacao: Operação que originou a alteração.
+        :type operacao: Operacoes
+        :param saldos: Saldo final de cada conta envolvida, em centavos, por RG.
+        :type saldos: dict
+        :raises ForaDoGrupo: Se a alteração não chegou à maioria do grupo, e não pode ser confirmada ao cliente.
+        """
+        if operacao == Operacoes.REPLICAR or not saldos or not self.eh_lider():
+            return
+        adiadas = getattr(self.locais, 'adiadas', None)
+        if adiadas is not None:
+            adiadas.append(self.preparar(saldos))
+            return
+        self.confirmar([self.preparar(saldos)])
+
+    def fechar(self) -> None:
+        """
+        Fecha as conexões com os outros nós.
+        """
+        for par in (*self.pares.values(), *self.encaminhamentos.values()):
+            par.fechar()
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import hmac
+import time
+import hashlib
+import secrets
+import threading
+from typing import TYPE_CHECKING, Dict, Iterable, Set
+
+from pixson.recursos.metricas import metricas
+
+if TYPE_CHECKING:
+    from pixson.recursos.conexao import Conexao
+    from pixson.recursos.conta import Conta
+
+# Validade, em segundos, dos tokens de sessão emitidos no login.
+VALIDADE_TOKEN_PADRAO = 3600.0
+# Caracteres hexadecimais da assinatura do token (128 bits).
+TAMANHO_ASSINATURA_TOKEN = 32
+
+
+class Sessoes:
+    """
+    Contas autenticadas nas conexões. Após o login, a conexão guarda a própria conta, e as operações
+    seguintes sobre ela, com ou sem o RG, usam essa conta fixada sem consultá-la no armazém ou no disco.
+
+    A conta fixada continua válida enquanto as alterações da conta forem aplicadas a ela. Se outra conexão
+    alterar a mesma conta por outro objeto, como ocorre sem o armazém em memória ou depois de a conta ser
+    descartada dele e lida de novo, `Conta.aplicar` invalida a conta fixada, que é obtida novamente na
+    próxima operação. Como a invalidação ocorre com a trava da conta mantida, uma conexão que lê a conta
+    fixada sob a mesma trava nunca observa um saldo desatualizado.
+    """
+
+    def __init__(self) -> None:
+        """
+        Construtor da classe Sessoes.
+        """
+        self.conexoes: Dict[str, Set[Conexao]] = {}
+        self.lock = threading.Lock()
+
+    def fixar(self, conexao: Conexao, rg: str, conta: Conta | None) -> None:
+        """
+        Associa a conta autenticada à conexão, substituindo a de um login anterior.
+        O chamador deve manter a trava da conta.
+        :param conexao: Conexão do cliente.
+        :type conexao: Conexao
+        :param rg: RG da conta autenticada.
+        :type rg: str
+        :param conta: Conta autenticada, ou None se ela pertence a outra partição.
+        :type conta: Conta or None
+        """
+        self.liberar(conexao)
+        with self.lock:
+            self.conexoes.setdefault(rg, set()).add(conexao)
+        conexao.rg = rg
+        conexao.conta = conta
+
+    def liberar(self, conexao: Conexao) -> None:
+        """
+        Desfaz a associação da conexão com a sua conta, ao encerrá-la ou num novo login.
+        :param conexao: Conexão do cliente.
+        :type conexao: Conexao
+        """
+        if conexao.rg is None:
+            return
+        with self.lock:
+            conexoes = self.conexoes.get(conexao.rg)
+            if conexoes is not None:
+                conexoes.discard(conexao)
+                if not conexoes:
+                    del self.conexoes[conexao.rg]
+        conexao.rg = None
+        conexao.conta = None
+
+    def invalidar(self, contas: Iterable[Conta]) -> None:
+        """
+        Invalida as contas fixadas em outros objetos que não os alterados. Chamado por `Conta.aplicar`,
+        com as travas das contas mantidas.
+        :param contas: Contas alteradas.
+        :type contas: Iterable[Conta]
+        """
+        invalidadas = 0
+        with self.lock:
+            for conta in contas:
+                for conexao in self.conexoes.get(conta.rg, ()):
+                    if conexao.conta is not None and conexao.conta is not conta:
+                        conexao.conta = None
+                        invalidadas += 1
+        if invalidadas:
+            metricas.incrementar('sessoes.invalidadas', invalidadas)
+
+
+class TokensSessao:
+    """
+    Tokens de sessão, emitidos no login com "sessao:1" e apresentados por uma nova conexão para retomar a
+    sessão sem um novo login. O token leva o RG autenticado e o instante, em segundos desde a época, em que
+    expira, assinados por HMAC-SHA256 com o segredo do servidor: a validação não guarda estado nem consulta
+    a conta, e as partições, que compartilham o segredo, aceitam os tokens emitidos por qualquer uma delas.
+
+    Um token não pode ser revogado antes de expirar. Sem um segredo informado, cada início do servidor sorteia
+    um novo, e os tokens emitidos antes dele deixam de ser aceitos.
+    """
+
+    def __init__(self, segredo: bytes | None = None, validade: float = VALIDADE_TOKEN_PADRAO) -> None:
+        """
+        Construtor da classe TokensSessao.
+        :param segredo: Chave do HMAC dos tokens. Por padrão, 32 bytes sorteados.
+        :type segredo: bytes or None
+        :param validade: Tempo, em segundos, durante o qual cada token é aceito.
+        :type validade: float
+        """
+        self.segredo = segredo if segredo is not None else secrets.token_bytes(32)
+        self.validade = validade
+
+    def assinar(self, rg: str, expira: str) -> str:
+        """
+        Calcula a assinatura do RG e do instante de expiração de um token.
+        :rtype: str
+        """
+        mensagem = f'{rg}.{expira}'.encode('ascii')
+        return hmac.new(self.segredo, mensagem, hashlib.sha256).hexdigest()[:TAMANHO_ASSINATURA_TOKEN]
+
+    def emitir(self, rg: str) -> str:
+        """
+        Emite um token da sessão autenticada com o RG, no formato "rg.expira.assinatura".
+        :param rg: RG autenticado no login.
+        :type rg: str
+        :rtype: str
+        """
+        expira = str(int(time.time() + self.validade))
+        metricas.incrementar('sessoes.tokens_emitidos')
+        return f'{rg}.{expira}.{self.assinar(rg, expira)}'
+
+    def validar(self, token: str) -> str | None:
+        """
+        Valida um token de sessão.
+        :param token: Token recebido do cliente.
+        :type token: str
+        :return: O RG da sessão, ou None se o token for inválido ou tiver expirado.
+        :rtype: str or None
+        """
+        rg, _, resto = token.partition('.')
+        expira, _, assinatura = resto.partition('.')
+        if not expira.isdigit() or int(expira) < time.time():
+            return None
+        if not hmac.compare_digest(assinatura, self.assinar(rg, expira)):
+            return None
+        return rg
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import ssl
+
+
+def criar_contexto_servidor(certificado: str, chave: str | None = None) -> ssl.SSLContext:
+    """
+    Cria o contexto TLS do servidor, a partir de TLS 1.2. O OpenSSL emite tickets de sessão, com chaves
+    sorteadas a cada início do processo, e mantém o cache de sessões do TLS 1.2: um cliente que reconecta
+    com a sessão da conexão anterior retoma a sessão sem a troca de chaves e sem o envio do certificado.
+    :param certificado: Arquivo PEM com o certificado do servidor e, opcionalmente, a cadeia e a chave privada.
+    :type certificado: str
+    :param chave: Arquivo PEM com a chave privada, se não estiver no arquivo do certificado.
+    :type chave: str or None
+    :rtype: ssl.SSLContext
+    """
+    contexto = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    contexto.minimum_version = ssl.TLSVersion.TLSv1_2
+    contexto.load_cert_chain(certfile=certificado, keyfile=chave)
+    return contexto
+
+
+def criar_contexto_cliente(ca: str | None = None, verificar: bool = True) -> ssl.SSLContext:
+    """
+    Cria o contexto TLS do cliente, a partir de TLS 1.2, que verifica o certificado e o nome do servidor.
+    :param ca: Arquivo PEM com os certificados das autoridades aceitas, ou o próprio certificado do servidor,
+    se for autoassinado. Por padrão, as autoridades do sistema.
+    :type ca: str or None
+    :param verificar: Se o certificado do servidor é verificado. Desativar apenas em testes locais.
+    :type verificar: bool
+    :rtype: ssl.SSLContext
+    """
+    contexto = ssl.create_default_context(cafile=ca)
+    contexto.minimum_version = ssl.TLSVersion.TLSv1_2
+    if not verificar:
+        contexto.check_hostname = False
+        contexto.verify_mode = ssl.CERT_NONE
+    return contexto
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import time
+import threading
+from typing import Dict, List, Set
+
+from pixson.recursos.diario import AnexoDiario
+
+# Intervalo, em segundos, entre as tentativas de resolver as transferências pendentes.
+INTERVALO_RESOLUCAO = 1.0
+
+
+class TransferenciasPendentes(AnexoDiario):
+    """
+    Transferências entre partições já debitadas na partição de origem cujo crédito ainda não foi confirmado
+    nem estornado. Cada transferência recebe um id crescente, enviado com o crédito, para que a partição de
+    destino não o aplique duas vezes quando ele é reenviado após uma falha ambígua, em que não se sabe se o
+    crédito chegou.
+
+    O débito registra a transferência no diário, na anotação "transferencia", e a confirmação ou o estorno
+    a remove, na anotação "concluida"; assim, as transferências pendentes sobrevivem a uma queda e são
+    conservadas nos checkpoints. Os ids das transferências em andamento são reservados, para que apenas uma
+    thread envie o crédito de cada uma.
+    """
+
+    def __init__(self) -> None:
+        """
+        Construtor da classe TransferenciasPendentes.
+        """
+        # Para cada id: partição de destino, RGs de origem e de destino e valor, em centavos.
+        self.pendentes: Dict[int, Dict] = {}
+        self.reservadas: Set[int] = set()
+        self.proximo = 0
+        self.lock = threading.Lock()
+
+    def criar(self, particao: int, origem: str, destino: str, valor: int) -> Dict:
+        """
+        Cria uma transferência, com um id maior que o de todas as anteriores, inclusive as de execuções
+        anteriores, e a reserva para a thread que a debita. A transferência só fica pendente quando o débito
+        é aplicado com a anotação "transferencia".
+        :param particao: Partição da conta de destino.
+        :type particao: int
+        :param origem: RG da conta de origem.
+        :type origem: str
+        :param destino: RG da conta de destino.
+        :type destino: str
+        :param valor: Valor transferido, em centavos.
+        :type valor: int
+        :rtype: dict
+        """
+        with self.lock:
+            self.proximo = max(self.proximo + 1, time.time_ns() // 1000)
+            self.reservadas.add(self.proximo)
+            return {'id': self.proximo, 'particao': particao, 'origem': origem, 'destino': destino, 'valor': valor}
+
+    def reservar(self, id: int) -> bool:
+        """
+        Reserva uma transferência pendente para reenviar o crédito dela.
+        :return: Se a transferência ainda estava pendente e não estava reservada por outra thread.
+        :rtype: bool
+        """
+        with self.lock:
+            if id not in self.pendentes or id in self.reservadas:
+                return False
+            self.reservadas.add(id)
+            return True
+
+    def liberar(self, id: int) -> None:
+        """
+        Libera a reserva de uma transferência.
+        """
+        with self.lock:
+            self.reservadas.discard(id)
+
+    def livres(self) -> List[Dict]:
+        """
+        Lista as transferências pendentes que não estão reservadas, das mais antigas às mais recentes.
+        :rtype: List[Dict]
+        """
+        with self.lock:
+            return [self.pendentes[id] for id in sorted(self.pendentes) if id not in self.reservadas]
+
+    def resolvidas(self) -> int:
+        """
+        Retorna um id abaixo do qual todas as transferências já foram confirmadas ou estornadas, e cujos
+        créditos a partição de destino pode esquecer.
+        :rtype: int
+        """
+        with self.lock:
+            return min((*self.pendentes, *self.reservadas), default=self.proximo + 1)
+
+    def anotar(self, anotacoes: Dict) -> None:
+        with self.lock:
+            transferencia = anotacoes.get('transferencia')
+            if transferencia is not None:
+                self.pendentes[transferencia['id']] = transferencia
+                self.proximo = max(self.proximo, transferencia['id'])
+            if 'concluida' in anotacoes:
+                self.pendentes.pop(anotacoes['concluida'], None)
+            if 'ultima_transferencia' in anotacoes:
+                self.proximo = max(self.proximo, anotacoes['ultima_transferencia'])
+
+    def conservar(self) -> List[Dict]:
+        with self.lock:
+            return [
+                {'ultima_transferencia': self.proximo},
+                *({'transferencia': self.pendentes[id]} for id in sorted(self.pendentes))
+            ]
+
+
+class CreditosRecebidos(AnexoDiario):
+    """
+    Ids dos créditos de transferências entre partições aplicados na partição de destino, por partição de
+    origem. Cada crédito traz também um id abaixo do qual a origem já resolveu todas as transferências: os ids
+    menores são esquecidos, e um crédito repetido com um deles é considerado aplicado.
+
+    Os créditos são registrados no diário, na anotação "credito", e os ids guardados são conservados nos
+    checkpoints, na anotação "creditos".
+    """
+
+    def __init__(self) -> None:
+        """
+        Construtor da classe CreditosRecebidos.
+        """
+        self.recebidos: Dict[int, Set[int]] = {}
+        self.limites: Dict[int, int] = {}
+        self.lock = threading.Lock()
+
+    def avancar(self, particao: int, resolvidas: int) -> None:
+        """
+        Esquece os créditos da partição de origem com ids abaixo do informado por ela.
+        :param particao: Partição de origem.
+        :type particao: int
+        :param resolvidas: Id abaixo do qual a origem resolveu todas as transferências.
+        :type resolvidas: int
+        """
+        with self.lock:
+            if resolvidas > self.limites.get(particao, 0):
+                self.limites[particao] = resolvidas
+                recebidos = self.recebidos.get(particao, set())
+                recebidos.difference_update({id for id in recebidos if id < resolvidas})
+
+    def aplicado(self, particao: int, id: int) -> bool:
+        """
+        Verifica se o crédito da transferência já foi aplicado, ou resolvido pela partição de origem.
+        :rtype: bool
+        """
+        with self.lock:
+            return id < self.limites.get(particao, 0) or id in self.recebidos.get(particao, ())
+
+    def anotar(self, anotacoes: Dict) -> None:
+        credito = anotacoes.get('credito')
+        if credito is not None:
+            particao, id, resolvidas = credito
+            self.avancar(particao=particao, resolvidas=resolvidas)
+            with self.lock:
+                if id >= self.limites.get(particao, 0):
+                    self.recebidos.setdefault(particao, set()).add(id)
+        creditos = anotacoes.get('creditos')
+        if creditos is not None:
+            self.avancar(particao=creditos['particao'], resolvidas=creditos['resolvidas'])
+            with self.lock:
+                self.recebidos.setdefault(creditos['particao'], set()).update(creditos['ids'])
+
+    def conservar(self) -> List[Dict]:
+        with self.lock:
+            return [
+                {'creditos': {'particao': particao, 'resolvidas': self.limites.get(particao, 0), 'ids': sorted(ids)}}
+                for particao, ids in self.recebidos.items()
+            ] + [
+                {'creditos': {'particao': particao, 'resolvidas': limite, 'ids': []}}
+                for particao, limite in self.limites.items() if particao not in self.recebidos
+            ]
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import time
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List
+
+from pixson.recursos.metricas import metricas
+
+QUANTIDADE_TRAVAS_PADRAO = 64
+
+
+class TravasContas:
+    """
+    Conjunto fixo de travas distribuídas entre as contas pelo RG (lock striping).
+    Operações em contas de faixas diferentes não disputam a mesma trava.
+    """
+
+    def __init__(self, quantidade: int = QUANTIDADE_TRAVAS_PADRAO) -> None:
+        """
+        Construtor da classe TravasContas.
+        :param quantidade: Número de travas. Mais travas reduzem a disputa entre contas não relacionadas.
+        :type quantidade: int
+        """
+        self.travas = [threading.RLock() for _ in range(quantidade)]
+
+    def indice(self, rg: str) -> int:
+        """
+        Obtém o índice da trava responsável pela conta.
+        :param rg: RG do cliente.
+        :type rg: str
+        :rtype: int
+        """
+        return hash(str(rg)) % len(self.travas)
+
+    @contextmanager
+    def travar(self, *rgs: str) -> Iterator[None]:
+        """
+        Adquire as travas de todas as contas informadas, sempre em ordem crescente de índice,
+        para que operações envolvendo mais de uma conta, como transferências, não entrem em deadlock.
+        O tempo de espera só é medido quando a trava já está ocupada, para não onerar o caso sem disputa.
+        :param rgs: RGs das contas envolvidas na operação.
+        :type rgs: str
+        """
+        travas: List[threading.RLock] = [self.travas[i] for i in sorted({self.indice(rg) for rg in rgs})]
+        for trava in travas:
+            if not trava.acquire(blocking=False):
+                inicio = time.perf_counter()
+                trava.acquire()
+                metricas.registrar('travas.espera', time.perf_counter() - inicio)
+        metricas.incrementar('travas.aquisicoes', len(travas))
+        try:
+            yield
+        finally:
+            for trava in reversed(travas):
+                trava.release()
+
+    @contextmanager
+    def travar_todas(self) -> Iterator[None]:
+        """
+        Adquire todas as travas, em ordem, suspendendo as operações sobre qualquer conta.
+        """
+        for trava in self.travas:
+            trava.acquire()
+        try:
+            yield
+        finally:
+            for trava in reversed(self.travas):
+                trava.release()
@@ -5,12 +5,13 @@ TAMANHO_BUFFER_PADRAO = 1024
 
 def verificar_porta(porta: int) -> bool:
     """
-    Verifica se a porta está em uso.
+    Verifica se a porta está livre. As conexões antigas da porta em TIME_WAIT não a tornam ocupada.
     :param porta: Porta a ser verificada.
     :type porta: int
     :rtype: bool
     """
     s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     try:
         s.bind(('', porta))
         s.close()
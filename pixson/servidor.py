@@ -1,167 +1,971 @@
 from __future__ import annotations
 
+import os
+import sys
+import json
+import time
+import errno
 import signal
 import socket
 import select
+import secrets
+import argparse
 import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, Set
 
 from pixson.recursos import utils
 from pixson.recursos.protocolo import *
+from pixson.recursos.enums import SituacaoChave
+from pixson.recursos.conexao import Conexao, ConexaoAsyncio
 from pixson.recursos.conta import Conta
+from pixson.recursos.metricas import metricas, registro, iniciar_registro
+from pixson.recursos.travas import TravasContas
+from pixson.recursos.pares import PoolPar
+from pixson.recursos.particoes import HOST_PARTICOES, particao_do_rg
+from pixson.recursos.replicacao import EPOCA_ANTIGA, INTERVALO_BATIMENTO, NAO_LIDER, ForaDoGrupo, Replicacao
+from pixson.recursos.sessoes import Sessoes, TokensSessao, VALIDADE_TOKEN_PADRAO
+from pixson.recursos.limites import LimiteTaxa
+from pixson.recursos.diario import Diario, INTERVALO_CHECKPOINT_PADRAO
+from pixson.recursos.transferencias import CreditosRecebidos, TransferenciasPendentes, INTERVALO_RESOLUCAO
+from pixson.recursos.idempotencia import Idempotencia, CAPACIDADE_CHAVES_PADRAO, JANELA_PADRAO
+from pixson.recursos.notificacoes import Assinatura, Notificacoes, RepasseNotificacoes, MAX_ASSINATURAS_PADRAO
+from pixson.recursos.agregados import Agregados, FAIXAS_PADRAO, TOPO_PADRAO
+from pixson.recursos.dinheiro import ler_valor
+from pixson.recursos.extrato import Extrato, SEGMENTO_PADRAO, RETENCAO_PADRAO, PAGINA_PADRAO, PAGINA_MAXIMA, movimento_para_dict
+from pixson.recursos.armazenamento import Armazenamento, PASTA_CONTAS, ARMAZENAMENTO_JSON, ARMAZENAMENTOS, criar_armazenamento
+from pixson.recursos.armazem import ArmazemContas, CAPACIDADE_PADRAO, INTERVALO_PADRAO, LIMITE_SUJAS_PADRAO
+
+if TYPE_CHECKING:
+    # Importados apenas pelos modos que os usam, pois são os módulos mais lentos de carregar na inicialização.
+    import ssl
+    import asyncio
+    from logging.handlers import QueueListener
+    from concurrent.futures import ThreadPoolExecutor
 
 PORTA_PADRAO = 5000
+# Conexões completas aguardando o `accept`: rajadas de conexões, como a de clientes reconectando
+# logo após um reinício, não são recusadas enquanto as primeiras são aceitas.
+BACKLOG_PADRAO = socket.SOMAXCONN
+# Tempo máximo, em segundos, para as conexões terminarem as operações em andamento no encerramento.
+PRAZO_DRENAGEM_PADRAO = 10.0
+# Tempo máximo, em segundos, para o novo processo de um reinício ficar pronto para aceitar conexões.
+PRAZO_SUBSTITUTO = 60.0
+# Tempo, em segundos, sem receber dados após o qual a conexão do cliente é encerrada (0 não encerra).
+TEMPO_OCIOSO_PADRAO = 300.0
+# Conexões atendidas ao mesmo tempo; as excedentes são recusadas de imediato, sem uma thread (0 não limita).
+MAX_CONEXOES_PADRAO = 4096
+# Tempo máximo, em segundos, para o cliente receber uma resposta; o cliente que não lê as respostas é desconectado.
+PRAZO_ENVIO_PADRAO = 10.0
+# Tempo máximo, em segundos, para o cliente concluir o handshake TLS.
+PRAZO_HANDSHAKE = 10.0
+# Bytes de uma solicitação ainda incompleta acumulados por conexão; acima disso, a conexão é encerrada.
+TAMANHO_MAXIMO_SOLICITACAO = 1024 * 1024
+# Bytes ainda não lidos pelo cliente acima dos quais, no motor asyncio, o envio das notificações é adiado,
+# e as alterações seguintes são agrupadas; é o limite em que o `drain` das respostas aguarda o cliente.
+LIMITE_ENVIO_NOTIFICACOES = 64 * 1024
+# Tempo, em segundos, entre as tentativas de envio das notificações adiadas.
+INTERVALO_ENVIO_NOTIFICACOES = 0.05
+# Threads que executam as operações no motor asyncio: as escritas aguardam o fsync do diário nelas, sem
+# bloquear o laço de eventos, e as de conexões diferentes compartilham o mesmo fsync.
+TRABALHADORES_ASYNCIO = 64
+
+MOTOR_THREADING = 'threading'
+MOTOR_ASYNCIO = 'asyncio'
+MOTORES = (MOTOR_THREADING, MOTOR_ASYNCIO)
+
+PROCESSADORES: Dict[Operacoes, Callable[..., None]] = {}
+OPERACOES_ESCRITA = frozenset((Operacoes.SAQUE, Operacoes.DEPOSITO, Operacoes.TRANSFERENCIA, Operacoes.LOTE))
+# Consultas que uma réplica sem a concessão do líder recusa, pois a sua cópia das contas pode estar desatualizada.
+OPERACOES_LEITURA = frozenset((Operacoes.SALDO, Operacoes.EXTRATO, Operacoes.RELATORIO))
+# Operações trocadas apenas entre os processos do servidor, recusadas nas conexões de clientes.
+OPERACOES_INTERNAS = frozenset((Operacoes.CREDITO,))
+METRICAS_OPERACOES = {operacao: f'operacao.{operacao.name.lower()}' for operacao in Operacoes}
+# Recusas que não dependem da solicitação, mas de uma falha momentânea: não são guardadas com a chave de
+# idempotência, para que a repetição da solicitação seja aplicada.
+ERROS_TRANSITORIOS = frozenset(('Partição de destino indisponível',))
 
-lock = threading.RLock()
+
+def processador(operacao: Operacoes) -> Callable:
+    """
+    Registra o método decorado como processador da operação, na tabela de despacho do servidor.
+    :param operacao: Operação processada pelo método.
+    :type operacao: Operacoes
+    :rtype: Callable
+    """
+    def registrar(funcao: Callable[..., None]) -> Callable[..., None]:
+        PROCESSADORES[operacao] = funcao
+        return funcao
+    return registrar
 
 
 class Servidor:
-    def __init__(self) -> None:
+    def __init__(
+            self,
+            porta: int = PORTA_PADRAO,
+            motor: str = MOTOR_THREADING,
+            armazem: ArmazemContas | None = None,
+            diario: Diario | None = None,
+            extrato: Extrato | None = None,
+            agregados: Agregados | None = None,
+            idempotencia: Idempotencia | None = None,
+            notificacoes: Notificacoes | None = None,
+            armazenamento: Armazenamento | None = None,
+            registro_operacoes: QueueListener | None = None,
+            particao: int = 0,
+            particoes: int = 1,
+            porta_particoes: int | None = None,
+            replicacao: Replicacao | None = None,
+            backlog: int = BACKLOG_PADRAO,
+            aquecer_cache: bool = False,
+            prazo_drenagem: float = PRAZO_DRENAGEM_PADRAO,
+            socket_herdado: int | None = None,
+            tempo_ocioso: float = TEMPO_OCIOSO_PADRAO,
+            max_conexoes: int = MAX_CONEXOES_PADRAO,
+            limite_taxa: float = 0,
+            prazo_envio: float = PRAZO_ENVIO_PADRAO,
+            tls: ssl.SSLContext | None = None,
+            tokens: TokensSessao | None = None
+    ) -> None:
         """
         Construtor da classe Servidor.
+        :param porta: Porta em que o servidor irá escutar.
+        :type porta: int
+        :param motor: Motor de processamento das conexões ('threading' ou 'asyncio').
+        :type motor: str
+        :param armazem: Cache em memória das contas. Sem ele, cada operação lê e grava o arquivo da conta.
+        :type armazem: ArmazemContas or None
+        :param diario: Registro sequencial das alterações, reaplicado na inicialização após uma queda.
+        :type diario: Diario or None
+        :param extrato: Índice dos movimentos de cada conta, consultado pela operação de extrato.
+        :type extrato: Extrato or None
+        :param agregados: Agregados de todas as contas, atualizados a cada alteração e consultados pelo relatório.
+        :type agregados: Agregados or None
+        :param idempotencia: Respostas das operações com chave de idempotência, repetidas sem reaplicá-las.
+        :type idempotencia: Idempotencia or None
+        :param notificacoes: Assinaturas das contas, cujas alterações de saldo são enviadas às conexões assinantes.
+        :type notificacoes: Notificacoes or None
+        :param armazenamento: Meio de persistência das contas. Por padrão, um arquivo JSON por conta.
+        :type armazenamento: Armazenamento or None
+        :param registro_operacoes: Thread de escrita do registro das operações, parada no encerramento.
+        :type registro_operacoes: QueueListener or None
+        :param particao: Índice da partição das contas atendida por este processo.
+        :type particao: int
+        :param particoes: Quantidade de partições. Com mais de uma, todas escutam na mesma porta (SO_REUSEPORT)
+        e as solicitações de contas de outras partições são encaminhadas à partição responsável.
+        :type particoes: int
+        :param porta_particoes: Primeira porta interna das partições; a partição `i` escuta em `porta_particoes + i`.
+        :type porta_particoes: int or None
+        :param replicacao: Grupo de réplicas de que o servidor faz parte.
+        :type replicacao: Replicacao or None
+        :param backlog: Tamanho da fila de conexões aguardando o `accept`.
+        :type backlog: int
+        :param aquecer_cache: Carrega as contas no armazém em memória, em segundo plano, após o início.
+        :type aquecer_cache: bool
+        :param prazo_drenagem: Tempo máximo, em segundos, para as operações em andamento terminarem no encerramento.
+        :type prazo_drenagem: float
+        :param socket_herdado: Descritor do socket de escuta herdado do processo anterior, num reinício.
+        :type socket_herdado: int or None
+        :param tempo_ocioso: Tempo, em segundos, sem receber dados após o qual a conexão é encerrada (0 não encerra).
+        :type tempo_ocioso: float
+        :param max_conexoes: Conexões atendidas ao mesmo tempo; as excedentes são recusadas (0 não limita).
+        :type max_conexoes: int
+        :param limite_taxa: Requisições por segundo de cada conexão; as excedentes são recusadas (0 não limita).
+        :type limite_taxa: float
+        :param prazo_envio: Tempo máximo, em segundos, para o cliente receber uma resposta (0 não limita).
+        :type prazo_envio: float
+        :param tls: Contexto TLS das conexões dos clientes. As conexões entre as partições não usam TLS.
+        :type tls: ssl.SSLContext or None
+        :param tokens: Tokens de sessão emitidos no login com "sessao:1" e aceitos na retomada da sessão.
+        :type tokens: TokensSessao or None
         """
-        if not utils.verificar_porta(porta=PORTA_PADRAO):
-            print('Porta já está em uso')
-            exit()
+        if motor not in MOTORES:
+            raise ValueError(f'Motor inválido: {motor}')
+        if (particoes > 1 or replicacao is not None) and motor != MOTOR_THREADING:
+            raise ValueError('O servidor particionado ou replicado requer o motor threading')
+        if particoes > 1 and replicacao is not None:
+            raise ValueError('O servidor não pode ser particionado e replicado ao mesmo tempo')
+        if limite_taxa and replicacao is not None:
+            # As réplicas encaminham as escritas de todos os seus clientes ao líder por conexões compartilhadas.
+            raise ValueError('O servidor replicado não limita as requisições por conexão')
+        if tls is not None and replicacao is not None:
+            # As réplicas encaminham as escritas ao líder pela porta pública dele, sem TLS.
+            raise ValueError('O servidor replicado não usa TLS')
 
-        self.porta = PORTA_PADRAO
+        self.porta = porta
+        self.motor = motor
+        self.armazem = armazem
+        self.diario = diario
+        self.extrato = extrato
+        self.agregados = agregados
+        self.idempotencia = idempotencia
+        self.notificacoes = notificacoes
+        self.armazenamento = armazenamento
+        self.registro_operacoes = registro_operacoes
+        self.particao = particao
+        self.particoes = particoes
+        self.porta_particoes = porta_particoes if porta_particoes is not None else porta + 1
+        self.pares: Dict[int, PoolPar] = {}
+        self.repasses: Dict[int, RepasseNotificacoes] = {}
+        self.transferencias: TransferenciasPendentes | None = None
+        self.creditos: CreditosRecebidos | None = None
+        self.replicacao = replicacao
+        self.backlog = backlog
+        self.aquecer_cache = aquecer_cache
+        self.prazo_drenagem = prazo_drenagem
+        self.socket_herdado = socket_herdado
+        self.tempo_ocioso = tempo_ocioso
+        self.max_conexoes = max_conexoes
+        self.limite_taxa = limite_taxa
+        self.prazo_envio = prazo_envio
+        self.tls = tls
+        self.tokens = tokens
         self.socket = None
+        self.socket_particoes = None
         self.relogio = 0
+        self.lock_relogio = threading.Lock()
+        self.travas = TravasContas()
+        self.sessoes = Sessoes()
+        self.clientes = 0
+        self.condicao_clientes = threading.Condition()
+        self.despertador = None
+        self.sinal_despertar = None
+        self.drenando = False
+        self.tarefas: Dict[asyncio.Task, ConexaoAsyncio] = {}
+        self.executor: ThreadPoolExecutor | None = None
         self.disponivel = False
 
-    def incrementar_relogio(self) -> None:
+    def incrementar_relogio(self) -> int:
         """
         Incrementa o relógio do servidor.
+        :rtype: int
         """
-        with lock:
+        with self.lock_relogio:
             self.relogio += 1
-        print(f"Relógio Lógico Atualizado: {self.relogio}")
+            relogio = self.relogio
+        registro.debug('Relógio Lógico Atualizado: %d', relogio)
+        return relogio
 
     def atualizar_tempo(self, tempo: int) -> None:
         """
         Atualiza o relógio com o tempo recebido, se ele for maior que o tempo atual e incrementa o relógio.
         """
-        with lock:
+        with self.lock_relogio:
             self.relogio = max(self.relogio, tempo) + 1
-        print(f'Relógio Lógico Atualizado: {self.relogio}')
+            relogio = self.relogio
+        registro.debug('Relógio Lógico Atualizado: %d', relogio)
 
     def obter_e_incrementar_tempo(self) -> int:
         """
         Incrementa o relógio do servidor e retorna o valor atualizado.
         :rtype: int
         """
-        self.incrementar_relogio()
-        return self.relogio
+        return self.incrementar_relogio()
 
     def iniciar(self) -> None:
         """
         Inicia o servidor.
         """
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.socket.bind(('', self.porta))
-        self.socket.listen(1)
+        if self.socket_herdado is not None:
+            # Reinício sem interrupção: o socket de escuta, com as conexões que aguardam na fila, vem do processo anterior.
+            self.socket = socket.socket(fileno=self.socket_herdado)
+        else:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            # O servidor reinicia na mesma porta sem esperar o fim das conexões antigas em TIME_WAIT. A porta
+            # em uso por outro servidor ainda é recusada pelo próprio `bind`, sem uma verificação prévia.
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.tls is not None:
+            # As conexões aceitas herdam a opção: as mensagens pequenas e seguidas do handshake TLS, feito pelo
+            # transporte no motor asyncio antes mesmo da tarefa da conexão, não aguardam a confirmação das
+            # anteriores pelo cliente (algoritmo de Nagle).
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.particoes > 1:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            self.socket_particoes = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.socket_particoes.bind((HOST_PARTICOES, self.porta_particoes + self.particao))
+            self.socket_particoes.listen(socket.SOMAXCONN)
+            self.pares = {
+                particao: PoolPar(HOST_PARTICOES, self.porta_particoes + particao)
+                for particao in range(self.particoes) if particao != self.particao
+            }
+        if self.socket_herdado is None:
+            try:
+                self.socket.bind(('', self.porta))
+            except OSError:
+                print('Porta já está em uso')
+                exit()
+        self.socket.listen(self.backlog)
+        self.despertador, self.sinal_despertar = socket.socketpair()
+        if self.armazenamento is not None:
+            Conta.armazenamento = self.armazenamento
+        Conta.sessoes = self.sessoes
+        # Anexos reconstruídos pelo diário, se houver, antes de as contas serem reaplicadas.
+        anexos = []
+        if self.particoes > 1:
+            self.transferencias = TransferenciasPendentes()
+            self.creditos = CreditosRecebidos()
+            anexos += [self.transferencias, self.creditos]
+        if self.idempotencia is not None:
+            anexos.append(self.idempotencia)
+        Conta.anexos = anexos
+        if self.diario is not None:
+            registros = self.diario.recuperar()
+            if registros:
+                print(f"{registros} operações recuperadas do diário")
+            Conta.diario = self.diario
+            self.diario.iniciar()
+        if self.extrato is not None:
+            self.extrato.iniciar(obter_tempo=lambda: self.relogio)
+            Conta.extrato = self.extrato
+        if self.armazem is not None:
+            Conta.armazem = self.armazem
+            self.armazem.iniciar()
+        if self.replicacao is not None:
+            self.replicacao.iniciar(obter_tempo=self.obter_e_incrementar_tempo, atualizar_tempo=self.atualizar_tempo)
+            Conta.replicacao = self.replicacao
+        if self.agregados is not None:
+            Conta.agregados = self.agregados
+            self.agregados.iniciar(
+                pausar=self.travas.travar_todas,
+                pertence=lambda rg: self.particao_do_rg(rg) == self.particao
+            )
+        if self.notificacoes is not None:
+            self.notificacoes.iniciar(obter_tempo=self.obter_e_incrementar_tempo)
+            Conta.notificacoes = self.notificacoes
+            self.repasses = {
+                particao: RepasseNotificacoes(HOST_PARTICOES, self.porta_particoes + particao, self.notificacoes)
+                for particao in self.pares
+            }
         self.disponivel = True
-        print(f"Servidor iniciado na porta {self.porta}")
+        if self.particoes > 1:
+            threading.Thread(target=self.resolver_transferencias, daemon=True).start()
+            print(f"Partição {self.particao} de {self.particoes} iniciada na porta {self.porta}")
+        elif self.replicacao is not None:
+            threading.Thread(target=self.monitorar_replicas, daemon=True).start()
+            print(f"Réplica {self.replicacao.no} iniciada na porta {self.porta}")
+        else:
+            print(f"Servidor iniciado na porta {self.porta}")
+        if self.aquecer_cache and self.armazem is not None:
+            threading.Thread(target=self.carregar_contas, daemon=True).start()
 
-    def aceitar_conexao(self) -> None:
+    def carregar_contas(self) -> None:
         """
-        Aceita uma conexão de um cliente e processa as mensagens dele, numa nova thread.
+        Carrega as contas no armazém em memória, até a sua capacidade, enquanto o servidor já atende,
+        para que as primeiras operações sobre cada conta não aguardem a leitura do disco. Cada conta é
+        carregada com a sua trava, como nas operações.
         """
-        cliente_socket, cliente_socket_host = self.socket.accept()
-        print(f"Novo cliente conectado {cliente_socket_host}")
-        threading.Thread(target=self.processar_operacoes_cliente, args=(cliente_socket,)).start()
+        carregadas = 0
+        with metricas.medir('armazem.aquecimento'):
+            for rg in Conta.listar_rgs():
+                if not self.disponivel or carregadas >= self.armazem.capacidade:
+                    break
+                with self.travas.travar(rg):
+                    if self.armazem.obter(rg=rg) is not None:
+                        carregadas += 1
+        registro.info('%d contas carregadas no armazém', carregadas)
 
-    def processar_operacoes_cliente(self, cliente_socket) -> None:
+    def aceitar_conexao(self, servidor_socket: socket.socket | None = None) -> None:
         """
-        Processa as operações do cliente.
-        :param cliente_socket: Socket do cliente.
-        :type cliente_socket: socket.socket
+        Aceita uma conexão de um cliente e processa as mensagens dele, numa nova thread. No limite de conexões,
+        a conexão de um cliente é recusada de imediato, com uma resposta de erro, sem criar uma thread; as
+        conexões entre as partições são sempre aceitas, e sem TLS. Sem descritores de arquivo livres, o `accept` é
+        repetido após uma pausa, e as conexões aguardam na fila.
+        :param servidor_socket: Socket em que a conexão é aceita. Por padrão, o socket público do servidor.
+        :type servidor_socket: socket.socket or None
+        """
+        interna = servidor_socket is not None
+        try:
+            cliente_socket, cliente_socket_host = (servidor_socket or self.socket).accept()
+        except OSError as erro:
+            if erro.errno not in (errno.EMFILE, errno.ENFILE, errno.ENOBUFS, errno.ENOMEM):
+                raise
+            metricas.incrementar('conexoes.erros_accept')
+            registro.warning('Erro ao aceitar conexão: %s', erro)
+            time.sleep(0.1)
+            return
+        with self.condicao_clientes:
+            lotado = not interna and 0 < self.max_conexoes <= self.clientes
+            if not lotado:
+                self.clientes += 1
+        if lotado:
+            if self.tls is None:
+                cliente_socket.setblocking(False)
+                try:
+                    cliente_socket.send(self.mensagem_recusa())
+                except OSError:
+                    pass
+            else:
+                # A recusa cifrada exigiria o handshake, que bloquearia o `accept`: a conexão é apenas fechada.
+                metricas.incrementar('conexoes.recusadas')
+            cliente_socket.close()
+            return
+        registro.info('Novo cliente conectado %s', cliente_socket_host)
+        if self.tls is not None and not interna:
+            # O handshake é feito pela thread da conexão, em `processar_operacoes_cliente`.
+            cliente_socket = self.tls.wrap_socket(cliente_socket, server_side=True, do_handshake_on_connect=False)
+        threading.Thread(target=self.processar_operacoes_cliente, args=(cliente_socket, interna)).start()
+
+    def mensagem_recusa(self) -> bytes:
+        """
+        Obtém a resposta enviada às conexões recusadas no limite de conexões, sempre em texto, pois a
+        codificação ainda não foi negociada.
+        :rtype: bytes
+        """
+        metricas.incrementar('conexoes.recusadas')
+        return RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Servidor sobrecarregado').enquadrar()
+
+    def concluir_handshake(self, cliente_socket: ssl.SSLSocket) -> bool:
+        """
+        Conclui o handshake TLS de uma conexão, na thread dela, no prazo do handshake, para que um cliente
+        que não o conclui não retenha a thread.
+        :param cliente_socket: Socket TLS do cliente, ainda sem o handshake.
+        :type cliente_socket: ssl.SSLSocket
+        :return: Falso se o handshake falhou ou não terminou no prazo, e a conexão deve ser encerrada.
+        :rtype: bool
+        """
+        cliente_socket.settimeout(PRAZO_HANDSHAKE)
+        try:
+            cliente_socket.do_handshake()
+        except OSError as erro:
+            metricas.incrementar('tls.falhas')
+            registro.info('Falha no handshake TLS: %s', erro)
+            return False
+        cliente_socket.settimeout(None)
+        Servidor.registrar_handshake(cliente_socket)
+        return True
+
+    @staticmethod
+    def registrar_handshake(objeto_ssl: ssl.SSLSocket | ssl.SSLObject) -> None:
+        """
+        Contabiliza um handshake TLS concluído e, entre eles, os que retomaram a sessão de uma conexão
+        anterior, por um ticket ou pelo cache de sessões, sem a troca de chaves completa.
+        :param objeto_ssl: Socket ou objeto TLS da conexão.
+        :type objeto_ssl: ssl.SSLSocket or ssl.SSLObject
+        """
+        metricas.incrementar('tls.handshakes')
+        if objeto_ssl.session_reused:
+            metricas.incrementar('tls.retomadas')
+
+    def executar(self) -> None:
+        """
+        Aceita e processa conexões até o servidor ser encerrado, usando o motor configurado.
+        """
+        print('Aguardando conexão...')
+        if self.motor == MOTOR_ASYNCIO:
+            import asyncio
+            reiniciar = asyncio.run(self.executar_asyncio())
+            if reiniciar is not None:
+                self.finalizar(reiniciar=reiniciar)
+        else:
+            if self.socket_particoes is not None:
+                threading.Thread(target=self.aceitar_conexoes_particoes, daemon=True).start()
+            while self.disponivel:
+                self.aceitar_conexao()
+
+    def aceitar_conexoes_particoes(self) -> None:
+        """
+        Aceita as conexões das outras partições, que encaminham solicitações de contas desta partição.
         """
         while self.disponivel:
             try:
-                ready_to_read, ready_to_write, in_error = select.select(
-                    [cliente_socket, ],
-                    [cliente_socket, ],
-                    [],
-                    5
-                )
-            except select.error:
-                cliente_socket.shutdown(2)
-                cliente_socket.close()
-                print('erro de conexão')
+                self.aceitar_conexao(self.socket_particoes)
+            except OSError:
                 break
-            if len(ready_to_read) > 0:
-                mensagem = cliente_socket.recv(utils.TAMANHO_BUFFER_PADRAO).decode()
-                if mensagem:
-                    self.processar_operacao(cliente_socket=cliente_socket, mensagem=mensagem)
-                else:
+
+    async def executar_asyncio(self) -> bool | None:
+        """
+        Atende todas as conexões num único laço de eventos. Os sinais de encerramento e reinício são
+        recebidos pelo próprio laço, para que a drenagem não o bloqueie. As operações são executadas por um
+        conjunto de threads, e as tarefas das conexões aguardam o seu término, que não é interrompido pelo
+        cancelamento na drenagem. A cada segundo, as conexões ociosas e as que não leem as respostas são
+        encerradas.
+        :return: Se o servidor deve ser reiniciado, ao receber um sinal, ou None, se foi desconectado.
+        :rtype: bool or None
+        """
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+        laco = asyncio.get_running_loop()
+        self.executor = ThreadPoolExecutor(max_workers=TRABALHADORES_ASYNCIO, thread_name_prefix='operacoes')
+        encerramento = asyncio.Event()
+        reinicio = []
+
+        def sinalizar(reiniciar: bool) -> None:
+            if not encerramento.is_set():
+                print('Reiniciando...' if reiniciar else 'Encerrando...')
+                reinicio.append(reiniciar)
+                encerramento.set()
+
+        for sinal, reiniciar in Servidor.sinais().items():
+            laco.add_signal_handler(sinal, sinalizar, reiniciar)
+
+        # O servidor do asyncio fecha o socket que recebe; com uma cópia, o socket de escuta continua aberto
+        # para ser entregue ao novo processo num reinício.
+        servidor = await asyncio.start_server(
+            self.processar_operacoes_cliente_asyncio, sock=self.socket.dup(), backlog=self.backlog, ssl=self.tls,
+            ssl_handshake_timeout=PRAZO_HANDSHAKE if self.tls is not None else None
+        )
+        while self.disponivel and not encerramento.is_set():
+            try:
+                await asyncio.wait_for(encerramento.wait(), timeout=1)
+            except asyncio.TimeoutError:
+                self.varrer_conexoes_asyncio()
+        self.drenando = True
+        servidor.close()
+        tarefas = list(self.tarefas)
+        for tarefa in tarefas:
+            tarefa.cancel()
+        if tarefas:
+            _, pendentes = await asyncio.wait(tarefas, timeout=self.prazo_drenagem)
+            if pendentes:
+                registro.warning('%d conexões não terminaram no prazo de drenagem', len(pendentes))
+        self.executor.shutdown(wait=False)
+        return reinicio[0] if reinicio else None
+
+    def varrer_conexoes_asyncio(self) -> None:
+        """
+        Encerra as conexões sem dados recebidos há mais que o tempo ocioso e aborta as que aguardam o envio
+        das respostas há mais que o prazo de envio, descartando o que o cliente não leu. As tarefas das
+        conexões terminam ao ler o fim da conexão.
+        """
+        agora = time.monotonic()
+        for conexao in list(self.tarefas.values()):
+            if conexao.envio is not None:
+                if self.prazo_envio and agora - conexao.envio > self.prazo_envio:
+                    metricas.incrementar('conexoes.envio_expirado')
+                    conexao.writer.transport.abort()
+            elif self.tempo_ocioso and agora - conexao.atividade > self.tempo_ocioso:
+                metricas.incrementar('conexoes.ociosas')
+                conexao.writer.close()
+
+    async def processar_operacoes_cliente_asyncio(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Processa as operações do cliente no laço de eventos.
+        :param reader: Canal de leitura da conexão.
+        :type reader: asyncio.StreamReader
+        :param writer: Canal de escrita da conexão.
+        :type writer: asyncio.StreamWriter
+        """
+        import asyncio
+        if 0 < self.max_conexoes <= len(self.tarefas):
+            writer.write(self.mensagem_recusa())
+            writer.close()
+            return
+        registro.info('Novo cliente conectado %s', writer.get_extra_info('peername'))
+        if self.tls is not None:
+            # O handshake já foi concluído pelo transporte do asyncio antes de a tarefa da conexão começar.
+            Servidor.registrar_handshake(writer.get_extra_info('ssl_object'))
+        metricas.incrementar('conexoes.total')
+        metricas.incrementar('conexoes.ativas')
+        conexao = ConexaoAsyncio(writer, laco=asyncio.get_running_loop())
+        if self.limite_taxa:
+            conexao.limite = LimiteTaxa(self.limite_taxa)
+        tarefa = asyncio.current_task()
+        self.tarefas[tarefa] = conexao
+        try:
+            while self.disponivel and not self.drenando:
+                dados = await reader.read(utils.TAMANHO_BUFFER_PADRAO)
+                if not dados or writer.is_closing():
                     break
-            if len(ready_to_write) > 0:
-                pass
-            if len(in_error) > 0:
-                break
+                metricas.incrementar('bytes.recebidos', len(dados))
+                conexao.atividade = time.monotonic()
+                if not await self.processar_dados_asyncio(conexao=conexao, dados=dados):
+                    break
+                conexao.envio = conexao.atividade
+                await writer.drain()
+                conexao.envio = None
+        except ConnectionError:
+            registro.info('erro de conexão')
+        except asyncio.CancelledError:
+            # Cancelada na drenagem: a operação recebida já foi aplicada e a sua resposta, se ainda no buffer,
+            # é enviada pelo fechamento do writer.
+            pass
+        finally:
+            writer.close()
+            self.sessoes.liberar(conexao)
+            self.cancelar_assinaturas(conexao)
+            self.tarefas.pop(tarefa, None)
+            metricas.incrementar('conexoes.ativas', -1)
+        registro.info('Cliente desconectado')
+
+    async def processar_dados_asyncio(self, conexao: ConexaoAsyncio, dados: bytes) -> bool:
+        """
+        Processa os dados recebidos numa thread do executor, liberando o laço de eventos para as outras
+        conexões enquanto as escritas aguardam o fsync do diário. As respostas são enfileiradas no writer
+        pelo próprio laço, antes de a tarefa retomar. Se a tarefa for cancelada, aguarda o fim da operação
+        antes de propagar o cancelamento.
+        :param conexao: Conexão do cliente.
+        :type conexao: ConexaoAsyncio
+        :param dados: Dados recebidos.
+        :type dados: bytes
+        :return: Se a conexão deve continuar aberta.
+        :rtype: bool
+        """
+        import asyncio
+        futuro = conexao.laco.run_in_executor(self.executor, self.processar_dados, conexao, dados)
+        try:
+            return await asyncio.shield(futuro)
+        except asyncio.CancelledError:
+            await futuro
+            raise
+
+    def processar_operacoes_cliente(self, cliente_socket: socket.socket, interna: bool = False) -> None:
+        """
+        Processa as operações do cliente, até ele desconectar, ficar ocioso além do tempo ocioso ou não
+        receber uma resposta no prazo de envio. O cliente que não lê as respostas mantém a trava da conta
+        da operação no máximo pelo prazo de envio. As notificações das contas assinadas são enviadas por esta
+        mesma thread, entre as solicitações, ao ser despertada pelo par de sockets da assinatura. Com TLS, o
+        handshake é concluído antes pela própria thread.
+        :param cliente_socket: Socket do cliente.
+        :type cliente_socket: socket.socket
+        :param interna: Se a conexão é de outra partição do servidor, sem o limite de requisições.
+        :type interna: bool
+        """
+        metricas.incrementar('conexoes.total')
+        metricas.incrementar('conexoes.ativas')
+        conexao = Conexao(cliente_socket)
+        conexao.interna = interna
+        if self.limite_taxa and not interna:
+            conexao.limite = LimiteTaxa(self.limite_taxa)
+        tls = self.tls is not None and not interna
+        atividade = time.monotonic()
+        try:
+            if tls and not self.concluir_handshake(cliente_socket):
+                return
+            if self.prazo_envio:
+                cliente_socket.settimeout(self.prazo_envio)
+            # O despertador fica legível na drenagem: a conexão ociosa termina de imediato, e a conexão
+            # com uma operação em andamento termina assim que a concluir e responder.
+            while self.disponivel and not self.drenando:
+                espera = 5
+                if self.tempo_ocioso:
+                    espera = min(espera, atividade + self.tempo_ocioso - time.monotonic())
+                    if espera <= 0:
+                        metricas.incrementar('conexoes.ociosas')
+                        registro.info('Conexão ociosa encerrada')
+                        break
+                leituras = [cliente_socket, self.despertador]
+                if conexao.assinatura is not None:
+                    leituras.append(conexao.assinatura.leitura)
+                try:
+                    if tls and cliente_socket.pending():
+                        # Dados já decifrados pelo TLS e ainda não lidos não tornam o socket legível.
+                        ready_to_read, ready_to_write, in_error = [cliente_socket], [], []
+                    else:
+                        ready_to_read, ready_to_write, in_error = select.select(
+                            leituras,
+                            [],
+                            [],
+                            espera
+                        )
+                except select.error:
+                    cliente_socket.shutdown(2)
+                    cliente_socket.close()
+                    registro.info('erro de conexão')
+                    break
+                if cliente_socket in ready_to_read and not self.drenando:
+                    try:
+                        dados = cliente_socket.recv(utils.TAMANHO_BUFFER_PADRAO)
+                        if not dados:
+                            break
+                        metricas.incrementar('bytes.recebidos', len(dados))
+                        atividade = time.monotonic()
+                        if not self.processar_dados(conexao=conexao, dados=dados):
+                            break
+                    except socket.timeout:
+                        metricas.incrementar('conexoes.envio_expirado')
+                        registro.info('Prazo de envio expirado')
+                        break
+                    except OSError:
+                        registro.info('erro de conexão')
+                        break
+                if conexao.assinatura is not None and conexao.assinatura.leitura in ready_to_read:
+                    try:
+                        self.enviar_notificacoes(conexao)
+                    except socket.timeout:
+                        metricas.incrementar('conexoes.envio_expirado')
+                        registro.info('Prazo de envio expirado')
+                        break
+                    except OSError:
+                        registro.info('erro de conexão')
+                        break
+                if len(in_error) > 0:
+                    break
+        finally:
+            cliente_socket.close()
+            self.sessoes.liberar(conexao)
+            self.cancelar_assinaturas(conexao)
+            metricas.incrementar('conexoes.ativas', -1)
+            with self.condicao_clientes:
+                self.clientes -= 1
+                self.condicao_clientes.notify_all()
+        registro.info('Cliente desconectado')
 
-        cliente_socket.close()
-        print('Cliente desconectado')
+    def encerrar(self, reiniciar: bool = False) -> None:
+        """
+        Encerra o servidor sem interromper operações: deixa de aceitar conexões, aguarda as operações em
+        andamento, grava as alterações pendentes e termina o processo. Ao reiniciar, o socket de escuta é
+        entregue a um novo processo do servidor, e as conexões que chegam enquanto isso aguardam na fila
+        do `accept`, sem serem recusadas.
+        :param reiniciar: Entrega o socket de escuta a um novo processo antes de terminar.
+        :type reiniciar: bool
+        """
+        if self.drenando:
+            return
+        print('Reiniciando...' if reiniciar else 'Encerrando...')
+        self.drenar()
+        self.finalizar(reiniciar=reiniciar)
 
-    def encerrar(self) -> None:
+    def drenar(self) -> bool:
         """
-        Encerra o servidor.
+        Encerra as conexões dos clientes, aguardando, até o prazo de drenagem, as que têm uma operação em andamento.
+        Chamado pelo tratador do sinal, na thread principal, que deixa de aceitar conexões enquanto isso.
+        :return: Falso se alguma conexão não terminou no prazo.
+        :rtype: bool
+        """
+        self.drenando = True
+        self.sinal_despertar.send(b'\0')
+        with self.condicao_clientes:
+            drenado = self.condicao_clientes.wait_for(lambda: self.clientes == 0, timeout=self.prazo_drenagem)
+            if not drenado:
+                registro.warning('%d conexões não terminaram no prazo de drenagem', self.clientes)
+        return drenado
+
+    def finalizar(self, reiniciar: bool) -> None:
         """
-        print('Encerrando...')
-        self.desconectar()
+        Grava as alterações pendentes e termina o processo, depois da drenagem. Ao reiniciar, o novo processo
+        só é iniciado depois da gravação, pois ele lê as contas e o diário ao iniciar.
+        :param reiniciar: Entrega o socket de escuta a um novo processo antes de terminar.
+        :type reiniciar: bool
+        """
+        self.desconectar(fechar_socket=not reiniciar)
+        if reiniciar:
+            iniciar_substituto(self.socket)
+            self.socket.close()
         exit()
 
-    def desconectar(self) -> None:
+    @staticmethod
+    def sinais() -> Dict[int, bool]:
+        """
+        Obtém os sinais tratados pelo servidor e se cada um deles o reinicia: SIGINT e SIGTERM o encerram,
+        e SIGUSR2, onde existir, o reinicia entregando o socket de escuta a um novo processo.
+        :rtype: dict
+        """
+        sinais = {signal.SIGINT: False, signal.SIGTERM: False}
+        if hasattr(signal, 'SIGUSR2'):
+            sinais[signal.SIGUSR2] = True
+        return sinais
+
+    def desconectar(self, fechar_socket: bool = True) -> None:
         """
         Desconecta o servidor.
+        :param fechar_socket: Fecha o socket de escuta, que é mantido aberto para ser entregue a um novo processo.
+        :type fechar_socket: bool
         """
         self.disponivel = False
-        self.socket.close()
+        if fechar_socket:
+            self.socket.close()
+        if self.despertador is not None:
+            self.despertador.close()
+            self.sinal_despertar.close()
+        if self.socket_particoes is not None:
+            self.socket_particoes.close()
+        for par in self.pares.values():
+            par.fechar()
+        for repasse in self.repasses.values():
+            repasse.fechar()
+        if self.replicacao is not None:
+            self.replicacao.fechar()
+        if self.diario is not None:
+            self.diario.encerrar()
+        if self.extrato is not None:
+            self.extrato.encerrar()
+        if self.armazem is not None:
+            self.armazem.encerrar()
+        Conta.armazenamento.fechar()
+        if self.registro_operacoes is not None:
+            self.registro_operacoes.stop()
 
     @staticmethod
-    def criar() -> Servidor:
+    def criar(
+            porta: int = PORTA_PADRAO,
+            motor: str = MOTOR_THREADING,
+            armazem: ArmazemContas | None = None,
+            diario: Diario | None = None,
+            extrato: Extrato | None = None,
+            agregados: Agregados | None = None,
+            idempotencia: Idempotencia | None = None,
+            notificacoes: Notificacoes | None = None,
+            armazenamento: Armazenamento | None = None,
+            registro_operacoes: QueueListener | None = None,
+            particao: int = 0,
+            particoes: int = 1,
+            porta_particoes: int | None = None,
+            replicacao: Replicacao | None = None,
+            backlog: int = BACKLOG_PADRAO,
+            aquecer_cache: bool = False,
+            prazo_drenagem: float = PRAZO_DRENAGEM_PADRAO,
+            socket_herdado: int | None = None,
+            tempo_ocioso: float = TEMPO_OCIOSO_PADRAO,
+            max_conexoes: int = MAX_CONEXOES_PADRAO,
+            limite_taxa: float = 0,
+            prazo_envio: float = PRAZO_ENVIO_PADRAO,
+            tls: ssl.SSLContext | None = None,
+            tokens: TokensSessao | None = None
+    ) -> Servidor:
         """
         Cria uma instância do servidor.
+        :param porta: Porta em que o servidor irá escutar.
+        :type porta: int
+        :param motor: Motor de processamento das conexões ('threading' ou 'asyncio').
+        :type motor: str
+        :param armazem: Cache em memória das contas.
+        :type armazem: ArmazemContas or None
+        :param diario: Registro sequencial das alterações.
+        :type diario: Diario or None
+        :param extrato: Índice dos movimentos de cada conta.
+        :type extrato: Extrato or None
+        :param agregados: Agregados de todas as contas.
+        :type agregados: Agregados or None
+        :param idempotencia: Respostas das operações com chave de idempotência.
+        :type idempotencia: Idempotencia or None
+        :param notificacoes: Assinaturas das alterações de saldo das contas.
+        :type notificacoes: Notificacoes or None
+        :param armazenamento: Meio de persistência das contas.
+        :type armazenamento: Armazenamento or None
+        :param registro_operacoes: Thread de escrita do registro das operações.
+        :type registro_operacoes: QueueListener or None
+        :param particao: Índice da partição das contas atendida por este processo.
+        :type particao: int
+        :param particoes: Quantidade de partições.
+        :type particoes: int
+        :param porta_particoes: Primeira porta interna das partições.
+        :type porta_particoes: int or None
+        :param replicacao: Grupo de réplicas de que o servidor faz parte.
+        :type replicacao: Replicacao or None
+        :param backlog: Tamanho da fila de conexões aguardando o `accept`.
+        :type backlog: int
+        :param aquecer_cache: Carrega as contas no armazém em memória, em segundo plano, após o início.
+        :type aquecer_cache: bool
+        :param prazo_drenagem: Tempo máximo, em segundos, para as operações em andamento terminarem no encerramento.
+        :type prazo_drenagem: float
+        :param socket_herdado: Descritor do socket de escuta herdado do processo anterior, num reinício.
+        :type socket_herdado: int or None
+        :param tempo_ocioso: Tempo, em segundos, sem receber dados após o qual a conexão é encerrada.
+        :type tempo_ocioso: float
+        :param max_conexoes: Conexões atendidas ao mesmo tempo.
+        :type max_conexoes: int
+        :param limite_taxa: Requisições por segundo de cada conexão.
+        :type limite_taxa: float
+        :param prazo_envio: Tempo máximo, em segundos, para o cliente receber uma resposta.
+        :type prazo_envio: float
+        :param tls: Contexto TLS das conexões dos clientes.
+        :type tls: ssl.SSLContext or None
+        :param tokens: Tokens de sessão emitidos no login e aceitos na retomada da sessão.
+        :type tokens: TokensSessao or None
         :rtype: Servidor
         """
-        servidor = Servidor()
+        servidor = Servidor(
+            porta=porta,
+            motor=motor,
+            armazem=armazem,
+            diario=diario,
+            extrato=extrato,
+            agregados=agregados,
+            idempotencia=idempotencia,
+            notificacoes=notificacoes,
+            armazenamento=armazenamento,
+            registro_operacoes=registro_operacoes,
+            particao=particao,
+            particoes=particoes,
+            porta_particoes=porta_particoes,
+            replicacao=replicacao,
+            backlog=backlog,
+            aquecer_cache=aquecer_cache,
+            prazo_drenagem=prazo_drenagem,
+            socket_herdado=socket_herdado,
+            tempo_ocioso=tempo_ocioso,
+            max_conexoes=max_conexoes,
+            limite_taxa=limite_taxa,
+            prazo_envio=prazo_envio,
+            tls=tls,
+            tokens=tokens
+        )
         servidor.iniciar()
 
-        signal.signal(signal.SIGINT, lambda signum, frame: servidor.encerrar())
+        for sinal, reiniciar in Servidor.sinais().items():
+            if reiniciar and particoes > 1:
+                # As partições compartilham a porta e são encerradas pelo processo que as criou.
+                continue
+            signal.signal(sinal, lambda signum, frame, reiniciar=reiniciar: servidor.encerrar(reiniciar=reiniciar))
         return servidor
 
-    def processar_operacao_saldo(self, cliente_socket, mensagem: str) -> None:
+    def processar_dados(self, conexao: Conexao, dados: bytes) -> bool:
+        """
+        Processa, em ordem, todas as solicitações completas contidas nos dados recebidos do cliente,
+        conforme a codificação negociada no login. Os dados de uma solicitação incompleta ficam no buffer
+        da conexão até o tamanho máximo de uma solicitação. Um cabeçalho binário inválido, como o de outra
+        versão do protocolo, não permite delimitar os quadros seguintes: é respondido como uma operação
+        inválida, e a conexão é encerrada.
+        :param conexao: Conexão do cliente.
+        :type conexao: Conexao
+        :param dados: Dados recebidos do socket.
+        :type dados: bytes
+        :return: Falso se a solicitação incompleta excede o tamanho máximo, ou o cabeçalho binário é inválido,
+        e a conexão deve ser encerrada.
+        :rtype: bool
+        """
+        if conexao.codificacao == CODIFICACAO_BINARIA:
+            for quadro in conexao.extrair_quadros(dados):
+                self.processar_operacao_binaria(conexao=conexao, quadro=quadro)
+            if conexao.invalida:
+                metricas.incrementar('conexoes.quadros_invalidos')
+                registro.info('Cabeçalho binário inválido')
+                conexao.id_requisicao = None
+                conexao.buffer = b''
+                conexao.responder(RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Operaçao inválida'))
+                return False
+        else:
+            for mensagem in conexao.extrair_mensagens(dados):
+                self.processar_operacao(conexao=conexao, mensagem=mensagem)
+        if len(conexao.buffer) > TAMANHO_MAXIMO_SOLICITACAO:
+            metricas.incrementar('conexoes.excedidas')
+            conexao.id_requisicao = None
+            conexao.responder(RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Solicitação muito grande'))
+            return False
+        return True
+
+    @processador(Operacoes.SALDO)
+    def processar_operacao_saldo(self, conexao: Conexao, solicitacao: OperacaoSaldo) -> None:
         """
         Processa a operação de saldo.
-        :param cliente_socket: Socket do cliente.
-        :type cliente_socket: socket.socket
-        :param mensagem: Comando recebido do cliente.
-        :type mensagem: str
+        :param conexao: Conexão do cliente.
+        :type conexao: Conexao
+        :param solicitacao: Solicitação recebida do cliente.
+        :type solicitacao: OperacaoSaldo
         """
-        solicitacao = OperacaoSaldo.desencapsular(mensagem=mensagem)
         rg = str(solicitacao.rg)
 
-        with lock:
-            conta = Conta.obter_conta(rg=rg)
+        with self.travas.travar(rg):
+            conta = self.obter_conta(conexao=conexao, rg=rg)
             if conta:
-                resposta = RespostaSucesso(tempo=self.obter_e_incrementar_tempo(), resposta=f"Saldo: {conta.saldo}")
+                resposta = RespostaSucesso(tempo=self.obter_e_incrementar_tempo(), resposta=f"Saldo: {formatar_valor(conta.saldo)}")
             else:
                 resposta = RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Cliente não encontrado')
-            cliente_socket.send(resposta.encapsular().encode())
+            conexao.responder(resposta)
 
-    def processar_operacao_saque(self, cliente_socket, mensagem: str) -> None:
+    @processador(Operacoes.SAQUE)
+    def processar_operacao_saque(self, conexao: Conexao, solicitacao: OperacaoSaque) -> None:
         """
         Processa a operação de saque.
-        :param cliente_socket: Socket do cliente.
-        :type cliente_socket: socket.socket
-        :param mensagem: Comando recebido do cliente.
-        :type mensagem: str
+        :param conexao: Conexão do cliente.
+        :type conexao: Conexao
+        :param solicitacao: Solicitação recebida do cliente.
+        :type solicitacao: OperacaoSaque
         """
-        solicitacao = OperacaoSaque.desencapsular(mensagem=mensagem)
         rg = str(solicitacao.rg)
 
-        with lock:
-            conta = Conta.obter_conta(rg=rg)
+        with self.travas.travar(rg):
+            conta = self.obter_conta(conexao=conexao, rg=rg)
             if conta:
                 if conta.saldo >= solicitacao.valor:
                     conta.sacar(valor=solicitacao.valor)
@@ -170,117 +974,1200 @@ class Servidor:
                     resposta = RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Saldo insuficiente')
             else:
                 resposta = RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Cliente não encontrado')
-            cliente_socket.send(resposta.encapsular().encode())
+            conexao.responder(resposta)
 
-    def processar_operacao_deposito(self, cliente_socket, mensagem: str) -> None:
+    @processador(Operacoes.DEPOSITO)
+    def processar_operacao_deposito(self, conexao: Conexao, solicitacao: OperacaoDeposito) -> None:
         """
         Processa a operação de depósito.
-        :param cliente_socket: Socket do cliente.
-        :type cliente_socket: socket.socket
-        :param mensagem: Comando recebido do cliente.
-        :type mensagem: str
+        :param conexao: Conexão do cliente.
+        :type conexao: Conexao
+        :param solicitacao: Solicitação recebida do cliente.
+        :type solicitacao: OperacaoDeposito
         """
-        solicitacao = OperacaoDeposito.desencapsular(mensagem=mensagem)
-        with lock:
-            rg = str(solicitacao.rg)
+        rg = str(solicitacao.rg)
 
-            conta = Conta.obter_conta(rg=rg)
+        with self.travas.travar(rg):
+            conta = self.obter_conta(conexao=conexao, rg=rg)
             if conta:
                 conta.depositar(valor=solicitacao.valor)
                 resposta = RespostaSucesso(tempo=self.obter_e_incrementar_tempo(), resposta='Depósito realizado com sucesso')
             else:
                 resposta = RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Cliente não encontrado')
 
-            cliente_socket.send(resposta.encapsular().encode())
+            conexao.responder(resposta)
 
-    def processar_operacao_transferencia(self, cliente_socket, mensagem: str) -> None:
+    @processador(Operacoes.TRANSFERENCIA)
+    def processar_operacao_transferencia(self, conexao: Conexao, solicitacao: OperacaoTransferencia) -> None:
         """
         Processa a operação de transferência.
-        :param cliente_socket: Socket do cliente.
-        :type cliente_socket: socket.socket
-        :param mensagem: Comando recebido do cliente.
-        :type mensagem: str
+        :param conexao: Conexão do cliente.
+        :type conexao: Conexao
+        :param solicitacao: Solicitação recebida do cliente.
+        :type solicitacao: OperacaoTransferencia
         """
-        solicitacao = OperacaoTransferencia.desencapsular(mensagem=mensagem)
-
         if solicitacao.rg_origem == solicitacao.rg_destino:
             resposta = RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Não é possível transferir para a mesma conta')
-            cliente_socket.send(resposta.encapsular().encode())
+            conexao.responder(resposta)
+            return
+        if self.particao_do_rg(solicitacao.rg_destino) != self.particao:
+            self.transferir_entre_particoes(conexao=conexao, solicitacao=solicitacao)
             return
 
-        with lock:
-            conta_origem = Conta.obter_conta(rg=solicitacao.rg_origem)
-            conta_destino = Conta.obter_conta(rg=solicitacao.rg_destino)
+        with self.travas.travar(solicitacao.rg_origem, solicitacao.rg_destino):
+            conta_origem = self.obter_conta(conexao=conexao, rg=solicitacao.rg_origem)
+            conta_destino = self.obter_conta(conexao=conexao, rg=solicitacao.rg_destino)
 
             if conta_origem is None:
                 resposta = RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Conta de origem não encontrada')
-                cliente_socket.send(resposta.encapsular().encode())
+                conexao.responder(resposta)
                 return
             if conta_destino is None:
                 resposta = RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Conta de destino não encontrada')
-                cliente_socket.send(resposta.encapsular().encode())
+                conexao.responder(resposta)
                 return
             if conta_origem.saldo < solicitacao.valor:
                 resposta = RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Saldo insuficiente')
-                cliente_socket.send(resposta.encapsular().encode())
+                conexao.responder(resposta)
                 return
 
             conta_origem.transferir(conta_destino=conta_destino, valor=solicitacao.valor)
             resposta = RespostaSucesso(tempo=self.obter_e_incrementar_tempo(), resposta='Transferência realizada com sucesso')
-            cliente_socket.send(resposta.encapsular().encode())
+            conexao.responder(resposta)
             return
 
-    def processar_operacao_login(self, cliente_socket, mensagem: str) -> None:
+    def transferir_entre_particoes(self, conexao: Conexao, solicitacao: OperacaoTransferencia) -> None:
         """
-        Processa a operação de ‘login’.
-        :param cliente_socket: Socket do cliente.
-        :type cliente_socket: socket.socket
-        :param mensagem: Comando recebido do cliente.
-        :type mensagem: str
+        Processa uma transferência cuja conta de destino pertence a outra partição. O débito é registrado
+        primeiro, sob a trava da conta de origem, junto com a transferência pendente, e o crédito é enviado
+        em seguida à partição de destino, com o id da transferência; ver `resolver_transferencia`. Assim,
+        o valor nunca é creditado sem ter sido debitado, nem creditado duas vezes. A trava não é mantida
+        durante o envio, pois duas transferências em sentidos opostos entre as mesmas partições
+        aguardariam uma pela outra.
+        :param conexao: Conexão do cliente.
+        :type conexao: Conexao
+        :param solicitacao: Solicitação recebida do cliente.
+        :type solicitacao: OperacaoTransferencia
+        """
+        with self.travas.travar(solicitacao.rg_origem):
+            conta_origem = self.obter_conta(conexao=conexao, rg=solicitacao.rg_origem)
+            if conta_origem is None:
+                conexao.responder(RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Conta de origem não encontrada'))
+                return
+            if conta_origem.saldo < solicitacao.valor:
+                conexao.responder(RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Saldo insuficiente'))
+                return
+            transferencia = self.transferencias.criar(
+                particao=self.particao_do_rg(solicitacao.rg_destino),
+                origem=solicitacao.rg_origem,
+                destino=solicitacao.rg_destino,
+                valor=solicitacao.valor
+            )
+            try:
+                Conta.aplicar(
+                    operacao=Operacoes.TRANSFERENCIA,
+                    saldos={conta_origem: conta_origem.saldo - solicitacao.valor},
+                    anotacoes={'transferencia': transferencia}
+                )
+            except BaseException:
+                self.transferencias.liberar(transferencia['id'])
+                raise
+
+        try:
+            motivo = self.resolver_transferencia(transferencia=transferencia, reenvio=False)
+        finally:
+            self.transferencias.liberar(transferencia['id'])
+        metricas.incrementar('particoes.transferencias')
+        if motivo is None:
+            conexao.responder(RespostaSucesso(tempo=self.obter_e_incrementar_tempo(), resposta='Transferência realizada com sucesso'))
+        else:
+            conexao.responder(RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta=motivo))
+
+    def resolver_transferencia(self, transferencia: Dict, reenvio: bool) -> str | None:
+        """
+        Envia o crédito de uma transferência pendente à partição de destino e a conclui conforme a resposta:
+        confirmada, ou estornada se a partição de destino recusou o crédito, por exemplo por não ter a conta.
+        No primeiro envio, a conexão recusada também é estornada, pois o crédito não chegou ao destino. Se a
+        partição não respondeu, não se sabe se o crédito foi aplicado: a transferência continua pendente e o
+        crédito é reenviado com o mesmo id por `resolver_transferencias`, sem ser aplicado duas vezes, até uma
+        resposta do destino. A transferência deve estar reservada pelo chamador.
+        :param transferencia: Transferência pendente.
+        :type transferencia: dict
+        :param reenvio: Se o crédito já foi enviado antes, sem resposta.
+        :type reenvio: bool
+        :return: O motivo da falha informado ao cliente, ou None se o crédito foi confirmado.
+        :rtype: str or None
+        """
+        credito = OperacaoCredito(
+            tempo=self.obter_e_incrementar_tempo(),
+            particao=self.particao,
+            id=transferencia['id'],
+            resolvidas=self.transferencias.resolvidas(),
+            rg=transferencia['destino'],
+            valor=transferencia['valor']
+        )
+        try:
+            resposta = self.pares[transferencia['particao']].enviar(credito, idempotente=reenvio)
+        except ConnectionRefusedError:
+            if reenvio:
+                return 'Transferência pendente de confirmação da partição de destino'
+            resposta = None
+        except (OSError, ValueError):
+            metricas.incrementar('particoes.pendentes')
+            return 'Transferência pendente de confirmação da partição de destino'
+        else:
+            self.atualizar_tempo(tempo=resposta.tempo)
+
+        concluida = {'concluida': transferencia['id']}
+        if isinstance(resposta, RespostaSucesso):
+            Conta.aplicar(operacao=Operacoes.TRANSFERENCIA, saldos={}, anotacoes=concluida)
+            return None
+        with self.travas.travar(transferencia['origem']):
+            conta_origem = Conta.obter_conta(rg=transferencia['origem'])
+            Conta.aplicar(
+                operacao=Operacoes.TRANSFERENCIA,
+                saldos={conta_origem: conta_origem.saldo + transferencia['valor']},
+                anotacoes=concluida
+            )
+        if resposta is not None and resposta.resposta == 'Conta de destino não encontrada':
+            return resposta.resposta
+        return 'Partição de destino indisponível'
+
+    def resolver_transferencias(self) -> None:
+        """
+        Reenvia periodicamente o crédito das transferências pendentes, inclusive as recuperadas do diário
+        após uma queda, até cada uma ser confirmada ou estornada.
+        """
+        while self.disponivel:
+            time.sleep(INTERVALO_RESOLUCAO)
+            for transferencia in self.transferencias.livres():
+                if not self.disponivel:
+                    return
+                if not self.transferencias.reservar(transferencia['id']):
+                    continue
+                try:
+                    if self.resolver_transferencia(transferencia=transferencia, reenvio=True) is None:
+                        metricas.incrementar('particoes.resolvidas')
+                except Exception:
+                    registro.exception('Falha ao resolver a transferência %d', transferencia['id'])
+                finally:
+                    self.transferencias.liberar(transferencia['id'])
+
+    @processador(Operacoes.CREDITO)
+    def processar_operacao_credito(self, conexao: Conexao, solicitacao: OperacaoCredito) -> None:
+        """
+        Processa, na partição da conta de destino, o crédito de uma transferência entre partições. Um crédito
+        já aplicado, reenviado pela partição de origem após uma falha, é confirmado sem ser aplicado de novo.
+        :param conexao: Conexão da partição de origem.
+        :type conexao: Conexao
+        :param solicitacao: Crédito recebido da partição de origem.
+        :type solicitacao: OperacaoCredito
+        """
+        self.creditos.avancar(particao=solicitacao.particao, resolvidas=solicitacao.resolvidas)
+        with self.travas.travar(solicitacao.rg):
+            if self.creditos.aplicado(particao=solicitacao.particao, id=solicitacao.id):
+                metricas.incrementar('particoes.creditos_repetidos')
+                conexao.responder(RespostaSucesso(tempo=self.obter_e_incrementar_tempo(), resposta='Crédito realizado com sucesso'))
+                return
+            conta = Conta.obter_conta(rg=solicitacao.rg)
+            if conta is None:
+                conexao.responder(RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Conta de destino não encontrada'))
+                return
+            Conta.aplicar(
+                operacao=Operacoes.TRANSFERENCIA,
+                saldos={conta: conta.saldo + solicitacao.valor},
+                anotacoes={'credito': [solicitacao.particao, solicitacao.id, solicitacao.resolvidas]}
+            )
+            conexao.responder(RespostaSucesso(tempo=self.obter_e_incrementar_tempo(), resposta='Crédito realizado com sucesso'))
+
+    @processador(Operacoes.LOTE)
+    def processar_operacao_lote(self, conexao: Conexao, solicitacao: OperacaoLote) -> None:
+        """
+        Processa um lote de saques, depósitos e transferências. As travas de todas as contas envolvidas
+        são adquiridas uma única vez, as operações são aplicadas em ordem sobre os saldos em memória e
+        cada conta alterada é persistida uma única vez ao final. A resposta traz o status de cada operação.
+        :param conexao: Conexão do cliente.
+        :type conexao: Conexao
+        :param solicitacao: Solicitação recebida do cliente.
+        :type solicitacao: OperacaoLote
+        """
+        rgs = set()
+        for item in solicitacao.itens:
+            if isinstance(item, OperacaoTransferencia):
+                rgs.update((item.rg_origem, item.rg_destino))
+            else:
+                rgs.add(item.rg)
+
+        with self.travas.travar(*rgs):
+            contas = {rg: self.obter_conta(conexao=conexao, rg=rg) for rg in rgs}
+            saldos = {}
+            status = []
+            for item in solicitacao.itens:
+                if isinstance(item, OperacaoTransferencia):
+                    origem, destino = contas[item.rg_origem], contas[item.rg_destino]
+                    if item.rg_origem == item.rg_destino:
+                        status.append(StatusLote.OPERACAO_INVALIDA)
+                        continue
+                    debitos = {origem: item.valor, destino: -item.valor}
+                else:
+                    conta = contas[item.rg]
+                    debitos = {conta: item.valor if isinstance(item, OperacaoSaque) else -item.valor}
+
+                if None in debitos:
+                    status.append(StatusLote.CONTA_NAO_ENCONTRADA)
+                    continue
+                if any(saldos.get(conta, conta.saldo) < valor for conta, valor in debitos.items() if valor > 0):
+                    status.append(StatusLote.SALDO_INSUFICIENTE)
+                    continue
+                for conta, valor in debitos.items():
+                    saldos[conta] = saldos.get(conta, conta.saldo) - valor
+                status.append(StatusLote.OK)
+
+            if saldos:
+                Conta.aplicar(operacao=Operacoes.LOTE, saldos=saldos)
+            conexao.responder(RespostaLote(tempo=self.obter_e_incrementar_tempo(), status=status))
+
+    @processador(Operacoes.LOGIN)
+    def processar_operacao_login(self, conexao: Conexao, solicitacao: OperacaoLogin) -> None:
+        """
+        Processa a operação de ‘login’. Se o login for bem-sucedido, a conta é fixada na conexão, e a conexão
+        passa a usar a codificação solicitada pelo cliente; a resposta do login é sempre enviada em texto. Com
+        "sessao:1", a resposta traz um token com o qual outra conexão retoma a sessão, por `OperacaoRetomar`.
+        :param conexao: Conexão do cliente.
+        :type conexao: Conexao
+        :param solicitacao: Solicitação recebida do cliente.
+        :type solicitacao: OperacaoLogin
         """
-        solicitacao = OperacaoLogin.desencapsular(mensagem=mensagem)
         rg = str(solicitacao.rg)
-        conta = Conta.obter_conta(rg=rg)
+        with self.travas.travar(rg):
+            conta = Conta.obter_conta(rg=rg)
+            if conta:
+                self.sessoes.fixar(conexao=conexao, rg=rg, conta=conta)
         if conta:
-            resposta = RespostaSucesso(tempo=self.obter_e_incrementar_tempo(), resposta='Login realizado com sucesso')
+            texto = 'Login realizado com sucesso'
+            if solicitacao.sessao and self.tokens is not None:
+                texto += SEPARADOR_TOKEN + self.tokens.emitir(rg=rg)
+            resposta = RespostaSucesso(tempo=self.obter_e_incrementar_tempo(), resposta=texto)
         else:
             resposta = RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Cliente não encontrado')
-        cliente_socket.send(resposta.encapsular().encode())
+        conexao.responder(resposta)
+        if conta:
+            conexao.codificacao = solicitacao.codificacao
 
-    def processar_operacao(self, cliente_socket, mensagem: str) -> None:
+    @processador(Operacoes.RETOMAR)
+    def processar_operacao_retomar(self, conexao: Conexao, solicitacao: OperacaoRetomar) -> None:
         """
-        Atualiza o relógio lógico do servidor e processa a mensagem do cliente.
-        :param cliente_socket: Socket do cliente.
-        :type cliente_socket: socket.socket
+        Processa a retomada de uma sessão pelo token emitido num login anterior, de outra conexão ou de outra
+        partição. Como no login, a conta é fixada na conexão, que passa a usar a codificação solicitada, e a
+        resposta é sempre enviada em texto. A conta de outra partição não é consultada: o token dispensa o
+        encaminhamento do login, e apenas o RG fica associado à conexão, como num login encaminhado.
+        :param conexao: Conexão do cliente.
+        :type conexao: Conexao
+        :param solicitacao: Solicitação recebida do cliente.
+        :type solicitacao: OperacaoRetomar
+        """
+        rg = self.tokens.validar(token=solicitacao.token) if self.tokens is not None else None
+        retomada = rg is not None
+        if retomada and self.particao_do_rg(rg) != self.particao:
+            self.sessoes.fixar(conexao=conexao, rg=rg, conta=None)
+        elif retomada:
+            with self.travas.travar(rg):
+                conta = Conta.obter_conta(rg=rg)
+                if conta:
+                    self.sessoes.fixar(conexao=conexao, rg=rg, conta=conta)
+            retomada = bool(conta)
+        if retomada:
+            metricas.incrementar('sessoes.retomadas')
+            resposta = RespostaSucesso(tempo=self.obter_e_incrementar_tempo(), resposta='Sessão retomada')
+        else:
+            metricas.incrementar('sessoes.tokens_recusados')
+            resposta = RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Sessão inválida ou expirada')
+        conexao.responder(resposta)
+        if retomada:
+            conexao.codificacao = solicitacao.codificacao
+
+    @processador(Operacoes.ESTATISTICAS)
+    def processar_operacao_estatisticas(self, conexao: Conexao, solicitacao: OperacaoEstatisticas) -> None:
+        """
+        Processa a consulta às métricas do servidor, respondidas em JSON: contadores, como conexões ativas
+        e bytes trafegados, e histogramas de latência por operação, de espera pelas travas das contas e
+        de persistência.
+        :param conexao: Conexão do cliente.
+        :type conexao: Conexao
+        :param solicitacao: Solicitação recebida do cliente.
+        :type solicitacao: OperacaoEstatisticas
+        """
+        estatisticas = metricas.instantaneo()
+        estatisticas['relogio'] = self.relogio
+        if self.particoes > 1:
+            estatisticas['particao'] = self.particao
+        if self.replicacao is not None:
+            estatisticas['replicacao'] = self.replicacao.informacoes()
+        if self.armazem is not None:
+            estatisticas['contas_em_memoria'] = len(self.armazem.contas)
+        resposta = RespostaSucesso(tempo=self.obter_e_incrementar_tempo(), resposta=json.dumps(estatisticas))
+        conexao.responder(resposta)
+
+    @processador(Operacoes.EXTRATO)
+    def processar_operacao_extrato(self, conexao: Conexao, solicitacao: OperacaoExtrato) -> None:
+        """
+        Processa a consulta de uma página do extrato da conta, respondida em JSON: o saldo atual, os movimentos,
+        do mais recente para o mais antigo, e o número sequencial da próxima página, ou nulo na última.
+        :param conexao: Conexão do cliente.
+        :type conexao: Conexao
+        :param solicitacao: Solicitação recebida do cliente.
+        :type solicitacao: OperacaoExtrato
+        """
+        if self.extrato is None:
+            conexao.responder(RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Extrato desativado'))
+            return
+        rg = str(solicitacao.rg)
+
+        with self.travas.travar(rg):
+            conta = self.obter_conta(conexao=conexao, rg=rg)
+            saldo = conta.saldo if conta else None
+        if conta is None:
+            conexao.responder(RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Cliente não encontrado'))
+            return
+
+        movimentos, proximo = self.extrato.consultar(
+            rg=rg,
+            inicio=solicitacao.inicio,
+            fim=solicitacao.fim,
+            chave=solicitacao.chave,
+            antes=solicitacao.antes,
+            limite=min(solicitacao.limite or PAGINA_PADRAO, PAGINA_MAXIMA)
+        )
+        extrato = {
+            'rg': rg,
+            'saldo_centavos': saldo,
+            'movimentos': [movimento_para_dict(movimento) for movimento in movimentos],
+            'proximo': proximo,
+        }
+        conexao.responder(RespostaSucesso(tempo=self.obter_e_incrementar_tempo(), resposta=json.dumps(extrato)))
+
+    @processador(Operacoes.RELATORIO)
+    def processar_operacao_relatorio(self, conexao: Conexao, solicitacao: OperacaoRelatorio) -> None:
+        """
+        Processa a consulta ao relatório dos agregados das contas, respondido em JSON: quantidade de contas,
+        soma dos saldos, histograma dos saldos e contas de maior saldo. Com a verificação, uma varredura de todas
+        as contas é iniciada em segundo plano, no máximo uma a cada intervalo mínimo, e o relatório informa se
+        ela foi iniciada e as divergências encontradas pela última varredura concluída.
+        Num servidor particionado, o relatório é o das contas da partição que recebeu a solicitação.
+        :param conexao: Conexão do cliente.
+        :type conexao: Conexao
+        :param solicitacao: Solicitação recebida do cliente.
+        :type solicitacao: OperacaoRelatorio
+        """
+        if self.agregados is None:
+            conexao.responder(RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Relatório desativado'))
+            return
+        iniciada = self.agregados.reconstruir_em_segundo_plano() if solicitacao.verificar else False
+        relatorio = self.agregados.relatorio()
+        if relatorio is None:
+            conexao.responder(RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Relatório em preparação'))
+            return
+        if solicitacao.verificar:
+            relatorio['verificacao_iniciada'] = iniciada
+        if self.particoes > 1:
+            relatorio['particao'] = self.particao
+        conexao.responder(RespostaSucesso(tempo=self.obter_e_incrementar_tempo(), resposta=json.dumps(relatorio)))
+
+    @processador(Operacoes.ASSINAR)
+    def processar_operacao_assinar(self, conexao: Conexao, solicitacao: OperacaoAssinar) -> None:
+        """
+        Processa a assinatura das alterações de saldo de uma conta, ou o seu cancelamento. Depois da resposta,
+        a conexão recebe o saldo atual e, a cada alteração da conta, o novo saldo, numa `NotificacaoSaldo`.
+        Num servidor particionado, a conta de outra partição é assinada nela pelo repasse deste processo.
+        :param conexao: Conexão do cliente.
+        :type conexao: Conexao
+        :param solicitacao: Solicitação recebida do cliente.
+        :type solicitacao: OperacaoAssinar
+        """
+        if self.notificacoes is None:
+            conexao.responder(RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Notificações desativadas'))
+            return
+        rg = str(solicitacao.rg)
+        if solicitacao.cancelar:
+            if conexao.assinatura is not None and self.notificacoes.cancelar(assinatura=conexao.assinatura, rg=rg):
+                self.cancelar_repasse(rg)
+            conexao.responder(RespostaSucesso(tempo=self.obter_e_incrementar_tempo(), resposta='Assinatura cancelada'))
+            return
+
+        particao = self.particao_do_rg(rg)
+        if particao != self.particao:
+            # A existência da conta é verificada na partição responsável, que envia o saldo atual pelo repasse.
+            try:
+                resposta = self.pares[particao].enviar(
+                    OperacaoSaldo(tempo=self.obter_e_incrementar_tempo(), rg=rg), idempotente=True
+                )
+            except (OSError, ValueError):
+                conexao.responder(RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Partição indisponível'))
+                return
+            self.atualizar_tempo(tempo=resposta.tempo)
+            if isinstance(resposta, RespostaErro):
+                conexao.responder(RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta=resposta.resposta))
+                return
+            try:
+                nova = self.notificacoes.assinar(assinatura=self.obter_assinatura(conexao), rg=rg, saldo=None)
+            except ValueError as erro:
+                conexao.responder(RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta=str(erro)))
+                return
+            self.repasses[particao].assinar(rg=rg, nova=nova)
+            conexao.responder(RespostaSucesso(tempo=self.obter_e_incrementar_tempo(), resposta='Assinatura realizada'))
+            return
+
+        with self.travas.travar(rg):
+            conta = self.obter_conta(conexao=conexao, rg=rg)
+            if conta is None:
+                resposta = RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Cliente não encontrado')
+            else:
+                try:
+                    self.notificacoes.assinar(assinatura=self.obter_assinatura(conexao), rg=rg, saldo=conta.saldo)
+                    resposta = RespostaSucesso(tempo=self.obter_e_incrementar_tempo(), resposta='Assinatura realizada')
+                except ValueError as erro:
+                    resposta = RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta=str(erro))
+        conexao.responder(resposta)
+
+    def obter_assinatura(self, conexao: Conexao) -> Assinatura:
+        """
+        Obtém as assinaturas da conexão, criando-as na primeira assinatura. No motor asyncio, o envio das
+        notificações é agendado no laço de eventos; no threading, a thread da conexão é despertada pelo
+        par de sockets da assinatura.
+        :param conexao: Conexão do cliente.
+        :type conexao: Conexao
+        :rtype: Assinatura
+        """
+        if conexao.assinatura is None:
+            if isinstance(conexao, ConexaoAsyncio):
+                # Chamado na thread do executor que processa a assinatura: o laço é o da conexão.
+                laco = conexao.laco
+                conexao.assinatura = Assinatura(
+                    despertar=lambda: laco.call_soon_threadsafe(self.enviar_notificacoes_asyncio, conexao)
+                )
+            else:
+                conexao.assinatura = Assinatura()
+        return conexao.assinatura
+
+    def enviar_notificacoes(self, conexao: Conexao) -> None:
+        """
+        Envia à conexão, na thread dela, os saldos pendentes das contas assinadas. Um cliente que não lê as
+        notificações bloqueia apenas a própria thread, até o prazo de envio, enquanto as alterações seguintes
+        das contas dele são agrupadas.
+        :param conexao: Conexão do cliente.
+        :type conexao: Conexao
+        """
+        try:
+            conexao.assinatura.leitura.recv(utils.TAMANHO_BUFFER_PADRAO)
+        except BlockingIOError:
+            pass
+        dados = self.notificacoes.empacotar(assinatura=conexao.assinatura, codificacao=conexao.codificacao)
+        if dados:
+            conexao.send(dados)
+
+    def enviar_notificacoes_asyncio(self, conexao: ConexaoAsyncio) -> None:
+        """
+        Envia à conexão, no laço de eventos, os saldos pendentes das contas assinadas. Se o cliente ainda não
+        leu os dados anteriores além do limite de envio, o envio é adiado, e as alterações seguintes são
+        agrupadas; a conexão é abortada pela varredura se o cliente não os ler no prazo de envio.
+        :param conexao: Conexão do cliente.
+        :type conexao: ConexaoAsyncio
+        """
+        import asyncio
+        if conexao.writer.is_closing() or conexao.assinatura is None:
+            return
+        if conexao.writer.transport.get_write_buffer_size() > LIMITE_ENVIO_NOTIFICACOES:
+            if conexao.envio is None:
+                conexao.envio = time.monotonic()
+            metricas.incrementar('notificacoes.adiadas')
+            asyncio.get_running_loop().call_later(INTERVALO_ENVIO_NOTIFICACOES, self.enviar_notificacoes_asyncio, conexao)
+            return
+        # Abaixo do limite, o `drain` das respostas também não aguarda o cliente.
+        conexao.envio = None
+        dados = self.notificacoes.empacotar(assinatura=conexao.assinatura, codificacao=conexao.codificacao)
+        if dados:
+            conexao.send(dados)
+
+    def cancelar_assinaturas(self, conexao: Conexao) -> None:
+        """
+        Cancela as assinaturas da conexão, ao encerrá-la, inclusive as repassadas a outras partições.
+        :param conexao: Conexão do cliente.
+        :type conexao: Conexao
+        """
+        if conexao.assinatura is None:
+            return
+        for rg in self.notificacoes.cancelar_todas(assinatura=conexao.assinatura):
+            self.cancelar_repasse(rg)
+        conexao.assinatura.fechar()
+
+    def cancelar_repasse(self, rg: str) -> None:
+        """
+        Cancela o repasse da assinatura local de uma conta de outra partição.
+        :param rg: RG da conta.
+        :type rg: str
+        """
+        particao = self.particao_do_rg(rg)
+        if particao != self.particao:
+            self.repasses[particao].cancelar(rg=rg)
+
+    @processador(Operacoes.REPLICAR)
+    def processar_operacao_replicar(self, conexao: Conexao, solicitacao: OperacaoReplicar) -> None:
+        """
+        Aplica uma alteração, ou um batimento, recebido do líder às contas cuja última versão aplicada é mais
+        antiga, e renova a concessão deste nó. A mensagem de um líder de uma época anterior é recusada.
+        :param conexao: Conexão do líder.
+        :type conexao: Conexao
+        :param solicitacao: Alteração replicada.
+        :type solicitacao: OperacaoReplicar
+        """
+        if self.replicacao is None:
+            conexao.responder(RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Servidor sem replicação'))
+            return
+        if not self.replicacao.receber(
+                no=solicitacao.no, epoca=solicitacao.epoca, tempo=solicitacao.tempo, ativos=solicitacao.ativos
+        ):
+            conexao.responder(RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta=EPOCA_ANTIGA))
+            return
+        if solicitacao.saldos:
+            versao = (solicitacao.epoca, solicitacao.tempo, solicitacao.no)
+            with self.travas.travar(*solicitacao.saldos):
+                recentes = self.replicacao.filtrar_recentes({rg: (saldo, versao) for rg, saldo in solicitacao.saldos.items()})
+                self.aplicar_replica(recentes)
+        conexao.responder(RespostaSucesso(tempo=self.obter_e_incrementar_tempo(), resposta='Alteração replicada'))
+
+    @processador(Operacoes.ESTADO)
+    def processar_operacao_estado(self, conexao: Conexao, solicitacao: OperacaoEstado) -> None:
+        """
+        Envia a um nó que está voltando ao grupo o saldo e a versão de todas as contas e o inclui entre os
+        nós ativos. Apenas o líder responde. As operações são suspensas durante a cópia, para que toda
+        alteração seja ou copiada, ou replicada ao nó depois dela.
+        :param conexao: Conexão do nó.
+        :type conexao: Conexao
+        :param solicitacao: Pedido do estado.
+        :type solicitacao: OperacaoEstado
+        """
+        if self.replicacao is None:
+            conexao.responder(RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Servidor sem replicação'))
+            return
+        with self.travas.travar_todas():
+            if not self.replicacao.eh_lider():
+                conexao.responder(RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta=NAO_LIDER))
+                return
+            self.replicacao.incluir(solicitacao.no)
+            contas = {}
+            for rg in Conta.listar_rgs():
+                conta = Conta.obter_conta(rg=rg)
+                if conta is not None:
+                    contas[rg] = [conta.saldo, *self.replicacao.versao(rg)]
+            informacoes = self.replicacao.informacoes()
+            estado = {'epoca': informacoes['epoca'], 'ativos': informacoes['ativos'], 'contas': contas}
+            resposta = RespostaSucesso(tempo=self.obter_e_incrementar_tempo(), resposta=json.dumps(estado))
+        conexao.responder(resposta)
+
+    def aplicar_replica(self, saldos: Dict[str, int]) -> None:
+        """
+        Aplica saldos recebidos de outro nó. O chamador deve manter as travas das contas.
+        :param saldos: Saldo de cada conta, em centavos, por RG.
+        :type saldos: dict
+        """
+        contas = {}
+        for rg, saldo in saldos.items():
+            conta = Conta.obter_conta(rg=rg)
+            if conta is not None:
+                contas[conta] = saldo
+        if contas:
+            Conta.aplicar(operacao=Operacoes.REPLICAR, saldos=contas)
+
+    def sincronizar_replica(self, lider: int) -> bool:
+        """
+        Copia o estado das contas do líder, que inclui este nó no grupo, e adota a visão dele sobre os nós
+        ativos. Os saldos são aplicados com as operações suspensas, pois as alterações do líder já podem
+        estar chegando.
+        :param lider: Número do líder.
+        :type lider: int
+        :return: Se o estado foi copiado.
+        :rtype: bool
+        """
+        try:
+            resposta = self.replicacao.encaminhamentos[lider].enviar(
+                OperacaoEstado(tempo=self.obter_e_incrementar_tempo(), no=self.replicacao.no), idempotente=True
+            )
+        except (OSError, ValueError):
+            return False
+        self.atualizar_tempo(tempo=resposta.tempo)
+        if not isinstance(resposta, RespostaSucesso):
+            return False
+        estado = json.loads(resposta.resposta)
+        with self.travas.travar_todas():
+            self.aplicar_replica(self.replicacao.adotar_estado(lider=lider, tempo=resposta.tempo, estado=estado))
+        registro.warning('Estado de %d contas copiado do líder %d', len(estado['contas']), lider)
+        return True
+
+    def procurar_lider(self) -> None:
+        """
+        Consulta a visão dos outros nós sobre o grupo e volta a ele pelo líder que encontrar ou, se não houver
+        um, assume a liderança quando este nó for o escolhido; ver `Replicacao.avaliar`.
+        """
+        visoes = {}
+        for no, par in self.replicacao.pares.items():
+            try:
+                resposta = par.enviar(OperacaoEstatisticas(tempo=self.obter_e_incrementar_tempo()), idempotente=True)
+            except (OSError, ValueError):
+                continue
+            self.atualizar_tempo(tempo=resposta.tempo)
+            if isinstance(resposta, RespostaSucesso):
+                visoes[no] = json.loads(resposta.resposta)['replicacao']
+        decisao = self.replicacao.avaliar(visoes)
+        if decisao is None:
+            return
+        acao, no = decisao
+        if acao == 'seguir':
+            self.sincronizar_replica(lider=no)
+        else:
+            self.replicacao.assumir(epoca=no)
+
+    def monitorar_replicas(self) -> None:
+        """
+        Laço da thread que, no líder, envia os batimentos aos nós ativos e, num nó sem a concessão do líder,
+        procura o líder para voltar ao grupo.
+        """
+        while self.disponivel:
+            time.sleep(INTERVALO_BATIMENTO)
+            try:
+                if self.replicacao.eh_lider():
+                    self.replicacao.bater()
+                elif not self.replicacao.atualizada():
+                    self.procurar_lider()
+            except Exception:
+                registro.exception('Falha ao monitorar o grupo de réplicas')
+
+    def particao_do_rg(self, rg: str) -> int:
+        """
+        Obtém a partição responsável pela conta.
+        :param rg: RG do cliente.
+        :type rg: str
+        :rtype: int
+        """
+        return particao_do_rg(rg, self.particoes) if self.particoes > 1 else 0
+
+    @staticmethod
+    def contas_da_solicitacao(solicitacao: Protocolo) -> Set[str]:
+        """
+        Obtém as contas que determinam a partição responsável pela solicitação. Nas transferências,
+        é a conta de origem: a partição dela coordena o crédito na partição da conta de destino.
+        :param solicitacao: Solicitação recebida do cliente.
+        :type solicitacao: Protocolo
+        :rtype: set
+        """
+        if isinstance(solicitacao, OperacaoTransferencia):
+            return {solicitacao.rg_origem}
+        if isinstance(solicitacao, OperacaoLote):
+            return {
+                rg
+                for item in solicitacao.itens
+                for rg in ((item.rg_origem, item.rg_destino) if isinstance(item, OperacaoTransferencia) else (item.rg,))
+            }
+        rg = getattr(solicitacao, 'rg', None)
+        return {rg} if rg is not None else set()
+
+    @staticmethod
+    def completar_rg(conexao: Conexao, solicitacao: Protocolo) -> bool:
+        """
+        Preenche o RG omitido numa solicitação com o RG autenticado no login da conexão, antes de ela ser
+        processada ou encaminhada a outro processo.
+        :param conexao: Conexão do cliente.
+        :type conexao: Conexao
+        :param solicitacao: Solicitação recebida do cliente.
+        :type solicitacao: Protocolo
+        :return: Falso se o RG foi omitido sem um login anterior.
+        :rtype: bool
+        """
+        if solicitacao.campo_sessao is None or getattr(solicitacao, solicitacao.campo_sessao) is not None:
+            return True
+        if conexao.rg is None:
+            return False
+        setattr(solicitacao, solicitacao.campo_sessao, conexao.rg)
+        return True
+
+    def obter_conta(self, conexao: Conexao, rg: str) -> Conta | None:
+        """
+        Obtém uma conta para uma operação da conexão. A conta autenticada no login é a conta fixada na
+        conexão, obtida novamente apenas se ela foi invalidada por uma alteração feita por outro objeto.
+        O chamador deve manter a trava da conta.
+        :param conexao: Conexão do cliente.
+        :type conexao: Conexao
+        :param rg: RG do cliente.
+        :type rg: str
+        :rtype: Conta or None
+        """
+        if rg != conexao.rg:
+            return Conta.obter_conta(rg=rg)
+        if conexao.conta is None:
+            conexao.conta = Conta.obter_conta(rg=rg)
+            metricas.incrementar('sessoes.recarregadas')
+        return conexao.conta
+
+    def encaminhar(self, conexao: Conexao, solicitacao: Protocolo, par: PoolPar) -> bool:
+        """
+        Encaminha a solicitação a outro processo do servidor e repassa a resposta ao cliente. O tempo lógico
+        é propagado nos dois sentidos, como numa troca de mensagens entre processos do relógio de Lamport.
+        :param conexao: Conexão do cliente.
+        :type conexao: Conexao
+        :param solicitacao: Solicitação recebida do cliente.
+        :type solicitacao: Protocolo
+        :param par: Conexões com o processo responsável pela solicitação.
+        :type par: PoolPar
+        :return: Falso, sem responder ao cliente, se o processo não respondeu.
+        :rtype: bool
+        """
+        solicitacao.tempo = self.obter_e_incrementar_tempo()
+        encaminhada = solicitacao
+        if isinstance(solicitacao, OperacaoLogin):
+            # A conexão entre processos usa sempre texto; a codificação é negociada apenas com o cliente.
+            encaminhada = OperacaoLogin(tempo=solicitacao.tempo, rg=solicitacao.rg, sessao=solicitacao.sessao)
+        try:
+            resposta = par.enviar(encaminhada, idempotente=solicitacao.operacao not in OPERACOES_ESCRITA)
+        except (OSError, ValueError):
+            return False
+        metricas.incrementar('encaminhadas')
+        self.atualizar_tempo(tempo=resposta.tempo)
+        resposta.tempo = self.obter_e_incrementar_tempo()
+        conexao.responder(resposta)
+        if isinstance(solicitacao, OperacaoLogin) and isinstance(resposta, RespostaSucesso):
+            # A conta pertence à outra partição: apenas o RG fica associado à conexão, para as operações sem RG.
+            self.sessoes.fixar(conexao=conexao, rg=solicitacao.rg, conta=None)
+            conexao.codificacao = solicitacao.codificacao
+        return True
+
+    def processar_solicitacao(self, conexao: Conexao, solicitacao: Protocolo | None) -> None:
+        """
+        Encaminha uma solicitação já desencapsulada para o processador registrado para a sua operação,
+        para a partição responsável pelas contas dela, se o servidor for particionado, ou para o líder,
+        se ela alterar contas e o servidor for uma réplica. Uma réplica sem a concessão do líder recusa as
+        consultas, e o líder sem a maioria do grupo recusa as escritas.
+        :param conexao: Conexão do cliente.
+        :type conexao: Conexao
+        :param solicitacao: Solicitação recebida do cliente, ou None se ela for inválida.
+        :type solicitacao: Protocolo or None
+        """
+        conexao.id_requisicao = solicitacao.id_requisicao if solicitacao is not None else None
+        if solicitacao is not None and solicitacao.operacao in OPERACOES_INTERNAS and not conexao.interna:
+            solicitacao = None
+        if conexao.limite is not None and not conexao.limite.consumir(
+                len(solicitacao.itens) if isinstance(solicitacao, OperacaoLote) else 1
+        ):
+            metricas.incrementar('operacoes.limitadas')
+            conexao.responder(RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Limite de requisições excedido'))
+            return
+        if solicitacao is not None and not Servidor.completar_rg(conexao=conexao, solicitacao=solicitacao):
+            conexao.responder(RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Login necessário'))
+            return
+        # A assinatura de uma conta de outra partição é mantida por este processo, que envia as notificações
+        # pela conexão do cliente; ela é repassada à partição responsável por `processar_operacao_assinar`.
+        if self.particoes > 1 and solicitacao is not None and solicitacao.operacao != Operacoes.ASSINAR:
+            particoes = {self.particao_do_rg(rg) for rg in Servidor.contas_da_solicitacao(solicitacao)}
+            if len(particoes) > 1:
+                resposta = RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Lote com contas de partições diferentes')
+                conexao.responder(resposta)
+                return
+            if particoes and self.particao not in particoes:
+                if not self.encaminhar(conexao=conexao, solicitacao=solicitacao, par=self.pares[particoes.pop()]):
+                    conexao.responder(RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Partição indisponível'))
+                return
+        if self.replicacao is not None and solicitacao is not None:
+            if solicitacao.operacao in OPERACOES_ESCRITA and not self.replicacao.eh_lider():
+                # Uma escrita que falhou no encaminhamento pode ter sido aplicada pelo líder, e não é repetida.
+                lider = self.replicacao.lider()
+                if lider is None or not self.encaminhar(
+                        conexao=conexao, solicitacao=solicitacao, par=self.replicacao.encaminhamentos[lider]
+                ):
+                    conexao.responder(RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Líder indisponível'))
+                return
+            if solicitacao.operacao in OPERACOES_ESCRITA and not self.replicacao.com_maioria():
+                conexao.responder(RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Líder indisponível'))
+                return
+            if solicitacao.operacao in OPERACOES_LEITURA and not self.replicacao.atualizada():
+                metricas.incrementar('replicacao.desatualizadas')
+                conexao.responder(RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Réplica desatualizada'))
+                return
+        funcao = PROCESSADORES.get(solicitacao.operacao) if solicitacao is not None else None
+        if funcao is not None:
+            inicio = time.perf_counter()
+            if self.replicacao is not None and solicitacao.operacao in OPERACOES_ESCRITA:
+                self.processar_replicado(conexao=conexao, solicitacao=solicitacao, funcao=funcao)
+            else:
+                self.despachar(conexao=conexao, solicitacao=solicitacao, funcao=funcao)
+            metricas.registrar(METRICAS_OPERACOES[solicitacao.operacao], time.perf_counter() - inicio)
+        else:
+            metricas.incrementar('operacoes.invalidas')
+            resposta = RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Operaçao inválida')
+            conexao.responder(resposta)
+
+    def despachar(self, conexao: Conexao, solicitacao: Protocolo, funcao: Callable[..., None]) -> None:
+        """
+        Executa o processador de uma solicitação, pela chave de idempotência, se ela tiver uma.
+        :param conexao: Conexão do cliente.
+        :type conexao: Conexao
+        :param solicitacao: Solicitação recebida do cliente.
+        :type solicitacao: Protocolo
+        :param funcao: Processador da operação.
+        :type funcao: callable
+        """
+        if (
+                solicitacao.chave_idempotencia is not None and self.idempotencia is not None
+                and solicitacao.operacao in OPERACOES_ESCRITA
+        ):
+            self.processar_idempotente(conexao=conexao, solicitacao=solicitacao, funcao=funcao)
+        else:
+            funcao(self, conexao, solicitacao)
+
+    def processar_replicado(self, conexao: Conexao, solicitacao: Protocolo, funcao: Callable[..., None]) -> None:
+        """
+        Processa, no líder do grupo de réplicas, uma operação que altera saldos. As alterações são versionadas
+        em `Conta.aplicar`, com as travas das contas, mas só são enviadas aos demais nós depois de o processador
+        liberar as travas, e a resposta ao cliente é retida até a maioria do grupo recebê-las.
+        :param conexao: Conexão do cliente.
+        :type conexao: Conexao
+        :param solicitacao: Solicitação recebida do cliente.
+        :type solicitacao: Protocolo
+        :param funcao: Processador da operação.
+        :type funcao: callable
+        """
+        conexao.adiar_respostas()
+        try:
+            with self.replicacao.adiar() as adiadas:
+                self.despachar(conexao=conexao, solicitacao=solicitacao, funcao=funcao)
+                self.replicacao.confirmar(adiadas)
+        except ForaDoGrupo:
+            # A alteração foi aplicada por este nó, mas não chegou à maioria do grupo e não é confirmada.
+            conexao.liberar_respostas(enviar=False)
+            metricas.incrementar('replicacao.nao_confirmadas')
+            conexao.responder(RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Líder indisponível'))
+            return
+        except BaseException:
+            conexao.liberar_respostas(enviar=False)
+            raise
+        conexao.liberar_respostas(enviar=True)
+
+    def processar_idempotente(self, conexao: Conexao, solicitacao: Protocolo, funcao: Callable[..., None]) -> None:
+        """
+        Processa uma operação que altera saldos enviada com uma chave de idempotência. Na primeira solicitação
+        com a chave, a operação é aplicada e a resposta é guardada; nas repetições, a resposta guardada é
+        enviada de novo, com um novo tempo lógico, sem reaplicar a operação. A resposta é guardada mesmo que o
+        envio falhe, pois é justamente a perda da resposta que leva o cliente a repetir a solicitação, e é
+        registrada no diário, se houver, para sobreviver a um reinício. Num servidor particionado ou replicado,
+        a chave é verificada pelo processo que aplica a operação.
+        :param conexao: Conexão do cliente.
+        :type conexao: Conexao
+        :param solicitacao: Solicitação recebida do cliente, com o RG omitido já preenchido.
+        :type solicitacao: Protocolo
+        :param funcao: Processador da operação.
+        :type funcao: callable
+        """
+        chave = solicitacao.chave_idempotencia
+        situacao, resposta = self.idempotencia.reservar(chave=chave, impressao=Idempotencia.impressao(solicitacao))
+        if situacao == SituacaoChave.REPETIDA:
+            metricas.incrementar('idempotencia.repetidas')
+            resposta.tempo = self.obter_e_incrementar_tempo()
+            conexao.responder(resposta)
+            return
+        if situacao == SituacaoChave.EM_ANDAMENTO:
+            metricas.incrementar('idempotencia.em_andamento')
+            conexao.responder(RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Solicitação em andamento'))
+            return
+        if situacao == SituacaoChave.DIVERGENTE:
+            metricas.incrementar('idempotencia.divergentes')
+            resposta = RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Chave de idempotência já usada em outra solicitação')
+            conexao.responder(resposta)
+            return
+
+        conexao.ultima_resposta = None
+        try:
+            funcao(self, conexao, solicitacao)
+        finally:
+            resposta = conexao.ultima_resposta
+            if resposta is None or (isinstance(resposta, RespostaErro) and resposta.resposta in ERROS_TRANSITORIOS):
+                self.idempotencia.liberar(chave=chave)
+            else:
+                anotacoes = self.idempotencia.concluir(chave=chave, resposta=resposta)
+                if anotacoes is not None and Conta.diario is not None:
+                    Conta.aplicar(operacao=solicitacao.operacao, saldos={}, anotacoes=anotacoes)
+
+    def processar_operacao(self, conexao: Conexao, mensagem: str) -> None:
+        """
+        Atualiza o relógio lógico do servidor e processa a mensagem de texto do cliente.
+        :param conexao: Conexão do cliente.
+        :type conexao: Conexao
         :param mensagem: Comando recebido do cliente.
         :type mensagem: str
         :rtype: None
         """
-        self.atualizar_tempo(tempo=Protocolo.obter_tempo(mensagem))
-
-        if match(pattern=OperacaoSaldo.pattern, string=mensagem):
-            self.processar_operacao_saldo(cliente_socket, mensagem)
-        elif match(pattern=OperacaoSaque.pattern, string=mensagem):
-            self.processar_operacao_saque(cliente_socket, mensagem)
-        elif match(pattern=OperacaoDeposito.pattern, string=mensagem):
-            self.processar_operacao_deposito(cliente_socket, mensagem)
-        elif match(pattern=OperacaoTransferencia.pattern, string=mensagem):
-            self.processar_operacao_transferencia(cliente_socket, mensagem)
-        elif match(pattern=OperacaoLogin.pattern, string=mensagem):
-            self.processar_operacao_login(cliente_socket, mensagem)
+        try:
+            solicitacao = Protocolo.analisar(mensagem)
+        except ValueError:
+            solicitacao = None
         else:
-            resposta = RespostaErro(tempo=self.obter_e_incrementar_tempo(), resposta='Operaçao inválida')
-            cliente_socket.send(resposta.encapsular().encode())
+            self.atualizar_tempo(tempo=solicitacao.tempo)
+        self.processar_solicitacao(conexao, solicitacao)
+
+    def processar_operacao_binaria(self, conexao: Conexao, quadro: bytes) -> None:
+        """
+        Atualiza o relógio lógico do servidor e processa um quadro binário do cliente.
+        :param conexao: Conexão do cliente.
+        :type conexao: Conexao
+        :param quadro: Quadro binário completo recebido do cliente.
+        :type quadro: bytes
+        """
+        try:
+            solicitacao = Protocolo.desempacotar(quadro)
+        except (ValueError, struct.error):
+            solicitacao = None
+        else:
+            self.atualizar_tempo(tempo=solicitacao.tempo)
+        self.processar_solicitacao(conexao, solicitacao)
+
+
+def iniciar_substituto(servidor_socket: socket.socket) -> bool:
+    """
+    Inicia um novo processo do servidor, com os mesmos argumentos, que herda o socket de escuta, e aguarda
+    até ele avisar, por um pipe, que está pronto para aceitar conexões.
+    :param servidor_socket: Socket de escuta do servidor.
+    :type servidor_socket: socket.socket
+    :return: Se o novo processo ficou pronto no prazo.
+    :rtype: bool
+    """
+    import subprocess
+
+    argumentos = []
+    ignorar = False
+    for argumento in sys.argv[1:]:
+        if ignorar:
+            ignorar = False
+        elif argumento in ('--socket-herdado', '--aviso-pronto'):
+            ignorar = True
+        elif not argumento.startswith(('--socket-herdado=', '--aviso-pronto=')):
+            argumentos.append(argumento)
+
+    leitura, escrita = os.pipe()
+    processo = subprocess.Popen(
+        [
+            sys.executable, '-m', 'pixson.servidor', *argumentos,
+            '--socket-herdado', str(servidor_socket.fileno()), '--aviso-pronto', str(escrita)
+        ],
+        pass_fds=(servidor_socket.fileno(), escrita)
+    )
+    os.close(escrita)
+    prontos, _, _ = select.select([leitura], [], [], PRAZO_SUBSTITUTO)
+    pronto = bool(prontos) and os.read(leitura, 1) == b'1'
+    os.close(leitura)
+    if pronto:
+        print(f'Processo {processo.pid} assumiu a porta')
+    else:
+        print(f'Processo {processo.pid} não ficou pronto para assumir a porta')
+    return pronto
+
+
+def executar_servidor(argumentos: argparse.Namespace, particao: int = 0) -> None:
+    """
+    Cria e executa um servidor, ou uma das partições do servidor particionado, com os argumentos da linha de comando.
+    :param argumentos: Argumentos da linha de comando.
+    :type argumentos: argparse.Namespace
+    :param particao: Índice da partição atendida por este processo.
+    :type particao: int
+    """
+    armazem = None
+    if not argumentos.sem_cache:
+        armazem = ArmazemContas(
+            capacidade=argumentos.cache_capacidade,
+            intervalo=argumentos.cache_intervalo,
+            limite_sujas=argumentos.cache_limite
+        )
+
+    diario = None
+    if not argumentos.sem_diario:
+        diario = Diario(
+            caminho=f"{argumentos.pasta}/diario.jsonl" if argumentos.particoes == 1 else f"{argumentos.pasta}/diario-{particao}.jsonl",
+            intervalo_checkpoint=argumentos.diario_checkpoint,
+            persistir=armazem.descarregar if armazem is not None else None
+        )
+
+    extrato = None
+    if not argumentos.sem_extrato:
+        extrato = Extrato(
+            pasta=f"{argumentos.pasta}/extratos",
+            segmento=argumentos.extrato_segmento,
+            retencao=argumentos.extrato_retencao
+        )
+
+    agregados = None
+    if not argumentos.sem_agregados:
+        agregados = Agregados(faixas=argumentos.faixas_saldo, topo=argumentos.relatorio_topo)
+
+    registro_operacoes = None
+    if argumentos.registro or argumentos.registro_arquivo:
+        registro_operacoes = iniciar_registro(arquivo=argumentos.registro_arquivo)
+
+    replicacao = None
+    if argumentos.replicas:
+        replicacao = Replicacao(no=argumentos.replicas.index(argumentos.porta), portas=argumentos.replicas)
+
+    tls = None
+    if argumentos.tls_certificado:
+        from pixson.recursos.tls import criar_contexto_servidor
+        tls = criar_contexto_servidor(certificado=argumentos.tls_certificado, chave=argumentos.tls_chave)
+
+    servidor = Servidor.criar(
+        porta=argumentos.porta,
+        motor=argumentos.motor,
+        armazem=armazem,
+        diario=diario,
+        extrato=extrato,
+        agregados=agregados,
+        idempotencia=None if argumentos.sem_idempotencia else Idempotencia(
+            capacidade=argumentos.idempotencia_capacidade, janela=argumentos.idempotencia_janela
+        ),
+        notificacoes=None if argumentos.sem_notificacoes else Notificacoes(max_assinaturas=argumentos.max_assinaturas),
+        armazenamento=criar_armazenamento(argumentos.armazenamento, pasta=argumentos.pasta),
+        registro_operacoes=registro_operacoes,
+        particao=particao,
+        particoes=argumentos.particoes,
+        porta_particoes=argumentos.porta_particoes,
+        replicacao=replicacao,
+        backlog=argumentos.backlog,
+        aquecer_cache=argumentos.aquecer_cache,
+        prazo_drenagem=argumentos.prazo_drenagem,
+        socket_herdado=argumentos.socket_herdado,
+        tempo_ocioso=argumentos.tempo_ocioso,
+        max_conexoes=argumentos.max_conexoes,
+        limite_taxa=argumentos.limite_taxa,
+        prazo_envio=argumentos.prazo_envio,
+        tls=tls,
+        tokens=TokensSessao(segredo=argumentos.segredo_sessao, validade=argumentos.sessao_validade)
+    )
+    if argumentos.aviso_pronto is not None:
+        os.write(argumentos.aviso_pronto, b'1')
+        os.close(argumentos.aviso_pronto)
+    if argumentos.arquivo_pid:
+        Path(argumentos.arquivo_pid).write_text(str(os.getpid()))
+    try:
+        servidor.executar()
+    finally:
+        # Num reinício, o arquivo já tem o número do novo processo e é mantido.
+        if argumentos.arquivo_pid and Path(argumentos.arquivo_pid).read_text() == str(os.getpid()):
+            Path(argumentos.arquivo_pid).unlink()
+
+
+def executar_particoes(argumentos: argparse.Namespace) -> None:
+    """
+    Executa cada partição do servidor num processo próprio e aguarda o encerramento de todas.
+    O Ctrl+C do terminal chega diretamente às partições; um SIGTERM recebido por este processo
+    é repassado a elas como SIGINT, para que encerrem normalmente.
+    :param argumentos: Argumentos da linha de comando.
+    :type argumentos: argparse.Namespace
+    """
+    import multiprocessing
+
+    # As partições compartilham a porta (SO_REUSEPORT), e o `bind` delas não recusaria outro servidor
+    # particionado na mesma porta: a verificação é feita antes de criá-las.
+    if not utils.verificar_porta(porta=argumentos.porta):
+        print('Porta já está em uso')
+        exit()
+
+    processos = [
+        multiprocessing.Process(target=executar_servidor, args=(argumentos, particao), name=f'particao-{particao}')
+        for particao in range(argumentos.particoes)
+    ]
+    for processo in processos:
+        processo.start()
+
+    def repassar_encerramento(signum, frame) -> None:
+        for processo in processos:
+            if processo.is_alive():
+                os.kill(processo.pid, signal.SIGINT)
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, repassar_encerramento)
+    for processo in processos:
+        processo.join()
 
 
 def main():
     """
     Função principal.
     """
-    servidor = Servidor.criar()
-    print('Aguardando conexão...')
-    while servidor.disponivel:
-        servidor.aceitar_conexao()
+    parser = argparse.ArgumentParser(description='Servidor PIXSON')
+    parser.add_argument('--porta', type=int, default=PORTA_PADRAO, help='porta em que o servidor irá escutar')
+    parser.add_argument('--motor', choices=MOTORES, default=MOTOR_THREADING, help='motor de processamento das conexões')
+    parser.add_argument('--armazenamento', choices=ARMAZENAMENTOS, default=ARMAZENAMENTO_JSON, help='meio de persistência das contas')
+    parser.add_argument('--sem-cache', action='store_true', help='lê e grava o arquivo da conta em toda operação')
+    parser.add_argument('--cache-capacidade', type=int, default=CAPACIDADE_PADRAO, help='contas mantidas em memória')
+    parser.add_argument('--cache-intervalo', type=float, default=INTERVALO_PADRAO, help='segundos entre gravações em lote (0 grava imediatamente)')
+    parser.add_argument('--cache-limite', type=int, default=LIMITE_SUJAS_PADRAO, help='contas alteradas que antecipam a gravação')
+    parser.add_argument('--aquecer-cache', action='store_true', help='carrega as contas em memória, em segundo plano, ao iniciar')
+    parser.add_argument('--sem-diario', action='store_true', help='não registra as alterações no diário')
+    parser.add_argument('--diario-checkpoint', type=int, default=INTERVALO_CHECKPOINT_PADRAO, help='registros do diário entre checkpoints')
+    parser.add_argument('--sem-extrato', action='store_true', help='não registra os movimentos das contas para o extrato')
+    parser.add_argument('--extrato-segmento', type=int, default=SEGMENTO_PADRAO, help='movimentos por segmento do extrato de cada conta')
+    parser.add_argument('--extrato-retencao', type=int, default=RETENCAO_PADRAO, help='segmentos fechados consultáveis de cada conta; os mais antigos vão para o arquivo morto')
+    parser.add_argument('--sem-agregados', action='store_true', help='não mantém os agregados das contas para o relatório')
+    parser.add_argument('--relatorio-topo', type=int, default=TOPO_PADRAO, help='contas de maior saldo no relatório')
+    parser.add_argument('--faixas-saldo', type=lambda valores: [ler_valor(valor) for valor in valores.split(',')], default=FAIXAS_PADRAO, help='limites, em reais e separados por vírgula, das faixas do histograma de saldos')
+    parser.add_argument('--sem-idempotencia', action='store_true', help='ignora as chaves de idempotência das solicitações')
+    parser.add_argument('--idempotencia-capacidade', type=int, default=CAPACIDADE_CHAVES_PADRAO, help='chaves de idempotência guardadas; além delas, a usada há mais tempo é descartada')
+    parser.add_argument('--idempotencia-janela', type=float, default=JANELA_PADRAO, help='segundos durante os quais uma chave de idempotência repetida retorna a resposta original')
+    parser.add_argument('--sem-notificacoes', action='store_true', help='recusa as assinaturas das alterações de saldo das contas')
+    parser.add_argument('--max-assinaturas', type=int, default=MAX_ASSINATURAS_PADRAO, help='contas assinadas ao mesmo tempo por uma conexão')
+    parser.add_argument('--registro', action='store_true', help='registra conexões e atualizações do relógio, fora do caminho das requisições')
+    parser.add_argument('--registro-arquivo', help='arquivo do registro (padrão: saída de erro)')
+    parser.add_argument('--particoes', type=int, default=1, help='processos que dividem as contas entre si pelo RG')
+    parser.add_argument('--porta-particoes', type=int, help='primeira porta interna das partições (padrão: porta + 1)')
+    parser.add_argument('--replicas', type=lambda portas: [int(porta) for porta in portas.split(',')], help='portas de todas as réplicas do grupo, separadas por vírgula, incluindo a deste servidor')
+    parser.add_argument('--pasta', default=PASTA_CONTAS, help='pasta das contas, do diário e dos extratos')
+    parser.add_argument('--backlog', type=int, default=BACKLOG_PADRAO, help='conexões aguardando o accept')
+    parser.add_argument('--prazo-drenagem', type=float, default=PRAZO_DRENAGEM_PADRAO, help='segundos para as operações em andamento terminarem no encerramento')
+    parser.add_argument('--tempo-ocioso', type=float, default=TEMPO_OCIOSO_PADRAO, help='segundos sem receber dados até a conexão ser encerrada (0 não encerra)')
+    parser.add_argument('--max-conexoes', type=int, default=MAX_CONEXOES_PADRAO, help='conexões atendidas ao mesmo tempo; as excedentes são recusadas (0 não limita)')
+    parser.add_argument('--limite-taxa', type=float, default=0, help='requisições por segundo de cada conexão; as excedentes são recusadas (0 não limita)')
+    parser.add_argument('--prazo-envio', type=float, default=PRAZO_ENVIO_PADRAO, help='segundos para o cliente receber uma resposta (0 não limita)')
+    parser.add_argument('--tls-certificado', help='arquivo PEM com o certificado do servidor; ativa o TLS nas conexões dos clientes')
+    parser.add_argument('--tls-chave', help='arquivo PEM com a chave privada, se não estiver no arquivo do certificado')
+    parser.add_argument('--sessao-validade', type=float, default=VALIDADE_TOKEN_PADRAO, help='segundos durante os quais um token de sessão é aceito na retomada da sessão')
+    parser.add_argument('--sessao-segredo', help='arquivo com o segredo dos tokens de sessão, que continuam aceitos após um reinício (padrão: sorteado a cada início)')
+    parser.add_argument('--arquivo-pid', help='arquivo com o número do processo, atualizado pelo novo processo num reinício (SIGUSR2)')
+    parser.add_argument('--socket-herdado', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--aviso-pronto', type=int, help=argparse.SUPPRESS)
+    argumentos = parser.parse_args()
+
+    if argumentos.relatorio_topo < 1:
+        parser.error('o relatório deve ter ao menos uma conta de maior saldo (--relatorio-topo)')
+    if argumentos.replicas:
+        if argumentos.porta not in argumentos.replicas:
+            parser.error('a porta do servidor deve estar na lista de réplicas')
+        if argumentos.motor != MOTOR_THREADING or argumentos.particoes > 1:
+            parser.error('o servidor replicado requer o motor threading, sem partições')
+        if argumentos.limite_taxa:
+            parser.error('o servidor replicado não limita as requisições por conexão')
+        if argumentos.tls_certificado:
+            parser.error('o servidor replicado não usa TLS')
+    if argumentos.tls_chave and not argumentos.tls_certificado:
+        parser.error('a chave TLS requer o certificado (--tls-certificado)')
+    # O segredo é lido ou sorteado uma única vez, para que as partições aceitem os tokens umas das outras.
+    if argumentos.sessao_segredo:
+        argumentos.segredo_sessao = Path(argumentos.sessao_segredo).read_bytes().strip()
+        if not argumentos.segredo_sessao:
+            parser.error('o arquivo do segredo das sessões está vazio')
+    else:
+        argumentos.segredo_sessao = secrets.token_bytes(32)
+    if argumentos.particoes > 1:
+        if argumentos.socket_herdado is not None:
+            parser.error('o servidor particionado não é reiniciado com o socket herdado')
+        if argumentos.motor != MOTOR_THREADING:
+            parser.error('o servidor particionado requer o motor threading')
+        if argumentos.armazenamento != ARMAZENAMENTO_JSON:
+            parser.error('o servidor particionado requer o armazenamento json, em que cada conta tem o seu arquivo')
+        executar_particoes(argumentos)
+    else:
+        executar_servidor(argumentos)
 
 
 if __name__ == '__main__':
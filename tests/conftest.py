@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import socket
+from typing import Callable, List
+
+import pytest
+
+
+@pytest.fixture
+def portas_livres() -> Callable[[int], List[int]]:
+    """
+    Sorteia portas livres do sistema para os servidores dos testes.
+    :rtype: Callable
+    """
+    def sortear(quantidade: int) -> List[int]:
+        sockets = [socket.socket() for _ in range(quantidade)]
+        try:
+            for s in sockets:
+                s.bind(('localhost', 0))
+            return [s.getsockname()[1] for s in sockets]
+        finally:
+            for s in sockets:
+                s.close()
+
+    return sortear
@@ -0,0 +1,97 @@
+"""
+Failover do grupo de réplicas: com o líder encerrado por SIGKILL durante as escritas, o nó seguinte assume a
+liderança, e nenhuma escrita confirmada ao cliente é perdida.
+"""
+from __future__ import annotations
+
+import shutil
+import signal
+import socket
+import threading
+import time
+from typing import Dict
+
+from pixson.recursos.protocolo import OperacaoDeposito, OperacaoTransferencia, RespostaSucesso
+from benchmarks.comum import RAIZ, requisitar
+from benchmarks.failover import RGS, aguardar_grupo, consultar_saldos, iniciar_replica
+
+PRAZO_RESPOSTA = 10.0
+VALOR = 1
+
+
+def escrever(porta: int, mensagem: str) -> bool:
+    """
+    Envia uma escrita numa nova conexão.
+    :return: Se a escrita foi confirmada ao cliente.
+    :rtype: bool
+    """
+    try:
+        with socket.create_connection(('localhost', porta), timeout=PRAZO_RESPOSTA) as s:
+            return RespostaSucesso.regex.match(requisitar(s, mensagem)) is not None
+    except OSError:
+        return False
+
+
+def depositar_continuamente(porta: int, rg: str, parar: threading.Event, contagem: Dict[str, int]) -> None:
+    """
+    Deposita `VALOR` centavos na conta até ser parado, contando os depósitos tentados e os confirmados.
+    """
+    with socket.create_connection(('localhost', porta), timeout=PRAZO_RESPOSTA) as s:
+        while not parar.is_set():
+            contagem['tentados'] += 1
+            resposta = requisitar(s, OperacaoDeposito(0, rg, VALOR).encapsular())
+            if RespostaSucesso.regex.match(resposta):
+                contagem['confirmados'] += 1
+
+
+def test_seguidor_assume_sem_perder_escritas_confirmadas(portas_livres, tmp_path):
+    portas = portas_livres(3)
+    for no in range(3):
+        shutil.copytree(RAIZ / 'contas', tmp_path / f'contas-{no}')
+    replicas = []
+    try:
+        for no in range(3):
+            replicas.append(iniciar_replica(tmp_path, no, portas))
+        assert aguardar_grupo(portas, lider=0) is not None, 'O grupo não elegeu o nó 0'
+
+        # Escritas no líder e encaminhadas por uma seguidora, todas confirmadas.
+        esperados = consultar_saldos(portas[0])
+        for indice, rg in enumerate(RGS):
+            assert escrever(portas[indice % 3], OperacaoDeposito(0, rg, 100 + indice).encapsular())
+            esperados[rg] += 100 + indice
+        for origem, destino in zip(RGS, RGS[1:]):
+            assert escrever(portas[2], OperacaoTransferencia(0, origem, destino, 50).encapsular())
+            esperados[origem] -= 50
+            esperados[destino] += 50
+
+        # Depósitos contínuos por uma seguidora enquanto o líder é encerrado.
+        parar = threading.Event()
+        contagem = {'tentados': 0, 'confirmados': 0}
+        depositante = threading.Thread(target=depositar_continuamente, args=(portas[2], RGS[0], parar, contagem))
+        depositante.start()
+        time.sleep(0.5)
+        replicas[0].send_signal(signal.SIGKILL)
+        replicas[0].wait()
+        grupo = aguardar_grupo(portas[1:], lider=1)
+        confirmados_apos_falha = contagem['confirmados']
+        limite = time.monotonic() + PRAZO_RESPOSTA
+        while contagem['confirmados'] < confirmados_apos_falha + 10 and time.monotonic() < limite:
+            time.sleep(0.05)
+        parar.set()
+        depositante.join(PRAZO_RESPOSTA)
+
+        assert grupo is not None, 'O nó 1 não assumiu a liderança'
+        assert contagem['confirmados'] >= confirmados_apos_falha + 10, 'Escritas não confirmadas após a falha'
+        assert grupo['epoca'] > 1 and grupo['ativos'] == [1, 2]
+        for porta in portas[1:]:
+            saldos = consultar_saldos(porta)
+            # Um depósito que o cliente não viu confirmado pode ter sido aplicado, mas um confirmado nunca se perde.
+            assert esperados[RGS[0]] + contagem['confirmados'] * VALOR <= saldos[RGS[0]]
+            assert saldos[RGS[0]] <= esperados[RGS[0]] + contagem['tentados'] * VALOR
+            assert {rg: saldo for rg, saldo in saldos.items() if rg != RGS[0]} == {
+                rg: saldo for rg, saldo in esperados.items() if rg != RGS[0]
+            }
+    finally:
+        for replica in replicas:
+            replica.terminate()
+            replica.wait()
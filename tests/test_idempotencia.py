@@ -0,0 +1,89 @@
+"""
+Chaves de idempotência registradas no diário: a repetição de um saque após uma queda do servidor recebe a
+resposta original, sem debitar a conta de novo.
+"""
+from __future__ import annotations
+
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+
+from pixson.recursos.enums import SituacaoChave, StatusLote
+from pixson.recursos.idempotencia import Idempotencia
+from pixson.recursos.protocolo import OperacaoSaldo, OperacaoSaque, RespostaLote, RespostaSucesso
+from benchmarks.comum import RAIZ, aguardar_porta
+
+RG = '0000000000'
+PRAZO_RESPOSTA = 10.0
+
+
+def iniciar_servidor(pasta, porta: int) -> subprocess.Popen:
+    """
+    Inicia o servidor com as contas em `pasta/contas`.
+    :rtype: subprocess.Popen
+    """
+    processo = subprocess.Popen(
+        [sys.executable, '-m', 'pixson.servidor', '--porta', str(porta)],
+        cwd=pasta, env=dict(os.environ, PYTHONPATH=str(RAIZ)), stdout=subprocess.DEVNULL
+    )
+    aguardar_porta(porta)
+    return processo
+
+
+def sacar_e_consultar(porta: int) -> tuple:
+    """
+    Envia o saque com a chave fixa e consulta o saldo da conta.
+    :return: As duas respostas, em texto.
+    :rtype: tuple
+    """
+    saque = OperacaoSaque(0, RG, 100)
+    saque.chave_idempotencia = 'saque-unico'
+    with socket.create_connection(('localhost', porta), timeout=PRAZO_RESPOSTA) as s:
+        arquivo = s.makefile('rb')
+        s.sendall(saque.enquadrar())
+        resposta_saque = arquivo.readline().decode().strip()
+        s.sendall(OperacaoSaldo(0, RG).enquadrar())
+        resposta_saldo = arquivo.readline().decode().strip()
+    return resposta_saque.partition('|')[2], resposta_saldo.partition('|')[2]
+
+
+def test_chave_sobrevive_a_queda_do_servidor(portas_livres, tmp_path):
+    porta, = portas_livres(1)
+    shutil.copytree(RAIZ / 'contas', tmp_path / 'contas')
+    servidor = iniciar_servidor(tmp_path, porta)
+    try:
+        original = sacar_e_consultar(porta)
+        assert original[0] == 's:0|resposta:Saque realizado com sucesso'
+        servidor.send_signal(signal.SIGKILL)
+        servidor.wait()
+
+        servidor = iniciar_servidor(tmp_path, porta)
+        assert sacar_e_consultar(porta) == original
+    finally:
+        servidor.terminate()
+        servidor.wait()
+
+
+def test_anotacoes_reconstroem_as_chaves():
+    idempotencia = Idempotencia()
+    idempotencia.reservar('saque', 1)
+    idempotencia.reservar('lote', 2)
+    idempotencia.reservar('andamento', 3)
+    anotacoes = [
+        idempotencia.concluir('saque', RespostaSucesso(tempo=0, resposta='Saque realizado com sucesso')),
+        idempotencia.concluir('lote', RespostaLote(tempo=0, status=[StatusLote.OK, StatusLote.SALDO_INSUFICIENTE])),
+    ]
+    assert idempotencia.conservar() == anotacoes
+
+    recuperada = Idempotencia()
+    for anotacao in anotacoes:
+        recuperada.anotar(anotacao)
+    situacao, resposta = recuperada.reservar('lote', 2)
+    assert situacao == SituacaoChave.REPETIDA
+    assert resposta.status == [StatusLote.OK, StatusLote.SALDO_INSUFICIENTE]
+    assert recuperada.reservar('saque', 9)[0] == SituacaoChave.DIVERGENTE
+    assert recuperada.reservar('andamento', 3)[0] == SituacaoChave.NOVA
+    assert Idempotencia.impressao(OperacaoSaque(1, RG, 100)) == Idempotencia.impressao(OperacaoSaque(2, RG, 100))
@@ -0,0 +1,86 @@
+"""
+Transferências concorrentes entre as contas de exemplo, nos dois motores do servidor: a soma dos saldos é
+conservada, e nenhuma transferência fica presa nas travas das contas.
+"""
+from __future__ import annotations
+
+import random
+import socket
+import threading
+from re import match
+from typing import List
+
+import pytest
+
+from pixson.recursos.dinheiro import ler_valor
+from pixson.recursos.protocolo import OperacaoLogin, OperacaoSaldo, OperacaoTransferencia, RespostaSucesso
+from benchmarks.comum import RAIZ, requisitar, servidor_temporario
+
+RGS = sorted(arquivo.stem for arquivo in (RAIZ / 'contas').glob('*.json'))
+CLIENTES = 16
+OPERACOES = 150
+# Tempo máximo, em segundos, de cada resposta e de todas as transferências; excedê-lo indica um deadlock.
+PRAZO_RESPOSTA = 10.0
+PRAZO_TOTAL = 60.0
+
+
+def transferir(porta: int, semente: int, largada: threading.Barrier, sessoes: bool, falhas: List[BaseException]) -> None:
+    """
+    Executa transferências de valores aleatórios entre contas aleatórias, nos dois sentidos de cada par, ou,
+    com sessões, da conta autenticada para contas aleatórias.
+    """
+    aleatorio = random.Random(semente)
+    rg_sessao = RGS[semente % len(RGS)]
+    try:
+        with socket.create_connection(('localhost', porta), timeout=PRAZO_RESPOSTA) as s:
+            if sessoes:
+                requisitar(s, OperacaoLogin(0, rg_sessao).encapsular())
+            largada.wait()
+            for tempo in range(OPERACOES):
+                if sessoes:
+                    rg_origem = None
+                    rg_destino = aleatorio.choice([rg for rg in RGS if rg != rg_sessao])
+                else:
+                    rg_origem, rg_destino = aleatorio.sample(RGS, 2)
+                valor = aleatorio.randint(1, 300)
+                resposta = requisitar(s, OperacaoTransferencia(tempo, rg_origem, rg_destino, valor).encapsular())
+                assert resposta, 'Conexão encerrada pelo servidor'
+    except BaseException as erro:
+        falhas.append(erro)
+
+
+def somar_saldos(porta: int) -> int:
+    """
+    Consulta e soma o saldo de todas as contas, em centavos.
+    :rtype: int
+    """
+    total = 0
+    with socket.create_connection(('localhost', porta), timeout=PRAZO_RESPOSTA) as s:
+        for rg in RGS:
+            resposta = RespostaSucesso.desencapsular(requisitar(s, OperacaoSaldo(0, rg).encapsular()))
+            total += ler_valor(match(r'^Saldo: (.*)$', resposta.resposta).group(1))
+    return total
+
+
+@pytest.mark.parametrize('motor', ['threading', 'asyncio'])
+@pytest.mark.parametrize('sessoes', [False, True], ids=['rg-origem', 'sessoes'])
+@pytest.mark.parametrize('argumentos', [[], ['--cache-capacidade', '2']], ids=['cache', 'cache-pequeno'])
+def test_transferencias_concorrentes_conservam_saldo(portas_livres, motor, sessoes, argumentos):
+    porta, = portas_livres(1)
+    with servidor_temporario(porta, ['--motor', motor, *argumentos]):
+        total_inicial = somar_saldos(porta)
+        largada = threading.Barrier(CLIENTES + 1, timeout=PRAZO_TOTAL)
+        falhas: List[BaseException] = []
+        threads = [
+            threading.Thread(target=transferir, args=(porta, semente, largada, sessoes, falhas), daemon=True)
+            for semente in range(CLIENTES)
+        ]
+        for thread in threads:
+            thread.start()
+        largada.wait()
+        for thread in threads:
+            thread.join(PRAZO_TOTAL)
+
+        assert not any(thread.is_alive() for thread in threads), 'Transferências presas nas travas das contas'
+        assert not falhas, falhas
+        assert somar_saldos(porta) == total_inicial